@@ -15,6 +15,13 @@ router = APIRouter()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 GOOGLE_SEARCH_ENGINE_ID = os.getenv("GOOGLE_SEARCH_ENGINE_ID", "")
 
+# SIH_STUB_URL points the fallback at the local Google stand-in
+STUB_URL = os.getenv("SIH_STUB_URL", "").rstrip("/")
+GOOGLE_SEARCH_URL = (
+    f"{STUB_URL}/google/customsearch/v1" if STUB_URL
+    else "https://www.googleapis.com/customsearch/v1"
+)
+
 # Load datasets
 BASE_DIR = Path(__file__).parent.parent
 SIDDHA_PATH = BASE_DIR / "data" / "siddha_clean.json"
@@ -190,7 +197,7 @@ async def google_search_fallback(query: str, system: str) -> List[Dict]:
     Fallback to Google Custom Search API when no local results found.
     Searches for medical/traditional medicine terms related to the query.
     """
-    if not GOOGLE_API_KEY or not GOOGLE_SEARCH_ENGINE_ID:
+    if not STUB_URL and (not GOOGLE_API_KEY or not GOOGLE_SEARCH_ENGINE_ID):
         return []
     
     try:
@@ -205,7 +212,7 @@ async def google_search_fallback(query: str, system: str) -> List[Dict]:
         search_query = f"{query} {system_context.get(system, 'traditional medicine')} term definition"
         
         # Google Custom Search API endpoint
-        url = "https://www.googleapis.com/customsearch/v1"
+        url = GOOGLE_SEARCH_URL
         params = {
             "key": GOOGLE_API_KEY,
             "cx": GOOGLE_SEARCH_ENGINE_ID,
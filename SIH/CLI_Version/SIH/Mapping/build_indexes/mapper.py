@@ -5,7 +5,6 @@ import json
 import re
 import sys
 from pathlib import Path
-from groq import Groq
 
 # -------------------------------------------------------------
 # FIX IMPORT PATHS (based on your folder structure)
@@ -21,11 +20,12 @@ from search_icd import search_icd
 from search_icd_tm2 import search_icd as search_icd_tm2
 from search_icd11_standard import search_icd11_standard
 
+from llm_cache import cached_completion, make_groq_client
+
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+client = make_groq_client()
 # -------------------------------------------------------------
 # Safe JSON extraction
 # -------------------------------------------------------------
@@ -41,7 +41,7 @@ def safe_json_extract(text):
 # -------------------------------------------------------------
 # LLM picks BEST 3 ICD codes
 # -------------------------------------------------------------
-def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list):
+def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list, use_cache=True):
 
     icd_text = "\n".join([
         f"{i+1}. {x['code']} — {x['title']}"
@@ -74,14 +74,16 @@ def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list):
     """
 
     try:
-        res = client.chat.completions.create(
+        # Identical prompts are answered from the LLM cache unless use_cache=False
+        raw = cached_completion(
+            client,
             model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
+            prompt=prompt,
+            use_cache=use_cache,
+            validate=safe_json_extract,
             max_tokens=200,
             temperature=0.1
         )
-
-        raw = res.choices[0].message.content
         parsed = safe_json_extract(raw)
 
         if parsed:
@@ -25,7 +25,13 @@ from typing import Optional, Dict, Tuple
 from pathlib import Path
 
 # WHO ICD-11 API Configuration
-ICD11_API_BASE = "https://id.who.int/icd"
+# SIH_STUB_URL points lookups at the local stand-in servers instead of WHO
+STUB_URL = os.getenv("SIH_STUB_URL", "").rstrip("/")
+ICD11_API_BASE = f"{STUB_URL}/who/icd" if STUB_URL else "https://id.who.int/icd"
+ICD11_TOKEN_URL = (
+    f"{STUB_URL}/who/connect/token" if STUB_URL
+    else "https://icdaccessmanagement.who.int/connect/token"
+)
 ICD11_RELEASE = "release/11/2024-01"  # Latest release
 ICD11_TM2_URI = f"{ICD11_API_BASE}/{ICD11_RELEASE}/tm2"  # Traditional Medicine 2
 ICD11_MMS_URI = f"{ICD11_API_BASE}/{ICD11_RELEASE}/mms"  # Standard MMS (fallback)
@@ -48,7 +54,7 @@ class ICD11Lookup:
     def _get_access_token(self) -> bool:
         """Get OAuth2 access token from WHO"""
         try:
-            token_url = "https://icdaccessmanagement.who.int/connect/token"
+            token_url = ICD11_TOKEN_URL
             
             payload = {
                 'client_id': CLIENT_ID,
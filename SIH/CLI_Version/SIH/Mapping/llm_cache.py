@@ -0,0 +1,227 @@
+"""
+LLM Response Cache
+Content-addressed SQLite cache for Groq chat completions. The refinement
+prompts are deterministic in the query and candidate codes, so identical
+prompts are answered from disk instead of paying the network round trip.
+Also builds the shared Groq client (make_groq_client) for the search modules.
+"""
+
+import os
+import sqlite3
+import hashlib
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Configuration
+DB_FILE = Path(__file__).parent / "llm_cache.db"
+DEFAULT_TTL = 7 * 24 * 3600   # Cached answers expire after a week
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so indentation changes do not miss the cache"""
+    return " ".join(prompt.split())
+
+
+def cache_key(model: str, prompt: str) -> str:
+    """Cache key: model name + SHA-256 of the normalized prompt"""
+    digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+def make_groq_client():
+    """
+    Groq client for the refinement calls.
+    SIH_STUB_URL points it at the local Groq stand-in (local_stubs.py).
+    Without GROQ_API_KEY the client is still built, so importing a search
+    module never fails; its calls are then rejected and callers fall back.
+    """
+    from groq import Groq
+
+    stub_url = os.getenv("SIH_STUB_URL", "").rstrip("/")
+    api_key = os.getenv("GROQ_API_KEY") or ("stub" if stub_url else None)
+    if api_key is None:
+        print("⚠️  GROQ_API_KEY is not set - LLM refinement will use its fallback")
+        api_key = "unset"
+    return Groq(api_key=api_key, base_url=f"{stub_url}/groq" if stub_url else None)
+
+
+class LLMCache:
+    """SQLite-backed store of LLM responses with a TTL"""
+
+    def __init__(self, db_path: str = None, ttl: float = DEFAULT_TTL):
+        """Initialize database connection"""
+        if db_path is None:
+            db_path = DB_FILE
+
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0}
+        self.create_tables()
+
+    def create_tables(self):
+        """Create cache table if it doesn't exist"""
+        with self.lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self.conn.commit()
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        """Cached response for this model/prompt, or None if missing or expired"""
+        key = cache_key(model, prompt)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET hits = hits + 1 WHERE key = ?", (key,))
+            self.conn.commit()
+            self.stats["hits"] += 1
+            return row["response"]
+
+    def put(self, model: str, prompt: str, response: str, ttl: float = None):
+        """Store a response (replaces any previous entry for the prompt)"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key(model, prompt), model, response, now, now + ttl)
+            )
+            self.conn.commit()
+            self.stats["stored"] += 1
+
+    def purge_expired(self) -> int:
+        """Delete expired entries. Returns how many were removed."""
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        """Drop every cached response"""
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_cache")
+            self.conn.commit()
+
+    def get_statistics(self) -> Dict:
+        """Hit/miss counters for this process plus what is stored on disk"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS lifetime_hits "
+                "FROM llm_cache WHERE expires_at > ?",
+                (time.time(),)
+            ).fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": row["entries"],
+            "lifetime_hits": row["lifetime_hits"]
+        }
+
+    def close(self):
+        """Close database connection"""
+        if self.conn:
+            self.conn.close()
+
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()
+
+
+# -------------------------------------------------------------
+# Cached chat completion
+# -------------------------------------------------------------
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """Process-wide cache (created on first use)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+    return _cache
+
+
+def cached_completion(
+    client,
+    model: str,
+    prompt: str,
+    use_cache: bool = True,
+    validate: Callable[[str], object] = None,
+    ttl: float = None,
+    timeout: float = None,
+    **params
+) -> str:
+    """
+    Chat completion for a single user prompt, served from the cache when possible
+
+    Args:
+        client: Groq client
+        model: Model name (part of the cache key)
+        prompt: User prompt
+        use_cache: False bypasses the cache for this call (result is still stored)
+        validate: Only responses for which validate(text) is truthy are cached,
+                  so an unparseable answer is not replayed
+        ttl: Override the cache TTL in seconds
+        timeout: Hard deadline in seconds for the LLM call (no retries when set)
+        **params: Passed to client.chat.completions.create (max_tokens, temperature, ...)
+
+    Returns:
+        Response text
+    """
+    cache = get_cache()
+
+    if use_cache:
+        cached = cache.get(model, prompt)
+        if cached is not None:
+            return cached
+    else:
+        cache.stats["bypassed"] += 1
+
+    if timeout is not None:
+        client = client.with_options(timeout=timeout, max_retries=0)
+
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        **params
+    )
+    text = response.choices[0].message.content
+
+    try:
+        cacheable = validate is None or validate(text)
+    except Exception:
+        cacheable = False
+    if cacheable:
+        cache.put(model, prompt, text, ttl)
+    return text
+
+
+def cache_stats() -> Dict:
+    """Statistics of the process-wide cache"""
+    return get_cache().get_statistics()
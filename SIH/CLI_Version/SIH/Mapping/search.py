@@ -6,17 +6,14 @@ import pickle
 import numpy as np
 from pathlib import Path
 
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
 from scipy import sparse
 from sentence_transformers import SentenceTransformer, util
-from groq import Groq
+from llm_cache import cached_completion, make_groq_client
 
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+client = make_groq_client()
 # -------------------------------------------------------------
 # PATHS
 # -------------------------------------------------------------
@@ -93,10 +90,11 @@ def semantic_rerank(query, candidate_ids, top_k=5):
 # -------------------------------------------------------------
 # 4) LLM Refinement — pick the BEST Siddha diagnosis
 # -------------------------------------------------------------
-def refine_with_llm(query, candidates):
+def refine_with_llm(query, candidates, use_cache=True):
     """
     candidates = list of dicts:
     [{"code": "...", "term": "...", "score": 0.xx}, ...]
+    use_cache = False skips the LLM cache lookup (the fresh answer is still stored)
     """
 
     # Format candidate list for LLM
@@ -118,17 +116,17 @@ def refine_with_llm(query, candidates):
     """
 
     try:
-        response = client.chat.completions.create(
+        raw = cached_completion(
+            client,
             model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
+            prompt=prompt,
+            use_cache=use_cache,
+            validate=lambda text: json.loads(text.strip()),
             max_tokens=150,
             temperature=0.2
-        )
-
-        raw = response.choices[0].message.content.strip()
+        ).strip()
 
         # Safe JSON extraction
-        import json
         result = json.loads(raw)
         return result
 
@@ -3,8 +3,6 @@ import pickle
 import numpy as np
 from pathlib import Path
 
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
 from scipy import sparse
 from sentence_transformers import SentenceTransformer, util
 
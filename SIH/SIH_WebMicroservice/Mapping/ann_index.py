@@ -0,0 +1,330 @@
+"""
+Approximate Nearest-Neighbour Index
+IVF (inverted file) index over a corpus's document embeddings, used as a
+dense retrieval path next to BM25 -> TF-IDF. Documents are clustered
+with spherical k-means; a query scans the documents of the `nprobe`
+lists whose centroids are closest to it, so a symptom description with no
+word in common with the right code can still reach the semantic stage.
+Plain numpy on CPU; the index stores only centroids and list membership,
+and scores against the corpus's own (possibly mmap'd) embedding matrix.
+
+Corpora below SIH_ANN_MIN_DOCS get a single list, i.e. an exact scan:
+sentence embeddings of short medical terms are weakly clustered, so an
+IVF scan loses recall, while an exact scan of a few thousand rows takes
+a couple of milliseconds (see benchmark_ann.py).
+
+Large corpora (SIH_BINARY_MIN_DOCS and up: ICD-11 standard, ICD-10) can
+instead get a BinaryIndex: one sign bit per dimension, packed into uint64
+words, is compared with the query's bits by XOR + popcount over every row,
+and the SIH_BINARY_RESCORE rows at the smallest Hamming distance are
+rescored with the stored embeddings. The signs are taken around the
+corpus mean; the raw embeddings all point roughly the same way, and their
+plain sign bits barely tell documents apart.
+
+Configuration:
+    SIH_DENSE_RETRIEVAL   1 (default) adds ANN candidates to the lexical ones, 0 disables
+    SIH_DENSE_K           dense candidates per query (default 20)
+    SIH_ANN_NPROBE        lists scanned per query (default 16)
+    SIH_ANN_MIN_DOCS      corpus size from which IVF lists are built (default 10000)
+    SIH_BINARY_PREFILTER  1 (default) builds a sign-bit prefilter for large corpora, 0 keeps IVF
+    SIH_BINARY_MIN_DOCS   corpus size from which the prefilter replaces IVF (default 10000)
+    SIH_BINARY_RESCORE    prefilter candidates rescored per query (default 800)
+"""
+
+import os
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from embedding_matrix import cosine_scores, normalize_rows
+
+# Configuration
+DENSE_RETRIEVAL = os.getenv("SIH_DENSE_RETRIEVAL", "1") == "1"
+DENSE_K = int(os.getenv("SIH_DENSE_K", "20"))
+NPROBE = int(os.getenv("SIH_ANN_NPROBE", "16"))
+ANN_MIN_DOCS = int(os.getenv("SIH_ANN_MIN_DOCS", "10000"))
+BINARY_PREFILTER = os.getenv("SIH_BINARY_PREFILTER", "1") == "1"
+BINARY_MIN_DOCS = int(os.getenv("SIH_BINARY_MIN_DOCS", "10000"))
+RESCORE = int(os.getenv("SIH_BINARY_RESCORE", "800"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 256           # training points per list
+
+
+class IVFIndex:
+    """
+    Inverted lists over the rows of an embedding matrix
+
+    centroids: (lists x dim) unit vectors
+    offsets:   list j holds ids[offsets[j]:offsets[j + 1]]
+    ids:       document rows grouped by list
+    """
+
+    kind = "ivf"
+    arrays = ("centroids", "offsets", "ids")
+    options = ("nprobe",)
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray,
+                 nprobe: int = NPROBE):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.nprobe = nprobe
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def probe(self, q_unit: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows in the nprobe lists closest to a unit query vector"""
+        if nprobe >= self.n_lists:
+            return self.ids
+        nearest = np.argpartition(-(self.centroids @ q_unit), nprobe - 1)[:nprobe]
+        return np.concatenate([self.ids[self.offsets[j]:self.offsets[j + 1]] for j in nearest])
+
+    def search(self, embeddings, query: np.ndarray, top_k: int = DENSE_K, nprobe: int = None):
+        """
+        Approximate top_k rows by cosine similarity to the query
+
+        Returns (row ids, scores), best first.
+        """
+        q_unit = normalize_rows(query).ravel()
+        rows = np.sort(self.probe(q_unit, nprobe or self.nprobe))   # sorted: sequential mmap reads
+        if not len(rows):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = cosine_scores(embeddings, q_unit, rows)
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return rows[best], scores[best]
+
+    def extended(self, n_base: int, extra: np.ndarray, deleted: Sequence[int] = ()) -> "IVFIndex":
+        """
+        Copy with rows n_base, n_base + 1, ... (the extra vectors) assigned
+        to their nearest list and deleted rows dropped (for live corpus
+        updates; rows keep their numbering)
+        """
+        extra = np.asarray(extra, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        lists = np.repeat(np.arange(self.n_lists), np.diff(self.offsets))
+        ids = self.ids
+        if len(deleted):
+            keep = ~np.isin(ids, np.asarray(deleted, dtype=np.int64))
+            ids, lists = ids[keep], lists[keep]
+        if len(extra):
+            extra_lists = np.argmax(normalize_rows(extra) @ self.centroids.T, axis=1)
+            ids = np.concatenate([ids, n_base + np.arange(len(extra))])
+            lists = np.concatenate([lists, extra_lists])
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=self.n_lists))])
+        return IVFIndex(self.centroids, offsets, ids[order], self.nprobe)
+
+    def get_statistics(self) -> Dict:
+        sizes = np.diff(self.offsets)
+        return {
+            "kind": self.kind,
+            "lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "docs": len(self.ids),
+            "largest_list": int(sizes.max()) if len(sizes) else 0
+        }
+
+
+def pack_signs(vectors) -> np.ndarray:
+    """One bit per dimension (1 where positive), packed into uint64 words per row"""
+    signs = np.atleast_2d(np.asarray(vectors)) > 0
+    pad = -signs.shape[1] % 64
+    if pad:
+        signs = np.pad(signs, ((0, 0), (0, pad)))
+    return np.packbits(signs, axis=1).view(np.uint64)
+
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming(bits: np.ndarray, q_bits: np.ndarray) -> np.ndarray:
+    """Hamming distance of every packed row to the packed query"""
+    diff = bits ^ q_bits
+    if hasattr(np, "bitwise_count"):    # numpy >= 2.0: hardware popcount
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT8[diff.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+class BinaryIndex:
+    """
+    Sign-bit prefilter over every row of an embedding matrix
+
+    center: (dim,) mean unit vector the signs are taken around
+    bits:   (docs x words) packed signs of (row - center)
+    ids:    document row of each bits row
+    """
+
+    kind = "binary"
+    arrays = ("center", "bits", "ids")
+    options = ("rescore",)
+
+    def __init__(self, center: np.ndarray, bits: np.ndarray, ids: np.ndarray, rescore: int = RESCORE):
+        self.center = np.asarray(center, dtype=np.float32)
+        self.bits = np.asarray(bits, dtype=np.uint64)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.rescore = rescore
+
+    def __len__(self):
+        return len(self.ids)
+
+    def prefilter(self, q_unit: np.ndarray, rescore: int) -> np.ndarray:
+        """Rows of the `rescore` smallest Hamming distances to a unit query vector"""
+        if rescore >= len(self.ids):
+            return self.ids
+        distances = hamming(self.bits, pack_signs(q_unit - self.center))
+        return self.ids[np.argpartition(distances, rescore - 1)[:rescore]]
+
+    def search(self, embeddings, query: np.ndarray, top_k: int = DENSE_K, rescore: int = None):
+        """
+        Top_k rows by cosine similarity among the prefiltered rows
+
+        Returns (row ids, scores), best first.
+        """
+        q_unit = normalize_rows(query).ravel()
+        rows = np.sort(self.prefilter(q_unit, rescore or self.rescore))
+        if not len(rows):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = cosine_scores(embeddings, q_unit, rows)
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return rows[best], scores[best]
+
+    def extended(self, n_base: int, extra: np.ndarray, deleted: Sequence[int] = ()) -> "BinaryIndex":
+        """Copy with the extra vectors as rows n_base, n_base + 1, ... and deleted rows dropped"""
+        extra = np.asarray(extra, dtype=np.float32).reshape(-1, len(self.center))
+        bits, ids = self.bits, self.ids
+        if len(deleted):
+            keep = ~np.isin(ids, np.asarray(deleted, dtype=np.int64))
+            bits, ids = bits[keep], ids[keep]
+        if len(extra):
+            bits = np.concatenate([bits, pack_signs(normalize_rows(extra) - self.center)])
+            ids = np.concatenate([ids, n_base + np.arange(len(extra))])
+        return BinaryIndex(self.center, bits, ids, self.rescore)
+
+    def get_statistics(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "docs": len(self.ids),
+            "bits": int(self.bits.shape[1] * 64),
+            "rescore": self.rescore,
+            "bytes": int(self.bits.nbytes)
+        }
+
+
+ANN_KINDS = {cls.kind: cls for cls in (IVFIndex, BinaryIndex)}
+
+
+# -------------------------------------------------------------
+# Build
+# -------------------------------------------------------------
+def default_kind(n_docs: int) -> str:
+    """The sign-bit prefilter for large corpora (if enabled), else IVF"""
+    return "binary" if BINARY_PREFILTER and n_docs >= BINARY_MIN_DOCS else "ivf"
+
+
+def ann_params(n_docs: int) -> tuple:
+    """Everything the index built for an n_docs corpus depends on, besides the embeddings"""
+    if default_kind(n_docs) == "binary":
+        return ("binary", RESCORE)
+    return ("ivf", default_lists(n_docs), NPROBE, KMEANS_ITERATIONS)
+
+
+def build_ann(embeddings):
+    """BinaryIndex or IVFIndex for the corpus, per default_kind()"""
+    if default_kind(len(embeddings)) == "binary":
+        return build_binary(embeddings)
+    return build_ivf(embeddings)
+
+
+def build_binary(embeddings, rescore: int = RESCORE) -> BinaryIndex:
+    """Pack the sign bits of every row around the mean unit row"""
+    units = normalize_rows(embeddings)
+    center = units.mean(axis=0) if len(units) else np.zeros(units.shape[1], np.float32)
+    return BinaryIndex(center, pack_signs(units - center), np.arange(len(units)), rescore)
+
+
+def default_lists(n_docs: int) -> int:
+    """About sqrt(N) lists, and one list (exact scan) below ANN_MIN_DOCS"""
+    if n_docs < ANN_MIN_DOCS:
+        return 1
+    return int(np.sqrt(n_docs))
+
+
+def build_ivf(embeddings, n_lists: int = None, nprobe: int = NPROBE,
+              iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> IVFIndex:
+    """Cluster the rows with spherical k-means and build the inverted lists"""
+    units = normalize_rows(embeddings)
+    n = len(units)
+    n_lists = min(n_lists or default_lists(n), max(n, 1))
+
+    if n_lists <= 1:
+        centroid = normalize_rows(units.mean(axis=0, keepdims=True)) if n else np.zeros((1, units.shape[1]), np.float32)
+        return IVFIndex(centroid, [0, n], np.arange(n), nprobe)
+
+    rng = np.random.default_rng(seed)
+    sample = units[rng.choice(n, min(n, n_lists * KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        members = sparse.csr_matrix((np.ones(len(sample), np.float32), (assign, np.arange(len(sample)))),
+                                    shape=(n_lists, len(sample)))
+        sums = np.asarray(members @ sample)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]   # reseed empty lists
+        centroids = normalize_rows(sums)
+
+    assign = np.concatenate([
+        np.argmax(units[i:i + 4096] @ centroids.T, axis=1) for i in range(0, n, 4096)
+    ])
+    order = np.argsort(assign, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+    return IVFIndex(centroids, offsets, order, nprobe)
+
+
+# -------------------------------------------------------------
+# Search helpers
+# -------------------------------------------------------------
+def exact_search(embeddings, query: np.ndarray, top_k: int = DENSE_K):
+    """Brute-force cosine top_k over every row (reference for recall)"""
+    scores = cosine_scores(embeddings, query)
+    k = min(top_k, len(scores))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return best, scores[best]
+
+
+def union_ids(lexical: Sequence[int], dense: Sequence[int]) -> List[int]:
+    """Lexical candidates in order, then dense ones not already present"""
+    return list(dict.fromkeys([int(i) for i in lexical] + [int(i) for i in dense]))
+
+
+def recall_at_k(index, embeddings, queries: np.ndarray, k: int = 10,
+                nprobe: int = None) -> Dict:
+    """
+    Recall@k of an IVFIndex / BinaryIndex search against exact search, with
+    mean latencies (nprobe: lists probed, or rows rescored by a BinaryIndex)
+    """
+    hits, ann_s, exact_s = 0, 0.0, 0.0
+    for q in queries:
+        start = time.perf_counter()
+        truth, _ = exact_search(embeddings, q, k)
+        exact_s += time.perf_counter() - start
+        start = time.perf_counter()
+        found, _ = index.search(embeddings, q, k, nprobe)
+        ann_s += time.perf_counter() - start
+        hits += len(set(truth.tolist()) & set(found.tolist()))
+    n = max(len(queries), 1)
+    return {
+        "recall": hits / (n * k),
+        "ann_ms": ann_s / n * 1000,
+        "exact_ms": exact_s / n * 1000
+    }
@@ -13,6 +13,8 @@ router = APIRouter()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Users allowed to change the search corpora (comma-separated usernames)
+ADMIN_USERS = {u.strip() for u in os.getenv("SIH_ADMIN_USERS", "").split(",") if u.strip()}
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
@@ -96,6 +98,11 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_admin_user(current_user: User = Depends(get_current_active_user)):
+    if current_user.username not in ADMIN_USERS:
+        raise HTTPException(status_code=403, detail="Admin rights required")
+    return current_user
+
 async def get_optional_user(token: str = Depends(oauth2_scheme)):
     if not token:
         return None
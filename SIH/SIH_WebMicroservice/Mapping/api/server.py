@@ -2,21 +2,34 @@
 # server.py  (FastAPI Backend for Siddha → ICD Mapping System)
 # -------------------------------------------------------------
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional
 from .autocomplete import router as autocomplete_router
-from .auth_simple import router as auth_router, get_optional_user, User
+from .auth_simple import router as auth_router, get_optional_user, get_current_active_user, get_admin_user, User
 import os
-from emr_integration_hapi import BahmniIntegration
+from emr_integration_hapi import BahmniIntegration, default_base_url
+from emr_outbox import enqueue_condition, get_outbox, start_dispatcher, stop_dispatcher
+from llm_cache import cache_stats
+from llm_jobs import LLM_DEADLINE, get_jobs, shutdown_jobs
+from index_registry import WATCH, index_stats, reload_system, start_watcher, stop_watcher
+from corpus_store import CORPORA, corpus_stats
+from live_updates import enable_live_updates, get_live, live_stats, start_compactor, stop_compactor
+from encoder import encoder_stats, stop_batcher
+from code_lookup import code_lookup_stats
+from tm_sessions import get_sessions, picked_candidates
+from mapping_table import mapping_table_stats
+import asyncio
+import json
 
 # Import your logic
-from search import search_siddha
+from search import search_siddha, refine_with_llm
 from search_ayurveda import search_ayurveda
 from search_unani import search_unani
-from build_indexes.mapper import map_to_icd
+from build_indexes.mapper import map_code, llm_pick_best
 from fhir_generator import generate_fhir_from_mapping, generate_fhir_bundle_from_mappings
 from icd11_fhir_pipeline import ICD11FHIRPipeline
 # from emr_integration import BahmniIntegration
@@ -71,10 +84,14 @@ class DiagnoseInput(BaseModel):
 class MapInput(BaseModel):
     query: str
     system: str = "siddha"
+    refine: bool = False  # start a background LLM refinement job
 
 class MapSiddhaCodeInput(BaseModel):
     code: str
-    term: str
+    term: Optional[str] = None     # required unless session or record gives it
+    refine: bool = False  # start a background LLM pick of the best ICD-11 codes
+    session: Optional[str] = None  # token from /{system}/diagnose or /map: reuse its candidates
+    record: Optional[dict] = None  # or the selected TM candidate itself
 
 class FHIRGenerationInput(BaseModel):
     mapping_result: dict
@@ -84,13 +101,27 @@ class FHIRGenerationInput(BaseModel):
 
 class EMRSendInput(BaseModel):
     fhir_condition: dict
-    emr_url: str = "http://localhost"
+    emr_url: Optional[str] = None     # default_base_url(): http://localhost, or the stand-in
+    username: str = "superman"
+    password: str = "Admin123"
+    idempotency_key: Optional[str] = None
+
+class EMRSendBatchInput(BaseModel):
+    fhir_conditions: list
+    emr_url: Optional[str] = None
     username: str = "superman"
     password: str = "Admin123"
 
 class ICD11CodeInput(BaseModel):
     code: str
 
+class CorpusDocumentInput(BaseModel):
+    code: Optional[str] = None        # required when adding
+    term: Optional[str] = None
+    english: Optional[str] = None     # ayurveda / unani only
+    definition: Optional[str] = None
+    system: Optional[str] = None
+
 
 # -------------------------------------------------------------
 # ROUTE 1 — Siddha Search (Autocomplete)
@@ -117,7 +148,8 @@ def siddha_diagnose(body: DiagnoseInput):
     result = search_siddha(body.symptoms)
     return {
         "input": body.symptoms,
-        "candidates": result["candidates"]
+        "candidates": result["candidates"],
+        "session": get_sessions().create("siddha", body.symptoms, result["candidates"])
     }
 
 @app.post("/ayurveda/diagnose")
@@ -126,7 +158,8 @@ def ayurveda_diagnose(body: DiagnoseInput):
     result = search_ayurveda(body.symptoms)
     return {
         "input": body.symptoms,
-        "candidates": result["candidates"]
+        "candidates": result["candidates"],
+        "session": get_sessions().create("ayurveda", body.symptoms, result["candidates"])
     }
 
 @app.post("/unani/diagnose")
@@ -135,7 +168,8 @@ def unani_diagnose(body: DiagnoseInput):
     result = search_unani(body.symptoms)
     return {
         "input": body.symptoms,
-        "candidates": result["candidates"]
+        "candidates": result["candidates"],
+        "session": get_sessions().create("unani", body.symptoms, result["candidates"])
     }
 
 
@@ -159,29 +193,195 @@ def map_to_icd_system(body: MapInput):
         result = search_siddha(body.query)
         candidates_key = "siddha_candidates"
     
-    return {candidates_key: result["candidates"]}
+    response = {candidates_key: result["candidates"],
+                "session": get_sessions().create(body.system, body.query, result["candidates"])}
+    if body.refine and result["candidates"]:
+        # Candidates go back now; the LLM pick arrives via /llm/jobs/{job_id}
+        response["refinement"] = get_jobs().submit(
+            "refine_tm",
+            refine_with_llm,
+            body.query,
+            result["candidates"],
+            timeout=LLM_DEADLINE,
+            system_name=body.system.replace("-", " ").title()
+        )
+    return response
 
 
+def selected_candidates(body: MapSiddhaCodeInput, system: str):
+    """TM candidates (selected first) from the request's record or session, else None"""
+    try:
+        candidates = picked_candidates(get_sessions(), system, body.code, body.session, body.record)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if candidates is None and not body.term:
+        raise HTTPException(status_code=422, detail="term is required without a session or record")
+    return candidates
+
+def map_code_to_icd(body: MapSiddhaCodeInput, system: str):
+    """Retrieval mapping for a selected TM code, plus an optional refinement job"""
+    tm_candidates = selected_candidates(body, system)
+    term = body.term or tm_candidates[0]["term"]
+    # From the precomputed table if it holds this code and term; with a
+    # record / session the TM corpus is not searched again
+    result = map_code(body.code, term, system=system, tm_candidates=tm_candidates)
+    if body.refine and result["icd11_standard_candidates"]:
+        result["refinement"] = get_jobs().submit(
+            "pick_icd",
+            llm_pick_best,
+            body.code,
+            term,
+            "",
+            result["icd11_standard_candidates"],
+            timeout=LLM_DEADLINE
+        )
+    return result
+
 @app.post("/map/siddha-code")
 def map_specific_siddha_to_icd(body: MapSiddhaCodeInput):
     """Map a specific Siddha code to ICD-11 Standard and ICD-11 TM2."""
-    query = f"{body.code} {body.term}"
-    result = map_to_icd(query, system="siddha")
-    return result
+    return map_code_to_icd(body, "siddha")
 
 @app.post("/map/ayurveda-code")
 def map_specific_ayurveda_to_icd(body: MapSiddhaCodeInput):
     """Map a specific Ayurveda code to ICD-11 Standard and ICD-11 TM2."""
-    query = f"{body.code} {body.term}"
-    result = map_to_icd(query, system="ayurveda")
-    return result
+    return map_code_to_icd(body, "ayurveda")
 
 @app.post("/map/unani-code")
 def map_specific_unani_to_icd(body: MapSiddhaCodeInput):
     """Map a specific Unani code to ICD-11 Standard and ICD-11 TM2."""
-    query = f"{body.code} {body.term}"
-    result = map_to_icd(query, system="unani")
-    return result
+    return map_code_to_icd(body, "unani")
+
+@app.get("/llm/jobs/{job_id}")
+async def llm_job_status(job_id: str, wait: float = 0):
+    """
+    State of a refinement job (pending / running / done / failed / rejected / cancelled).
+    wait > 0 long-polls up to that many seconds (max 30) for the result.
+    """
+    jobs = get_jobs()
+    if wait > 0:
+        job = await asyncio.to_thread(jobs.wait, job_id, min(wait, 30.0))
+    else:
+        job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/llm/jobs/{job_id}/events")
+async def llm_job_events(job_id: str):
+    """Server-sent events: one 'status' event per change, ending with the result."""
+    jobs = get_jobs()
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def stream():
+        last_status = None
+        while True:
+            job = await asyncio.to_thread(jobs.wait, job_id, 1.0)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+            if job["finished_at"]:
+                return
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.on_event("shutdown")
+def stop_llm_jobs():
+    shutdown_jobs()
+
+@app.get("/llm/cache/stats")
+def llm_cache_statistics():
+    """Hit rate and size of the LLM response cache."""
+    return cache_stats()
+
+@app.get("/indexes/stats")
+def search_index_statistics():
+    """Which search indexes are loaded, their load times and resident sizes."""
+    return {**index_stats(), "corpora": corpus_stats(), "live_updates": live_stats(),
+            "code_lookup": code_lookup_stats(), "diagnose_sessions": get_sessions().get_statistics(),
+            "mapping_table": mapping_table_stats()}
+
+@app.get("/encoder/stats")
+def query_encoder_statistics():
+    """Query encoder backend, query cache hits and micro-batch size histograms."""
+    return encoder_stats()
+
+@app.on_event("shutdown")
+def stop_query_batcher():
+    stop_batcher()
+
+@app.post("/indexes/{system}/reload")
+def reload_search_index(system: str, user: User = Depends(get_current_active_user)):
+    """
+    Load the current index files for a system and swap them in.
+    The old version keeps serving until the new one has loaded and passed
+    its manifest check; searches already running finish on the old one.
+    """
+    try:
+        return reload_system(system)
+    except KeyError:
+        return {"error": f"Unknown search system '{system}'"}
+    except Exception as e:
+        return {"error": f"Reload failed, still serving the previous version: {e}", "system": system}
+
+@app.on_event("startup")
+def start_index_watcher():
+    """Reload indexes when their bundles change (SIH_INDEX_WATCH=1)"""
+    if WATCH:
+        start_watcher()
+
+@app.on_event("shutdown")
+def stop_index_watcher():
+    stop_watcher()
+
+def _live_change(system: str, change):
+    if system not in CORPORA:
+        raise HTTPException(status_code=404, detail=f"Unknown corpus '{system}'")
+    try:
+        return change(get_live(system))
+    except KeyError as e:
+        return {"error": e.args[0]}
+    except ValueError as e:
+        return {"error": str(e)}
+
+@app.post("/corpus/{system}/documents")
+def add_corpus_document(system: str, doc: CorpusDocumentInput, admin: User = Depends(get_admin_user)):
+    """
+    Add a document to a live corpus. It is searchable when this returns;
+    only the new document is encoded. Written into the corpus JSON at the
+    next compaction.
+    """
+    return _live_change(system, lambda live: live.add(doc.dict(exclude_none=True)))
+
+@app.put("/corpus/{system}/documents/{code}")
+def update_corpus_document(system: str, code: str, doc: CorpusDocumentInput,
+                           admin: User = Depends(get_admin_user)):
+    """Change the given fields of a document (e.g. fix a definition)"""
+    return _live_change(system, lambda live: live.update(code, doc.dict(exclude_none=True, exclude={"code"})))
+
+@app.delete("/corpus/{system}/documents/{code}")
+def delete_corpus_document(system: str, code: str, admin: User = Depends(get_admin_user)):
+    return _live_change(system, lambda live: live.delete(code))
+
+@app.post("/corpus/{system}/compact")
+def compact_corpus(system: str, admin: User = Depends(get_admin_user)):
+    """Fold pending changes into the corpus JSON and rebuild its indexes now"""
+    return _live_change(system, lambda live: live.compact())
+
+@app.on_event("startup")
+def start_live_updates():
+    """Replay journals left by a previous run and compact in the background"""
+    enable_live_updates(list(CORPORA))
+    start_compactor()
+
+@app.on_event("shutdown")
+def stop_live_updates():
+    stop_compactor()
 
 app.include_router(autocomplete_router)
 app.include_router(auth_router)
@@ -236,21 +436,91 @@ def generate_fhir_bundle(
 # -------------------------------------------------------------
 # ROUTE 5 — Send to EMR (Bahmni)
 # -------------------------------------------------------------
+@app.on_event("startup")
+def start_emr_outbox():
+    """Deliver queued EMR Conditions in the background"""
+    start_dispatcher()
+
+@app.on_event("shutdown")
+def stop_emr_outbox():
+    stop_dispatcher()
+
 @app.post("/emr/send")
-def send_to_emr(body: EMRSendInput):
+def send_to_emr(body: EMRSendInput, user: User = Depends(get_current_active_user)):
+    """
+    Queue a FHIR Condition for delivery to Bahmni EMR.
+    Returns a delivery ID immediately; poll /emr/outbox/{delivery_id}
+    for the outcome.
+    """
+    try:
+        delivery = enqueue_condition(
+            fhir_condition=body.fhir_condition,
+            emr_url=body.emr_url or default_base_url(),
+            username=body.username,
+            password=body.password,
+            idempotency_key=body.idempotency_key
+        )
+        
+        return {
+            "success": True,
+            "message": "Queued for delivery to Bahmni EMR",
+            "delivery_id": delivery["id"],
+            "status": delivery["status"],
+            "resource_id": delivery["resource_id"]
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@app.get("/emr/outbox")
+def emr_outbox_status(
+    status: Optional[str] = None,
+    limit: int = 50,
+    user: User = Depends(get_current_active_user)
+):
+    """
+    Delivery counts (pending / in_progress / delivered / failed)
+    and the most recent deliveries, optionally filtered by status.
+    """
+    outbox = get_outbox()
+    return {
+        "counts": outbox.get_statistics(),
+        "deliveries": outbox.list_deliveries(status=status, limit=limit)
+    }
+
+@app.get("/emr/outbox/{delivery_id}")
+def emr_delivery_status(delivery_id: str, user: User = Depends(get_current_active_user)):
+    """Status of a single EMR delivery."""
+    delivery = get_outbox().get_delivery(delivery_id)
+    if delivery is None:
+        return {"error": "Delivery not found", "delivery_id": delivery_id}
+    return delivery
+
+@app.post("/emr/outbox/{delivery_id}/retry")
+def emr_delivery_retry(delivery_id: str, user: User = Depends(get_current_active_user)):
+    """Re-queue a delivery that failed permanently."""
+    delivery = get_outbox().requeue(delivery_id)
+    if delivery is None:
+        return {"error": "Delivery not found", "delivery_id": delivery_id}
+    start_dispatcher().wake()
+    return delivery
+
+@app.post("/emr/send-batch")
+def send_batch_to_emr(body: EMRSendBatchInput, user: User = Depends(get_current_active_user)):
     """
-    Send FHIR Condition resource to Bahmni EMR.
+    Send several FHIR Conditions (e.g. all diagnoses of an encounter)
+    to the EMR in a single FHIR transaction.
     """
     try:
-        # Connect to Bahmni
         bahmni = BahmniIntegration(
             base_url=body.emr_url,
             username=body.username,
             password=body.password
         )
         
-        # Send FHIR Condition
-        result = bahmni.send_fhir_condition(body.fhir_condition)
+        result = bahmni.send_fhir_conditions(body.fhir_conditions)
         
         if "error" in result:
             return {
@@ -261,9 +531,8 @@ def send_to_emr(body: EMRSendInput):
         
         return {
             "success": True,
-            "message": "Successfully sent to Bahmni EMR",
-            "resource_id": result.get("id"),
-            "resource": result
+            "message": f"Successfully sent {len(result['resource_ids'])} condition(s) to Bahmni EMR",
+            "resource_ids": result["resource_ids"]
         }
     except Exception as e:
         return {
@@ -0,0 +1,111 @@
+"""
+Benchmark: IVF dense retrieval vs exact dense search
+Builds the IVF index for each corpus's embeddings and reports recall@k
+against an exhaustive cosine scan, per-query latency of both, and the
+memory the IVF index adds, for a range of nprobe values. Use it to pick
+SIH_ANN_MIN_DOCS / SIH_ANN_NPROBE for a corpus. With --binary, does the
+same for the sign-bit prefilter over a range of rescore counts
+(SIH_BINARY_MIN_DOCS / SIH_BINARY_RESCORE).
+
+Queries are document embeddings with Gaussian noise added (so the nearest
+neighbour is not trivially the row itself), or with --encode, the sample
+queries below encoded by the shared query encoder.
+
+Usage:
+    python benchmark_ann.py ayurveda icd_tm2
+    python benchmark_ann.py --index-dir ../indexes --queries 500 --k 10 icd11_standard
+    python benchmark_ann.py --encode siddha
+    python benchmark_ann.py --binary icd11_standard icd
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ann_index import build_binary, build_ivf, recall_at_k
+from embedding_matrix import EmbeddingMatrix
+from index_bundle import load_index_files
+
+BASE_DIR = Path(__file__).parent
+QUERIES = [
+    "fever with headache", "knee pain and swelling", "cough with breathlessness",
+    "skin rash itching", "abdominal pain diarrhoea", "burning sensation while passing urine",
+    "loss of appetite and weight loss", "difficulty sleeping", "joint stiffness in the morning",
+    "dizziness and vomiting"
+]
+
+
+def sample_queries(embeddings, count: int, noise: float, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), min(count, len(embeddings)), replace=False))],
+                      dtype=np.float32)
+    scale = noise * np.linalg.norm(rows, axis=1, keepdims=True) / np.sqrt(rows.shape[1])
+    return (rows + scale * rng.normal(size=rows.shape)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of IVF vs exact dense search")
+    parser.add_argument("systems", nargs="+")
+    parser.add_argument("--index-dir", type=Path, default=BASE_DIR / "indexes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5, help="query noise relative to the row norm")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=None,
+                        help="IVF lists (default sqrt(N), even below SIH_ANN_MIN_DOCS)")
+    parser.add_argument("--encode", action="store_true", help="encode the sample text queries")
+    parser.add_argument("--binary", action="store_true", help="benchmark the sign-bit prefilter instead of IVF")
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print(f"🧪 {'Sign-bit prefilter' if args.binary else 'IVF'} vs exact dense search (recall@{args.k})")
+    print("=" * 78)
+
+    for system in args.systems:
+        index = load_index_files(args.index_dir, system)
+        embeddings = np.asarray(index["embeddings"], dtype=np.float32)
+        if args.encode:
+            from encoder import encode_query
+            queries = np.stack([encode_query(q) for q in QUERIES])
+        else:
+            queries = sample_queries(embeddings, args.queries, args.noise)
+        if args.binary:
+            benchmark_binary(system, index["embeddings"], queries, args.k)
+            continue
+
+        start = time.perf_counter()
+        ivf = build_ivf(embeddings, n_lists=args.lists or int(np.sqrt(len(embeddings))))
+        build_s = time.perf_counter() - start
+        extra_mb = sum(getattr(ivf, name).nbytes for name in ("centroids", "offsets", "ids")) / 1024 / 1024
+        print(f"\n{system}: {len(embeddings)} docs x {embeddings.shape[1]}, {ivf.n_lists} lists, "
+              f"built in {build_s:.2f}s, +{extra_mb:.2f} MB ({len(queries)} queries)")
+        print(f"{'nprobe':>8}{'scanned':>10}{'recall':>9}{'ANN ms':>9}{'exact ms':>10}{'speed-up':>10}")
+
+        probes = sorted({p for p in (1, 2, 4, 8, 16, 32) if p < ivf.n_lists} | {ivf.n_lists})
+        for nprobe in probes:
+            result = recall_at_k(ivf, embeddings, queries, k=args.k, nprobe=nprobe)
+            scanned = np.mean([len(ivf.probe(q / np.linalg.norm(q), nprobe)) for q in queries]) / len(embeddings)
+            print(f"{nprobe:>8}{scanned:>10.0%}{result['recall']:>9.3f}{result['ann_ms']:>9.2f}"
+                  f"{result['exact_ms']:>10.2f}{result['exact_ms'] / max(result['ann_ms'], 1e-9):>9.1f}x")
+
+
+def benchmark_binary(system: str, embeddings, queries: np.ndarray, k: int):
+    """Recall and latency of the prefilter + rescore against an exact scan of the same matrix"""
+    start = time.perf_counter()
+    binary = build_binary(embeddings)
+    build_s = time.perf_counter() - start
+    stored = embeddings.storage_dtype if isinstance(embeddings, EmbeddingMatrix) else "float32"
+    print(f"\n{system}: {len(binary)} docs, {binary.bits.shape[1] * 64} bits, built in {build_s:.2f}s, "
+          f"+{binary.bits.nbytes / 1024 / 1024:.2f} MB, rescoring {stored} rows ({len(queries)} queries)")
+    print(f"{'rescore':>8}{'scanned':>10}{'recall':>9}{'ANN ms':>9}{'exact ms':>10}{'speed-up':>10}")
+    for rescore in (100, 200, 400, 800):
+        if rescore >= len(binary):
+            break
+        result = recall_at_k(binary, embeddings, queries, k=k, nprobe=rescore)
+        print(f"{rescore:>8}{rescore / len(binary):>10.0%}{result['recall']:>9.3f}{result['ann_ms']:>9.2f}"
+              f"{result['exact_ms']:>10.2f}{result['exact_ms'] / max(result['ann_ms'], 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
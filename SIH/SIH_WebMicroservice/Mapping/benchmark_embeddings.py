@@ -0,0 +1,100 @@
+"""
+Benchmark: embedding storage dtypes for the semantic rerank
+For each corpus, compares the old rerank (fancy-index float32 rows, then
+sentence_transformers util.cos_sim) with the normalized dot-product kernel
+over float32, float16 and int8 matrices, and over matrices reduced to
+--dims dimensions (basis fitted on the corpus, as index_builder.py --dim
+does): memory, latency of a 60-candidate rerank and of a full-corpus scan,
+and accuracy against full float32 cosine (top-1 agreement, recall@10 of
+the full scan, largest score error).
+
+Queries are document embeddings with Gaussian noise added, or with
+--queries-from, the embeddings of another corpus: real encoded texts.
+Prefer the latter for reduced matrices; noise added in every dimension
+falls mostly outside the reduced basis and skews their recall.
+
+Usage:
+    python benchmark_embeddings.py ayurveda siddha
+    python benchmark_embeddings.py --index-dir ../indexes --queries 500 icd_tm2
+    python benchmark_embeddings.py --dims 128 256 --queries-from unani icd_tm2
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmark_ann import sample_queries
+from embedding_matrix import DTYPES, EmbeddingMatrix, cosine_scores, fit_projection
+from index_bundle import load_index_files
+
+BASE_DIR = Path(__file__).parent
+CANDIDATES = 60
+
+
+def timed(fn, n: int) -> float:
+    """Mean milliseconds of fn(i) over i = 0 .. n-1"""
+    fn(0)
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory, speed and accuracy of embedding dtypes")
+    parser.add_argument("systems", nargs="+")
+    parser.add_argument("--index-dir", type=Path, default=BASE_DIR / "indexes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.2, help="query noise relative to the row norm")
+    parser.add_argument("--queries-from", help="use this corpus's embeddings as queries")
+    parser.add_argument("--dims", type=int, nargs="*", default=[128, 256], help="reduced dimensions to compare")
+    args = parser.parse_args()
+
+    from sentence_transformers import util
+
+    print("=" * 86)
+    print(f"🧪 Semantic rerank by embedding dtype ({CANDIDATES} candidates)")
+    print("=" * 86)
+
+    for system in args.systems:
+        raw = np.asarray(load_index_files(args.index_dir, system)["embeddings"], dtype=np.float32)
+        if args.queries_from:
+            source = np.asarray(load_index_files(args.index_dir, args.queries_from)["embeddings"], dtype=np.float32)
+            queries = source[np.random.default_rng(7).permutation(len(source))[:args.queries]]
+        else:
+            queries = sample_queries(raw, args.queries, args.noise)
+        rng = np.random.default_rng(11)
+        candidates = [rng.choice(len(raw), CANDIDATES, replace=False) for _ in queries]
+        truth = [cosine_scores(raw, q) for q in queries]
+
+        print(f"\n{system}: {len(raw)} docs x {raw.shape[1]}")
+        print(f"{'storage':<18}{'MB':>7}{'rerank ms':>11}{'scan ms':>9}{'top-1':>8}{'recall@10':>11}{'max err':>10}")
+
+        n = len(queries)
+        rerank_ms = timed(lambda i: util.cos_sim(queries[i], raw[candidates[i]]).cpu().numpy()[0], n)
+        print(f"{'float32 cos_sim':<18}{raw.nbytes / 2**20:>7.2f}{rerank_ms:>11.3f}{'':>9}{'':>8}{'':>11}{'':>10}")
+
+        variants = [(dtype, dtype, None) for dtype in DTYPES]
+        for dim in args.dims:
+            if dim < raw.shape[1]:
+                basis = fit_projection(raw, dim)
+                variants += [(f"{dtype} {dim}d", dtype, basis) for dtype in ("float32", "int8")]
+
+        for label, dtype, basis in variants:
+            matrix = EmbeddingMatrix.from_vectors(raw, dtype, basis)
+            rerank_ms = timed(lambda i: cosine_scores(matrix, queries[i], candidates[i]), n)
+            scan_ms = timed(lambda i: cosine_scores(matrix, queries[i]), n)
+            top1 = recall = error = 0.0
+            for q, expected in zip(queries, truth):
+                scores = cosine_scores(matrix, q)
+                top1 += np.argmax(scores) == np.argmax(expected)
+                recall += len(set(np.argsort(-scores)[:10]) & set(np.argsort(-expected)[:10])) / 10
+                error = max(error, float(np.abs(scores - expected).max()))
+            print(f"{label:<18}{matrix.nbytes / 2**20:>7.2f}{rerank_ms:>11.3f}{scan_ms:>9.2f}"
+                  f"{top1 / n:>8.3f}{recall / n:>11.3f}{error:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark: query encoder backends
+Per-query latency of the torch sentence-transformer and of its ONNX
+Runtime exports (onnx_encoder.py), one encode call per query as the search
+modules make them, with parity against torch: smallest cosine over the
+queries and, with --system, how much of the dense top-10 over that corpus
+stays the same.
+
+With --concurrency N, N threads encode queries at once through the default
+backend, each query its own call or collected by the micro-batcher
+(encode_batcher.py), and throughput / latency of both are compared.
+
+Usage:
+    python benchmark_encoder.py
+    python benchmark_encoder.py --repeat 50 --threads 1 --system icd_tm2
+    python benchmark_encoder.py --concurrency 16
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ann_index import exact_search
+from benchmark_ann import QUERIES
+from encode_batcher import MAX_BATCH, WINDOW_MS, QueryBatcher
+from encoder import get_embedder
+from onnx_encoder import FILES, ONNX_DIR, PARITY_TEXTS, load_encoder, parity
+
+BASE_DIR = Path(__file__).parent
+
+
+def latencies(encoder, queries, repeat: int) -> np.ndarray:
+    """Milliseconds of each single-query encode call"""
+    encoder.encode([queries[0]])
+    times = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            encoder.encode([query])
+            times.append((time.perf_counter() - start) * 1000)
+    return np.array(times)
+
+
+def concurrent_run(encode_one, queries, clients: int, repeat: int):
+    """(queries per second, per-query ms) with `clients` threads splitting the queries"""
+    work = [q for _ in range(repeat) for q in queries]
+    times = [[] for _ in range(clients)]
+    barrier = threading.Barrier(clients + 1)
+
+    def client(i):
+        barrier.wait()
+        for query in work[i::clients]:
+            start = time.perf_counter()
+            encode_one(query)
+            times[i].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    return len(work) / (time.perf_counter() - start), np.concatenate([np.array(t) for t in times])
+
+
+def benchmark_batching(queries, clients: int, repeat: int, window_ms: float, max_batch: int):
+    encoder = get_embedder(remote=False)
+    encoder.encode(queries)
+    batcher = QueryBatcher(lambda texts: encoder.encode(texts, batch_size=len(texts)), window_ms, max_batch)
+    modes = {
+        "per query": (lambda query: encoder.encode([query])[0], None),
+        f"batched {window_ms:g}ms": (batcher.encode, batcher)
+    }
+
+    print("=" * 78)
+    print(f"🧪 {clients} concurrent clients: {len(queries)} queries x {repeat}")
+    print("=" * 78)
+    print(f"{'mode':<16}{'queries/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'mean batch':>12}")
+    for name, (encode_one, stats) in modes.items():
+        rate, times = concurrent_run(encode_one, queries, clients, repeat)
+        mean_batch = stats.get_statistics()["mean_batch_size"] if stats else 1.0
+        print(f"{name:<16}{rate:>11.1f}{np.percentile(times, 50):>9.2f}{np.percentile(times, 95):>9.2f}"
+              f"{mean_batch:>12.1f}")
+    batcher.stop()
+    print(f"\nBatch sizes: {batcher.get_statistics()['batch_size_histogram']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and parity of the query encoder backends")
+    parser.add_argument("--onnx-dir", type=Path, default=ONNX_DIR)
+    parser.add_argument("--repeat", type=int, default=10, help="passes over the queries")
+    parser.add_argument("--threads", type=int, default=0, help="threads per backend (0: library default)")
+    parser.add_argument("--system", help="also compare dense top-10 over this corpus")
+    parser.add_argument("--index-dir", type=Path, default=BASE_DIR / "indexes")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="compare per-query and micro-batched encoding under this many client threads")
+    parser.add_argument("--window-ms", type=float, default=WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    queries = QUERIES + PARITY_TEXTS
+    if args.concurrency:
+        benchmark_batching(queries, args.concurrency, args.repeat, args.window_ms, args.max_batch)
+        return
+
+    backends = {"torch": get_embedder("torch", remote=False)}
+    for backend in FILES:
+        try:
+            backends[backend] = load_encoder(backend, args.onnx_dir, threads=args.threads)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"⚠️  {backend} skipped: {e}")
+
+    embeddings = None
+    if args.system:
+        from index_bundle import load_index_files
+        embeddings = load_index_files(args.index_dir, args.system)["embeddings"]
+
+    print("=" * 78)
+    print(f"🧪 Query encoding: {len(queries)} queries x {args.repeat}")
+    print("=" * 78)
+    print(f"{'backend':<12}{'MB':>8}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'speed-up':>10}"
+          f"{'min cos':>10}{'top-10':>8}")
+
+    reference = backends["torch"].encode(queries)
+    torch_mean = None
+    for name, encoder in backends.items():
+        if name == "torch":
+            size = sum(p.numel() * p.element_size() for p in encoder.parameters()) / 1024 / 1024
+        else:
+            size = encoder.path.stat().st_size / 1024 / 1024
+        times = latencies(encoder, queries, args.repeat)
+        torch_mean = torch_mean or times.mean()
+        vectors = encoder.encode(queries)
+        check = parity(reference, vectors, 0.0)
+        overlap = ""
+        if embeddings is not None:
+            hits = sum(len(set(exact_search(embeddings, r, 10)[0].tolist())
+                           & set(exact_search(embeddings, v, 10)[0].tolist()))
+                       for r, v in zip(reference, vectors))
+            overlap = f"{hits / (10 * len(queries)):.3f}"
+        print(f"{name:<12}{size:>8.1f}{np.percentile(times, 50):>9.2f}{np.percentile(times, 95):>9.2f}"
+              f"{times.mean():>9.2f}{torch_mean / times.mean():>9.1f}x{check['min_cosine']:>10.5f}{overlap:>8}")
+
+
+if __name__ == "__main__":
+    main()
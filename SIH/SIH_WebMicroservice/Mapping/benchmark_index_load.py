@@ -0,0 +1,110 @@
+"""
+Benchmark: pickle indexes vs binary index bundles
+Each load runs in a fresh subprocess so the numbers include a cold import
+of the index files and the process RSS growth it causes (corpus strings come
+from corpus_store in both cases and are not counted). A BM25 + TF-IDF query
+is timed after loading to show the bundle scorer is not slower.
+
+Usage:
+    python convert_indexes.py ayurveda            # create the bundle first
+    python benchmark_index_load.py ayurveda --runs 5
+    python benchmark_index_load.py --index-dir ../indexes icd_tm2
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+QUERY = "fever with headache and body pain"
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def child(mode: str, system: str, index_dir: Path):
+    """Load one corpus one way and print JSON timings"""
+    import numpy as np
+    import scipy.sparse  # noqa: F401  (import cost is not part of the load)
+    import sklearn.feature_extraction.text  # noqa: F401
+    import rank_bm25  # noqa: F401
+
+    from index_bundle import bundle_path, load_bundle, load_pickled_indexes
+
+    before = rss_bytes()
+    start = time.perf_counter()
+    if mode == "pickle":
+        index = load_pickled_indexes(index_dir, system)
+    else:
+        index = load_bundle(bundle_path(index_dir, system))
+    load_ms = (time.perf_counter() - start) * 1000
+    loaded = rss_bytes()
+
+    start = time.perf_counter()
+    scores = index["bm25"].get_scores(QUERY.lower().split())
+    top = np.argsort(scores)[::-1][:100]
+    q_vec = index["tfidf_vectorizer"].transform([QUERY])
+    (index["tfidf_matrix"][top] @ q_vec.T).toarray()
+    index["embeddings"][top[:60]].sum()
+    query_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "load_ms": load_ms,
+        "rss_mb": (loaded - before) / 1024 / 1024,
+        "query_ms": query_ms
+    }))
+
+
+def run(mode: str, system: str, index_dir: Path) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", mode, system, "--index-dir", str(index_dir)],
+        capture_output=True, text=True, check=True, cwd=BASE_DIR
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pickle and bundle index loading")
+    parser.add_argument("systems", nargs="+")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--index-dir", type=Path, default=BASE_DIR / "indexes")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.systems[0], args.index_dir.resolve())
+        return
+
+    print("=" * 78)
+    print(f"🧪 Index load benchmark ({args.runs} cold runs each, median)")
+    print("=" * 78)
+    print(f"{'system':<16}{'format':<8}{'load ms':>10}{'RSS MB':>10}{'query ms':>11}")
+
+    for system in args.systems:
+        for mode in ("pickle", "bundle"):
+            try:
+                runs = [run(mode, system, args.index_dir.resolve())
+                        for _ in range(args.runs)]
+            except subprocess.CalledProcessError as e:
+                print(f"{system:<16}{mode:<8}  ❌ {e.stderr.strip().splitlines()[-1]}")
+                continue
+            med = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+            print(f"{system:<16}{mode:<8}{med['load_ms']:>10.1f}{med['rss_mb']:>10.1f}{med['query_ms']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
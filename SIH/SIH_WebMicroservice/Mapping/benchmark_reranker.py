@@ -0,0 +1,115 @@
+"""
+Benchmark: final ranking step - semantic only vs cross-encoder vs Groq LLM
+Runs the normal BM25 -> TF-IDF -> semantic retrieval for each query, then
+times each final stage on the same candidates and reports accuracy@1.
+
+Evaluation set (JSONL, one {"query": "...", "code": "..."} per line) or,
+by default, self-retrieval: each sampled record's definition is the query
+and its own code is the expected answer.
+
+Usage:
+    python benchmark_reranker.py --system siddha --samples 200
+    python benchmark_reranker.py --eval eval.jsonl --top-n 10 --llm
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+import cross_encoder
+from index_registry import get_system
+
+# system -> (module, search function)
+SYSTEM_MODULES = {
+    "siddha": ("search", "search_siddha"),
+    "ayurveda": ("search_ayurveda", "search_ayurveda"),
+    "unani": ("search_unani", "search_unani"),
+}
+
+
+def load_eval_set(module, path: str = None, samples: int = 200, seed: int = 13):
+    """[(query, expected_code), ...]"""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [(row["query"], row["code"]) for row in rows]
+
+    index = get_system(module.SYSTEM)
+    records = [
+        (d, c) for c, d in zip(index["codes"], index["definitions"])
+        if d and d not in ("nan", "No description available.") and len(d.split()) >= 4
+    ]
+    random.Random(seed).shuffle(records)
+    return records[:samples]
+
+
+def retrieve(search_fn, query):
+    """Candidates exactly as the search module produces them before the final step"""
+    cross_encoder.ENABLED = False
+    return search_fn(query)["candidates"]
+
+
+def summarize(name, latencies, correct, total):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+    print(f"{name:<16} acc@1 {correct / max(total, 1):6.1%}   "
+          f"mean {statistics.mean(latencies) if latencies else 0:8.1f} ms   p95 {p95:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare final ranking stages")
+    parser.add_argument("--system", choices=SYSTEM_MODULES, default="siddha")
+    parser.add_argument("--eval", help="JSONL evaluation set")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=cross_encoder.TOP_N)
+    parser.add_argument("--llm", action="store_true", help="also time refine_with_llm (needs Groq or SIH_STUB_URL)")
+    args = parser.parse_args()
+
+    module_name, function_name = SYSTEM_MODULES[args.system]
+    module = __import__(module_name)
+    search_fn = getattr(module, function_name)
+    if args.llm:
+        from search import refine_with_llm
+    eval_set = load_eval_set(module, args.eval, args.samples)
+    model = cross_encoder.get_model()
+
+    # Warm-up so model loading is not counted
+    model.predict([("warm up", "warm up")])
+
+    results = {"semantic": [[], 0], "cross-encoder": [[], 0], "llm": [[], 0]}
+
+    print("=" * 70)
+    print(f"🧪 Final ranking benchmark: {args.system}, {len(eval_set)} queries, top-n {args.top_n}")
+    print("=" * 70)
+
+    for query, expected in eval_set:
+        candidates = retrieve(search_fn, query)
+        if not candidates:
+            continue
+
+        results["semantic"][1] += candidates[0]["code"] == expected
+        results["semantic"][0].append(0.0)
+
+        start = time.perf_counter()
+        reranked = cross_encoder.cross_encoder_rerank(query, candidates, top_n=args.top_n, model=model)
+        results["cross-encoder"][0].append((time.perf_counter() - start) * 1000)
+        results["cross-encoder"][1] += reranked[0]["code"] == expected
+
+        if args.llm:
+            start = time.perf_counter()
+            pick = refine_with_llm(query, candidates, use_cache=False,
+                                   system_name=args.system.title())
+            results["llm"][0].append((time.perf_counter() - start) * 1000)
+            results["llm"][1] += pick.get("code") == expected
+
+    print()
+    for name, (latencies, correct) in results.items():
+        if latencies:
+            summarize(name, latencies, correct, len(latencies))
+    print("\n(latency is for the final step only; retrieval is shared)")
+
+
+if __name__ == "__main__":
+    main()
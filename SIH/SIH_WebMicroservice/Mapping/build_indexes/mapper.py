@@ -5,7 +5,6 @@ import json
 import re
 import sys
 from pathlib import Path
-from groq import Groq
 
 # -------------------------------------------------------------
 # FIX IMPORT PATHS (based on your folder structure)
@@ -20,11 +19,13 @@ from search_icd import search_icd
 from search_icd_tm2 import search_icd as search_icd_tm2
 from search_icd11_standard import search_icd11_standard
 
+from llm_cache import cached_completion, make_groq_client
+from mapping_table import get_table
+
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+client = make_groq_client()
 # -------------------------------------------------------------
 # Safe JSON extraction
 # -------------------------------------------------------------
@@ -40,7 +41,7 @@ def safe_json_extract(text):
 # -------------------------------------------------------------
 # LLM picks BEST 3 ICD codes
 # -------------------------------------------------------------
-def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list):
+def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list, use_cache=True, timeout=None):
 
     icd_text = "\n".join([
         f"{i+1}. {x['code']} — {x['title']}"
@@ -73,14 +74,17 @@ def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list):
     """
 
     try:
-        res = client.chat.completions.create(
+        # Identical prompts are answered from the LLM cache unless use_cache=False
+        raw = cached_completion(
+            client,
             model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
+            prompt=prompt,
+            use_cache=use_cache,
+            validate=safe_json_extract,
+            timeout=timeout,
             max_tokens=200,
             temperature=0.1
         )
-
-        raw = res.choices[0].message.content
         parsed = safe_json_extract(raw)
 
         if parsed:
@@ -100,18 +104,28 @@ def llm_pick_best(siddha_code, siddha_term, siddha_reason, icd_list):
         }
 
 
+def search_tm(user_input: str, system: str = "siddha"):
+    if system == "ayurveda":
+        return search_ayurveda(user_input)
+    if system == "unani":
+        return search_unani(user_input)
+    return search_siddha(user_input)   # default to siddha
+
+
 # -------------------------------------------------------------
 # FULL PIPELINE - Supports multiple traditional medicine systems
 # -------------------------------------------------------------
-def map_to_icd(user_input: str, system: str = "siddha"):
+def map_to_icd(user_input: str, system: str = "siddha", tm_candidates=None):
+    """
+    tm_candidates = TM candidates the caller already has (the selected one
+    first), e.g. from an earlier diagnose call; the TM search is then skipped
+    """
 
     # STEP 1 — Traditional medicine search based on system
-    if system == "ayurveda":
-        tm_out = search_ayurveda(user_input)
-    elif system == "unani":
-        tm_out = search_unani(user_input)
-    else:  # default to siddha
-        tm_out = search_siddha(user_input)
+    if tm_candidates:
+        tm_out = {"candidates": tm_candidates}
+    else:
+        tm_out = search_tm(user_input, system)
     
     tm_candidates = tm_out["candidates"]    # top candidates
 
@@ -134,6 +148,30 @@ def map_to_icd(user_input: str, system: str = "siddha"):
     }
 
 
+# -------------------------------------------------------------
+# SELECTED TM CODE - precomputed table, else the full pipeline
+# -------------------------------------------------------------
+def map_code(code: str, term: str, system: str = "siddha", tm_candidates=None):
+    """
+    Same result as map_to_icd(f"{code} {term}", ...), with the ICD candidates
+    read from the precomputed mapping table (mapping_table.py) when it holds
+    this code and term for the loaded index versions
+    """
+    query = f"{code} {term}"
+    icd = get_table().lookup(system, code, term)
+    if icd is None:
+        return map_to_icd(query, system=system, tm_candidates=tm_candidates)
+
+    if not tm_candidates:
+        tm_candidates = search_tm(query, system)["candidates"]   # a code query: no encoding
+    return {
+        "input": query,
+        "system": system,
+        f"{system}_candidates": tm_candidates,
+        **icd
+    }
+
+
 # -------------------------------------------------------------
 # TEST
 # -------------------------------------------------------------
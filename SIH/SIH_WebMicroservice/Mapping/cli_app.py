@@ -18,6 +18,7 @@ from search_ayurveda import search_ayurveda
 from search_unani import search_unani
 from build_indexes.mapper import map_to_icd
 from fhir_generator import generate_fhir_from_mapping
+from tm_sessions import selected_first
 
 
 class Colors:
@@ -247,7 +248,10 @@ class TMICDMapper:
             if self.selected_tm_candidate.get('english'):
                 query += " " + self.selected_tm_candidate['english']
             
-            self.mapping_result = map_to_icd(query, system=self.current_system)
+            # The selected candidate leads; the TM corpus is not searched again
+            tm_candidates = selected_first(self.tm_candidates, self.selected_tm_candidate['code'])
+            self.mapping_result = map_to_icd(query, system=self.current_system,
+                                             tm_candidates=tm_candidates or [self.selected_tm_candidate])
             
             self.icd11_standard_candidates = self.mapping_result.get('icd11_standard_candidates', [])
             self.icd11_tm2_candidates = self.mapping_result.get('icd11_tm2_candidates', [])
@@ -0,0 +1,125 @@
+"""
+Exact-Code Lookup
+Queries that are just a code ("SP42", "ee-4.4", "SP70 (EE-4.4)"), or a
+code followed by its own term (what /map/*-code sends), are looked up in a
+code -> rows hash index of the loaded corpus. The rows found are put first,
+ahead of the BM25 -> TF-IDF -> semantic cascade's ranked results, so the
+named code always leads and its neighbours still follow.
+
+Codes match ignoring case, whitespace, "-" and "_". Compound codes
+("SP70 (EE-4.4)") are also found by each of their parts, unless a part
+names more than MAX_HITS rows (e.g. a TM2 code grouping many NAMASTE
+codes), in which case the query runs through the cascade.
+
+Each index version carries its own code index (index["code_index"], built
+on its first code query, or by live_updates.py for the rows it changes),
+so reloads and live edits are seen immediately.
+
+Configuration:
+    SIH_CODE_LOOKUP   1 (default) answers code queries from the code index, 0 always runs the cascade
+"""
+
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from corpus_store import normalize
+
+# Configuration
+CODE_LOOKUP = os.getenv("SIH_CODE_LOOKUP", "1") == "1"
+MAX_HITS = 10               # most rows one code query may return
+MAX_QUERY_LENGTH = 64       # longer queries are never a code on their own
+
+# What a code (its tokens joined) looks like: contains a digit, or has no
+# lowercase letters ("BFB"), so ordinary words never reach the lookup
+CODE_TOKEN = re.compile(r"^(?=.*\d|[^a-z]*$)[A-Za-z0-9$#.\-_()\[\],/]+$")
+_FOLD = re.compile(r"[\s\-_]+")
+_PARTS = re.compile(r"[\s(),/;\[\]]+")
+
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+def code_key(code: str) -> str:
+    """Lookup key of a code: upper case without whitespace, '-' or '_'"""
+    return _FOLD.sub("", code.upper())
+
+
+def build_code_index(codes: Iterable[str], skip: Iterable[int] = ()) -> Dict[str, List[int]]:
+    """key -> rows for every code and every part of a compound code (rows in skip left out)"""
+    skip = set(skip)
+    full, parts = defaultdict(list), defaultdict(list)
+    for i, code in enumerate(codes):
+        if i in skip or not code:
+            continue
+        full[code_key(code)].append(i)
+        pieces = [p for p in _PARTS.split(code) if p]
+        if len(pieces) > 1:
+            for piece in pieces:
+                parts[code_key(piece)].append(i)
+    index = dict(full)
+    for key, rows in parts.items():
+        index.setdefault(key, rows)     # a code's own key wins over another code's part
+    return index
+
+
+def code_index(index: Dict) -> Dict[str, List[int]]:
+    """The code index of a loaded search index (built on first use if it has none)"""
+    codes = index.get("code_index")
+    if codes is None:
+        codes = index["code_index"] = build_code_index(index["codes"])
+    return codes
+
+
+def _terms_match(index: Dict, row: int, text: str) -> bool:
+    wanted = normalize(text).split()
+    return any(
+        normalize(index[column][row]).split() == wanted
+        for column in ("terms", "english") if index.get(column) is not None
+    )
+
+
+def match_code(index: Dict, query: str, system: str = None) -> Optional[List[int]]:
+    """
+    Rows an exact-code query names, or None if it should go through the cascade
+
+    Matches the whole query as a code, or its leading one or two tokens as a
+    code when the rest of the query is that code's term (or English name).
+    """
+    if not CODE_LOOKUP:
+        return None
+    text = query.strip()
+    tokens = text.split()
+    lookup = code_index(index)
+    rows = None
+    if tokens and len(text) <= MAX_QUERY_LENGTH and CODE_TOKEN.match("".join(tokens)):
+        rows = lookup.get(code_key(text))
+    for n in (2, 1):
+        if rows or len(tokens) <= n or not CODE_TOKEN.match("".join(tokens[:n])):
+            continue
+        rest = " ".join(tokens[n:])
+        rows = [r for r in lookup.get(code_key("".join(tokens[:n])), []) if _terms_match(index, r, rest)]
+    if rows and len(rows) > MAX_HITS:
+        rows = None
+    with _stats_lock:
+        _stats[system or "unknown"]["hits" if rows else "misses"] += 1
+    return rows or None
+
+
+def prepend_exact(exact: List[Dict], ranked: List[Dict]) -> List[Dict]:
+    """
+    Exact-code candidates first, then the ranked ones that are not among them
+
+    Keeps the length of the ranked list (or of exact, if that is longer).
+    """
+    codes = {c["code"] for c in exact}
+    rest = [c for c in ranked if c["code"] not in codes]
+    return exact + rest[:max(len(ranked) - len(exact), 0)]
+
+
+def code_lookup_stats() -> Dict:
+    """Code-query hits / misses per system"""
+    with _stats_lock:
+        return {"enabled": CODE_LOOKUP, **{system: dict(counts) for system, counts in _stats.items()}}
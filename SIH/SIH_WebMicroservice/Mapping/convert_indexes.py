@@ -0,0 +1,123 @@
+"""
+Convert pickled search indexes to binary index bundles
+Reads a corpus's JSON data, bm25_*.pkl, tfidf_*.pkl, tfidf_matrix_*.npz and
+embeddings_*.npy (the files the search modules load today) and writes
+indexes/<system>.bundle. The bundle is then checked against the pickles:
+BM25 scores, TF-IDF query vectors and embeddings must match (embeddings
+within the rounding of the stored dtype, see embedding_matrix.py).
+
+Usage:
+    python convert_indexes.py                       # every corpus with complete index files
+    python convert_indexes.py ayurveda unani
+    python convert_indexes.py --data-dir ../data --index-dir ../indexes siddha
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from corpus_store import COLUMNS, CORPORA, attach, load_corpus
+from ann_index import build_ann
+from embedding_matrix import TOLERANCE, normalize_rows
+from index_bundle import bundle_path, load_bundle, load_pickled_indexes, resolve_bundle, write_bundle
+
+BASE_DIR = Path(__file__).parent
+
+PARITY_QUERIES = [
+    "fever with headache", "knee pain and swelling", "cough with breathlessness",
+    "skin rash itching", "abdominal pain diarrhoea", "jvara"
+]
+
+
+def index_files(system: str, index_dir: Path) -> dict:
+    return {
+        "bm25": index_dir / f"bm25_{system}.pkl",
+        "tfidf": index_dir / f"tfidf_{system}.pkl",
+        "tfidf_matrix": index_dir / f"tfidf_matrix_{system}.npz",
+        "embeddings": index_dir / f"embeddings_{system}.npy",
+    }
+
+
+def load_pickled_index(system: str, data_dir: Path, index_dir: Path) -> dict:
+    """The pickle path, with the corpus columns the search modules attach"""
+    return attach(load_pickled_indexes(index_dir, system), load_corpus(system, data_dir))
+
+
+def check_parity(pickled: dict, bundled: dict, columns):
+    """Raise AssertionError if the bundle does not reproduce the pickled indexes"""
+    for name in columns:
+        assert list(bundled[name]) == pickled[name], f"column {name} differs"
+
+    for query in PARITY_QUERIES:
+        tokens = query.lower().split()
+        expected = pickled["bm25"].get_scores(tokens)
+        assert np.allclose(bundled["bm25"].get_scores(tokens), expected), f"BM25 differs for '{query}'"
+
+        a = pickled["tfidf_vectorizer"].transform([query]).toarray()
+        b = bundled["tfidf_vectorizer"].transform([query]).toarray()
+        assert np.allclose(a, b), f"TF-IDF differs for '{query}'"
+
+    assert abs(pickled["tfidf_matrix"] - bundled["tfidf_matrix"]).max() < 1e-12, "TF-IDF matrix differs"
+    stored = bundled["embeddings"]
+    expected = normalize_rows(pickled["embeddings"])
+    assert np.abs(np.asarray(stored) - expected).max() <= TOLERANCE[stored.storage_dtype], "embeddings differ"
+
+
+def convert(system: str, data_dir: Path, index_dir: Path, verify: bool = True) -> dict:
+    """Convert one corpus; returns the bundle manifest"""
+    pickled = load_pickled_index(system, data_dir, index_dir)
+    columns = {name: pickled[name] for name in COLUMNS if name in pickled}
+    files = index_files(system, index_dir)
+
+    path = bundle_path(index_dir, system)
+    manifest = write_bundle(
+        path, system, columns,
+        bm25=pickled["bm25"],
+        vectorizer=pickled["tfidf_vectorizer"],
+        tfidf_matrix=pickled["tfidf_matrix"],
+        embeddings=pickled["embeddings"],
+        ann=build_ann(pickled["embeddings"]),
+        source={"data": CORPORA[system]["data"], "converted_from": [p.name for p in files.values()]}
+    )
+    if verify:
+        check_parity(pickled, load_bundle(path), columns)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickled indexes to binary bundles")
+    parser.add_argument("systems", nargs="*", help=f"corpora to convert ({', '.join(CORPORA)})")
+    parser.add_argument("--data-dir", type=Path, default=BASE_DIR / "data")
+    parser.add_argument("--index-dir", type=Path, default=BASE_DIR / "indexes")
+    parser.add_argument("--no-verify", action="store_true", help="skip the parity check")
+    args = parser.parse_args()
+
+    systems = args.systems or list(CORPORA)
+    print("=" * 70)
+    print(f"📦 Converting {len(systems)} corpora in {args.index_dir}")
+    print("=" * 70)
+
+    for system in systems:
+        if system not in CORPORA:
+            print(f"❌ {system}: unknown corpus (choose from {', '.join(CORPORA)})")
+            continue
+        missing = [p.name for p in index_files(system, args.index_dir).values() if not p.exists()]
+        if not (args.data_dir / CORPORA[system]["data"]).exists():
+            missing.append(CORPORA[system]["data"])
+        if missing:
+            print(f"⚠️  {system}: skipped, missing {', '.join(missing)}")
+            continue
+        try:
+            manifest = convert(system, args.data_dir, args.index_dir, verify=not args.no_verify)
+        except Exception as e:
+            print(f"❌ {system}: {e}")
+            continue
+        size = sum(p.stat().st_size for p in resolve_bundle(bundle_path(args.index_dir, system)).iterdir())
+        print(f"✅ {system}: {manifest['doc_count']} docs, "
+              f"{manifest['bm25']['vocab_size']} BM25 terms, {size / 1024 / 1024:.1f} MB"
+              f"{'' if args.no_verify else ', parity OK'}")
+
+
+if __name__ == "__main__":
+    main()
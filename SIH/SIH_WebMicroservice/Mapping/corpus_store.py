@@ -0,0 +1,197 @@
+"""
+Columnar Corpus Store
+One compact copy of each terminology dataset per process, shared by the
+search modules and autocomplete. Records are held as parallel column lists
+(codes, terms, english, definitions) of interned strings instead of lists
+of dicts, and the normalized forms used for matching are computed once per
+column rather than on every request. A corpus whose JSON file has changed
+on disk is re-read on its next use (keeping the old copy if the new file
+cannot be parsed), so reloaded indexes attach the matching strings.
+
+Configuration:
+    SIH_DATA_DIR   directory holding the corpus JSON files (default: ./data)
+"""
+
+import os
+import re
+import sys
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Configuration
+BASE_DIR = Path(__file__).parent
+DATA_DIR = Path(os.getenv("SIH_DATA_DIR", BASE_DIR / "data"))
+
+COLUMNS = ("codes", "terms", "english", "definitions", "systems")
+
+# system -> data file, {column: JSON field}, and the columns joined with ". "
+# into the document text that BM25 / TF-IDF / embeddings are built from
+# (index_builder.py). Optional "tfidf" overrides TfidfVectorizer arguments.
+CORPORA = {
+    "siddha": {
+        "data": "siddha_clean.json",
+        "fields": {"codes": "code", "terms": "term", "definitions": "definition", "systems": "system"},
+        "doc": ["terms", "definitions"]
+    },
+    "ayurveda": {
+        "data": "ayurveda_data.json",
+        "fields": {"codes": "tm2_code", "terms": "term", "english": "english",
+                   "definitions": "description", "systems": "system"},
+        "doc": ["terms", "english", "definitions"]
+    },
+    "unani": {
+        "data": "unani_data.json",
+        "fields": {"codes": "tm2_code", "terms": "term", "english": "english",
+                   "definitions": "description", "systems": "system"},
+        "doc": ["terms", "english", "definitions"]
+    },
+    "ayurveda_sat": {
+        "data": "ayurveda_sat_data.json",
+        "fields": {"codes": "code", "terms": "term", "definitions": "definition", "systems": "system"},
+        "doc": ["codes", "terms", "definitions"],
+        "tfidf": {"max_features": 5000}
+    },
+    "namaste": {
+        "data": "namaste_data.json",
+        "fields": {"codes": "tm2_code", "terms": "term", "definitions": "description"},
+        "doc": ["terms", "definitions"]
+    },
+    "icd": {
+        "data": "icd11_cleaned.json",
+        "fields": {"codes": "code", "terms": "title", "definitions": "definition"},
+        "doc": ["terms", "definitions"]
+    },
+    "icd_tm2": {
+        "data": "icd11_tm_codes.json",
+        "fields": {"codes": "code", "terms": "title", "definitions": "definition"},
+        "doc": ["terms", "definitions"]
+    },
+    "icd11_standard": {
+        "data": "icd11_standard.json",
+        "fields": {"codes": "code", "terms": "title", "definitions": "definition"},
+        "doc": ["terms", "definitions"]
+    },
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase and keep only ASCII letters, digits and spaces"""
+    return re.sub(r"[^a-zA-Z0-9 ]", "", text.lower())
+
+
+class Corpus:
+    """Parallel string columns for one system; absent columns are None"""
+
+    def __init__(self, system: str, columns: Dict[str, List[str]], stamp: tuple = None):
+        self.system = system
+        self.stamp = stamp   # (mtime_ns, size) of the data file it was read from
+        self.codes = columns["codes"]
+        self.terms = columns["terms"]
+        self.english: Optional[List[str]] = columns.get("english")
+        self.definitions = columns["definitions"]
+        self.systems: Optional[List[str]] = columns.get("systems")
+        self._normalized: Dict[str, List[str]] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def column(self, name: str) -> List[str]:
+        values = getattr(self, name)
+        if values is None:
+            raise KeyError(f"{self.system} corpus has no '{name}' column")
+        return values
+
+    def columns(self) -> Dict[str, List[str]]:
+        """Present columns keyed by name"""
+        return {name: getattr(self, name) for name in COLUMNS if getattr(self, name) is not None}
+
+    def normalized(self, name: str) -> List[str]:
+        """normalize() of every value in a column, computed on first use"""
+        with self.lock:
+            if name not in self._normalized:
+                self._normalized[name] = [sys.intern(normalize(v)) for v in self.column(name)]
+            return self._normalized[name]
+
+    def record(self, i: int, term_column: str = "terms") -> Dict:
+        """One row as a dict (the shape autocomplete returns)"""
+        record = {
+            "code": self.codes[i],
+            "term": self.column(term_column)[i],
+            "definition": self.definitions[i]
+        }
+        if self.systems is not None:
+            record["system"] = self.systems[i]
+        return record
+
+
+def data_stamp(system: str, data_dir: Path = None) -> Optional[tuple]:
+    """(mtime_ns, size) of a corpus's data file, or None if it is missing"""
+    try:
+        st = (Path(data_dir or DATA_DIR) / CORPORA[system]["data"]).stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_corpus(system: str, data_dir: Path = None) -> Corpus:
+    """Read a corpus from its JSON file into interned columns (not cached)"""
+    config = CORPORA[system]
+    stamp = data_stamp(system, data_dir)
+    with open(Path(data_dir or DATA_DIR) / config["data"], "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    columns = {
+        name: [sys.intern(str(x.get(field) or "")) for x in records]
+        for name, field in config["fields"].items()
+    }
+    return Corpus(system, columns, stamp)
+
+
+def attach(index: Dict, corpus: Corpus) -> Dict:
+    """Add the corpus columns to a loaded search index, checking they line up"""
+    doc_count = index["bm25"].corpus_size
+    if doc_count != len(corpus):
+        raise ValueError(
+            f"{corpus.system} index has {doc_count} documents but the corpus has "
+            f"{len(corpus)} - rebuild the index"
+        )
+    index.update(corpus.columns())
+    return index
+
+
+# -------------------------------------------------------------
+# Process-wide store
+# -------------------------------------------------------------
+_corpora: Dict[str, Corpus] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_corpus(system: str) -> Corpus:
+    """Shared corpus for a system (loaded on first use, re-read if its file changed)"""
+    with _corpora_lock:
+        corpus = _corpora.get(system)
+        if corpus is not None:
+            stamp = data_stamp(system)
+            if stamp is None or stamp == corpus.stamp:
+                return corpus
+        try:
+            _corpora[system] = load_corpus(system)
+        except (OSError, ValueError) as e:
+            if corpus is None:
+                raise
+            # Half-written file: keep serving the copy we have
+            print(f"⚠️  Could not re-read {system} corpus, keeping the loaded copy: {e}")
+            return corpus
+        return _corpora[system]
+
+
+def corpus_stats() -> Dict:
+    """Loaded corpora and their row counts"""
+    with _corpora_lock:
+        return {
+            system: {"rows": len(corpus), "normalized_columns": sorted(corpus._normalized)}
+            for system, corpus in _corpora.items()
+        }
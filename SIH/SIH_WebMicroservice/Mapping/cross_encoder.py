@@ -0,0 +1,75 @@
+"""
+Local Cross-Encoder Reranking
+Optional final stage after semantic_rerank: scores the top-N (query,
+candidate) pairs with a small CPU cross-encoder in one batched forward
+pass. Gives clinics without internet a reranking step that does not
+depend on the Groq LLM.
+
+Enable with environment variables:
+    SIH_CROSS_ENCODER=1                     turn the stage on
+    SIH_CROSS_ENCODER_MODEL=<hf model id>   default cross-encoder/ms-marco-MiniLM-L-6-v2
+    SIH_RERANK_TOP_N=10                     candidates scored per query
+"""
+
+import os
+import threading
+from typing import Dict, List
+
+# Configuration
+ENABLED = os.getenv("SIH_CROSS_ENCODER", "0").lower() in ("1", "true", "yes")
+MODEL_NAME = os.getenv("SIH_CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+TOP_N = int(os.getenv("SIH_RERANK_TOP_N", "10"))
+MAX_LENGTH = 256          # Tokens per (query, candidate) pair
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Load the cross-encoder on first use (CPU)"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import CrossEncoder
+            _model = CrossEncoder(MODEL_NAME, max_length=MAX_LENGTH, device="cpu")
+    return _model
+
+
+def candidate_text(candidate: Dict) -> str:
+    """Text scored against the query: term/title plus a usable definition"""
+    text = candidate.get("term") or candidate.get("title") or ""
+    definition = candidate.get("definition") or ""
+    if definition and definition not in ("nan", "No description available."):
+        text = f"{text}. {definition}"
+    return text
+
+
+def cross_encoder_rerank(query: str, candidates: List[Dict], top_n: int = None,
+                         model=None) -> List[Dict]:
+    """
+    Re-order the top_n candidates by cross-encoder score
+
+    Candidates beyond top_n keep their semantic order after the reranked
+    ones. Each reranked candidate gets a "rerank_score"; "score" is kept.
+    """
+    top_n = TOP_N if top_n is None else top_n
+    head, tail = candidates[:top_n], candidates[top_n:]
+    if len(head) < 2:
+        return candidates
+
+    model = model or get_model()
+    pairs = [(query, candidate_text(c)) for c in head]
+    scores = model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    reranked = [
+        dict(c, rerank_score=float(s))
+        for c, s in sorted(zip(head, scores), key=lambda pair: pair[1], reverse=True)
+    ]
+    return reranked + tail
+
+
+def maybe_rerank(query: str, candidates: List[Dict]) -> List[Dict]:
+    """Apply the cross-encoder when SIH_CROSS_ENCODER is on, otherwise no-op"""
+    if not ENABLED:
+        return candidates
+    return cross_encoder_rerank(query, candidates)
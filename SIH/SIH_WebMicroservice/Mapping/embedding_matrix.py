@@ -0,0 +1,174 @@
+"""
+Normalized Embedding Matrix
+Document embeddings stored L2-normalized, as float32, float16 or int8, so
+the semantic rerank is one numpy dot product over the gathered candidate
+rows: no torch conversion and no re-normalizing of every candidate on
+every query. float16 halves and int8 quarters the resident / mmap'd size
+of the float32 matrix.
+
+int8 rows store each unit vector minus the corpus mean, with a per-row
+scale: the embeddings of one corpus share a large common direction, so
+quantizing only the part that differs between documents keeps ~10x more
+precision. numpy widens float16 to float32 slowly, so float16 saves memory
+but scores slower than float32; int8 is both smaller and faster.
+
+Optionally the rows are stored reduced to SIH_EMBEDDING_DIM coordinates
+in a basis fitted per corpus (fit_projection): the mean direction plus
+the leading principal directions of the rest. Queries are projected onto
+the same basis inside dot(), so scores stay on the cosine scale; how much
+recall that costs depends on the corpus (see benchmark_embeddings.py).
+
+The search modules and the IVF index score through cosine_scores(), which
+also accepts plain float32 matrices (pickled indexes, live-update stacks).
+
+Configuration:
+    SIH_EMBEDDING_DTYPE   int8 (default), float16 or float32 - how index_builder.py stores embeddings
+    SIH_EMBEDDING_DIM     stored dimension after projection, 0 (default) keeps every dimension
+"""
+
+import os
+from typing import Sequence
+
+import numpy as np
+
+# Configuration
+EMBEDDING_DTYPE = os.getenv("SIH_EMBEDDING_DTYPE", "int8")
+EMBEDDING_DIM = int(os.getenv("SIH_EMBEDDING_DIM", "0"))
+DTYPES = ("float32", "float16", "int8")
+
+# Largest element error of a stored row against the normalized float32 row
+TOLERANCE = {"float32": 1e-6, "float16": 1e-3, "int8": 1 / 127}
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def fit_projection(vectors, dim: int) -> np.ndarray:
+    """
+    Orthonormal (input dim x dim) basis for reduced embeddings
+
+    The first column is the mean direction of the unit rows, which carries
+    most of every cosine; the others are the leading principal directions
+    of the rows with that component removed.
+    """
+    units = normalize_rows(vectors)
+    if not 1 <= dim < units.shape[1]:
+        raise ValueError(f"Reduced dimension must be between 1 and {units.shape[1] - 1}, got {dim}")
+    mean = units.mean(axis=0)
+    first = mean / max(np.linalg.norm(mean), 1e-12)
+    rest = (units - np.outer(units @ first, first)).astype(np.float64)
+    _, components = np.linalg.eigh(rest.T @ rest)     # ascending eigenvalues
+    basis = np.column_stack([first, components[:, ::-1][:, :dim - 1]])
+    return np.ascontiguousarray(basis, dtype=np.float32)
+
+
+def quantize(vectors, dtype: str = EMBEDDING_DTYPE, offset: np.ndarray = None,
+             projection: np.ndarray = None):
+    """
+    Normalize rows (and project them) and convert them to the storage dtype
+
+    Returns (data, scales, offset); scales and offset are None except for
+    int8, where row i is data[i] * scales[i] + offset. The offset defaults
+    to the mean of the rows (pass the stored one when appending).
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown embedding dtype '{dtype}' (choose from {', '.join(DTYPES)})")
+    units = normalize_rows(vectors)
+    if projection is not None:
+        units = units @ projection      # coordinates in the reduced basis
+    if dtype != "int8":
+        return units.astype(dtype), None, None
+    if offset is None:
+        offset = units.mean(axis=0) if len(units) else np.zeros(units.shape[1], np.float32)
+    residual = units - offset
+    scales = np.maximum(np.abs(residual).max(axis=1), 1e-12) / 127
+    data = np.rint(residual / scales[:, None]).astype(np.int8)
+    return data, scales.astype(np.float32), np.asarray(offset, dtype=np.float32)
+
+
+class EmbeddingMatrix:
+    """
+    Unit-norm document embeddings in a compact dtype
+
+    Indexing returns float32 rows like a plain matrix (mapped back to the
+    input dimension when reduced); dot() scores rows against a query
+    without converting the whole block first.
+    """
+
+    def __init__(self, data: np.ndarray, scales: np.ndarray = None, offset: np.ndarray = None,
+                 projection: np.ndarray = None):
+        self.data = data                 # (docs x dim), float32 / float16 / int8, possibly mmap'd
+        self.scales = scales             # (docs,) float32 for int8, else None
+        self.offset = offset             # (dim,) float32 for int8, else None
+        self.projection = projection     # (input dim x dim) basis of reduced rows, else None
+        self.shape = (data.shape[0], data.shape[1] if projection is None else projection.shape[0])
+        self.dtype = np.dtype(np.float32)    # dtype of the rows handed out
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype: str = EMBEDDING_DTYPE,
+                     projection: np.ndarray = None) -> "EmbeddingMatrix":
+        return cls(*quantize(vectors, dtype, projection=projection), projection)
+
+    @property
+    def storage_dtype(self) -> str:
+        return self.data.dtype.name
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.data, self.scales, self.offset, self.projection) if a is not None)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        block = np.asarray(self.data[rows], dtype=np.float32)
+        if self.scales is not None:
+            block = block * (self.scales[rows][..., None] if block.ndim > 1 else self.scales[rows])
+            block += self.offset
+        if self.projection is not None:
+            block = block @ self.projection.T
+        return block
+
+    def __array__(self, dtype=None, copy=None):
+        full = self[np.arange(len(self))]
+        return full if dtype is None else full.astype(dtype)
+
+    def dot(self, q_unit: np.ndarray, rows=None) -> np.ndarray:
+        """Cosine similarity of the given rows (all if None) to a unit query vector"""
+        q = np.asarray(q_unit, dtype=np.float32).ravel()
+        if self.projection is not None:
+            q = q @ self.projection
+        block = self.data if rows is None else self.data[rows]
+        scores = np.asarray(block @ q, dtype=np.float32)    # numpy widens int8 / float16 to float32
+        if self.scales is not None:
+            scores *= self.scales if rows is None else self.scales[rows]
+            scores += float(self.offset @ q)
+        return scores
+
+    def appended(self, extra) -> "EmbeddingMatrix":
+        """Copy with rows appended (for live corpus updates)"""
+        data, scales, offset = quantize(extra, self.storage_dtype, self.offset, self.projection)
+        return EmbeddingMatrix(
+            np.concatenate([self.data, data]),
+            None if self.scales is None else np.concatenate([self.scales, scales]),
+            offset,
+            self.projection
+        )
+
+
+def cosine_scores(embeddings, query, rows: Sequence[int] = None) -> np.ndarray:
+    """
+    Cosine similarity between a query and document rows
+
+    EmbeddingMatrix rows are already unit length; any other matrix (e.g. the
+    float32 arrays of pickled indexes) is normalized over the gathered rows.
+    """
+    q_unit = normalize_rows(query).ravel()
+    if isinstance(embeddings, EmbeddingMatrix):
+        return embeddings.dot(q_unit, None if rows is None else np.asarray(rows, dtype=np.int64))
+    block = np.asarray(embeddings if rows is None else embeddings[np.asarray(rows, dtype=np.int64)],
+                       dtype=np.float32)
+    return (block @ q_unit) / np.maximum(np.linalg.norm(block, axis=1), 1e-12)
@@ -0,0 +1,333 @@
+"""
+Embedding Sidecar
+A local daemon that loads the sentence-transformer once per host and
+serves encode requests over a UNIX socket, so the CLI, the API workers and
+index builds on the same machine share one copy of the model instead of
+each loading PubMedBERT (and paying its start-up) separately.
+
+encoder.get_embedder() uses the sidecar whenever its socket answers and
+serves the same model; otherwise, or when the sidecar goes away, texts are
+encoded in-process as before. Requests from all clients are merged into
+batched encodes (encode_batcher.py). On platforms without UNIX sockets
+(Windows) there is no sidecar and every process encodes in-process.
+
+Protocol: every message is a 4-byte big-endian length and a UTF-8 JSON
+object. Requests are {"op": "info"} or {"op": "encode", "backend": ...,
+"texts": [...]}; an encode reply {"shape": [n, dim]} is followed by the
+n x dim little-endian float32 vectors, failures reply {"error": ...}.
+
+Usage:
+    python embedding_sidecar.py                      # serve on SIH_EMBED_SOCKET
+    python embedding_sidecar.py --backend onnx-int8 --socket /run/sih/embed.sock
+
+Configuration:
+    SIH_EMBED_SOCKET     socket path (default <tmp>/sih-embed.sock)
+    SIH_EMBED_SIDECAR    1 (default) uses a running sidecar, 0 always encodes in-process
+    SIH_EMBED_TIMEOUT    seconds a client waits for a reply before encoding in-process (default 60)
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import socketserver
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from encode_batcher import MAX_BATCH, QueryBatcher
+
+# Configuration
+SOCKET_PATH = Path(os.getenv("SIH_EMBED_SOCKET", Path(tempfile.gettempdir()) / "sih-embed.sock"))
+SIDECAR = os.getenv("SIH_EMBED_SIDECAR", "1") == "1"
+TIMEOUT = float(os.getenv("SIH_EMBED_TIMEOUT", "60"))
+RETRY_SECONDS = 30          # how long a client keeps encoding in-process after the sidecar failed
+UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+
+_HEADER = struct.Struct(">I")
+
+
+# -------------------------------------------------------------
+# Wire format
+# -------------------------------------------------------------
+def _recv_exact(sock, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding sidecar closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+def send_message(sock, message: Dict, payload: bytes = b""):
+    body = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(body)) + body + payload)
+
+
+def recv_message(sock) -> Dict:
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+def recv_vectors(sock, shape) -> np.ndarray:
+    count = int(np.prod(shape))
+    return np.frombuffer(_recv_exact(sock, count * 4), dtype="<f4").reshape(shape).astype(np.float32)
+
+
+# -------------------------------------------------------------
+# Server
+# -------------------------------------------------------------
+if UNIX_SOCKETS:      # socketserver has no UnixStreamServer without AF_UNIX (Windows)
+    class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """One thread per client connection; encodes go through a batcher per backend"""
+
+        daemon_threads = True
+        request_queue_size = 128    # every API worker thread opens its own connection
+
+        def __init__(self, path=SOCKET_PATH, backend: str = None):
+            from encoder import BACKEND, MODEL_NAME
+
+            self.path = Path(path)
+            self.model = MODEL_NAME
+            self.backend = backend or BACKEND
+            self.started = time.time()
+            self.requests = 0
+            self.texts = 0
+            self._batchers = {}
+            self._connections = set()
+            self._lock = threading.Lock()
+
+            if self.path.exists():
+                if _alive(self.path):
+                    raise OSError(f"An embedding sidecar is already serving {self.path}")
+                self.path.unlink()      # stale socket of a sidecar that died
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            super().__init__(str(self.path), SidecarHandler)
+            os.chmod(self.path, 0o660)  # clients of the same user / group only
+
+        def batcher(self, backend: str) -> QueryBatcher:
+            from encoder import get_embedder
+
+            with self._lock:
+                if backend not in self._batchers:
+                    embedder = get_embedder(backend, remote=False)
+                    self._batchers[backend] = QueryBatcher(lambda texts: embedder.encode(texts, batch_size=len(texts)))
+                return self._batchers[backend]
+
+        def encode(self, texts: List[str], backend: str = None) -> np.ndarray:
+            from encoder import get_embedder
+
+            backend = backend or self.backend
+            with self._lock:
+                self.requests += 1
+                self.texts += len(texts)
+            if len(texts) > MAX_BATCH:      # document batches are already large
+                return np.asarray(get_embedder(backend, remote=False).encode(texts, batch_size=64), dtype=np.float32)
+            return self.batcher(backend).encode_many(texts)
+
+        def info(self) -> Dict:
+            with self._lock:
+                return {
+                    "model": self.model,
+                    "backend": self.backend,
+                    "pid": os.getpid(),
+                    "uptime_s": round(time.time() - self.started, 1),
+                    "requests": self.requests,
+                    "texts": self.texts,
+                    "batching": {b: batcher.get_statistics() for b, batcher in self._batchers.items()}
+                }
+
+        def server_close(self):
+            super().server_close()
+            with self._lock:
+                connections = list(self._connections)
+            for sock in connections:     # clients see the sidecar go and fall back
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            for batcher in self._batchers.values():
+                batcher.stop()
+            if self.path.exists():
+                self.path.unlink()
+
+
+class SidecarHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        with self.server._lock:
+            self.server._connections.add(self.request)
+
+    def finish(self):
+        with self.server._lock:
+            self.server._connections.discard(self.request)
+
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                message = recv_message(sock)
+            except (ConnectionError, OSError):
+                return
+            try:
+                if message.get("op") == "info":
+                    send_message(sock, self.server.info())
+                elif message.get("op") == "encode":
+                    vectors = self.server.encode(list(message["texts"]), message.get("backend"))
+                    send_message(sock, {"shape": list(vectors.shape)}, vectors.astype("<f4").tobytes())
+                else:
+                    send_message(sock, {"error": f"Unknown op {message.get('op')!r}"})
+            except (ConnectionError, BrokenPipeError):
+                return
+            except Exception as e:
+                send_message(sock, {"error": f"{type(e).__name__}: {e}"})
+
+
+def _alive(path) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            sock.connect(str(path))
+        return True
+    except OSError:
+        return False
+
+
+# -------------------------------------------------------------
+# Client
+# -------------------------------------------------------------
+class SidecarClient:
+    """Connection(s) to a running sidecar, one per calling thread"""
+
+    def __init__(self, path=SOCKET_PATH, timeout: float = TIMEOUT):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self.requests = 0
+        self.texts = 0
+        self.failures = 0
+        self.info = self.request({"op": "info"})
+
+    def _socket(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(str(self.path))
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def request(self, message: Dict, vectors: bool = False):
+        """Send one request; the reply (and its vectors when asked for)"""
+        try:
+            sock = self._socket()
+            send_message(sock, message)
+            reply = recv_message(sock)
+            if "error" in reply:
+                raise ValueError(f"Embedding sidecar: {reply['error']}")
+            return recv_vectors(sock, reply["shape"]) if vectors else reply
+        except OSError:
+            self._drop()        # never reuse a connection left mid-message
+            self.failures += 1
+            raise
+
+    def encode(self, texts: List[str], backend: str) -> np.ndarray:
+        vectors = self.request({"op": "encode", "backend": backend, "texts": list(texts)}, vectors=True)
+        self.requests += 1
+        self.texts += len(texts)
+        return vectors
+
+    def close(self):
+        self._drop()
+
+    def get_statistics(self) -> Dict:
+        return {"socket": str(self.path), "requests": self.requests, "texts": self.texts,
+                "failures": self.failures, "server_pid": self.info.get("pid")}
+
+
+class RemoteEmbedder:
+    """
+    SentenceTransformer.encode lookalike served by the sidecar
+
+    When the sidecar cannot be reached the texts are encoded by `fallback()`
+    (the in-process model, loaded on first need), and the sidecar is tried
+    again after RETRY_SECONDS.
+    """
+
+    def __init__(self, client: SidecarClient, backend: str, fallback):
+        self.client = client
+        self.backend = backend
+        self.fallback = fallback
+        self._retry_at = 0.0
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size)[0]
+        texts = list(sentences)
+        if time.monotonic() >= self._retry_at:
+            try:
+                return self.client.encode(texts, self.backend)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Embedding sidecar unavailable, encoding in-process: {e}")
+                self._retry_at = time.monotonic() + RETRY_SECONDS
+        return np.asarray(self.fallback().encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+def connect(path=SOCKET_PATH, model: str = None):
+    """A client for the sidecar on `path` serving `model`, or None if there is none"""
+    if not SIDECAR or not UNIX_SOCKETS or not Path(path).exists():
+        return None
+    try:
+        client = SidecarClient(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Embedding sidecar at {path} not answering, encoding in-process: {e}")
+        return None
+    if model and client.info.get("model") != model:
+        print(f"⚠️  Embedding sidecar serves {client.info.get('model')}, queries use {model}; encoding in-process")
+        client.close()
+        return None
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve query/document embeddings over a UNIX socket")
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    parser.add_argument("--backend", help="default backend (default SIH_ENCODER_BACKEND)")
+    args = parser.parse_args()
+    if not UNIX_SOCKETS:
+        raise SystemExit("❌ The embedding sidecar needs UNIX sockets, which this platform lacks")
+
+    start = time.perf_counter()
+    server = EmbeddingServer(args.socket, args.backend)
+    server.batcher(server.backend).encode("warm up")     # load the model before taking clients
+    print(f"✅ Serving {server.model} ({server.backend}) on {server.path} "
+          f"(loaded in {time.perf_counter() - start:.1f}s, pid {os.getpid()})")
+
+    import signal
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("🛑 Embedding sidecar stopped")
+
+
+if __name__ == "__main__":
+    main()
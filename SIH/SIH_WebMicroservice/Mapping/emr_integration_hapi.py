@@ -3,13 +3,53 @@ HAPI FHIR Integration - This ACTUALLY works!
 HAPI FHIR is a pure FHIR server that stores and retrieves resources properly
 """
 
+import os
 import requests
 import json
-from typing import Dict
+import uuid
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
 import urllib3
 
+from fhir_paging import (
+    DEFAULT_PAGE_SIZE, DEFAULT_WORKERS, fetch_for_patients, iter_search_resources
+)
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Identifier system carrying our patient ID on placeholder Patients
+PATIENT_IDENTIFIER_SYSTEM = "urn:sih:patient-id"
+
+# Identifier system carrying outbox idempotency keys on delivered Conditions
+DELIVERY_IDENTIFIER_SYSTEM = "urn:sih:delivery-id"
+
+# EMR used when the caller names none
+DEFAULT_BASE_URL = "http://localhost"
+
+# Patients known to exist, per server: {base_url: {patient_id: "Patient/<patient_id>"}}
+# Shared by every BahmniIntegration instance so /emr/send does not re-check them
+_known_patients: Dict[str, Dict[str, str]] = {}
+_known_patients_lock = threading.Lock()
+
+
+def default_base_url() -> str:
+    """EMR URL for callers that name none: the local HAPI stand-in if SIH_STUB_URL is set"""
+    stub_url = os.getenv("SIH_STUB_URL", "").rstrip('/')
+    return f"{stub_url}/fhir" if stub_url else DEFAULT_BASE_URL
+
+
+def location_id(location: str, resource_type: str) -> Optional[str]:
+    """
+    Resource ID from a transaction-response location, relative or absolute:
+    "Condition/12/_history/1" and "http://host/fhir/Condition/12/_history/1"
+    both give "12"
+    """
+    parts = location.split("?")[0].strip("/").split("/")
+    for index in range(len(parts) - 2, -1, -1):
+        if parts[index] == resource_type and parts[index + 1]:
+            return parts[index + 1]
+    return None
+
 
 class BahmniIntegration:
     """
@@ -17,19 +57,52 @@ class BahmniIntegration:
     This is simpler and actually works!
     """
     
-    def __init__(self, base_url: str, username: str = None, password: str = None):
-        self.base_url = base_url.rstrip('/')
+    def __init__(self, base_url: str = None, username: str = None, password: str = None):
+        # An explicit base_url is always used; SIH_STUB_URL only changes the default
+        self.base_url = (base_url or default_base_url()).rstrip('/')
         # HAPI FHIR doesn't require authentication by default
         self.session = requests.Session()
         self.username = username
         self.password = password
+        with _known_patients_lock:
+            self.known_patients = _known_patients.setdefault(self.base_url, {})
         print("✅ Connected to HAPI FHIR Server")
         print(f"   URL: {self.base_url}")
     
+    def _remember_patient(self, patient_id: str, reference: str):
+        """Record that a patient exists on the server under the given reference"""
+        with _known_patients_lock:
+            self.known_patients[patient_id] = reference
+    
+    def _patient_reference(self, patient_id: str) -> str:
+        """Server reference for a patient (Patient/{patient_id} on both send paths)"""
+        return self.known_patients.get(patient_id, f"Patient/{patient_id}")
+    
+    def _build_patient(self, patient_id: str) -> Dict:
+        """Placeholder Patient resource for a patient we have not seen before"""
+        return {
+            "resourceType": "Patient",
+            "id": patient_id,
+            "identifier": [{
+                "system": PATIENT_IDENTIFIER_SYSTEM,
+                "value": patient_id
+            }],
+            "name": [{
+                "text": f"Patient {patient_id}",
+                "family": "Patient",
+                "given": [patient_id]
+            }],
+            "gender": "unknown",
+            "birthDate": "2000-01-01"
+        }
+    
     def ensure_patient_exists(self, patient_id: str) -> bool:
         """
         Ensure patient exists in HAPI FHIR, create if not
         """
+        if patient_id in self.known_patients:
+            return True
+        
         try:
             # Check if patient exists
             response = self.session.get(
@@ -39,20 +112,11 @@ class BahmniIntegration:
             )
             
             if response.status_code == 200:
+                self._remember_patient(patient_id, f"Patient/{patient_id}")
                 return True
             
             # Patient doesn't exist, create it
-            patient = {
-                "resourceType": "Patient",
-                "id": patient_id,
-                "name": [{
-                    "text": f"Patient {patient_id}",
-                    "family": "Patient",
-                    "given": [patient_id]
-                }],
-                "gender": "unknown",
-                "birthDate": "2000-01-01"
-            }
+            patient = self._build_patient(patient_id)
             
             create_response = self.session.put(
                 f"{self.base_url}/Patient/{patient_id}",
@@ -61,16 +125,22 @@ class BahmniIntegration:
                 verify=False
             )
             
-            return create_response.status_code in [200, 201]
+            if create_response.status_code in [200, 201]:
+                self._remember_patient(patient_id, f"Patient/{patient_id}")
+                return True
+            return False
             
         except Exception as e:
             print(f"⚠️  Could not ensure patient exists: {str(e)}")
             return False
     
-    def send_fhir_condition(self, fhir_condition: Dict) -> Dict:
+    def send_fhir_condition(self, fhir_condition: Dict, idempotency_key: str = None) -> Dict:
         """
         Send FHIR Condition to HAPI FHIR Server
         This will actually store and be retrievable!
+        
+        With an idempotency key the Condition is created conditionally
+        (If-None-Exist), so retrying a delivery never stores it twice.
         """
         try:
             # Extract patient ID from condition
@@ -87,13 +157,28 @@ class BahmniIntegration:
             if 'id' in fhir_to_send:
                 del fhir_to_send['id']
             
+            # Same reference a transaction uses for this patient
+            if patient_ref.startswith('Patient/'):
+                fhir_to_send['subject'] = {
+                    **fhir_to_send['subject'],
+                    'reference': self._patient_reference(patient_id)
+                }
+            
+            headers = {
+                'Content-Type': 'application/fhir+json',
+                'Accept': 'application/fhir+json'
+            }
+            if idempotency_key:
+                fhir_to_send['identifier'] = fhir_to_send.get('identifier', []) + [{
+                    "system": DELIVERY_IDENTIFIER_SYSTEM,
+                    "value": idempotency_key
+                }]
+                headers['If-None-Exist'] = f"identifier={DELIVERY_IDENTIFIER_SYSTEM}|{idempotency_key}"
+            
             response = self.session.post(
                 f"{self.base_url}/Condition",
                 json=fhir_to_send,
-                headers={
-                    'Content-Type': 'application/fhir+json',
-                    'Accept': 'application/fhir+json'
-                },
+                headers=headers,
                 verify=False
             )
             
@@ -113,6 +198,158 @@ class BahmniIntegration:
             print(f"❌ Exception: {str(e)}")
             return {"error": str(e)}
     
+    def build_transaction_bundle(self, fhir_conditions: List[Dict]) -> Dict:
+        """
+        Pack Conditions into a single FHIR transaction Bundle
+        
+        Patients not yet known to exist are added once per bundle as a PUT
+        to Patient/{patient_id}, like ensure_patient_exists does, so a
+        patient has the same ID whichever path created it and the
+        Conditions can reference it directly.
+        
+        Args:
+            fhir_conditions: FHIR R4 Condition resources
+        
+        Returns:
+            Transaction Bundle resource
+        """
+        entries = []
+        added = set()
+        
+        for fhir_condition in fhir_conditions:
+            condition = fhir_condition.copy()
+            # Server assigns the ID on create (see send_fhir_condition)
+            condition.pop('id', None)
+            
+            subject = dict(condition.get('subject', {}))
+            patient_ref = subject.get('reference', '')
+            if patient_ref.startswith('Patient/'):
+                patient_id = patient_ref.replace('Patient/', '')
+                if patient_id not in self.known_patients and patient_id not in added:
+                    added.add(patient_id)
+                    entries.append({
+                        "fullUrl": f"{self.base_url}/Patient/{patient_id}",
+                        "resource": self._build_patient(patient_id),
+                        "request": {
+                            "method": "PUT",
+                            "url": f"Patient/{patient_id}"
+                        }
+                    })
+                subject['reference'] = self._patient_reference(patient_id)
+                condition['subject'] = subject
+            
+            entries.append({
+                "fullUrl": f"urn:uuid:{uuid.uuid4()}",
+                "resource": condition,
+                "request": {
+                    "method": "POST",
+                    "url": "Condition"
+                }
+            })
+        
+        return {
+            "resourceType": "Bundle",
+            "type": "transaction",
+            "entry": entries
+        }
+    
+    def find_existing_patients(self, patient_ids: Iterable[str]):
+        """
+        Look up patients not known to exist with one search (_id=a,b,...)
+        and remember those the server has, so the bundle does not PUT
+        placeholders over them
+        """
+        missing = sorted({p for p in patient_ids if p not in self.known_patients})
+        if not missing:
+            return
+        response = self.session.get(
+            f"{self.base_url}/Patient",
+            params={"_id": ",".join(missing), "_elements": "id", "_count": len(missing)},
+            headers={'Accept': 'application/fhir+json'},
+            verify=False
+        )
+        if response.status_code != 200:
+            return      # the bundle PUTs them; nothing is lost but the demographics
+        for entry in response.json().get("entry", []):
+            patient_id = entry.get("resource", {}).get("id")
+            if patient_id in missing:
+                self._remember_patient(patient_id, f"Patient/{patient_id}")
+    
+    def send_fhir_conditions(self, fhir_conditions: List[Dict]) -> Dict:
+        """
+        Send many FHIR Conditions to HAPI FHIR in one transaction
+        
+        One round trip covers every Condition and any missing Patients
+        (plus one patient search if some are not known yet), instead of
+        2-3 requests per Condition with send_fhir_condition.
+        
+        Args:
+            fhir_conditions: FHIR R4 Condition resources
+        
+        Returns:
+            {"success": True, "resource_ids": [...], "response": <Bundle>}
+            or {"error": ..., "status_code": ...} on failure
+        """
+        if not fhir_conditions:
+            return {"success": True, "resource_ids": [], "response": None}
+        
+        try:
+            self.find_existing_patients(
+                c.get('subject', {}).get('reference', '')[len('Patient/'):]
+                for c in fhir_conditions
+                if c.get('subject', {}).get('reference', '').startswith('Patient/')
+            )
+            bundle = self.build_transaction_bundle(fhir_conditions)
+            
+            response = self.session.post(
+                self.base_url,
+                json=bundle,
+                headers={
+                    'Content-Type': 'application/fhir+json',
+                    'Accept': 'application/fhir+json'
+                },
+                verify=False
+            )
+            
+            if response.status_code not in [200, 201]:
+                print(f"❌ Transaction failed: {response.status_code}")
+                print(f"Error: {response.text}")
+                return {"error": response.text, "status_code": response.status_code}
+            
+            result = response.json()
+            resource_ids = self._read_transaction_response(bundle, result)
+            
+            print(f"✅ {len(resource_ids)} FHIR Condition(s) stored in one transaction")
+            return {
+                "success": True,
+                "resource_ids": resource_ids,
+                "response": result
+            }
+            
+        except Exception as e:
+            print(f"❌ Exception: {str(e)}")
+            return {"error": str(e)}
+    
+    def _read_transaction_response(self, bundle: Dict, result: Dict) -> List[Optional[str]]:
+        """
+        Match transaction-response entries to the request entries (FHIR keeps
+        them in the same order), caching patients and collecting Condition IDs
+        """
+        resource_ids = []
+        
+        for request_entry, response_entry in zip(bundle["entry"], result.get("entry", [])):
+            resource = request_entry["resource"]
+            location = response_entry.get("response", {}).get("location", "")
+            resource_id = location_id(location, resource["resourceType"])
+            
+            if resource["resourceType"] == "Patient":
+                if resource_id:
+                    self._remember_patient(resource["id"], f"Patient/{resource_id}")
+            else:
+                resource_ids.append(resource_id)
+        
+        return resource_ids
+    
     def get_condition(self, condition_id: str) -> Dict:
         """Retrieve a condition by ID"""
         try:
@@ -128,17 +365,44 @@ class BahmniIntegration:
         except Exception as e:
             return {"error": str(e)}
     
-    def get_patient_conditions(self, patient_id: str) -> Dict:
-        """Get all conditions for a patient"""
+    def iter_patient_conditions(self, patient_id: str,
+                                page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict]:
+        """
+        Stream a patient's conditions page by page
+        Follows the searchset `next` links, prefetching the following page
+        """
+        patient_ref = self._patient_reference(patient_id)
+        return iter_search_resources(
+            self.session,
+            f"{self.base_url}/Condition",
+            {"patient": patient_ref.replace('Patient/', '')},
+            page_size=page_size
+        )
+    
+    def get_patient_conditions(self, patient_id: str, page_size: int = DEFAULT_PAGE_SIZE) -> Dict:
+        """Get all conditions for a patient (every page, as one searchset Bundle)"""
         try:
-            response = self.session.get(
-                f"{self.base_url}/Condition?patient={patient_id}",
-                headers={'Accept': 'application/fhir+json'},
-                verify=False
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            return {"error": f"Failed to fetch: {response.status_code}"}
+            conditions = list(self.iter_patient_conditions(patient_id, page_size))
+            return {
+                "resourceType": "Bundle",
+                "type": "searchset",
+                "total": len(conditions),
+                "entry": [{"resource": c} for c in conditions]
+            }
         except Exception as e:
             return {"error": str(e)}
+    
+    def get_conditions_for_patients(self, patient_ids: Iterable[str],
+                                    max_workers: int = DEFAULT_WORKERS,
+                                    page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Dict]:
+        """
+        Fetch conditions for many patients concurrently
+        
+        Returns:
+            {patient_id: {"resources": [...]}} or {patient_id: {"error": "..."}}
+        """
+        return fetch_for_patients(
+            lambda pid: list(self.iter_patient_conditions(pid, page_size)),
+            patient_ids,
+            max_workers=max_workers
+        )
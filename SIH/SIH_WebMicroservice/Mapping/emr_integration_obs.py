@@ -3,12 +3,13 @@ EMR Integration using OpenMRS Observations API
 This approach is more stable and works better with Bahmni UI
 """
 
-import requests
 import json
 from typing import Dict, Optional
 from datetime import datetime
 import urllib3
 
+from emr_session_pool import get_session
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
@@ -22,25 +23,14 @@ class BahmniObservationIntegration:
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
-        self.session = requests.Session()
+        # Shared per EMR endpoint: keeps the session cookie and lookup cache
+        self.client = get_session(self.base_url, username, password)
+        self.session = self.client.session
         self.authenticate()
     
     def authenticate(self):
-        """Authenticate with Bahmni/OpenMRS"""
-        auth_url = f"{self.base_url}/openmrs/ws/rest/v1/session"
-        response = self.session.get(
-            auth_url,
-            auth=(self.username, self.password),
-            headers={'Content-Type': 'application/json'},
-            verify=False
-        )
-        
-        if response.status_code == 200:
-            print("✅ Authenticated with Bahmni")
-            return True
-        else:
-            print(f"❌ Authentication failed: {response.status_code}")
-            return False
+        """Authenticate with Bahmni/OpenMRS (no-op while the pooled session is fresh)"""
+        return self.client.authenticate()
     
     def get_or_create_diagnosis_concept(self):
         """
@@ -67,12 +57,10 @@ class BahmniObservationIntegration:
             "location": "8d6c993e-c2cc-11de-8d13-0010c6dffd0f"  # Default location
         }
         
-        response = self.session.post(
-            f"{self.base_url}/openmrs/ws/rest/v1/encounter",
+        response = self.client.post(
+            "/openmrs/ws/rest/v1/encounter",
             json=encounter_data,
-            auth=(self.username, self.password),
-            headers={'Content-Type': 'application/json'},
-            verify=False
+            headers={'Content-Type': 'application/json'}
         )
         
         if response.status_code in [200, 201]:
@@ -83,6 +71,17 @@ class BahmniObservationIntegration:
             print(f"Error: {response.text}")
             return None
     
+    def get_encounter_for_patient(self, patient_uuid: str):
+        """
+        Encounter to record the patient's diagnoses in
+        Diagnoses sent within a few minutes of each other (one consultation)
+        share an encounter instead of creating one per diagnosis
+        """
+        return self.client.cached(
+            f"encounter:{patient_uuid}",
+            lambda: self.create_encounter(patient_uuid)
+        )
+    
     def send_diagnosis(self, patient_uuid: str, icd11_code: str, icd11_display: str, 
                       tm_system: str, tm_code: str, tm_term: str) -> Dict:
         """
@@ -99,8 +98,8 @@ class BahmniObservationIntegration:
         Returns:
             Response from Bahmni
         """
-        # Create an encounter first
-        encounter_uuid = self.create_encounter(patient_uuid)
+        # Reuse the consultation's encounter, creating it if needed
+        encounter_uuid = self.get_encounter_for_patient(patient_uuid)
         
         if not encounter_uuid:
             return {"error": "Failed to create encounter", "status_code": 500}
@@ -117,12 +116,10 @@ class BahmniObservationIntegration:
             "comment": f"Traditional Medicine Mapping: {tm_system} → ICD-11"
         }
         
-        response = self.session.post(
-            f"{self.base_url}/openmrs/ws/rest/v1/obs",
+        response = self.client.post(
+            "/openmrs/ws/rest/v1/obs",
             json=observation_data,
-            auth=(self.username, self.password),
-            headers={'Content-Type': 'application/json'},
-            verify=False
+            headers={'Content-Type': 'application/json'}
         )
         
         if response.status_code in [200, 201]:
@@ -135,6 +132,8 @@ class BahmniObservationIntegration:
                 "diagnosis": diagnosis_text
             }
         else:
+            # The cached encounter may have been closed or voided
+            self.client.invalidate(f"encounter:{patient_uuid}")
             print(f"❌ Failed to send observation: {response.status_code}")
             print(f"Error: {response.text}")
             return {
@@ -144,11 +143,9 @@ class BahmniObservationIntegration:
     
     def get_patient_observations(self, patient_uuid: str) -> Dict:
         """Get all observations for a patient"""
-        response = self.session.get(
-            f"{self.base_url}/openmrs/ws/rest/v1/obs?patient={patient_uuid}&v=full",
-            auth=(self.username, self.password),
-            headers={'Accept': 'application/json'},
-            verify=False
+        response = self.client.get(
+            f"/openmrs/ws/rest/v1/obs?patient={patient_uuid}&v=full",
+            headers={'Accept': 'application/json'}
         )
         
         if response.status_code == 200:
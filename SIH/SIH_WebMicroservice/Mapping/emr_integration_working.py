@@ -3,12 +3,13 @@ Working EMR Integration for Bahmni
 Uses Bahmni's native diagnosis concepts that actually show up in the UI
 """
 
-import requests
 import json
 from typing import Dict, Optional
 from datetime import datetime
 import urllib3
 
+from emr_session_pool import get_session
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
@@ -21,33 +22,26 @@ class BahmniIntegration:
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
-        self.session = requests.Session()
+        # Shared per EMR endpoint: keeps the session cookie and lookup cache
+        self.client = get_session(self.base_url, username, password)
+        self.session = self.client.session
         self.authenticate()
     
     def authenticate(self):
-        """Authenticate with Bahmni/OpenMRS"""
-        auth_url = f"{self.base_url}/openmrs/ws/rest/v1/session"
-        response = self.session.get(
-            auth_url,
-            auth=(self.username, self.password),
-            headers={'Content-Type': 'application/json'},
-            verify=False
-        )
-        
-        if response.status_code == 200:
-            print("✅ Authenticated with Bahmni")
-            return True
-        else:
-            print(f"❌ Authentication failed: {response.status_code}")
-            return False
+        """Authenticate with Bahmni/OpenMRS (no-op while the pooled session is fresh)"""
+        return self.client.authenticate()
     
     def get_visit_for_patient(self, patient_uuid: str):
-        """Get or create an active visit for the patient"""
+        """Get or create an active visit for the patient (cached briefly per patient)"""
+        return self.client.cached(
+            f"visit:{patient_uuid}",
+            lambda: self._find_or_create_visit(patient_uuid)
+        )
+    
+    def _find_or_create_visit(self, patient_uuid: str):
         # Check for active visits
-        response = self.session.get(
-            f"{self.base_url}/openmrs/ws/rest/v1/visit?patient={patient_uuid}&includeInactive=false&v=default",
-            auth=(self.username, self.password),
-            verify=False
+        response = self.client.get(
+            f"/openmrs/ws/rest/v1/visit?patient={patient_uuid}&includeInactive=false&v=default"
         )
         
         if response.status_code == 200:
@@ -65,12 +59,10 @@ class BahmniIntegration:
             "location": "8d6c993e-c2cc-11de-8d13-0010c6dffd0f"  # Default location
         }
         
-        response = self.session.post(
-            f"{self.base_url}/openmrs/ws/rest/v1/visit",
+        response = self.client.post(
+            "/openmrs/ws/rest/v1/visit",
             json=visit_data,
-            auth=(self.username, self.password),
-            headers={'Content-Type': 'application/json'},
-            verify=False
+            headers={'Content-Type': 'application/json'}
         )
         
         if response.status_code in [200, 201]:
@@ -98,12 +90,10 @@ class BahmniIntegration:
                 "value": diagnosis_text
             }
             
-            response = self.session.post(
-                f"{self.base_url}/openmrs/ws/rest/v1/obs",
+            response = self.client.post(
+                "/openmrs/ws/rest/v1/obs",
                 json=obs_data,
-                auth=(self.username, self.password),
-                headers={'Content-Type': 'application/json'},
-                verify=False
+                headers={'Content-Type': 'application/json'}
             )
             
             if response.status_code in [200, 201]:
@@ -0,0 +1,572 @@
+"""
+Durable Outbox for Asynchronous EMR Delivery
+Queues FHIR Conditions in SQLite and delivers them to the EMR from a
+background dispatcher with retries, exponential backoff and idempotency keys
+
+Several API workers may share the database: a delivery is claimed in an
+IMMEDIATE transaction, so only one of them sends it. EMR credentials are
+kept only until the delivery is delivered or has failed; a failed delivery
+that is retried later is sent with SIH_EMR_USERNAME / SIH_EMR_PASSWORD.
+
+Configuration:
+    SIH_EMR_USERNAME   EMR user for deliveries whose own credentials were cleared
+    SIH_EMR_PASSWORD   its password
+"""
+
+import os
+import sqlite3
+import json
+import uuid
+import hashlib
+import time
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from emr_integration_hapi import BahmniIntegration
+
+# Configuration
+DB_FILE = Path(__file__).parent / "emr_outbox.db"
+MAX_ATTEMPTS = 6          # Give up (status "failed") after this many tries
+BACKOFF_BASE = 2.0        # Seconds before the first retry, doubled each attempt
+BACKOFF_MAX = 300.0       # Never wait more than 5 minutes between retries
+POLL_INTERVAL = 1.0       # Seconds the dispatcher sleeps when the queue is idle
+BATCH_SIZE = 10           # Deliveries claimed per dispatcher pass
+CLAIM_LEASE = 600.0       # Seconds before a delivery left in_progress counts as abandoned
+EMR_USERNAME = os.getenv("SIH_EMR_USERNAME")
+EMR_PASSWORD = os.getenv("SIH_EMR_PASSWORD")
+
+STATUS_PENDING = "pending"
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_DELIVERED = "delivered"
+STATUS_FAILED = "failed"
+
+# HTTP statuses worth retrying; any other 4xx means the request itself is bad
+RETRYABLE_STATUS_CODES = {408, 429}
+
+# Idempotency keys are unique per target EMR, not across all of them
+OUTBOX_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS emr_outbox (
+        id TEXT PRIMARY KEY,
+        idempotency_key TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+
+        -- Target EMR
+        emr_url TEXT NOT NULL,
+        username TEXT,
+        password TEXT,
+
+        -- Payload
+        fhir_condition TEXT NOT NULL,
+
+        -- Delivery state
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        last_status_code INTEGER,
+        resource_id TEXT,
+        delivered_at TEXT,
+        claimed_at REAL,
+
+        UNIQUE (emr_url, idempotency_key)
+    )
+'''
+
+
+class EMROutbox:
+    """SQLite-backed queue of FHIR Conditions waiting to be sent to an EMR"""
+
+    def __init__(self, db_path: str = None):
+        """Initialize database connection"""
+        if db_path is None:
+            db_path = DB_FILE
+
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.create_tables()
+
+    def create_tables(self):
+        """Create outbox table if it doesn't exist"""
+        with self.lock:
+            self.conn.execute(OUTBOX_TABLE_SQL)
+
+            # Databases created before claims were timed
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(emr_outbox)")}
+            if "claimed_at" not in columns:
+                self.conn.execute("ALTER TABLE emr_outbox ADD COLUMN claimed_at REAL")
+
+            # Databases whose idempotency keys were unique across all EMRs
+            if self._has_global_key_constraint():
+                self._rescope_idempotency_keys()
+
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_outbox_due
+                ON emr_outbox(status, next_attempt_at)
+            ''')
+
+            self.conn.commit()
+
+    def _has_global_key_constraint(self) -> bool:
+        """Whether idempotency_key alone carries a UNIQUE constraint"""
+        for index in self.conn.execute("PRAGMA index_list(emr_outbox)"):
+            if not index["unique"]:
+                continue
+            columns = [row["name"] for row in self.conn.execute(
+                f'PRAGMA index_info("{index["name"]}")'
+            )]
+            if columns == ["idempotency_key"]:
+                return True
+        return False
+
+    def _rescope_idempotency_keys(self):
+        """
+        Rebuild the table so idempotency keys are unique per EMR
+
+        SQLite cannot drop a column constraint in place, so the rows are
+        copied into a table created with the current schema. The copy runs
+        in one IMMEDIATE transaction; a worker that opened the database at
+        the same time finds the table already rebuilt and leaves it alone.
+        """
+        self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._has_global_key_constraint():
+                columns = [row[1] for row in self.conn.execute("PRAGMA table_info(emr_outbox)")]
+                column_list = ", ".join(columns)
+                self.conn.execute("ALTER TABLE emr_outbox RENAME TO emr_outbox_old")
+                self.conn.execute("DROP INDEX IF EXISTS idx_outbox_due")
+                self.conn.execute(OUTBOX_TABLE_SQL)
+                self.conn.execute(
+                    f"INSERT INTO emr_outbox ({column_list}) SELECT {column_list} FROM emr_outbox_old"
+                )
+                self.conn.execute("DROP TABLE emr_outbox_old")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def enqueue(
+        self,
+        fhir_condition: Dict,
+        emr_url: str,
+        username: str = None,
+        password: str = None,
+        idempotency_key: str = None
+    ) -> Dict:
+        """
+        Queue a FHIR Condition for delivery
+
+        The idempotency key defaults to the Condition's generated ID, so a
+        client re-submitting the same Condition gets the same delivery back
+        instead of a duplicate. Keys are scoped to the target EMR: the same
+        key sent to two EMRs makes two deliveries.
+
+        Returns:
+            Delivery record
+        """
+        if idempotency_key is None:
+            idempotency_key = fhir_condition.get("id") or str(uuid.uuid4())
+
+        now = datetime.utcnow().isoformat() + "Z"
+
+        with self.lock:
+            self.conn.execute('''
+                INSERT OR IGNORE INTO emr_outbox (
+                    id, idempotency_key, created_at, updated_at,
+                    emr_url, username, password, fhir_condition,
+                    status, attempts, next_attempt_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+            ''', (
+                str(uuid.uuid4()), idempotency_key, now, now,
+                emr_url, username, password,
+                json.dumps(fhir_condition, ensure_ascii=False),
+                STATUS_PENDING, time.time()
+            ))
+            self.conn.commit()
+
+            row = self.conn.execute(
+                'SELECT * FROM emr_outbox WHERE emr_url = ? AND idempotency_key = ?',
+                (emr_url, idempotency_key)
+            ).fetchone()
+
+        return self._row_to_dict(row)
+
+    def claim_due(self, limit: int = BATCH_SIZE) -> List[Dict]:
+        """
+        Claim pending deliveries whose retry time has come
+
+        Claimed rows move to "in_progress" so no other dispatcher picks them up.
+        The select and update run in one IMMEDIATE transaction, which also
+        keeps dispatchers in other processes from claiming the same rows.
+        Their stored credentials are included since the dispatcher needs them.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute('''
+                    SELECT * FROM emr_outbox
+                    WHERE status = ? AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at
+                    LIMIT ?
+                ''', (STATUS_PENDING, now, limit)).fetchall()
+
+                self.conn.executemany('''
+                    UPDATE emr_outbox SET status = ?, claimed_at = ?, updated_at = ? WHERE id = ?
+                ''', [
+                    (STATUS_IN_PROGRESS, now, datetime.utcnow().isoformat() + "Z", row["id"])
+                    for row in rows
+                ])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+        return [self._row_to_dict(row, include_credentials=True) for row in rows]
+
+    def mark_delivered(self, delivery_id: str, resource_id: Optional[str]):
+        """Record a successful delivery"""
+        now = datetime.utcnow().isoformat() + "Z"
+
+        with self.lock:
+            self.conn.execute('''
+                UPDATE emr_outbox
+                SET status = ?, attempts = attempts + 1, resource_id = ?,
+                    last_error = NULL, last_status_code = NULL,
+                    username = NULL, password = NULL,
+                    delivered_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (STATUS_DELIVERED, resource_id, now, now, delivery_id))
+            self.conn.commit()
+
+    def mark_attempt_failed(
+        self,
+        delivery_id: str,
+        error: str,
+        status_code: Optional[int] = None,
+        retryable: bool = True,
+        max_attempts: int = MAX_ATTEMPTS
+    ) -> str:
+        """
+        Record a failed attempt and schedule the retry with exponential backoff
+
+        Returns:
+            New status ("pending" if it will be retried, otherwise "failed")
+        """
+        now = datetime.utcnow().isoformat() + "Z"
+
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT attempts FROM emr_outbox WHERE id = ?', (delivery_id,)
+            ).fetchone()
+            attempts = (row["attempts"] if row else 0) + 1
+
+            if retryable and attempts < max_attempts:
+                status = STATUS_PENDING
+                next_attempt_at = time.time() + backoff_delay(attempts)
+            else:
+                status = STATUS_FAILED
+                next_attempt_at = time.time()
+
+            self.conn.execute('''
+                UPDATE emr_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?,
+                    last_error = ?, last_status_code = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, attempts, next_attempt_at, error, status_code, now, delivery_id))
+            if status == STATUS_FAILED:
+                # Not kept for a retry that may never come (requeue uses the configured ones)
+                self.conn.execute(
+                    'UPDATE emr_outbox SET username = NULL, password = NULL WHERE id = ?', (delivery_id,)
+                )
+            self.conn.commit()
+
+        return status
+
+    def requeue(self, delivery_id: str) -> Optional[Dict]:
+        """Put a failed delivery back in the queue with a fresh attempt budget"""
+        now = datetime.utcnow().isoformat() + "Z"
+
+        with self.lock:
+            self.conn.execute('''
+                UPDATE emr_outbox
+                SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ?
+                WHERE id = ? AND status = ?
+            ''', (STATUS_PENDING, time.time(), now, delivery_id, STATUS_FAILED))
+            self.conn.commit()
+
+        return self.get_delivery(delivery_id)
+
+    def recover_stale(self, lease: float = CLAIM_LEASE) -> int:
+        """
+        Return deliveries left "in_progress" by a crashed process to the queue
+
+        Only claims older than the lease are taken back, so deliveries another
+        live worker is sending right now are left alone. Safe because every
+        attempt carries the idempotency key, so the EMR will not store a
+        Condition twice if the earlier attempt got through.
+        """
+        with self.lock:
+            cursor = self.conn.execute('''
+                UPDATE emr_outbox SET status = ?, updated_at = ?
+                WHERE status = ? AND (claimed_at IS NULL OR claimed_at < ?)
+            ''', (STATUS_PENDING, datetime.utcnow().isoformat() + "Z", STATUS_IN_PROGRESS,
+                  time.time() - lease))
+            self.conn.commit()
+        return cursor.rowcount
+
+    def get_delivery(self, delivery_id: str) -> Optional[Dict]:
+        """Get a delivery by ID"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT * FROM emr_outbox WHERE id = ?', (delivery_id,)
+            ).fetchone()
+
+        if row:
+            return self._row_to_dict(row)
+        return None
+
+    def list_deliveries(self, status: str = None, limit: int = 50) -> List[Dict]:
+        """Most recent deliveries, optionally filtered by status"""
+        with self.lock:
+            if status:
+                rows = self.conn.execute('''
+                    SELECT * FROM emr_outbox WHERE status = ?
+                    ORDER BY created_at DESC LIMIT ?
+                ''', (status, limit)).fetchall()
+            else:
+                rows = self.conn.execute('''
+                    SELECT * FROM emr_outbox
+                    ORDER BY created_at DESC LIMIT ?
+                ''', (limit,)).fetchall()
+
+        return [self._row_to_dict(row, include_payload=False) for row in rows]
+
+    def get_statistics(self) -> Dict:
+        """Number of deliveries in each status"""
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT status, COUNT(*) FROM emr_outbox GROUP BY status
+            ''').fetchall()
+
+        counts = {
+            STATUS_PENDING: 0,
+            STATUS_IN_PROGRESS: 0,
+            STATUS_DELIVERED: 0,
+            STATUS_FAILED: 0
+        }
+        counts.update({row[0]: row[1] for row in rows})
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def _row_to_dict(self, row, include_credentials: bool = False, include_payload: bool = True) -> Dict:
+        """Convert database row to dictionary (credentials hidden by default)"""
+        record = dict(row)
+
+        if include_payload:
+            record["fhir_condition"] = json.loads(record["fhir_condition"])
+        else:
+            del record["fhir_condition"]
+
+        if not include_credentials:
+            del record["username"]
+            del record["password"]
+
+        return record
+
+    def close(self):
+        """Close database connection"""
+        if self.conn:
+            self.conn.close()
+
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.close()
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: ~2s, 4s, 8s, ... capped at BACKOFF_MAX"""
+    delay = min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxDispatcher:
+    """Background thread that drains the outbox into the EMR"""
+
+    def __init__(
+        self,
+        outbox: EMROutbox,
+        max_attempts: int = MAX_ATTEMPTS,
+        poll_interval: float = POLL_INTERVAL,
+        batch_size: int = BATCH_SIZE
+    ):
+        self.outbox = outbox
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.clients = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start delivering in the background"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        recovered = self.outbox.recover_stale()
+        if recovered:
+            print(f"♻️  Re-queued {recovered} interrupted EMR deliveries")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="emr-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the dispatcher thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Deliver new items now instead of waiting for the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.process_once()
+            except Exception as e:
+                print(f"⚠️  EMR outbox dispatcher error: {e}")
+                processed = 0
+
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def process_once(self) -> int:
+        """Claim and deliver one batch of due items. Returns how many were tried."""
+        items = self.outbox.claim_due(self.batch_size)
+        for item in items:
+            self._deliver(item)
+        return len(items)
+
+    def _client(self, item: Dict) -> BahmniIntegration:
+        """
+        One EMR client per endpoint and user, so its HTTP session is reused
+
+        The client is rebuilt when the user's password changes, so a
+        delivery never goes out with credentials cached for an earlier one.
+        """
+        username = item["username"] or EMR_USERNAME
+        password = item["password"] if item["username"] else EMR_PASSWORD
+        key = (item["emr_url"], username)
+        digest = hashlib.sha256((password or "").encode()).hexdigest()
+        cached = self.clients.get(key)
+        if cached is None or cached[0] != digest:
+            cached = (digest, BahmniIntegration(
+                base_url=item["emr_url"],
+                username=username,
+                password=password
+            ))
+            self.clients[key] = cached
+        return cached[1]
+
+    def _deliver(self, item: Dict):
+        try:
+            result = self._client(item).send_fhir_condition(
+                item["fhir_condition"],
+                idempotency_key=item["idempotency_key"]
+            )
+        except Exception as e:
+            result = {"error": str(e)}
+
+        if "error" not in result:
+            self.outbox.mark_delivered(item["id"], result.get("id"))
+            return
+
+        status_code = result.get("status_code")
+        retryable = (
+            status_code is None
+            or status_code >= 500
+            or status_code in RETRYABLE_STATUS_CODES
+        )
+        status = self.outbox.mark_attempt_failed(
+            item["id"],
+            error=str(result.get("error"))[:2000],
+            status_code=status_code,
+            retryable=retryable,
+            max_attempts=self.max_attempts
+        )
+        if status == STATUS_FAILED:
+            print(f"❌ EMR delivery {item['id']} failed permanently: {status_code}")
+
+
+# -------------------------------------------------------------
+# Shared instances for the API server
+# -------------------------------------------------------------
+_outbox = None
+_dispatcher = None
+
+
+def get_outbox() -> EMROutbox:
+    """Get or create the process-wide outbox"""
+    global _outbox
+    if _outbox is None:
+        _outbox = EMROutbox()
+    return _outbox
+
+
+def start_dispatcher() -> OutboxDispatcher:
+    """Start the process-wide dispatcher (idempotent)"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OutboxDispatcher(get_outbox())
+    _dispatcher.start()
+    return _dispatcher
+
+
+def stop_dispatcher():
+    """Stop the process-wide dispatcher"""
+    if _dispatcher is not None:
+        _dispatcher.stop()
+
+
+def enqueue_condition(
+    fhir_condition: Dict,
+    emr_url: str,
+    username: str = None,
+    password: str = None,
+    idempotency_key: str = None
+) -> Dict:
+    """
+    Convenience function to queue a Condition and nudge the dispatcher
+
+    Returns:
+        Delivery record
+    """
+    delivery = get_outbox().enqueue(
+        fhir_condition, emr_url, username, password, idempotency_key
+    )
+    if _dispatcher is not None:
+        _dispatcher.wake()
+    return delivery
+
+
+# Example usage
+if __name__ == "__main__":
+    with EMROutbox() as outbox:
+        print("EMR Outbox Statistics:")
+        print(json.dumps(outbox.get_statistics(), indent=2))
@@ -0,0 +1,182 @@
+"""
+Pooled, Long-Lived Sessions for Bahmni/OpenMRS
+One authenticated client per EMR endpoint, shared by every integration
+instance. The OpenMRS session cookie is kept alive and renewed only when
+it expires, and lookups that rarely change (visits, encounters, concepts)
+are cached with a short TTL.
+"""
+
+import time
+import hashlib
+import threading
+import requests
+from typing import Any, Callable, Dict, Optional, Tuple
+import urllib3
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Configuration
+SESSION_TTL = 25 * 60     # Renew before OpenMRS' default 30 min session timeout
+LOOKUP_TTL = 5 * 60       # Visits/encounters/concepts reused for 5 minutes
+
+
+class OpenMRSSession:
+    """Authenticated OpenMRS REST client for one EMR endpoint"""
+
+    def __init__(self, base_url: str, username: str, password: str,
+                 session_ttl: float = SESSION_TTL, lookup_ttl: float = LOOKUP_TTL):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.session_ttl = session_ttl
+        self.lookup_ttl = lookup_ttl
+        self.session = requests.Session()
+        self.authenticated_at = None
+        self.stats = {"authentications": 0, "requests": 0, "cache_hits": 0, "cache_misses": 0}
+        self._auth_lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._cache_lock = threading.Lock()
+
+    # ---------------------------------------------------------
+    # Authentication
+    # ---------------------------------------------------------
+    def is_authenticated(self) -> bool:
+        """True while the session cookie is fresh"""
+        return (
+            self.authenticated_at is not None
+            and time.time() - self.authenticated_at < self.session_ttl
+        )
+
+    def authenticate(self, force: bool = False) -> bool:
+        """
+        Open an OpenMRS session (sets the JSESSIONID cookie)
+        Skipped while the current session is still fresh, unless forced
+        """
+        with self._auth_lock:
+            if not force and self.is_authenticated():
+                return True
+
+            response = self.session.get(
+                f"{self.base_url}/openmrs/ws/rest/v1/session",
+                auth=(self.username, self.password),
+                headers={'Content-Type': 'application/json'},
+                verify=False
+            )
+            self.stats["authentications"] += 1
+
+            if response.status_code == 200 and self._session_authenticated(response):
+                self.authenticated_at = time.time()
+                print("✅ Authenticated with Bahmni")
+                return True
+
+            self.authenticated_at = None
+            print(f"❌ Authentication failed: {response.status_code}")
+            return False
+
+    @staticmethod
+    def _session_authenticated(response: requests.Response) -> bool:
+        """OpenMRS answers 200 with {"authenticated": false} for bad credentials"""
+        try:
+            return response.json().get("authenticated", True)
+        except ValueError:
+            return True
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        Send a request on the authenticated session
+
+        Relies on the session cookie instead of re-sending Basic auth, and
+        re-authenticates once if OpenMRS reports the session has expired.
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        kwargs.setdefault("verify", False)
+
+        self.authenticate()
+        response = self.session.request(method, url, **kwargs)
+        self.stats["requests"] += 1
+
+        if response.status_code in (401, 403):
+            if self.authenticate(force=True):
+                response = self.session.request(method, url, **kwargs)
+                self.stats["requests"] += 1
+
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    # ---------------------------------------------------------
+    # TTL lookup cache
+    # ---------------------------------------------------------
+    def cached(self, key: str, loader: Callable[[], Any], ttl: float = None) -> Any:
+        """
+        Return a cached value, calling loader() when missing or expired
+        None results are not cached, so a failed lookup is retried next time
+        """
+        ttl = self.lookup_ttl if ttl is None else ttl
+        now = time.time()
+
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > now:
+                self.stats["cache_hits"] += 1
+                return entry[1]
+
+        self.stats["cache_misses"] += 1
+        value = loader()
+        if value is not None:
+            with self._cache_lock:
+                self._cache[key] = (now + ttl, value)
+        return value
+
+    def invalidate(self, key: str):
+        """Drop a cached lookup (e.g. after the EMR rejected a stale visit)"""
+        with self._cache_lock:
+            self._cache.pop(key, None)
+
+
+# -------------------------------------------------------------
+# Pool: one client per (EMR endpoint, user, password)
+# -------------------------------------------------------------
+_pool: Dict[Tuple[str, str, str], OpenMRSSession] = {}
+_pool_lock = threading.Lock()
+
+
+def get_session(base_url: str, username: str, password: str) -> OpenMRSSession:
+    """
+    Get the pooled client for an EMR endpoint, creating it on first use
+
+    Clients are keyed on the full credentials (the password by its SHA-256
+    digest), so a request with a wrong password gets its own client instead
+    of replacing the session other requests are using.
+    """
+    digest = hashlib.sha256((password or "").encode()).hexdigest()
+    key = (base_url.rstrip('/'), username, digest)
+
+    with _pool_lock:
+        client = _pool.get(key)
+        if client is None:
+            client = OpenMRSSession(base_url, username, password)
+            _pool[key] = client
+
+    return client
+
+
+def pool_stats() -> Dict[str, Dict]:
+    """Per-endpoint authentication, request and cache counters, summed over passwords"""
+    stats: Dict[str, Dict] = {}
+    with _pool_lock:
+        for (url, user, _), client in _pool.items():
+            totals = stats.setdefault(f"{user}@{url}", {})
+            for name, value in client.stats.items():
+                totals[name] = totals.get(name, 0) + value
+    return stats
+
+
+def clear_pool():
+    """Forget every pooled session"""
+    with _pool_lock:
+        _pool.clear()
@@ -0,0 +1,166 @@
+"""
+Micro-Batching Query Encoder
+Concurrent requests each encode one query, which leaves most of the
+encoder's matrix throughput unused. QueryBatcher is a worker thread in
+front of the encoder: callers queue their query and wait; the worker takes
+the first waiting query, collects more for up to SIH_ENCODE_BATCH_WINDOW_MS
+(or until SIH_ENCODE_BATCH_MAX), runs one batched encode and hands every
+caller its own vector. Queries that piled up while a batch was encoding
+join the next one without waiting, so a window of 0 still batches under
+load; a lone query pays at most the window.
+
+Batch sizes, queue waits and encode times are kept as histograms
+(get_statistics(), exported by the API as /encoder/stats).
+
+Configuration:
+    SIH_ENCODE_BATCHING          1 (default) batches concurrent query encodes, 0 encodes on the caller's thread
+    SIH_ENCODE_BATCH_WINDOW_MS   how long a batch waits for more queries (default 2)
+    SIH_ENCODE_BATCH_MAX         most queries per encode call (default 32)
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# Configuration
+BATCHING = os.getenv("SIH_ENCODE_BATCHING", "1") == "1"
+WINDOW_MS = float(os.getenv("SIH_ENCODE_BATCH_WINDOW_MS", "2"))
+MAX_BATCH = int(os.getenv("SIH_ENCODE_BATCH_MAX", "32"))
+
+# Upper bounds (ms) of the wait / encode time histogram buckets; the last bucket is open
+TIME_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_STOP = object()
+
+
+def time_bucket(ms: float) -> str:
+    for bound in TIME_BUCKETS_MS:
+        if ms <= bound:
+            return f"<={bound}"
+    return f">{TIME_BUCKETS_MS[-1]}"
+
+
+class QueryBatcher:
+    """
+    Collects single-query encodes from many threads into batched calls
+
+    encode_fn takes a list of strings and returns one vector per string
+    (SentenceTransformer.encode, OnnxEncoder.encode).
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.batch_sizes = Counter()
+        self.wait_ms = Counter()
+        self.encode_ms = Counter()
+        self.queries = 0
+        self.encoded = 0            # distinct texts actually encoded
+        self.errors = 0
+
+    def encode(self, query: str) -> np.ndarray:
+        """Vector of one query, encoded together with whatever else is waiting"""
+        return self._submit(query).result()
+
+    def encode_many(self, queries: List[str]) -> np.ndarray:
+        """Vectors of several queries (one caller's list), batched like single queries"""
+        futures = [self._submit(query) for query in queries]
+        return np.stack([future.result() for future in futures]) if futures else np.empty((0, 0), np.float32)
+
+    def _submit(self, query: str) -> Future:
+        future = Future()
+        self._start()
+        self._queue.put((query, future, time.perf_counter()))
+        return future
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    # ---------------------------------------------------------
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch, stop = self._collect(item)
+            self._encode(batch)
+            if stop:
+                return
+
+    def _collect(self, first):
+        """The first query plus those arriving within the window (already queued ones always join)"""
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _encode(self, batch):
+        start = time.perf_counter()
+        texts = list(dict.fromkeys(query for query, _, _ in batch))     # a repeated query is encoded once
+        try:
+            vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+
+        rows = {text: vectors[i] for i, text in enumerate(texts)}
+        with self._lock:
+            self.batch_sizes[len(batch)] += 1
+            self.encode_ms[time_bucket((done - start) * 1000)] += 1
+            for _, _, queued in batch:
+                self.wait_ms[time_bucket((start - queued) * 1000)] += 1
+            self.queries += len(batch)
+            self.encoded += len(texts)
+        for query, future, _ in batch:
+            future.set_result(np.array(rows[query]))
+
+    def get_statistics(self) -> Dict:
+        with self._lock:
+            batches = sum(self.batch_sizes.values())
+            order = [f"<={b}" for b in TIME_BUCKETS_MS] + [f">{TIME_BUCKETS_MS[-1]}"]
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "batches": batches,
+                "queries": self.queries,
+                "encoded": self.encoded,
+                "errors": self.errors,
+                "mean_batch_size": self.queries / batches if batches else 0.0,
+                "batch_size_histogram": {str(size): self.batch_sizes[size] for size in sorted(self.batch_sizes)},
+                "queue_wait_ms_histogram": {b: self.wait_ms[b] for b in order if self.wait_ms[b]},
+                "encode_ms_histogram": {b: self.encode_ms[b] for b in order if self.encode_ms[b]}
+            }
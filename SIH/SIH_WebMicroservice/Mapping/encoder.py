@@ -0,0 +1,135 @@
+"""
+Shared Query Encoder
+All search modules embed queries with the same PubMedBERT model; loading
+it once per process (on first search) instead of once per module keeps a
+single copy of the weights resident. Recent query embeddings are kept so
+the dense retrieval path and the semantic rerank encode a query once, and
+queries encoded concurrently by different requests share one batched
+forward pass (encode_batcher.py).
+
+Queries can be encoded by the torch model or by its ONNX Runtime export
+(onnx_encoder.py), full precision or int8. Documents are always encoded
+with torch (index_builder.py, live_updates.py), so the embedding cache
+only ever holds exact vectors.
+
+When an embedding sidecar (embedding_sidecar.py) is running on this host,
+every backend is served by it and no model is loaded in this process; the
+in-process model is loaded only if the sidecar is absent or stops
+answering.
+
+Configuration:
+    SIH_ENCODER_BACKEND   torch (default), onnx or onnx-int8 - query encoder; an ONNX
+                          backend that cannot be loaded falls back to torch
+"""
+
+import os
+import threading
+from functools import lru_cache
+from typing import Dict
+
+from encode_batcher import BATCHING, QueryBatcher
+
+# Configuration
+MODEL_NAME = "pritamdeka/S-PubMedBert-MS-MARCO"
+QUERY_CACHE_SIZE = 256
+BACKEND = os.getenv("SIH_ENCODER_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_embedders = {}
+_embedder_lock = threading.Lock()
+_batcher = None
+_sidecar = None
+_remote = {}
+
+
+def get_embedder(backend: str = None, remote: bool = True):
+    """
+    Encoder for a backend (default SIH_ENCODER_BACKEND)
+
+    Served by the embedding sidecar when one is running (unless remote is
+    False), else loaded into this process on first use.
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}' (choose from {', '.join(BACKENDS)})")
+    if remote:
+        client = get_sidecar()
+        if client is not None:
+            from embedding_sidecar import RemoteEmbedder
+
+            with _embedder_lock:
+                if backend not in _remote:
+                    _remote[backend] = RemoteEmbedder(client, backend, lambda: get_embedder(backend, remote=False))
+            return _remote[backend]
+    with _embedder_lock:
+        if backend not in _embedders:
+            _embedders[backend] = _torch_embedder() if backend == "torch" else _onnx_embedder(backend)
+    return _embedders[backend]
+
+
+def get_sidecar():
+    """Client of the host's embedding sidecar (looked up once per process), or None"""
+    global _sidecar
+    with _embedder_lock:
+        if _sidecar is None:
+            from embedding_sidecar import connect      # imported on first use, not with every search module
+            _sidecar = connect(model=MODEL_NAME) or False
+    return _sidecar or None
+
+
+def _torch_embedder():
+    # Caller holds _embedder_lock
+    if "torch" not in _embedders:
+        from sentence_transformers import SentenceTransformer
+        _embedders["torch"] = SentenceTransformer(MODEL_NAME)
+    return _embedders["torch"]
+
+
+def _onnx_embedder(backend: str):
+    # Caller holds _embedder_lock
+    try:
+        from onnx_encoder import load_encoder
+        return load_encoder(backend)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"⚠️  {backend} query encoder unavailable, using torch: {e}")
+        return _torch_embedder()
+
+
+def get_batcher() -> QueryBatcher:
+    """The process-wide micro-batcher in front of the query encoder"""
+    global _batcher
+    with _embedder_lock:
+        if _batcher is None:
+            _batcher = QueryBatcher(lambda texts: get_embedder().encode(texts, batch_size=len(texts)))
+    return _batcher
+
+
+def stop_batcher():
+    if _batcher is not None:
+        _batcher.stop()
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _encode_query(query: str):
+    if BATCHING:
+        vector = get_batcher().encode(query)
+    else:
+        vector = get_embedder().encode([query])[0]
+    vector.setflags(write=False)   # shared between callers
+    return vector
+
+
+def encode_query(query: str):
+    """Embedding of a single query string (read-only, cached)"""
+    return _encode_query(query)
+
+
+def encoder_stats() -> Dict:
+    """Loaded backends, sidecar use, query cache hits and micro-batching histograms"""
+    return {
+        "backend": BACKEND,
+        "loaded": sorted(_embedders),
+        "sidecar": _sidecar.get_statistics() if _sidecar else None,
+        "query_cache": _encode_query.cache_info()._asdict(),
+        "batching": {"enabled": BATCHING, **(_batcher.get_statistics() if _batcher is not None else {})}
+    }
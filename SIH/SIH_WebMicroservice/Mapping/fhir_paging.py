@@ -0,0 +1,129 @@
+"""
+Paged FHIR Search Helpers
+Streams searchset Bundles page by page (following `next` links) instead of
+loading a whole result set at once. The next page is prefetched in the
+background while the caller works through the current one.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urljoin
+
+import requests
+
+# Configuration
+DEFAULT_PAGE_SIZE = 100   # _count sent on the first request
+DEFAULT_WORKERS = 4       # concurrent patients in fetch_for_patients
+
+
+class FHIRSearchError(Exception):
+    """A search page could not be fetched"""
+
+    def __init__(self, url: str, status_code: int, text: str = ""):
+        super().__init__(f"FHIR search failed ({status_code}): {url}")
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+
+def next_link(bundle: Dict) -> Optional[str]:
+    """URL of the next page of a searchset Bundle, if any"""
+    for link in bundle.get("link", []):
+        if link.get("relation") == "next":
+            return link.get("url")
+    return None
+
+
+def _fetch_page(session: requests.Session, url: str, params: Optional[Dict],
+                headers: Dict, timeout: float) -> Dict:
+    response = session.get(url, params=params, headers=headers, timeout=timeout, verify=False)
+    if response.status_code != 200:
+        raise FHIRSearchError(url, response.status_code, response.text)
+    return response.json()
+
+
+def iter_search_pages(session: requests.Session, url: str, params: Optional[Dict] = None,
+                      page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = True,
+                      timeout: float = 30.0) -> Iterator[Dict]:
+    """
+    Yield each searchset Bundle of a FHIR search
+
+    Args:
+        session: Authenticated requests session
+        url: Search URL, e.g. ".../Condition"
+        params: Search parameters for the first page
+        page_size: _count for the first page (server may cap it)
+        prefetch: Fetch page N+1 while page N is being consumed
+
+    Raises:
+        FHIRSearchError: A page returned a non-200 status
+    """
+    headers = {'Accept': 'application/fhir+json'}
+    params = dict(params or {})
+    if page_size:
+        params.setdefault("_count", page_size)
+
+    bundle = _fetch_page(session, url, params, headers, timeout)
+
+    if not prefetch:
+        while bundle is not None:
+            yield bundle
+            link = next_link(bundle)
+            bundle = _fetch_page(session, urljoin(url, link), None, headers, timeout) if link else None
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while bundle is not None:
+            link = next_link(bundle)
+            pending = (
+                executor.submit(_fetch_page, session, urljoin(url, link), None, headers, timeout)
+                if link else None
+            )
+            try:
+                yield bundle
+            except GeneratorExit:
+                if pending:
+                    pending.cancel()
+                raise
+            bundle = pending.result() if pending else None
+
+
+def iter_search_resources(session: requests.Session, url: str, params: Optional[Dict] = None,
+                          **kwargs) -> Iterator[Dict]:
+    """Yield the resources of a FHIR search one by one, across all pages"""
+    for bundle in iter_search_pages(session, url, params, **kwargs):
+        for entry in bundle.get("entry", []):
+            resource = entry.get("resource")
+            if resource:
+                yield resource
+
+
+def fetch_for_patients(fetch: Callable[[str], List[Dict]], patient_ids: Iterable[str],
+                       max_workers: int = DEFAULT_WORKERS) -> Dict[str, Dict]:
+    """
+    Run a per-patient fetch concurrently with a bounded worker pool
+
+    Args:
+        fetch: Function returning the resources for one patient id
+        patient_ids: Patients to fetch
+        max_workers: Upper bound on concurrent requests
+
+    Returns:
+        {patient_id: {"resources": [...]}} or {patient_id: {"error": "..."}}
+    """
+    patient_ids = list(dict.fromkeys(patient_ids))
+    results = {}
+    if not patient_ids:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(patient_ids)))) as executor:
+        futures = {executor.submit(fetch, pid): pid for pid in patient_ids}
+        for future in as_completed(futures):
+            pid = futures[future]
+            try:
+                results[pid] = {"resources": future.result()}
+            except Exception as e:
+                results[pid] = {"error": str(e)}
+
+    # Keep the caller's order
+    return {pid: results[pid] for pid in patient_ids}
@@ -3,6 +3,7 @@ ICD-11 to FHIR CodeSystem Pipeline
 Takes an ICD-11 code and returns a FHIR-compliant CodeSystem JSON with Entity ID
 """
 
+import os
 import requests
 import json
 from typing import Dict, Optional
@@ -22,8 +23,15 @@ class ICD11FHIRPipeline:
         """
         self.client_id = client_id
         self.client_secret = client_secret
-        self.token_url = "https://icdaccessmanagement.who.int/connect/token"
-        self.search_url = "https://id.who.int/icd/release/11/2024-01/mms/search"
+        # SIH_STUB_URL points the pipeline at the local stand-ins (local_stubs.py)
+        stub_url = os.getenv("SIH_STUB_URL", "").rstrip('/')
+        if stub_url:
+            self.token_url = f"{stub_url}/who/connect/token"
+            self.api_base = f"{stub_url}/who/icd"
+        else:
+            self.token_url = "https://icdaccessmanagement.who.int/connect/token"
+            self.api_base = "https://id.who.int/icd"
+        self.search_url = f"{self.api_base}/release/11/2024-01/mms/search"
         self.access_token = None
     
     def get_access_token(self) -> str:
@@ -70,7 +78,7 @@ class ICD11FHIRPipeline:
         }
         
         # Primary strategy: Use codeinfo endpoint for exact code lookup
-        lookup_url = f"https://id.who.int/icd/release/11/2024-01/mms/codeinfo/{code}"
+        lookup_url = f"{self.api_base}/release/11/2024-01/mms/codeinfo/{code}"
         try:
             lookup_response = requests.get(lookup_url, headers=headers)
             if lookup_response.status_code == 200:
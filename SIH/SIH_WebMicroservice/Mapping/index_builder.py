@@ -0,0 +1,502 @@
+"""
+Incremental Index Builder
+One build command for every corpus in corpus_store.CORPORA, replacing the
+per-corpus build_indexes_*.py scripts. Each document's text is hashed;
+embeddings are looked up in a content-addressed cache (model + document
+hash) so only new or changed documents go through the encoder, and any
+stage whose input hash matches the previous bundle's manifest is carried
+over instead of refitted. The output is an index bundle (index_bundle.py)
+whose manifest records the stage hashes for the next build.
+
+Encoding sorts documents by token length and cuts batches to a token
+budget, so short terms are batched wide and long definitions narrow and
+little of each batch is padding. Several corpora can be built at once in
+worker processes, each limited to a fixed number of torch threads.
+
+Stages and what their input hash covers:
+    columns      codes / terms / definitions / ... stored in the bundle
+    bm25         document texts + BM25 parameters
+    tfidf        document texts + TfidfVectorizer arguments
+    embeddings   document texts + encoder model name + storage dtype / reduced dimension
+    ann          embeddings + IVF / sign-bit prefilter parameters (ann_index.py)
+
+Usage:
+    python index_builder.py                          # every corpus with a data file
+    python index_builder.py ayurveda unani
+    python index_builder.py --data-dir ../data --index-dir ../indexes siddha
+    python index_builder.py --force icd              # refit every stage
+    python index_builder.py --workers 2 --threads 4  # two corpora at a time
+    python index_builder.py --dtype float32          # unquantized embedding matrices
+    python index_builder.py --dim 256 icd11_standard # PCA-reduced embeddings
+"""
+
+import os
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from corpus_store import CORPORA, DATA_DIR, load_corpus
+from ann_index import ann_params, build_ann
+from embedding_matrix import DTYPES, EMBEDDING_DIM, EMBEDDING_DTYPE, EmbeddingMatrix, fit_projection
+from index_bundle import MANIFEST, bundle_path, load_bundle, resolve_bundle, write_bundle
+
+# Configuration
+BASE_DIR = Path(__file__).parent
+INDEX_DIR = BASE_DIR / "indexes"
+CACHE_NAME = "embedding_cache.db"    # kept in the index directory
+BUILDER_VERSION = 1
+TOKENS_PER_BATCH = 8192   # padded tokens (batch size x longest document) per encode call
+MAX_BATCH = 256
+
+BM25_PARAMS = {"k1": 1.5, "b": 0.75, "epsilon": 0.25}
+TFIDF_DEFAULTS = {"stop_words": "english"}
+
+# Values left out of the document text (ayurveda's placeholder definition)
+EMPTY_VALUES = {"", "No description available."}
+
+STAGES = ("columns", "bm25", "tfidf", "embeddings", "ann")
+
+
+# -------------------------------------------------------------
+# Hashing
+# -------------------------------------------------------------
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def digest(values: Iterable[str], *params) -> str:
+    """Order-sensitive hash of a sequence of strings plus JSON-able parameters"""
+    h = hashlib.sha256()
+    for value in values:
+        h.update(value.encode("utf-8"))
+        h.update(b"\0")
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def doc_text(system: str, values: Dict[str, str]) -> str:
+    """Document text of one record given its column values"""
+    return ". ".join(values[name] for name in CORPORA[system]["doc"] if values[name] not in EMPTY_VALUES)
+
+
+def build_docs(corpus) -> List[str]:
+    """Document text per row: the corpus's "doc" columns joined with '. '"""
+    fields = CORPORA[corpus.system]["doc"]
+    return [
+        ". ".join(value for value in row if value not in EMPTY_VALUES)
+        for row in zip(*(corpus.column(name) for name in fields))
+    ]
+
+
+def tfidf_params(system: str) -> Dict:
+    return {**TFIDF_DEFAULTS, **CORPORA[system].get("tfidf", {})}
+
+
+def stage_hashes(system: str, columns: Dict[str, List[str]], doc_hashes: List[str],
+                 model: str, embedding_dtype: str = EMBEDDING_DTYPE,
+                 embedding_dim: int = EMBEDDING_DIM) -> Dict[str, str]:
+    docs_digest = digest(doc_hashes)
+    reduced = [embedding_dim] if embedding_dim else []    # full-dimension hashes unchanged
+    embeddings = digest([docs_digest], model, embedding_dtype, *reduced)
+    return {
+        "columns": digest((v for name in columns for v in [name, *columns[name]])),
+        "bm25": digest([docs_digest], "lower-split", BM25_PARAMS),
+        "tfidf": digest([docs_digest], tfidf_params(system)),
+        "embeddings": embeddings,
+        "ann": digest([embeddings], *ann_params(len(doc_hashes))),
+    }
+
+
+# -------------------------------------------------------------
+# Content-addressed embedding cache
+# -------------------------------------------------------------
+class EmbeddingCache:
+    """SQLite store of document embeddings keyed by model + SHA-256 of the text"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        # Parallel builds share the file; wait for other writers instead of failing
+        self.conn = sqlite3.connect(str(db_path), timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+        self.create_tables()
+
+    def create_tables(self):
+        with self.lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    doc_hash TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, doc_hash)
+                )
+            ''')
+            self.conn.commit()
+
+    def get_many(self, model: str, doc_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the given hashes (missing ones are left out)"""
+        found = {}
+        unique = list(dict.fromkeys(doc_hashes))
+        with self.lock:
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT doc_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND doc_hash IN ({','.join('?' * len(chunk))})",
+                    (model, *chunk)
+                ).fetchall()
+                for doc_hash, vector in rows:
+                    found[doc_hash] = np.frombuffer(vector, dtype=np.float32)
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(unique) - len(found)
+        return found
+
+    def put_many(self, model: str, doc_hashes: List[str], vectors: np.ndarray):
+        now = time.time()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, doc_hash, dim, vector, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(model, h, vectors.shape[1], v.tobytes(), now) for h, v in zip(doc_hashes, vectors)]
+            )
+            self.conn.commit()
+        self.stats["stored"] += len(doc_hashes)
+
+    def get_statistics(self) -> Dict:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {**self.stats, "entries": entries}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# -------------------------------------------------------------
+# Stages
+# -------------------------------------------------------------
+def fit_bm25(docs: List[str]):
+    from rank_bm25 import BM25Okapi
+    return BM25Okapi([d.lower().split() for d in docs], **BM25_PARAMS)
+
+
+def fit_tfidf(system: str, docs: List[str]):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(**tfidf_params(system))
+    return vectorizer, vectorizer.fit_transform(docs)
+
+
+def token_lengths(encoder, texts: List[str]) -> List[int]:
+    """Tokens per text with the encoder's tokenizer, or a word count without one"""
+    tokenizer = getattr(encoder, "tokenizer", None)
+    if tokenizer is None:
+        return [len(t.split()) + 2 for t in texts]
+    limit = getattr(encoder, "max_seq_length", None) or 512
+    ids = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=limit)["input_ids"]
+    return [len(x) for x in ids]
+
+
+def length_buckets(lengths: List[int], tokens_per_batch: int = TOKENS_PER_BATCH,
+                   max_batch: int = MAX_BATCH) -> List[List[int]]:
+    """Row indices grouped into batches of similar length within the token budget"""
+    batches, batch, longest = [], [], 0
+    for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+        widest = max(longest, lengths[i])
+        if batch and (len(batch) >= max_batch or (len(batch) + 1) * widest > tokens_per_batch):
+            batches.append(batch)
+            batch, widest = [], lengths[i]
+        batch.append(i)
+        longest = widest
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def encode_bucketed(encoder, texts: List[str], tokens_per_batch: int = TOKENS_PER_BATCH,
+                    max_batch: int = MAX_BATCH) -> Tuple[np.ndarray, Dict]:
+    """
+    Encode texts in length-sorted batches; rows come back in the input order
+
+    Returns (embeddings, stats) where stats has the encode time, docs/sec,
+    batch count and padding efficiency (real tokens / padded tokens).
+    """
+    start = time.perf_counter()
+    lengths = token_lengths(encoder, texts)
+    batches = length_buckets(lengths, tokens_per_batch, max_batch)
+    out = None
+    for batch in batches:
+        vectors = np.asarray(encoder.encode([texts[i] for i in batch], batch_size=len(batch),
+                                            show_progress_bar=False), dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[batch] = vectors
+    seconds = time.perf_counter() - start
+    padded = sum(len(b) * max(lengths[i] for i in b) for b in batches)
+    return out, {
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(len(texts) / seconds, 1) if seconds else 0.0,
+        "batches": len(batches),
+        "padding_efficiency": round(sum(lengths) / padded, 3) if padded else 1.0
+    }
+
+
+def build_embeddings(docs: List[str], doc_hashes: List[str], cache: EmbeddingCache,
+                     model: str, encoder=None, previous: Dict = None,
+                     tokens_per_batch: int = TOKENS_PER_BATCH):
+    """
+    Embeddings for every document, encoding only those not seen before
+
+    Vectors come from the cache first, then from the previous bundle's rows
+    whose document hash is unchanged (so a deleted cache does not force a
+    full pass), and only the rest are encoded. Returns (embeddings, counts,
+    encode stats or None).
+    """
+    vectors = cache.get_many(model, doc_hashes)
+    counts = {"cached": len(vectors), "reused": 0, "encoded": 0}
+    stats = None
+
+    missing = [h for h in dict.fromkeys(doc_hashes) if h not in vectors]
+    if missing and previous is not None and "doc_hashes" in previous \
+            and previous["manifest"].get("build", {}).get("model") == model \
+            and previous["manifest"]["embeddings"].get("dtype") == "float32" \
+            and "reduced_dim" not in previous["manifest"]["embeddings"]:       # quantized / reduced rows are lossy
+        rows = {h: i for i, h in enumerate(previous["doc_hashes"])}
+        reused = [h for h in missing if h in rows]
+        if reused:
+            old = np.asarray(previous["embeddings"][[rows[h] for h in reused]], dtype=np.float32)
+            cache.put_many(model, reused, old)
+            vectors.update(zip(reused, old))
+            counts["reused"] = len(reused)
+            missing = [h for h in missing if h not in rows]
+
+    if missing:
+        if encoder is None:
+            from encoder import get_embedder
+            encoder = get_embedder("torch")
+        text = dict(zip(doc_hashes, docs))
+        encoded, stats = encode_bucketed(encoder, [text[h] for h in missing], tokens_per_batch)
+        cache.put_many(model, missing, encoded)
+        vectors.update(zip(missing, encoded))
+        counts["encoded"] = len(missing)
+
+    return np.stack([vectors[h] for h in doc_hashes]).astype(np.float32), counts, stats
+
+
+def load_previous(path: Path):
+    """The existing bundle, or None if there is none or it cannot be read"""
+    if not (resolve_bundle(path) / MANIFEST).exists():
+        return None
+    try:
+        return load_bundle(path)
+    except (ValueError, OSError, KeyError):
+        return None
+
+
+# -------------------------------------------------------------
+# Build one corpus
+# -------------------------------------------------------------
+def build_corpus(system: str, data_dir: Path = None, index_dir: Path = INDEX_DIR,
+                 cache: EmbeddingCache = None, encoder=None, model: str = None,
+                 force: bool = False, tokens_per_batch: int = TOKENS_PER_BATCH,
+                 embedding_dtype: str = EMBEDDING_DTYPE, embedding_dim: int = EMBEDDING_DIM) -> Dict:
+    """
+    Build (or bring up to date) indexes/<system>.bundle
+
+    Args:
+        encoder: Object with encode(texts, batch_size=..., show_progress_bar=...);
+                 defaults to the shared PubMedBERT model, loaded only if needed
+        model: Model name the cache is keyed on (default encoder.MODEL_NAME)
+        force: Refit every stage even when its input hash is unchanged
+        embedding_dtype: Stored embedding dtype (float32, float16 or int8)
+        embedding_dim: Store embeddings projected to this many dimensions
+                       (basis fitted on the corpus); 0 keeps them all
+
+    Returns:
+        Report with per-stage "rebuilt" / "reused", embedding counts and,
+        when anything was encoded, encode throughput under "encode"
+    """
+    if model is None:
+        from encoder import MODEL_NAME
+        model = MODEL_NAME
+    start = time.perf_counter()
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    own_cache = cache is None
+    if own_cache:
+        cache = EmbeddingCache(index_dir / CACHE_NAME)
+
+    try:
+        corpus = load_corpus(system, data_dir)
+        columns = corpus.columns()
+        docs = build_docs(corpus)
+        doc_hashes = [text_hash(d) for d in docs]
+        stages = stage_hashes(system, columns, doc_hashes, model, embedding_dtype, embedding_dim)
+
+        path = bundle_path(index_dir, system)
+        previous = load_previous(path)
+        old_stages = previous["manifest"].get("build", {}).get("stages", {}) if previous else {}
+        reuse = {s: not force and old_stages.get(s) == stages[s] for s in STAGES}
+
+        report = {"system": system, "docs": len(docs), "up_to_date": all(reuse.values()),
+                  "stages": {s: "reused" if reuse[s] else "rebuilt" for s in STAGES},
+                  "embeddings": {"cached": 0, "reused": 0, "encoded": 0}, "encode": None}
+        if report["up_to_date"]:
+            report["seconds"] = time.perf_counter() - start
+            return report
+
+        bm25 = previous["bm25"] if reuse["bm25"] else fit_bm25(docs)
+        if reuse["tfidf"]:
+            vectorizer, tfidf_matrix = previous["tfidf_vectorizer"], previous["tfidf_matrix"]
+        else:
+            vectorizer, tfidf_matrix = fit_tfidf(system, docs)
+        if reuse["embeddings"]:
+            embeddings = previous["embeddings"]
+            report["embeddings"]["reused"] = len(docs)
+        else:
+            vectors, report["embeddings"], report["encode"] = build_embeddings(
+                docs, doc_hashes, cache, model, encoder, previous, tokens_per_batch
+            )
+            projection = fit_projection(vectors, embedding_dim) if embedding_dim else None
+            embeddings = EmbeddingMatrix.from_vectors(vectors, embedding_dtype, projection)
+        ann = previous["ann"] if reuse["ann"] and "ann" in previous else build_ann(embeddings)
+
+        write_bundle(
+            path, system, {**columns, "doc_hashes": doc_hashes},
+            bm25=bm25, vectorizer=vectorizer, tfidf_matrix=tfidf_matrix, embeddings=embeddings, ann=ann,
+            embedding_dtype=embedding_dtype,
+            source={"data": CORPORA[system]["data"], "doc_fields": CORPORA[system]["doc"]},
+            build={"builder_version": BUILDER_VERSION, "model": model, "stages": stages,
+                   "rebuilt": [s for s in STAGES if not reuse[s]],
+                   "embeddings": report["embeddings"]}
+        )
+        report["seconds"] = time.perf_counter() - start
+        return report
+    finally:
+        if own_cache:
+            cache.close()
+
+
+# -------------------------------------------------------------
+# Build several corpora
+# -------------------------------------------------------------
+def _limit_threads(threads: int):
+    """Worker initializer: cap torch / BLAS threads before anything is loaded"""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _build_worker(system: str, kwargs: Dict) -> Dict:
+    return build_corpus(system, **kwargs)
+
+
+def build_all(systems: List[str], workers: int = 1, threads: int = None, **kwargs):
+    """
+    Build several corpora, up to `workers` at a time in separate processes
+
+    Each worker loads its own copy of the encoder and runs with `threads`
+    torch threads (default: CPU count / workers). Larger corpora start
+    first. Yields (system, report or exception) as each one finishes;
+    kwargs are passed to build_corpus.
+    """
+    data_dir = Path(kwargs.get("data_dir") or DATA_DIR)
+    systems = sorted(systems, key=lambda s: -(data_dir / CORPORA[s]["data"]).stat().st_size)
+
+    if workers <= 1:
+        if threads:
+            _limit_threads(threads)
+        for system in systems:
+            try:
+                yield system, build_corpus(system, **kwargs)
+            except Exception as e:
+                yield system, e
+        return
+
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    # spawn: workers must not inherit a parent that has torch threads running
+    with ProcessPoolExecutor(max_workers=workers, initializer=_limit_threads, initargs=(threads,),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(_build_worker, system, kwargs): system for system in systems}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+
+def describe(report: Dict) -> str:
+    if report["up_to_date"]:
+        return f"up to date ({report['docs']} docs, {report['seconds']:.1f}s)"
+    rebuilt = [s for s, state in report["stages"].items() if state == "rebuilt"]
+    emb = report["embeddings"]
+    line = (f"{report['docs']} docs | rebuilt: {', '.join(rebuilt)} | embeddings: "
+            f"{emb['encoded']} encoded, {emb['cached']} cached, {emb['reused']} reused")
+    if report["encode"]:
+        enc = report["encode"]
+        line += (f" | {enc['docs_per_sec']:.1f} docs/s, {enc['batches']} batches, "
+                 f"{enc['padding_efficiency']:.0%} of padded tokens real")
+    return f"{line} | {report['seconds']:.1f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update search index bundles")
+    parser.add_argument("systems", nargs="*", help=f"corpora to build ({', '.join(CORPORA)})")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    parser.add_argument("--tokens-per-batch", type=int, default=TOKENS_PER_BATCH)
+    parser.add_argument("--workers", type=int, default=1, help="corpora built at once")
+    parser.add_argument("--threads", type=int, help="torch threads per worker (default: CPUs / workers)")
+    parser.add_argument("--force", action="store_true", help="refit every stage")
+    parser.add_argument("--dtype", choices=DTYPES, default=EMBEDDING_DTYPE, help="stored embedding dtype")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM,
+                        help="store embeddings PCA-reduced to this many dimensions (0: all)")
+    args = parser.parse_args()
+
+    systems = []
+    for system in args.systems or [s for s in CORPORA if (args.data_dir / CORPORA[s]["data"]).exists()]:
+        if system not in CORPORA:
+            print(f"❌ {system}: unknown corpus (choose from {', '.join(CORPORA)})")
+        elif not (args.data_dir / CORPORA[system]["data"]).exists():
+            print(f"⚠️  {system}: skipped, missing {CORPORA[system]['data']}")
+        else:
+            systems.append(system)
+
+    print("=" * 70)
+    print(f"📦 Building {len(systems)} corpora into {args.index_dir} ({args.workers} worker(s))")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    encoded = 0
+    for system, report in build_all(systems, workers=args.workers, threads=args.threads,
+                                    data_dir=args.data_dir, index_dir=args.index_dir,
+                                    force=args.force, tokens_per_batch=args.tokens_per_batch,
+                                    embedding_dtype=args.dtype, embedding_dim=args.dim):
+        if isinstance(report, Exception):
+            print(f"❌ {system}: {report}")
+            continue
+        encoded += report["embeddings"]["encoded"]
+        print(f"✅ {system}: {describe(report)}")
+
+    seconds = time.perf_counter() - start
+    print(f"\n📊 {encoded} documents encoded in {seconds:.1f}s"
+          f"{f' ({encoded / seconds:.1f} docs/s overall)' if encoded else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Binary Index Bundle
+Versioned on-disk format for one corpus's search indexes, replacing the
+BM25 / TF-IDF / meta pickles. Everything is plain .npy arrays, UTF-8
+string tables and a JSON manifest, so a bundle loads with mmap and never
+unpickles Python objects.
+
+Layout of indexes/<system>.bundle/:
+    CURRENT                           name of the live version directory, replaced atomically
+    v<ns>-<pid>/                      one version; older ones are pruned once nothing maps them
+
+Layout of a version directory:
+    manifest.json                     format, version, counts, BM25/TF-IDF parameters
+    <column>.offsets.npy / .utf8      columnar string tables (codes, terms, ...)
+    bm25_vocab.*, bm25_idf.npy        BM25 vocabulary (sorted) and IDF
+    bm25_tf.{data,indices,indptr}.npy term x document frequency matrix (CSR)
+    bm25_doc_len.npy                  document lengths
+    tfidf_vocab.*, tfidf_idf.npy      TF-IDF vocabulary (feature order) and IDF
+    tfidf.{data,indices,indptr}.npy   document x feature TF-IDF matrix (CSR)
+    embeddings.npy                    document embeddings: float32, or (when the manifest
+                                      says "normalized") unit rows as float32 / float16 / int8
+    embeddings_scale/offset.npy       per-row scales and common offset of int8 embeddings
+    embeddings_projection.npy         basis of reduced embeddings (embedding_matrix.fit_projection)
+    ann_*.npy                         optional IVF / sign-bit index over the embeddings (ann_index.py)
+"""
+
+import os
+import json
+import mmap
+import pickle
+import time
+import shutil
+import bisect
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+from scipy import sparse
+
+from ann_index import ANN_KINDS, build_ivf
+from embedding_matrix import EMBEDDING_DTYPE, EmbeddingMatrix
+
+# Configuration
+FORMAT = "sih-index-bundle"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+
+# TF-IDF parameters that define transform(); anything else is fit-time only
+TFIDF_PARAMS = (
+    "analyzer", "lowercase", "token_pattern", "ngram_range", "stop_words",
+    "strip_accents", "binary", "norm", "use_idf", "smooth_idf", "sublinear_tf"
+)
+
+
+def bundle_path(index_dir, system: str) -> Path:
+    return Path(index_dir) / f"{system}.bundle"
+
+
+def resolve_bundle(path) -> Path:
+    """
+    Directory holding the live version of a bundle
+
+    The CURRENT pointer names it; bundles written before versioning keep
+    their files directly in the bundle directory.
+    """
+    path = Path(path)
+    try:
+        version = (path / CURRENT).read_text(encoding="utf-8").strip()
+    except OSError:
+        return path
+    return path / version if version else path
+
+
+def bundle_exists(index_dir, system: str) -> bool:
+    return (resolve_bundle(bundle_path(index_dir, system)) / MANIFEST).exists()
+
+
+def prune_versions(path, keep: int = 1) -> int:
+    """
+    Remove old versions of a bundle, keeping the live one and the newest
+    keep - 1 others (and files of a pre-versioning bundle). A version some
+    process still maps cannot be removed on Windows; it is retried on the
+    next prune. Returns the number of versions removed.
+    """
+    path = Path(path)
+    current = resolve_bundle(path)
+    if current == path:
+        return 0
+    old = sorted((p for p in path.iterdir() if p.is_dir() and p.name.startswith("v") and p != current),
+                 key=lambda p: p.name, reverse=True)[max(keep - 1, 0):]
+    removed = 0
+    for version in old:
+        shutil.rmtree(version, ignore_errors=True)
+        removed += not version.exists()
+    for legacy in path.iterdir() if keep <= 1 else ():
+        if legacy.is_file() and legacy.name != CURRENT:
+            try:
+                legacy.unlink()
+            except OSError:
+                pass
+    return removed
+
+
+# -------------------------------------------------------------
+# Columnar string tables
+# -------------------------------------------------------------
+class StringColumn:
+    """Read-only list of strings backed by one UTF-8 buffer and an offsets array"""
+
+    def __init__(self, offsets: np.ndarray, blob):
+        self.offsets = offsets.view(np.ndarray)   # plain view: cheap scalar access
+        self.blob = blob                          # mmap.mmap or bytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("StringColumn index out of range")
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self) -> List[str]:
+        """Decode every string in one pass"""
+        bounds = self.offsets.tolist()
+        data = self.blob[:bounds[-1]]
+        return [data[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+
+
+def write_strings(directory: Path, name: str, values: Iterable[str]):
+    encoded = [("" if v is None else str(v)).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(directory / f"{name}.offsets.npy", offsets)
+    with open(directory / f"{name}.utf8", "wb") as f:
+        f.write(b"".join(encoded))
+
+
+def read_strings(directory: Path, name: str) -> StringColumn:
+    offsets = np.load(directory / f"{name}.offsets.npy", mmap_mode="r")
+    with open(directory / f"{name}.utf8", "rb") as f:
+        # mmap cannot map an empty file
+        blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+    return StringColumn(offsets, blob)
+
+
+def _save_csr(directory: Path, name: str, matrix):
+    matrix = sparse.csr_matrix(matrix)
+    np.save(directory / f"{name}.data.npy", matrix.data)
+    np.save(directory / f"{name}.indices.npy", matrix.indices)
+    np.save(directory / f"{name}.indptr.npy", matrix.indptr)
+    return list(matrix.shape)
+
+
+def _load_csr(directory: Path, name: str, shape) -> sparse.csr_matrix:
+    arrays = [np.load(directory / f"{name}.{part}.npy", mmap_mode="r")
+              for part in ("data", "indices", "indptr")]
+    return sparse.csr_matrix(tuple(arrays), shape=tuple(shape), copy=False)
+
+
+# -------------------------------------------------------------
+# BM25 (same scores as rank_bm25.BM25Okapi, term-major CSR)
+# -------------------------------------------------------------
+class BM25Index:
+    """BM25Okapi scorer over a term x document frequency matrix"""
+
+    def __init__(self, vocab: StringColumn, idf: np.ndarray, tf: sparse.csr_matrix,
+                 doc_len: np.ndarray, k1: float, b: float, avgdl: float, epsilon: float = 0.25):
+        self.vocab = vocab
+        self.idf = idf
+        self.tf = tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.avgdl = avgdl
+        self.corpus_size = len(doc_len)
+        # Per-document part of the denominator, computed once
+        self.length_norm = k1 * (1 - b + b * np.asarray(doc_len, dtype=np.float64) / avgdl)
+
+    def term_id(self, token: str) -> int:
+        i = bisect.bisect_left(self.vocab, token)
+        return i if i < len(self.vocab) and self.vocab[i] == token else -1
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        scores = np.zeros(self.corpus_size)
+        indptr, indices, data = self.tf.indptr, self.tf.indices, self.tf.data
+        for token in query:
+            t = self.term_id(token)
+            if t < 0:
+                continue
+            start, end = indptr[t], indptr[t + 1]
+            docs = indices[start:end]
+            freq = data[start:end].astype(np.float64)
+            scores[docs] += self.idf[t] * (freq * (self.k1 + 1) / (freq + self.length_norm[docs]))
+        return scores
+
+
+def bm25_arrays(bm25):
+    """Vocabulary, IDF and term x document matrix from a fitted BM25Okapi (or a loaded BM25Index)"""
+    if isinstance(bm25, BM25Index):
+        return bm25.vocab.to_list(), np.asarray(bm25.idf), bm25.tf
+    vocab = sorted(bm25.idf)
+    term_ids = {term: i for i, term in enumerate(vocab)}
+    rows, cols, counts = [], [], []
+    for doc_id, freqs in enumerate(bm25.doc_freqs):
+        for term, count in freqs.items():
+            rows.append(term_ids[term])
+            cols.append(doc_id)
+            counts.append(count)
+    tf = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.int32), (rows, cols)),
+        shape=(len(vocab), bm25.corpus_size)
+    )
+    idf = np.array([bm25.idf[term] for term in vocab], dtype=np.float64)
+    return vocab, idf, tf
+
+
+# -------------------------------------------------------------
+# TF-IDF vectorizer state
+# -------------------------------------------------------------
+def _vectorizer_params(vectorizer) -> Dict:
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"]:
+        raise ValueError("Only the default word analyzer can be stored in a bundle")
+    stored = {key: params[key] for key in TFIDF_PARAMS}
+    if not isinstance(stored["stop_words"], (str, type(None))):
+        stored["stop_words"] = sorted(stored["stop_words"])
+    stored["dtype"] = np.dtype(params["dtype"]).name
+    return stored
+
+
+def _vectorizer_vocab(vectorizer) -> List[str]:
+    """Feature names in column order (a restored vectorizer only has the vocabulary parameter)"""
+    vocabulary = getattr(vectorizer, "vocabulary_", None) or vectorizer.vocabulary
+    return sorted(vocabulary, key=vocabulary.get)
+
+
+def _restore_vectorizer(params: Dict, vocab: StringColumn, idf: np.ndarray):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    params = dict(params)
+    params["ngram_range"] = tuple(params["ngram_range"])
+    params["dtype"] = np.dtype(params["dtype"]).type
+    vectorizer = TfidfVectorizer(**params, vocabulary={term: i for i, term in enumerate(vocab.to_list())})
+    vectorizer.idf_ = np.asarray(idf)
+    return vectorizer
+
+
+# -------------------------------------------------------------
+# Write / load
+# -------------------------------------------------------------
+def start_version(path) -> Path:
+    """Empty directory for a new version of a versioned directory (bundle or mapping table)"""
+    tmp = Path(path) / f".tmp-v{time.time_ns()}-{os.getpid()}"
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+def publish_version(path, tmp: Path, keep: int = 2) -> Path:
+    """
+    Make a directory from start_version() the live version
+
+    Nothing maps the new directory yet, so renaming it is safe; readers
+    switch when the CURRENT pointer is replaced (os.replace is atomic).
+    The previous version is kept for readers still opening it.
+    """
+    path = Path(path)
+    version = path / tmp.name[len(".tmp-"):]
+    tmp.rename(version)
+    pointer = path / f"{CURRENT}.tmp-{os.getpid()}"
+    pointer.write_text(version.name, encoding="utf-8")
+    os.replace(pointer, path / CURRENT)
+    prune_versions(path, keep)
+    return version
+
+
+def write_bundle(path, system: str, columns: Dict[str, List[str]], bm25, vectorizer,
+                 tfidf_matrix, embeddings, source: Dict = None, build: Dict = None,
+                 ann=None, embedding_dtype: str = EMBEDDING_DTYPE) -> Dict:
+    """
+    Write a new version of a bundle and make it the live one
+
+    The version is written to its own directory and published by replacing
+    the CURRENT pointer (publish_version), so readers never see a partial
+    bundle and files a serving process has mapped are never renamed.
+    index_registry prunes the previous version once it has drained.
+
+    Args:
+        columns: String columns keyed by the names the search module uses
+                 (e.g. {"codes": [...], "terms": [...], "defs": [...]})
+        bm25: Fitted rank_bm25.BM25Okapi, or the BM25Index of a loaded bundle
+        vectorizer: Fitted TfidfVectorizer (or one restored from a bundle)
+        tfidf_matrix: Document x feature TF-IDF matrix
+        embeddings: Document embeddings, or an EmbeddingMatrix from a loaded bundle
+        source: Optional provenance recorded in the manifest
+        build: Optional builder state (stage hashes) recorded in the manifest
+        ann: Optional IVFIndex / BinaryIndex over the embeddings
+        embedding_dtype: Store embeddings L2-normalized as float32, float16 or int8
+
+    Returns:
+        The manifest
+    """
+    path = Path(path)
+    doc_count = bm25.corpus_size
+    if not (isinstance(embeddings, EmbeddingMatrix) and embeddings.storage_dtype == embedding_dtype):
+        embeddings = EmbeddingMatrix.from_vectors(embeddings, embedding_dtype,
+                                                  getattr(embeddings, "projection", None))
+    for name, values in columns.items():
+        if len(values) != doc_count:
+            raise ValueError(f"Column '{name}' has {len(values)} rows, BM25 has {doc_count}")
+    if embeddings.shape[0] != doc_count or tfidf_matrix.shape[0] != doc_count:
+        raise ValueError("Embedding / TF-IDF row counts do not match the corpus")
+
+    tmp = start_version(path)
+
+    for name, values in columns.items():
+        write_strings(tmp, name, values)
+
+    vocab, idf, tf = bm25_arrays(bm25)
+    write_strings(tmp, "bm25_vocab", vocab)
+    np.save(tmp / "bm25_idf.npy", idf)
+    bm25_shape = _save_csr(tmp, "bm25_tf", tf)
+    np.save(tmp / "bm25_doc_len.npy", np.asarray(bm25.doc_len, dtype=np.int32))
+
+    tfidf_vocab = _vectorizer_vocab(vectorizer)
+    write_strings(tmp, "tfidf_vocab", tfidf_vocab)
+    np.save(tmp / "tfidf_idf.npy", np.asarray(vectorizer.idf_))
+    tfidf_shape = _save_csr(tmp, "tfidf", tfidf_matrix)
+
+    np.save(tmp / "embeddings.npy", np.ascontiguousarray(embeddings.data))
+    if embeddings.scales is not None:
+        np.save(tmp / "embeddings_scale.npy", embeddings.scales)
+        np.save(tmp / "embeddings_offset.npy", embeddings.offset)
+    if embeddings.projection is not None:
+        np.save(tmp / "embeddings_projection.npy", embeddings.projection)
+    if ann is not None:
+        for name in ann.arrays:
+            np.save(tmp / f"ann_{name}.npy", getattr(ann, name))
+
+    manifest_embeddings = {"dim": int(embeddings.shape[1]), "dtype": embedding_dtype, "normalized": True}
+    if embeddings.projection is not None:
+        manifest_embeddings["reduced_dim"] = int(embeddings.data.shape[1])
+
+    manifest = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "system": system,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "doc_count": doc_count,
+        "columns": list(columns),
+        "bm25": {
+            "k1": bm25.k1, "b": bm25.b, "epsilon": bm25.epsilon, "avgdl": bm25.avgdl,
+            "vocab_size": len(vocab), "shape": bm25_shape
+        },
+        "tfidf": {"params": _vectorizer_params(vectorizer), "shape": tfidf_shape},
+        "embeddings": manifest_embeddings,
+        "ann": ann.get_statistics() if ann is not None else None,
+        "source": source or {},
+        "build": build or {}
+    }
+    with open(tmp / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    publish_version(path, tmp)
+    return manifest
+
+
+def read_manifest(path) -> Dict:
+    path = resolve_bundle(path)
+    with open(path / MANIFEST, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{path} is not an index bundle")
+    if manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(
+            f"{path} is bundle version {manifest.get('version')}, "
+            f"this code reads version {FORMAT_VERSION} (rebuild it with index_builder.py)"
+        )
+    return manifest
+
+
+def load_bundle(path) -> Dict:
+    """
+    Load a bundle with memory-mapped arrays
+
+    Returns the same dict shape as the search modules' pickle loaders:
+    the string columns plus "bm25", "tfidf_vectorizer", "tfidf_matrix"
+    and "embeddings" (plus "ann" when the bundle has an ANN index).
+    """
+    path = resolve_bundle(path)
+    manifest = read_manifest(path)
+
+    index = {name: read_strings(path, name) for name in manifest["columns"]}
+
+    bm25 = manifest["bm25"]
+    index["bm25"] = BM25Index(
+        vocab=read_strings(path, "bm25_vocab"),
+        idf=np.load(path / "bm25_idf.npy", mmap_mode="r"),
+        tf=_load_csr(path, "bm25_tf", bm25["shape"]),
+        doc_len=np.load(path / "bm25_doc_len.npy", mmap_mode="r"),
+        k1=bm25["k1"], b=bm25["b"], avgdl=bm25["avgdl"], epsilon=bm25["epsilon"]
+    )
+
+    tfidf = manifest["tfidf"]
+    index["tfidf_vectorizer"] = _restore_vectorizer(
+        tfidf["params"], read_strings(path, "tfidf_vocab"), np.load(path / "tfidf_idf.npy")
+    )
+    index["tfidf_matrix"] = _load_csr(path, "tfidf", tfidf["shape"])
+    embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+    if manifest["embeddings"].get("normalized"):
+        extras = [path / f"embeddings_{name}.npy" for name in ("scale", "offset", "projection")]
+        embeddings = EmbeddingMatrix(embeddings, *(np.load(p) if p.exists() else None for p in extras))
+    index["embeddings"] = embeddings
+    ann = manifest.get("ann")
+    if ann:
+        kind = ANN_KINDS[ann.get("kind", "ivf")]
+        index["ann"] = kind(*(np.load(path / f"ann_{name}.npy") for name in kind.arrays),
+                            **{option: ann[option] for option in kind.options})
+    index["manifest"] = manifest
+    return index
+
+
+def load_pickled_indexes(index_dir, system: str) -> Dict:
+    """Legacy layout: bm25_/tfidf_ pickles, tfidf_matrix_ .npz and embeddings_ .npy"""
+    index_dir = Path(index_dir)
+    with open(index_dir / f"bm25_{system}.pkl", "rb") as f:
+        bm25 = pickle.load(f)["model"]
+    with open(index_dir / f"tfidf_{system}.pkl", "rb") as f:
+        vectorizer = pickle.load(f)["vectorizer"]
+    return {
+        "bm25": bm25,
+        "tfidf_vectorizer": vectorizer,
+        "tfidf_matrix": sparse.load_npz(index_dir / f"tfidf_matrix_{system}.npz"),
+        "embeddings": np.load(index_dir / f"embeddings_{system}.npy"),
+    }
+
+
+def load_index_files(index_dir, system: str) -> Dict:
+    """
+    A system's search indexes: the bundle when one exists, else the pickles.
+    Indexes without an ANN index get a single-list IVF one (exact dense scan).
+    """
+    if bundle_exists(index_dir, system):
+        index = load_bundle(bundle_path(index_dir, system))
+    else:
+        index = load_pickled_indexes(index_dir, system)
+    if "ann" not in index:
+        index["ann"] = build_ivf(index["embeddings"], n_lists=1)
+    return index
@@ -0,0 +1,547 @@
+"""
+Lazy Search-Index Registry
+Each search module registers a loader for its corpus instead of loading
+everything at import time. A corpus is loaded on first use and kept in an
+LRU; when the resident indexes exceed the memory budget, the least
+recently used corpora are evicted and reloaded on their next use.
+
+Indexes can be reloaded while the API is serving. A new version is loaded
+beside the live one, checked against its manifest, and swapped in under
+the lock; a search that pinned the old version (pinned()) keeps using it
+for all of its stages, and the old version is released once the last such
+search finishes. IndexWatcher reloads a system when its bundle changes;
+bundle versions this process no longer uses are then pruned from disk.
+
+Configuration:
+    SIH_INDEX_MEMORY_MB          heap budget for loaded indexes (0 = unlimited); memory-mapped
+                                 bundle arrays are page cache the OS can drop, so they are
+                                 reported as mapped_bytes but not counted against it
+    SIH_INDEX_WATCH              1 = reload indexes when their bundle changes
+    SIH_INDEX_WATCH_INTERVAL     seconds between bundle checks (default 5)
+"""
+
+import os
+import sys
+import mmap
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from index_bundle import MANIFEST, prune_versions, resolve_bundle
+
+# Configuration
+MEMORY_BUDGET_MB = float(os.getenv("SIH_INDEX_MEMORY_MB", "0"))
+WATCH = os.getenv("SIH_INDEX_WATCH", "0") == "1"
+WATCH_INTERVAL = float(os.getenv("SIH_INDEX_WATCH_INTERVAL", "5"))
+
+# Index versions pinned by the current search (system -> index)
+_pinned: ContextVar[Dict[str, Dict]] = ContextVar("sih_pinned_indexes", default={})
+
+
+def _mapping(array):
+    """The file mapping under an array (its mmap.mmap, else the outermost np.memmap), or None"""
+    root = None
+    while array is not None:
+        if isinstance(array, mmap.mmap):
+            return array
+        if isinstance(array, np.memmap):
+            root = array
+        array = getattr(array, "base", None)
+    return root
+
+
+def _mapped_bytes(mapping) -> int:
+    try:
+        return len(mapping) if isinstance(mapping, mmap.mmap) else mapping.nbytes
+    except ValueError:      # closed mmap
+        return 0
+
+
+def estimate_size(obj, _seen: set = None, mapped: Dict[int, int] = None) -> int:
+    """
+    Approximate heap bytes of a loaded index
+    Counts numpy/scipy buffers exactly and walks Python containers and
+    object attributes (e.g. BM25Okapi, TfidfVectorizer) recursively.
+    Memory-mapped buffers live in the page cache, not the heap: they add
+    nothing here and are recorded in `mapped` (mapping id -> bytes, so
+    views of one file count once) when it is given.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, (np.ndarray, mmap.mmap)):
+        mapping = _mapping(obj)
+        if mapping is None:
+            return obj.nbytes
+        if mapped is not None:
+            mapped[id(mapping)] = _mapped_bytes(mapping)
+        return 0
+    if sparse.issparse(obj):
+        return sum(estimate_size(getattr(obj, attr), _seen, mapped)
+                   for attr in ("data", "indices", "indptr") if hasattr(obj, attr))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen, mapped) + estimate_size(v, _seen, mapped) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen, mapped) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += estimate_size(vars(obj), _seen, mapped)
+    return size
+
+
+def measure_index(index: Dict) -> Tuple[int, int]:
+    """(heap bytes, memory-mapped bytes) of a loaded index"""
+    mapped = {}
+    resident = estimate_size(index, mapped=mapped)
+    return resident, sum(mapped.values())
+
+
+def validate_index(name: str, index: Dict):
+    """Raise ValueError unless every part of the index covers the same documents"""
+    counts = {}
+    if "bm25" in index:
+        counts["bm25"] = index["bm25"].corpus_size
+    for part in ("tfidf_matrix", "embeddings"):
+        if part in index:
+            counts[part] = index[part].shape[0]
+    if "codes" in index:
+        counts["codes"] = len(index["codes"])
+    manifest = index.get("manifest")
+    if manifest:
+        counts["manifest"] = manifest["doc_count"]
+        if "embeddings" in index and index["embeddings"].shape[1] != manifest["embeddings"]["dim"]:
+            raise ValueError(f"{name}: embedding dimension does not match the manifest")
+    if len(set(counts.values())) > 1:
+        raise ValueError(f"{name}: index parts disagree on the document count {counts}")
+
+
+class IndexRegistry:
+    """Loads per-system indexes on demand under an LRU memory budget"""
+
+    def __init__(self, memory_budget_mb: float = MEMORY_BUDGET_MB):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.loaders: Dict[str, Callable[[], Dict]] = {}
+        self.loaded: "OrderedDict[str, Dict]" = OrderedDict()   # LRU order, oldest first
+        self.stats: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.load_locks: Dict[str, threading.Lock] = {}
+        self.watch_paths: Dict[str, Path] = {}
+        self.in_flight: Dict[int, int] = {}        # id(index) -> pinned searches
+        self.retired: Dict[str, List[Dict]] = {}   # replaced versions still in use
+
+    def register(self, name: str, loader: Callable[[], Dict], watch: Path = None):
+        """Register the loader for a system (does not load it); watch = its bundle directory"""
+        with self.lock:
+            self.loaders[name] = loader
+            self.load_locks.setdefault(name, threading.Lock())
+            self.retired.setdefault(name, [])
+            if watch is not None:
+                self.watch_paths[name] = Path(watch)
+            self.stats.setdefault(name, {
+                "loaded": False,
+                "loads": 0,
+                "evictions": 0,
+                "hits": 0,
+                "load_time_ms": None,
+                "resident_bytes": 0,
+                "mapped_bytes": 0,
+                "last_used": None,
+                "version": 0,
+                "reloads": 0,
+                "reload_errors": 0,
+                "last_reload_error": None,
+                "draining": 0
+            })
+
+    def get(self, name: str) -> Dict:
+        """Index for a system, loading it on first use (the pinned version inside pinned())"""
+        pinned_index = _pinned.get().get(name)
+        if pinned_index is not None:
+            return pinned_index
+        with self.lock:
+            index = self.loaded.get(name)
+            if index is not None:
+                self.loaded.move_to_end(name)
+                self.stats[name]["hits"] += 1
+                self.stats[name]["last_used"] = time.time()
+                return index
+            if name not in self.loaders:
+                raise KeyError(f"Unknown search system '{name}'")
+            load_lock = self.load_locks[name]
+
+        # One loader per system at a time; other systems stay available
+        with load_lock:
+            with self.lock:
+                index = self.loaded.get(name)
+                if index is not None:
+                    self.loaded.move_to_end(name)
+                    return index
+
+            index, load_time, sizes = self._load(name)
+            with self.lock:
+                self._install(name, index, load_time, sizes)
+
+            print(f"📦 Loaded {name} indexes in {load_time * 1000:.0f} ms "
+                  f"({sizes[0] / 1024 / 1024:.1f} MB heap, {sizes[1] / 1024 / 1024:.1f} MB mapped)")
+            return index
+
+    def _load(self, name: str, validate: bool = False):
+        start = time.perf_counter()
+        index = self.loaders[name]()
+        if validate:
+            validate_index(name, index)
+        return index, time.perf_counter() - start, measure_index(index)
+
+    def _install(self, name: str, index: Dict, load_time: float, sizes: Tuple[int, int]):
+        """Make index the live version (caller holds lock)"""
+        old = self.loaded.pop(name, None)
+        if old is not None and id(old) in self.in_flight:
+            self.retired[name].append(old)
+        self.loaded[name] = index
+        self.stats[name].update(
+            loaded=True,
+            loads=self.stats[name]["loads"] + 1,
+            version=self.stats[name]["version"] + 1,
+            load_time_ms=round(load_time * 1000, 1),
+            resident_bytes=sizes[0],
+            mapped_bytes=sizes[1],
+            last_used=time.time(),
+            draining=len(self.retired[name])
+        )
+        self._enforce_budget(keep=name)
+
+    def reload(self, name: str) -> Dict:
+        """
+        Load a fresh version of a system and swap it in
+
+        The live version keeps serving while the new one loads. If loading
+        or validation fails the live version stays and the error is raised.
+        Searches already pinned to the old version finish on it.
+        """
+        with self.lock:
+            if name not in self.loaders:
+                raise KeyError(f"Unknown search system '{name}'")
+            load_lock = self.load_locks[name]
+
+        with load_lock:
+            try:
+                index, load_time, sizes = self._load(name, validate=True)
+            except Exception as e:
+                with self.lock:
+                    self.stats[name]["reload_errors"] += 1
+                    self.stats[name]["last_reload_error"] = str(e)
+                raise
+            with self.lock:
+                previous = self.stats[name]["version"]
+                self._install(name, index, load_time, sizes)
+                self.stats[name]["reloads"] += 1
+                self.stats[name]["last_reload_error"] = None
+                info = {
+                    "system": name,
+                    "version": self.stats[name]["version"],
+                    "previous_version": previous,
+                    "doc_count": len(index["codes"]) if "codes" in index else None,
+                    "load_time_ms": self.stats[name]["load_time_ms"],
+                    "draining": self.stats[name]["draining"],
+                    "manifest_created_at": index.get("manifest", {}).get("created_at")
+                }
+
+        print(f"🔄 Reloaded {name} indexes (version {info['version']}, "
+              f"{info['doc_count']} docs, {load_time * 1000:.0f} ms)")
+        if not info["draining"]:
+            self._prune_bundle(name)
+        return info
+
+    def wrap_loader(self, name: str, wrap: Callable[[Callable[[], Dict]], Callable[[], Dict]]):
+        """Replace a system's loader with wrap(loader) (e.g. to apply live updates)"""
+        with self.lock:
+            self.loaders[name] = wrap(self.loaders[name])
+
+    def refresh(self, name: str, derive: Callable[[Dict], Dict]) -> bool:
+        """
+        Swap in derive(live version) as a new version
+
+        Used for changes computed from the loaded index rather than read
+        from disk. Does nothing (returns False) if the system is not loaded;
+        its loader is expected to produce the same result on next use.
+        """
+        with self.lock:
+            if name not in self.loaders:
+                raise KeyError(f"Unknown search system '{name}'")
+            load_lock = self.load_locks[name]
+
+        with load_lock:
+            with self.lock:
+                current = self.loaded.get(name)
+            if current is None:
+                return False
+            start = time.perf_counter()
+            index = derive(current)
+            build_time = time.perf_counter() - start
+            sizes = measure_index(index)
+            with self.lock:
+                self._install(name, index, build_time, sizes)
+        return True
+
+    @contextmanager
+    def pinned(self, name: str):
+        """
+        Use one version of a system's index for the whole block
+
+        get() inside the block (in this thread / task) returns the same
+        version even if a reload swaps in a new one meanwhile.
+        """
+        pins = _pinned.get()
+        if name in pins:
+            yield pins[name]
+            return
+
+        index = self.get(name)
+        key = id(index)
+        with self.lock:
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        token = _pinned.set({**pins, name: index})
+        try:
+            yield index
+        finally:
+            _pinned.reset(token)
+            drained = False
+            with self.lock:
+                self.in_flight[key] -= 1
+                if not self.in_flight[key]:
+                    del self.in_flight[key]
+                    drained = self._release_drained(name)
+            if drained:
+                self._prune_bundle(name)
+
+    def _release_drained(self, name: str) -> bool:
+        """Drop replaced versions no search is using any more (caller holds lock); True if the last one went"""
+        retired = self.retired.get(name, [])
+        still_used = [index for index in retired if id(index) in self.in_flight]
+        if len(still_used) != len(retired):
+            self.retired[name] = still_used
+            self.stats[name]["draining"] = len(still_used)
+            print(f"♻️  Released {len(retired) - len(still_used)} old {name} index version(s)")
+            return not still_used
+        return False
+
+    def _prune_bundle(self, name: str):
+        """Delete the watched bundle's replaced versions once this process has drained them"""
+        path = self.watch_paths.get(name)
+        if path is None or not path.is_dir():
+            return
+        removed = prune_versions(path)
+        if removed:
+            print(f"🧹 Removed {removed} old {name} bundle version(s)")
+
+    def _enforce_budget(self, keep: str):
+        """Evict least recently used systems until under budget (caller holds lock)"""
+        if self.memory_budget <= 0:
+            return
+        while self.resident_bytes() > self.memory_budget:
+            victim = next((n for n in self.loaded if n != keep), None)
+            if victim is None:
+                break
+            self._evict(victim)
+
+    def _evict(self, name: str):
+        self.loaded.pop(name, None)
+        self.stats[name].update(loaded=False, resident_bytes=0, mapped_bytes=0)
+        self.stats[name]["evictions"] += 1
+        print(f"♻️  Evicted {name} indexes (memory budget)")
+
+    def unload(self, name: str):
+        """Drop a system's indexes; the next search reloads them"""
+        with self.lock:
+            if name in self.loaded:
+                self.loaded.pop(name)
+                self.stats[name].update(loaded=False, resident_bytes=0, mapped_bytes=0)
+
+    def resident_bytes(self) -> int:
+        """Heap bytes of the loaded indexes (what the memory budget limits)"""
+        return sum(self.stats[n]["resident_bytes"] for n in self.loaded)
+
+    def mapped_bytes(self) -> int:
+        return sum(self.stats[n]["mapped_bytes"] for n in self.loaded)
+
+    def set_memory_budget(self, memory_budget_mb: float):
+        """Change the budget at runtime (evicts immediately if now over it)"""
+        with self.lock:
+            self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+            self._enforce_budget(keep=next(reversed(self.loaded), None))
+
+    def get_statistics(self) -> Dict:
+        """Per-system load time, resident size, version and usage counters"""
+        with self.lock:
+            return {
+                "memory_budget_bytes": self.memory_budget,
+                "resident_bytes": self.resident_bytes(),
+                "mapped_bytes": self.mapped_bytes(),
+                "lru_order": list(self.loaded),
+                "in_flight": sum(self.in_flight.values()),
+                "systems": {name: dict(stats) for name, stats in self.stats.items()}
+            }
+
+
+# -------------------------------------------------------------
+# Bundle watcher
+# -------------------------------------------------------------
+def _manifest_stamp(bundle_dir: Path) -> Optional[tuple]:
+    try:
+        version = resolve_bundle(bundle_dir)
+        st = (version / MANIFEST).stat()
+    except OSError:
+        return None
+    return version.name, st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class IndexWatcher:
+    """Polls each registered bundle's manifest and reloads loaded systems that changed"""
+
+    def __init__(self, registry: IndexRegistry, interval: float = WATCH_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self.stamps: Dict[str, Optional[tuple]] = {}
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"checks": 0, "reloads": 0, "errors": 0}
+
+    def start(self) -> "IndexWatcher":
+        with self.registry.lock:
+            paths = dict(self.registry.watch_paths)
+        self.stamps = {name: _manifest_stamp(path) for name, path in paths.items()}
+        self.thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.check()
+
+    def check(self) -> List[str]:
+        """One pass over the bundles; returns the systems reloaded"""
+        with self.registry.lock:
+            paths = dict(self.registry.watch_paths)
+            loaded = set(self.registry.loaded)
+        self.stats["checks"] += 1
+
+        reloaded = []
+        for name, path in paths.items():
+            stamp = _manifest_stamp(path)
+            # None: mid-swap or removed - keep serving and look again next pass
+            if stamp is None or stamp == self.stamps.get(name):
+                continue
+            self.stamps[name] = stamp
+            if name not in loaded:
+                continue   # the next search loads the new version anyway
+            try:
+                self.registry.reload(name)
+                self.stats["reloads"] += 1
+                reloaded.append(name)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"❌ Reload of {name} failed, keeping the live version: {e}")
+        return reloaded
+
+
+# -------------------------------------------------------------
+# Process-wide registry used by the search modules
+# -------------------------------------------------------------
+registry = IndexRegistry()
+
+
+_watcher: Optional[IndexWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def register_system(name: str, loader: Callable[[], Dict], watch: Path = None):
+    registry.register(name, loader, watch)
+
+
+def get_system(name: str) -> Dict:
+    return registry.get(name)
+
+
+def pinned(name: str):
+    return registry.pinned(name)
+
+
+def reload_system(name: str) -> Dict:
+    return registry.reload(name)
+
+
+def index_stats() -> Dict:
+    stats = registry.get_statistics()
+    with _watcher_lock:
+        stats["watcher"] = dict(_watcher.stats, interval=_watcher.interval) if _watcher else None
+    return stats
+
+
+def start_watcher(interval: float = WATCH_INTERVAL) -> IndexWatcher:
+    """Start the process-wide bundle watcher (idempotent)"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = IndexWatcher(registry, interval).start()
+        return _watcher
+
+
+def stop_watcher():
+    global _watcher
+    with _watcher_lock:
+        watcher, _watcher = _watcher, None
+    if watcher is not None:
+        watcher.stop()
+
+
+# -------------------------------------------------------------
+# Load report: python index_registry.py [system ...]
+# -------------------------------------------------------------
+SEARCH_MODULES = {
+    "siddha": "search",
+    "ayurveda": "search_ayurveda",
+    "unani": "search_unani",
+    "icd": "search_icd",
+    "icd_tm2": "search_icd_tm2",
+    "icd11_standard": "search_icd11_standard",
+}
+
+if __name__ == "__main__":
+    import importlib
+    # The search modules register with the importable module, not __main__
+    import index_registry as shared
+
+    systems = sys.argv[1:] or list(SEARCH_MODULES)
+    for name in systems:
+        importlib.import_module(SEARCH_MODULES[name])
+        try:
+            shared.get_system(name)
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+
+    stats = shared.index_stats()
+    print("\n📊 Search index load report")
+    print(f"{'system':<16}{'load ms':>10}{'resident MB':>14}{'mapped MB':>12}")
+    for name in systems:
+        s = stats["systems"].get(name, {})
+        if s.get("loaded"):
+            print(f"{name:<16}{s['load_time_ms']:>10.0f}{s['resident_bytes'] / 1024 / 1024:>14.1f}"
+                  f"{s['mapped_bytes'] / 1024 / 1024:>12.1f}")
+    print(f"{'total':<16}{'':>10}{stats['resident_bytes'] / 1024 / 1024:>14.1f}"
+          f"{stats['mapped_bytes'] / 1024 / 1024:>12.1f}")
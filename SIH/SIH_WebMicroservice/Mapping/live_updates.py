@@ -0,0 +1,512 @@
+"""
+Live Corpus Updates
+Append, update and delete documents in a loaded corpus without a full
+index rebuild. Changes are written to a per-system journal next to the
+bundle (indexes/<system>.updates.jsonl) and applied on top of the loaded
+index as a new version (index_registry.refresh), so searches see them
+immediately while in-flight searches finish on the version they started
+with.
+
+How each part of the index follows a change:
+    BM25         document frequencies, N and average length are recounted
+                 over the live documents - scores match a full refit
+    TF-IDF       new documents are projected through the existing
+                 vocabulary and IDF (stale until compaction)
+    embeddings   only the new document is encoded (and cached by text hash)
+                 and added to the nearest IVF list
+    rows         an update deletes the old row and appends a new one;
+                 deleted rows stay in place but can no longer score
+
+Compaction folds the journal into the corpus JSON, runs the incremental
+index builder (unchanged documents come from the embedding cache) and
+reloads the system, after which BM25 / TF-IDF statistics are exact again.
+
+Configuration:
+    SIH_COMPACT_INTERVAL   seconds between automatic compactions (default 600)
+    SIH_COMPACT_MAX_OPS    compact as soon as this many changes are pending (default 200)
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from pathlib import Path
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+import corpus_store
+from corpus_store import COLUMNS, CORPORA
+from index_builder import INDEX_DIR, EmbeddingCache, CACHE_NAME, build_corpus, doc_text, text_hash
+from embedding_matrix import EmbeddingMatrix
+from index_bundle import BM25Index, bm25_arrays
+from index_registry import registry as default_registry
+from code_lookup import build_code_index
+
+# Configuration
+COMPACT_INTERVAL = float(os.getenv("SIH_COMPACT_INTERVAL", "600"))
+COMPACT_MAX_OPS = int(os.getenv("SIH_COMPACT_MAX_OPS", "200"))
+
+# API field name -> corpus column
+FIELDS = {"code": "codes", "term": "terms", "english": "english",
+          "definition": "definitions", "system": "systems"}
+
+
+# -------------------------------------------------------------
+# Index pieces that cover base rows plus appended rows
+# -------------------------------------------------------------
+class RowStack:
+    """Base matrix (dense or CSR, possibly memory-mapped) with extra rows appended"""
+
+    def __init__(self, base, extra):
+        self.base = base
+        self.extra = extra
+        self.n_base = base.shape[0]
+        self.shape = (self.n_base + extra.shape[0], base.shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.ndim == 0:
+            return self[[int(ids)]][0]
+        in_base = ids < self.n_base
+        if in_base.all():
+            return self.base[ids]
+        if sparse.issparse(self.base):
+            parts = sparse.vstack([self.base[ids[in_base]], self.extra[ids[~in_base] - self.n_base]]).tocsr()
+            order = np.concatenate([np.flatnonzero(in_base), np.flatnonzero(~in_base)])
+            return parts[np.argsort(order)]
+        out = np.empty((len(ids), self.shape[1]), dtype=self.base.dtype)
+        out[in_base] = self.base[ids[in_base]]
+        out[~in_base] = self.extra[ids[~in_base] - self.n_base]
+        return out
+
+
+class IncrementalBM25:
+    """
+    BM25Okapi over base rows (term x document CSR) plus appended documents,
+    minus deleted rows. Statistics are computed over live documents only,
+    so scores equal a BM25Okapi fitted on the live documents; deleted rows
+    score -inf.
+    """
+
+    def __init__(self, base, extra_docs: List[List[str]], deleted: List[int]):
+        if isinstance(base, BM25Index):
+            self.vocab, tf = base.vocab, base.tf
+        else:
+            self.vocab, _, tf = bm25_arrays(base)   # sorted vocabulary, like a bundle's
+        self.tf = tf
+        self.k1, self.b, self.epsilon = base.k1, base.b, base.epsilon
+        self.n_base = tf.shape[1]
+        self.corpus_size = self.n_base + len(extra_docs)
+
+        self.live = np.ones(self.corpus_size, dtype=bool)
+        self.live[list(deleted)] = False
+        self.doc_len = np.concatenate([np.asarray(base.doc_len, dtype=np.float64),
+                                       [len(doc) for doc in extra_docs]])
+
+        # Appended documents as term -> [(row, frequency)]
+        self.postings: Dict[str, List] = defaultdict(list)
+        for j, doc in enumerate(extra_docs):
+            for term, freq in Counter(doc).items():
+                self.postings[term].append((self.n_base + j, freq))
+
+        # Document frequencies over live rows
+        df = np.diff(tf.indptr).astype(np.int64)
+        deleted_base = [d for d in deleted if d < self.n_base]
+        if deleted_base:
+            df -= np.diff(tf[:, deleted_base].tocsr().indptr)
+        new_df = Counter()
+        for term, rows in self.postings.items():
+            n = sum(1 for row, _ in rows if self.live[row])
+            t = self.term_id(term)
+            if t >= 0:
+                df[t] += n
+            elif n:
+                new_df[term] = n
+
+        n_live = int(self.live.sum())
+        self.avgdl = float(self.doc_len[self.live].sum() / n_live) if n_live else 1.0
+        present = df > 0
+        idf = np.zeros(len(df))
+        idf[present] = np.log(n_live - df[present] + 0.5) - np.log(df[present] + 0.5)
+        new_idf = {t: np.log(n_live - n + 0.5) - np.log(n + 0.5) for t, n in new_df.items()}
+        n_terms = int(present.sum()) + len(new_idf)
+        average_idf = (idf[present].sum() + sum(new_idf.values())) / n_terms if n_terms else 0.0
+        idf[present & (idf < 0)] = self.epsilon * average_idf
+        self.idf = idf
+        self.new_idf = {t: (v if v >= 0 else self.epsilon * average_idf) for t, v in new_idf.items()}
+        self.length_norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+
+    def term_id(self, token: str) -> int:
+        """Row of a base-vocabulary term, or -1"""
+        i = bisect.bisect_left(self.vocab, token)
+        return i if i < len(self.vocab) and self.vocab[i] == token else -1
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        scores = np.zeros(self.corpus_size)
+        k1 = self.k1
+        for token in query:
+            t = self.term_id(token)
+            idf = self.idf[t] if t >= 0 else self.new_idf.get(token, 0.0)
+            if t >= 0:
+                start, end = self.tf.indptr[t], self.tf.indptr[t + 1]
+                docs = self.tf.indices[start:end]
+                freq = self.tf.data[start:end].astype(np.float64)
+                scores[docs] += idf * (freq * (k1 + 1) / (freq + self.length_norm[docs]))
+            for row, freq in self.postings.get(token, ()):
+                scores[row] += idf * (freq * (k1 + 1) / (freq + self.length_norm[row]))
+        scores[~self.live] = -np.inf
+        return scores
+
+
+# -------------------------------------------------------------
+# Per-system update journal
+# -------------------------------------------------------------
+class LiveCorpus:
+    """Journal of document changes for one system, applied on top of its loaded index"""
+
+    def __init__(self, system: str, index_dir: Path = INDEX_DIR, data_dir: Path = None,
+                 registry=default_registry, encoder=None, model: str = None):
+        if system not in CORPORA:
+            raise KeyError(f"Unknown corpus '{system}'")
+        self.system = system
+        self.index_dir = Path(index_dir)
+        self.data_dir = Path(data_dir) if data_dir else None
+        self.registry = registry
+        self.encoder = encoder
+        if model is None:
+            from encoder import MODEL_NAME
+            model = MODEL_NAME
+        self.model = model
+        self.journal = self.index_dir / f"{system}.updates.jsonl"
+        self.lock = threading.RLock()
+        self.vectors: Dict[str, np.ndarray] = {}   # text hash -> embedding
+        self.stats = {"adds": 0, "updates": 0, "deletes": 0, "compactions": 0,
+                      "last_compaction": None, "last_change": None}
+        self.ops = self._read_journal()
+
+        # Every load of the system (first use, eviction, reload) gets the journal applied
+        registry.wrap_loader(system, lambda load: lambda: self.apply(load()))
+
+    # ---------------------------------------------------------
+    # Journal
+    # ---------------------------------------------------------
+    def _read_journal(self) -> List[Dict]:
+        if not self.journal.exists():
+            return []
+        with open(self.journal, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _append_journal(self, op: Dict):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.ops)
+
+    def oldest_pending(self) -> Optional[float]:
+        with self.lock:
+            return self.ops[0]["at"] if self.ops else None
+
+    # ---------------------------------------------------------
+    # Current records (base corpus + journal)
+    # ---------------------------------------------------------
+    def _base_corpus(self):
+        if self.data_dir is None:
+            return corpus_store.get_corpus(self.system)
+        return corpus_store.load_corpus(self.system, self.data_dir)
+
+    def current_record(self, code: str) -> Optional[Dict[str, str]]:
+        """Column values of the live record with this code, or None"""
+        with self.lock:
+            for op in reversed(self.ops):
+                if op["code"] == code:
+                    return None if op["op"] == "delete" else dict(op["record"])
+            corpus = self._base_corpus()
+            columns = corpus.columns()
+            try:
+                i = corpus.codes.index(code)
+            except ValueError:
+                return None
+            return {name: values[i] for name, values in columns.items()}
+
+    def _columns(self) -> List[str]:
+        return [c for c in COLUMNS if c in CORPORA[self.system]["fields"]]
+
+    # ---------------------------------------------------------
+    # Changes
+    # ---------------------------------------------------------
+    def add(self, fields: Dict[str, str]) -> Dict:
+        """Append a document; fields use API names (code, term, english, definition, system)"""
+        code = (fields.get("code") or "").strip()
+        if not code:
+            raise ValueError("A document needs a code")
+        record = {name: "" for name in self._columns()}
+        record.update(self._to_columns(fields))
+        record["codes"] = code
+        with self.lock:
+            if self.current_record(code) is not None:
+                raise ValueError(f"{self.system} already has a document with code '{code}'")
+            self._journal("add", code, record)
+        return self._refresh("add", code)
+
+    def update(self, code: str, fields: Dict[str, str]) -> Dict:
+        """Change some fields of an existing document"""
+        with self.lock:
+            record = self.current_record(code)
+            if record is None:
+                raise KeyError(f"No {self.system} document with code '{code}'")
+            record.update(self._to_columns(fields))
+            record["codes"] = code
+            self._journal("update", code, record)
+        return self._refresh("update", code)
+
+    def delete(self, code: str) -> Dict:
+        with self.lock:
+            if self.current_record(code) is None:
+                raise KeyError(f"No {self.system} document with code '{code}'")
+            self._journal("delete", code, None)
+        return self._refresh("delete", code)
+
+    def _to_columns(self, fields: Dict[str, str]) -> Dict[str, str]:
+        columns = self._columns()
+        record = {}
+        for field, value in fields.items():
+            if value is None or field == "code":
+                continue
+            if field not in FIELDS or FIELDS[field] not in columns:
+                raise ValueError(f"{self.system} documents have no field '{field}'")
+            record[FIELDS[field]] = str(value)
+        return record
+
+    def _journal(self, kind: str, code: str, record: Optional[Dict]):
+        """Record a change (caller holds lock)"""
+        op = {"op": kind, "code": code, "record": record, "at": time.time()}
+        if record is not None:
+            self.embedding(doc_text(self.system, record))   # encode before it is journaled
+        self._append_journal(op)
+        self.ops.append(op)
+        self.stats[kind + "s"] += 1
+        self.stats["last_change"] = op["at"]
+
+    def _refresh(self, kind: str, code: str) -> Dict:
+        """Swap in an index version with every journaled change
+
+        Called without self.lock: the registry takes the system's load lock
+        and then apply() takes self.lock, the same order as a load.
+        """
+        start = time.perf_counter()
+        refreshed = self.registry.refresh(self.system, lambda live: self.apply(live.get("base", live)))
+        return {
+            "system": self.system,
+            "op": kind,
+            "code": code,
+            "pending": self.pending(),
+            "searchable": refreshed,
+            "apply_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    # ---------------------------------------------------------
+    # Embeddings for new documents
+    # ---------------------------------------------------------
+    def embedding(self, text: str) -> np.ndarray:
+        key = text_hash(text)
+        if key in self.vectors:
+            return self.vectors[key]
+        cache = EmbeddingCache(self.index_dir / CACHE_NAME)
+        try:
+            vector = cache.get_many(self.model, [key]).get(key)
+            if vector is None:
+                encoder = self.encoder
+                if encoder is None:
+                    from encoder import get_embedder
+                    encoder = get_embedder("torch")
+                vector = np.asarray(encoder.encode([text]), dtype=np.float32)[0]
+                cache.put_many(self.model, [key], vector[None, :])
+        finally:
+            cache.close()
+        self.vectors[key] = vector
+        return vector
+
+    # ---------------------------------------------------------
+    # Applying the journal to a loaded index
+    # ---------------------------------------------------------
+    def apply(self, base: Dict) -> Dict:
+        """New index dict: base rows plus the journal's changes (base is not modified)"""
+        with self.lock:
+            ops = list(self.ops)
+        if not ops:
+            return base
+
+        n_base = base["bm25"].corpus_size
+        names = [c for c in COLUMNS if c in base]
+        columns = {name: list(base[name]) for name in names}
+        rows_by_code = defaultdict(list)
+        for i, code in enumerate(columns["codes"]):
+            rows_by_code[code].append(i)
+
+        deleted, texts = set(), []
+        for op in ops:
+            deleted.update(rows_by_code.pop(op["code"], []))
+            if op["record"] is not None:
+                rows_by_code[op["code"]] = [n_base + len(texts)]
+                for name in names:
+                    columns[name].append(op["record"].get(name, ""))
+                texts.append(doc_text(self.system, op["record"]))
+
+        index = dict(base)
+        index.update(columns)
+        index["base"] = base
+        index["bm25"] = IncrementalBM25(base["bm25"], [t.lower().split() for t in texts], sorted(deleted))
+        index["code_index"] = build_code_index(columns["codes"], deleted)
+        index.pop("fingerprint", None)      # the base's; mapping_table.py hashes this version anew
+        vectorizer = base["tfidf_vectorizer"]
+        extra = np.empty((0, base["embeddings"].shape[1]), dtype=base["embeddings"].dtype)
+        if texts:
+            index["tfidf_matrix"] = RowStack(base["tfidf_matrix"], vectorizer.transform(texts).tocsr())
+            extra = np.stack([self.embedding(t) for t in texts]).astype(base["embeddings"].dtype)
+            if isinstance(base["embeddings"], EmbeddingMatrix):
+                index["embeddings"] = base["embeddings"].appended(extra)   # in memory until compaction
+            else:
+                index["embeddings"] = RowStack(base["embeddings"], extra)
+        if "ann" in base:
+            index["ann"] = base["ann"].extended(n_base, extra, sorted(deleted))
+        manifest = dict(base.get("manifest") or {})
+        if manifest:
+            manifest["doc_count"] = n_base + len(texts)
+        manifest["live_updates"] = {"pending": len(ops), "appended": len(texts), "deleted": len(deleted)}
+        index["manifest"] = manifest
+        return index
+
+    # ---------------------------------------------------------
+    # Compaction
+    # ---------------------------------------------------------
+    def _fold_into_data(self, ops: List[Dict]):
+        """Apply journal entries to the corpus JSON file (atomic replace)"""
+        fields = CORPORA[self.system]["fields"]
+        path = Path(self.data_dir or corpus_store.DATA_DIR) / CORPORA[self.system]["data"]
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        code_field = fields["codes"]
+        for op in ops:
+            if op["op"] == "add":
+                records.append({fields[c]: v for c, v in op["record"].items()})
+            elif op["op"] == "update":
+                for record in records:
+                    if str(record.get(code_field) or "") == op["code"]:
+                        record.update({fields[c]: v for c, v in op["record"].items()})
+            else:
+                records = [r for r in records if str(r.get(code_field) or "") != op["code"]]
+        tmp = path.with_name(path.name + f".tmp-{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def compact(self) -> Dict:
+        """Write pending changes into the corpus and rebuild its indexes exactly"""
+        start = time.perf_counter()
+        with self.lock:
+            ops = list(self.ops)
+            if not ops:
+                return {"system": self.system, "compacted": 0}
+            self._fold_into_data(ops)
+            report = build_corpus(self.system, self.data_dir, self.index_dir,
+                                  encoder=self.encoder, model=self.model)
+            self.ops = []
+            self.journal.unlink()
+            self.vectors.clear()
+            self.stats["compactions"] += 1
+            self.stats["last_compaction"] = time.time()
+
+        # The live version still has every change; swap in the rebuilt one
+        reloaded = self.registry.refresh(self.system, lambda live: self.registry.loaders[self.system]())
+        return {
+            "system": self.system,
+            "compacted": len(ops),
+            "docs": report["docs"],
+            "encoded": report["embeddings"]["encoded"],
+            "reloaded": reloaded,
+            "seconds": round(time.perf_counter() - start, 2)
+        }
+
+    def get_statistics(self) -> Dict:
+        with self.lock:
+            return {**self.stats, "pending": len(self.ops), "journal": str(self.journal)}
+
+
+# -------------------------------------------------------------
+# Process-wide live corpora and background compaction
+# -------------------------------------------------------------
+_live: Dict[str, LiveCorpus] = {}
+_live_lock = threading.Lock()
+_compactor: Optional[threading.Thread] = None
+_compactor_stop = threading.Event()
+
+
+def get_live(system: str) -> LiveCorpus:
+    """LiveCorpus for a registered search system (created on first use)"""
+    with _live_lock:
+        if system not in _live:
+            if system not in default_registry.loaders:
+                raise KeyError(f"Unknown search system '{system}'")
+            _live[system] = LiveCorpus(system)
+        return _live[system]
+
+
+def enable_live_updates(systems: List[str]):
+    """Replay any journals left from a previous run when these systems load"""
+    for system in systems:
+        if system in CORPORA and system in default_registry.loaders:
+            get_live(system)
+
+
+def live_stats() -> Dict:
+    with _live_lock:
+        return {system: live.get_statistics() for system, live in _live.items()}
+
+
+def compact_due(force: bool = False) -> List[Dict]:
+    """Compact every system with pending changes (all of them if force)"""
+    with _live_lock:
+        corpora = list(_live.values())
+    results = []
+    for live in corpora:
+        oldest = live.oldest_pending()
+        if oldest is not None and (force or live.pending() >= COMPACT_MAX_OPS
+                                   or time.time() - oldest >= COMPACT_INTERVAL):
+            try:
+                results.append(live.compact())
+            except Exception as e:
+                print(f"❌ Compaction of {live.system} failed, changes stay in the journal: {e}")
+    return results
+
+
+def start_compactor(check_every: float = 10.0):
+    """Background thread that runs compact_due() every check_every seconds"""
+    global _compactor
+    if _compactor is not None and _compactor.is_alive():
+        return
+    _compactor_stop.clear()
+
+    def run():
+        while not _compactor_stop.wait(check_every):
+            for result in compact_due():
+                print(f"🗜️  Compacted {result['system']}: {result['compacted']} changes, "
+                      f"{result['encoded']} encoded, {result['seconds']}s")
+
+    _compactor = threading.Thread(target=run, name="corpus-compactor", daemon=True)
+    _compactor.start()
+
+
+def stop_compactor():
+    _compactor_stop.set()
@@ -0,0 +1,179 @@
+"""
+Background LLM Refinement Jobs
+Runs the Groq refinement step off the request path: the API answers with
+retrieval candidates and a job ID, and the refined pick is fetched later
+by polling (or streamed as a server-sent event). At most MAX_PENDING jobs
+wait for a worker; beyond that a job is rejected at once and the caller
+keeps the retrieval candidates, instead of queueing a pick that would
+arrive long after it is useful. A job cancelled before a worker takes it
+(e.g. at shutdown) gives its place in the queue back.
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+
+# Configuration
+LLM_WORKERS = 4           # Concurrent refinement calls
+LLM_DEADLINE = 10.0       # Seconds a single Groq call may take (no retries)
+JOB_TTL = 15 * 60         # Finished jobs are forgotten after 15 minutes
+MAX_PENDING = 16          # Jobs waiting for a worker before new ones are rejected
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_REJECTED = "rejected"
+STATUS_CANCELLED = "cancelled"
+
+
+class RefinementJobs:
+    """In-memory registry of refinement jobs backed by a bounded thread pool"""
+
+    def __init__(self, max_workers: int = LLM_WORKERS, job_ttl: float = JOB_TTL,
+                 max_pending: int = MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-job")
+        self.job_ttl = job_ttl
+        self.max_pending = max_pending
+        self.pending = 0
+        self.jobs: Dict[str, Dict] = {}
+        self.events: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> Dict:
+        """
+        Queue fn(*args, **kwargs) and return the job record at once
+
+        If max_pending jobs are already waiting for a worker, the job is
+        not queued and comes back with status "rejected".
+
+        Args:
+            kind: Label for the job (e.g. "refine_tm", "pick_icd")
+            fn: Callable producing the refined result
+        """
+        self._expire()
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": STATUS_PENDING,
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self.events[job_id] = threading.Event()
+            if self.pending >= self.max_pending:
+                job.update(status=STATUS_REJECTED, finished_at=job["created_at"],
+                           error=f"Refinement queue full ({self.pending} jobs waiting), "
+                                 f"use the retrieval candidates")
+                self.events[job_id].set()
+                return self._public(job)
+            self.pending += 1
+
+        try:
+            future = self.executor.submit(self._run, job_id, fn, args, kwargs)
+        except RuntimeError as e:              # pool already shut down
+            self._release(job_id)
+            self._finish(job_id, STATUS_CANCELLED, None, str(e))
+            return self.get(job_id)
+        future.add_done_callback(partial(self._on_done, job_id))
+        return self._public(job)
+
+    def _run(self, job_id: str, fn: Callable, args, kwargs):
+        self._release(job_id, STATUS_RUNNING)
+        try:
+            result, error, status = fn(*args, **kwargs), None, STATUS_DONE
+        except Exception as e:
+            result, error, status = None, str(e), STATUS_FAILED
+        self._finish(job_id, status, result, error)
+
+    def _on_done(self, job_id: str, future: Future):
+        """A job cancelled before it ran never reaches _run: free its slot here"""
+        if future.cancelled():
+            self._release(job_id)
+            self._finish(job_id, STATUS_CANCELLED, None, "Cancelled before a worker took it")
+
+    def _release(self, job_id: str, status: str = None):
+        """Give back the job's place in the queue, optionally updating its status"""
+        with self.lock:
+            self.pending -= 1
+            job = self.jobs.get(job_id)
+            if job is not None and status:
+                job["status"] = status
+
+    def _finish(self, job_id: str, status: str, result, error: Optional[str]):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error, finished_at=time.time())
+            event = self.events.get(job_id)
+        if event:
+            event.set()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Current state of a job, or None if unknown/expired"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Block up to timeout seconds for the job to finish, then return its state"""
+        with self.lock:
+            event = self.events.get(job_id)
+        if event is None:
+            return None
+        event.wait(timeout)
+        return self.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.job_ttl
+        with self.lock:
+            expired = [
+                job_id for job_id, job in self.jobs.items()
+                if job["finished_at"] and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                self.jobs.pop(job_id, None)
+                self.events.pop(job_id, None)
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        job = dict(job)
+        if job["finished_at"]:
+            job["duration_ms"] = round((job["finished_at"] - job["created_at"]) * 1000, 1)
+        return job
+
+    def shutdown(self):
+        """Stop accepting jobs; running calls end at their deadline"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -------------------------------------------------------------
+# Process-wide registry
+# -------------------------------------------------------------
+_jobs: Optional[RefinementJobs] = None
+_jobs_lock = threading.Lock()
+
+
+def get_jobs() -> RefinementJobs:
+    """Job registry shared by the API (created on first use)"""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = RefinementJobs()
+    return _jobs
+
+
+def shutdown_jobs():
+    """Shut down the shared registry (FastAPI shutdown hook)"""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is not None:
+            _jobs.shutdown()
+            _jobs = None
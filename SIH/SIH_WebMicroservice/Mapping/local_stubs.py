@@ -0,0 +1,532 @@
+"""
+Local Stand-In Servers for Offline Runs and Benchmarks
+Serves recorded WHO ICD-11, HAPI FHIR, Groq and Google Custom Search
+responses from one local HTTP server, with configurable latency and
+error injection per service.
+
+Point the project's clients at it by setting SIH_STUB_URL:
+
+    python local_stubs.py --port 8765 --latency who=150 --error-rate groq=0.05
+    export SIH_STUB_URL=http://127.0.0.1:8765
+
+Routes (one prefix per service):
+    /who/connect/token                         WHO OAuth2 token
+    /who/icd/release/11/<release>/<mms|tm2>/.. WHO ICD-11 API
+    /fhir/..                                   HAPI FHIR (in-memory store)
+    /groq/openai/v1/chat/completions           Groq chat completions
+    /google/customsearch/v1                    Google Custom Search
+    /_stub/config, /_stub/stats                Runtime configuration/counters
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+RECORDINGS_PATH = Path(__file__).parent / "stub_recordings.json"
+
+SERVICES = ("who", "fhir", "groq", "google")
+
+
+# -------------------------------------------------------------
+# Latency / error injection
+# -------------------------------------------------------------
+class ServiceConfig:
+    """Injected behaviour for one service"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self) -> float:
+        """Seconds to wait before answering"""
+        ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(ms, 0.0) / 1000.0
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+class StubState:
+    """Everything the stand-ins share: config, recordings, FHIR store, counters"""
+
+    def __init__(self, recordings: Optional[Dict] = None):
+        self.config = {name: ServiceConfig() for name in SERVICES}
+        self.recordings = recordings if recordings is not None else load_recordings()
+        self.fhir = {}            # {resource_type: {id: resource}}
+        self.synthetic = {}       # {entity_id: record} for unrecorded WHO codes
+        self.stats = {name: {"requests": 0, "errors": 0} for name in SERVICES}
+        self.lock = threading.Lock()
+
+    def configure(self, service: str, **settings):
+        config = self.config[service]
+        for key, value in settings.items():
+            if hasattr(config, key):
+                setattr(config, key, type(getattr(config, key))(value))
+
+
+def load_recordings(path: Path = RECORDINGS_PATH) -> Dict:
+    """Recorded responses; missing file means every answer is synthesized"""
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def prompt_key(prompt: str) -> str:
+    """Recording key for an LLM prompt (whitespace-insensitive)"""
+    return hashlib.sha256(" ".join(prompt.split()).encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------------------------
+# Request handler
+# -------------------------------------------------------------
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None   # set by start_stub_server()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ----- plumbing -----
+    def _send(self, status: int, body=None, content_type: str = "application/json"):
+        payload = json.dumps(body if body is not None else {}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _read_json(self) -> Dict:
+        body = self._read_body()
+        return json.loads(body) if body else {}
+
+    def _base_url(self) -> str:
+        host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+        return f"http://{host}"
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        service, rest = parts[0], parts[1:]
+
+        if service == "_stub":
+            return self._admin(method, rest)
+        if service not in SERVICES:
+            return self._send(404, {"error": f"unknown service '{service}'"})
+
+        config = self.state.config[service]
+        with self.state.lock:
+            self.state.stats[service]["requests"] += 1
+
+        delay = config.delay()
+        if delay:
+            time.sleep(delay)
+
+        if config.should_fail():
+            self._read_body()
+            with self.state.lock:
+                self.state.stats[service]["errors"] += 1
+            return self._send(config.error_status, {"error": "injected failure"})
+
+        handler = getattr(self, f"_{service}")
+        return handler(method, rest, parse_qs(url.query))
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    # ----- admin -----
+    def _admin(self, method: str, rest):
+        if rest == ["stats"]:
+            return self._send(200, self.state.stats)
+        if rest == ["config"]:
+            if method == "POST":
+                # {"who": {"latency_ms": 200}, "groq": {"error_rate": 0.1}}
+                for service, settings in self._read_json().items():
+                    if service in self.state.config:
+                        self.state.configure(service, **settings)
+            return self._send(200, {k: v.to_dict() for k, v in self.state.config.items()})
+        return self._send(404, {"error": "unknown admin route"})
+
+    # ----- WHO ICD-11 -----
+    def _who(self, method: str, rest, query):
+        if rest == ["connect", "token"]:
+            self._read_body()
+            return self._send(200, {
+                "access_token": f"stub-{uuid.uuid4().hex}",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+                "scope": "icdapi_access"
+            })
+
+        # icd/release/11/<release>/<linearization>/...
+        if len(rest) < 6 or rest[:3] != ["icd", "release", "11"]:
+            # Foundation/entity URIs handed out in stemId
+            if len(rest) >= 3 and rest[:2] == ["icd", "entity"]:
+                entity = self._who_entity_by_id(rest[2])
+                if entity:
+                    return self._send(200, entity)
+            return self._send(404, {"error": "not found"})
+
+        linearization, tail = rest[4], rest[5:]
+        base = f"{self._base_url()}/who/icd/release/11/{rest[3]}/{linearization}"
+
+        if tail == ["search"]:
+            q = query.get("q", [""])[0]
+            return self._send(200, self._who_search(linearization, q))
+
+        if tail[0] == "codeinfo" and len(tail) == 2:
+            record = self._who_record(linearization, tail[1])
+            if not record:
+                return self._send(404, {"error": "code not found"})
+            return self._send(200, {
+                "code": tail[1],
+                "stemId": f"{base}/{record['entity_id']}"
+            })
+
+        # Direct lookup by code or by entity id
+        record = self._who_record(linearization, tail[0]) or self._who_entity_record(tail[0])
+        if not record:
+            return self._send(404, {"error": "not found"})
+        return self._send(200, self._who_entity_body(record, f"{base}/{record['entity_id']}"))
+
+    def _who_records(self, linearization: str) -> Dict:
+        return self.state.recordings.get("who", {}).get(linearization, {})
+
+    def _who_record(self, linearization: str, code: str) -> Optional[Dict]:
+        code = code.upper()
+        record = self._who_records(linearization).get(code)
+        if record:
+            return dict(record, code=code)
+        # Unrecorded but well-formed codes get a deterministic synthetic entity
+        if re.fullmatch(r"[0-9A-Z]{2}[0-9A-Z]{2}(\.[0-9A-Z]{1,2})?", code):
+            entity_id = str(int(hashlib.md5(code.encode()).hexdigest()[:8], 16))
+            record = {"code": code, "entity_id": entity_id, "title": f"Stub condition {code}"}
+            self.state.synthetic[entity_id] = record
+            return record
+        return None
+
+    def _who_entity_record(self, entity_id: str) -> Optional[Dict]:
+        if entity_id in self.state.synthetic:
+            return self.state.synthetic[entity_id]
+        for records in self.state.recordings.get("who", {}).values():
+            for code, record in records.items():
+                if record["entity_id"] == entity_id:
+                    return dict(record, code=code)
+        return None
+
+    def _who_entity_by_id(self, entity_id: str) -> Optional[Dict]:
+        record = self._who_entity_record(entity_id)
+        if record:
+            return self._who_entity_body(record, f"http://id.who.int/icd/entity/{entity_id}")
+        return None
+
+    @staticmethod
+    def _who_entity_body(record: Dict, entity_uri: str) -> Dict:
+        return {
+            "@id": entity_uri,
+            "code": record["code"],
+            "source": f"http://id.who.int/icd/entity/{record['entity_id']}",
+            "foundationURI": f"http://id.who.int/icd/entity/{record['entity_id']}",
+            "title": {"@language": "en", "@value": record["title"]},
+            "definition": {"@language": "en", "@value": record.get("definition", "")}
+        }
+
+    def _who_search(self, linearization: str, q: str) -> Dict:
+        q_norm = q.strip().upper()
+        words = [w for w in q.lower().split() if len(w) > 2]
+        matches = []
+        for code, record in self._who_records(linearization).items():
+            if code == q_norm or (words and all(w in record["title"].lower() for w in words)):
+                matches.append(dict(record, code=code))
+        if not matches:
+            synthetic = self._who_record(linearization, q_norm)
+            if synthetic:
+                matches.append(synthetic)
+
+        return {
+            "error": False,
+            "destinationEntities": [
+                {
+                    "id": f"http://id.who.int/icd/entity/{m['entity_id']}",
+                    "stemId": f"http://id.who.int/icd/entity/{m['entity_id']}",
+                    "theCode": m["code"],
+                    "title": m["title"],
+                    "chapter": m.get("chapter", ""),
+                    "definition": m.get("definition", "")
+                }
+                for m in matches
+            ]
+        }
+
+    # ----- HAPI FHIR -----
+    def _fhir(self, method: str, rest, query):
+        store = self.state.fhir
+
+        if method == "POST" and not rest:
+            return self._send(200, self._fhir_transaction(self._read_json()),
+                              "application/fhir+json")
+
+        if method == "POST" and len(rest) == 1:
+            resource = self._read_json()
+            if_none_exist = self.headers.get("If-None-Exist")
+            existing = if_none_exist and self._fhir_find(rest[0], if_none_exist)
+            if existing:
+                return self._send(200, existing, "application/fhir+json")
+            return self._send(201, self._fhir_create(rest[0], resource), "application/fhir+json")
+
+        if method == "PUT" and len(rest) == 2:
+            resource = self._fhir_create(rest[0], self._read_json(), rest[1])
+            return self._send(201, resource, "application/fhir+json")
+
+        if method == "GET" and len(rest) == 2:
+            resource = store.get(rest[0], {}).get(rest[1])
+            if resource:
+                return self._send(200, resource, "application/fhir+json")
+            return self._send(404, {"resourceType": "OperationOutcome"}, "application/fhir+json")
+
+        if method == "GET" and len(rest) == 1:
+            return self._send(200, self._fhir_search(rest[0], query), "application/fhir+json")
+
+        return self._send(400, {"resourceType": "OperationOutcome"}, "application/fhir+json")
+
+    def _fhir_create(self, resource_type: str, resource: Dict, resource_id: str = None) -> Dict:
+        with self.state.lock:
+            resource_id = resource_id or str(len(self.state.fhir.get(resource_type, {})) + 1000)
+            resource = dict(resource, id=resource_id, resourceType=resource_type)
+            self.state.fhir.setdefault(resource_type, {})[resource_id] = resource
+        return resource
+
+    def _fhir_find(self, resource_type: str, query: str) -> Optional[Dict]:
+        # "identifier=system|value"
+        system, _, value = query.split("=", 1)[-1].partition("|")
+        for resource in self.state.fhir.get(resource_type, {}).values():
+            for ident in resource.get("identifier", []):
+                if ident.get("system") == system and ident.get("value") == value:
+                    return resource
+        return None
+
+    def _fhir_search(self, resource_type: str, query) -> Dict:
+        resources = list(self.state.fhir.get(resource_type, {}).values())
+        ids = query.get("_id", [None])[0]
+        if ids:
+            resources = [r for r in resources if r.get("id") in ids.split(",")]
+        patient = query.get("patient", [None])[0]
+        if patient:
+            resources = [
+                r for r in resources
+                if r.get("subject", {}).get("reference") == f"Patient/{patient}"
+            ]
+
+        count = int(query.get("_count", [len(resources) or 1])[0])
+        offset = int(query.get("_offset", ["0"])[0])
+        links = []
+        if offset + count < len(resources):
+            # Every search parameter carries over; only the page moves
+            params = urlencode({**query, "_count": count, "_offset": offset + count}, doseq=True)
+            links.append({"relation": "next",
+                          "url": f"{self._base_url()}/fhir/{resource_type}?{params}"})
+
+        return {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": len(resources),
+            "link": links,
+            "entry": [{"resource": r} for r in resources[offset:offset + count]]
+        }
+
+    def _fhir_transaction(self, bundle: Dict) -> Dict:
+        resolved = {}
+        response_entries = []
+        for entry in bundle.get("entry", []):
+            resource = entry["resource"]
+            request = entry.get("request", {})
+            resource_type = resource["resourceType"]
+
+            existing = request.get("ifNoneExist") and self._fhir_find(
+                resource_type, request["ifNoneExist"]
+            )
+            if existing:
+                created, status = existing, "200 OK"
+            elif request.get("method") == "PUT":
+                resource_id = request["url"].split("/")[-1]
+                created, status = self._fhir_create(resource_type, resource, resource_id), "201 Created"
+            else:
+                subject = resource.get("subject", {})
+                if subject.get("reference") in resolved:
+                    subject["reference"] = resolved[subject["reference"]]
+                created, status = self._fhir_create(resource_type, resource), "201 Created"
+
+            reference = f"{resource_type}/{created['id']}"
+            if entry.get("fullUrl"):
+                resolved[entry["fullUrl"]] = reference
+            response_entries.append({
+                "response": {"status": status, "location": f"{reference}/_history/1"}
+            })
+
+        return {
+            "resourceType": "Bundle",
+            "type": "transaction-response",
+            "entry": response_entries
+        }
+
+    # ----- Groq -----
+    def _groq(self, method: str, rest, query):
+        if rest != ["openai", "v1", "chat", "completions"]:
+            return self._send(404, {"error": {"message": "unknown route"}})
+
+        request = self._read_json()
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        content = self.state.recordings.get("groq", {}).get(prompt_key(prompt))
+        if content is None:
+            content = synthesize_llm_answer(prompt)
+
+        return self._send(200, {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": len(content.split()),
+                "total_tokens": len(prompt.split()) + len(content.split())
+            }
+        })
+
+    # ----- Google Custom Search -----
+    def _google(self, method: str, rest, query):
+        if rest != ["customsearch", "v1"]:
+            return self._send(404, {"error": {"message": "unknown route"}})
+
+        q = query.get("q", [""])[0]
+        num = int(query.get("num", ["5"])[0])
+        recorded = self.state.recordings.get("google", {})
+        items = next((v for k, v in recorded.items() if k.lower() in q.lower()), None)
+        if items is None:
+            term = q.split(" ")[0] if q else "term"
+            items = [{
+                "title": f"{term.title()} - result {i + 1}",
+                "snippet": f"Recorded stand-in result {i + 1} for '{q}'.",
+                "link": f"https://example.org/{term.lower()}/{i + 1}"
+            } for i in range(num)]
+
+        return self._send(200, {"kind": "customsearch#search", "items": items[:num]})
+
+
+def synthesize_llm_answer(prompt: str) -> str:
+    """
+    Deterministic answer for prompts without a recording
+    Picks the first listed candidate(s), in the JSON shape the caller asks for
+    """
+    codes = re.findall(r"^\s*\d+\.\s+(\S+)\s+—", prompt, flags=re.MULTILINE)
+    if '"matches"' in prompt:
+        return json.dumps({
+            "matches": [{"code": c, "reason": "stub: ranked candidate"} for c in codes[:3]]
+        })
+    return json.dumps({"code": codes[0] if codes else "", "reason": "stub: top candidate"})
+
+
+# -------------------------------------------------------------
+# Server lifecycle
+# -------------------------------------------------------------
+def start_stub_server(host: str = "127.0.0.1", port: int = 0,
+                      state: StubState = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stand-ins in a background thread
+
+    Returns:
+        (server, base_url) - export base_url as SIH_STUB_URL
+    """
+    state = state or StubState()
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def _parse_service_values(values, cast=float) -> Dict[str, float]:
+    """["who=150", "groq=20"] -> {"who": 150.0, "groq": 20.0}"""
+    parsed = {}
+    for value in values or []:
+        service, _, amount = value.partition("=")
+        if service not in SERVICES:
+            raise SystemExit(f"unknown service '{service}' (choose from {', '.join(SERVICES)})")
+        parsed[service] = cast(amount)
+    return parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local WHO ICD-11 / HAPI FHIR / Groq / Google stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", metavar="SERVICE=MS",
+                        help="mean added latency, e.g. --latency who=150")
+    parser.add_argument("--jitter", action="append", metavar="SERVICE=MS",
+                        help="uniform +/- jitter around the latency")
+    parser.add_argument("--error-rate", action="append", metavar="SERVICE=FRACTION",
+                        help="fraction of requests answered with an error, e.g. groq=0.05")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    state = StubState()
+    for service in SERVICES:
+        state.config[service].error_status = args.error_status
+    for service, ms in _parse_service_values(args.latency).items():
+        state.config[service].latency_ms = ms
+    for service, ms in _parse_service_values(args.jitter).items():
+        state.config[service].jitter_ms = ms
+    for service, rate in _parse_service_values(args.error_rate).items():
+        state.config[service].error_rate = rate
+
+    server, base_url = start_stub_server(args.host, args.port, state)
+    print("=" * 70)
+    print("🧪 Local stand-in servers running")
+    print("=" * 70)
+    print(f"   WHO ICD-11 : {base_url}/who")
+    print(f"   HAPI FHIR  : {base_url}/fhir")
+    print(f"   Groq       : {base_url}/groq")
+    print(f"   Google     : {base_url}/google")
+    print(f"\n   export SIH_STUB_URL={base_url}")
+    print("   Press Ctrl+C to stop")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n📊", json.dumps(state.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Precomputed TM Code -> ICD Mapping Table
+The TM code sets are closed (about 1.9k Siddha, 2.9k Ayurveda and 2.5k
+Unani codes), so the ICD-11 Standard and TM2 candidates /map/{system}-code
+returns for each code can be computed once, offline, by the same pipeline
+(map_to_icd on "code term") and stored as top-k row ids + scores per code.
+/map/*-code then answers from the table with no query encoding or search;
+free text, edited terms and codes the table does not hold still go
+through the live pipeline. A code's English name (Ayurveda / Unani, what
+the UI sends) finds the same entry as its term.
+
+The table records a fingerprint (manifest + columns + deleted rows) of
+each index version it was built from. When a reload, a rebuilt bundle or
+a live update changes an ICD index, lookups fall back to the live pipeline
+until the table is rebuilt; after a TM index change, entries whose code
+and term are unchanged keep being served (their ICD query is the same).
+Rebuilds update the existing table: while the ICD indexes are unchanged
+only new or edited codes of the changed systems are mapped again. They
+run offline (python mapping_table.py) unless SIH_MAP_TABLE_REBUILD=1
+lets the server run them in the background.
+
+Configuration:
+    SIH_MAP_TABLE          1 (default) answers /map/*-code from the table, 0 always runs the pipeline
+    SIH_MAP_TABLE_REBUILD  1 updates the table in the background when an index changes (default 0)
+    SIH_MAP_TABLE_K        candidates kept per code and ICD system (default 10, what /map returns)
+
+Usage:
+    python mapping_table.py                  # siddha, ayurveda and unani
+    python mapping_table.py siddha --k 5
+    python mapping_table.py --out /tmp/icd_map.table
+    python mapping_table.py --full           # map every code again, ignoring the existing table
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+import search_icd11_standard
+import search_icd_tm2
+from code_lookup import code_index, code_key
+from corpus_store import normalize
+from index_bundle import publish_version, resolve_bundle, start_version
+from index_registry import pinned
+
+# Configuration
+BASE_DIR = Path(__file__).parent
+TABLE_PATH = BASE_DIR / "indexes" / "icd_map.table"
+MAP_TABLE = os.getenv("SIH_MAP_TABLE", "1") == "1"
+REBUILD = os.getenv("SIH_MAP_TABLE_REBUILD", "0") == "1"
+TOP_K = int(os.getenv("SIH_MAP_TABLE_K", "10"))
+
+FORMAT = "sih-icd-map-table"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+TABLE_FILE = "table.npz"
+
+STANDARD, TM2 = search_icd11_standard.SYSTEM, search_icd_tm2.SYSTEM
+TM_SYSTEMS = ("siddha", "ayurveda", "unani")     # the systems with a /map/{system}-code route
+# map_to_icd result key -> (index registry system, candidate dict builder)
+ICD_SYSTEMS = {
+    "icd11_standard_candidates": (STANDARD, search_icd11_standard.candidate),
+    "icd11_tm2_candidates": (TM2, search_icd_tm2.candidate),
+}
+FINGERPRINT_COLUMNS = ("codes", "terms", "definitions")
+
+
+def index_fingerprint(index: Dict) -> str:
+    """Hash identifying a loaded index version (cached on the index dict)"""
+    fingerprint = index.get("fingerprint")
+    if fingerprint is None:
+        h = hashlib.sha256(json.dumps(index.get("manifest", {}), sort_keys=True, default=str).encode("utf-8"))
+        for column in FINGERPRINT_COLUMNS:
+            for value in index.get(column) or ():
+                h.update(str(value).encode("utf-8"))
+                h.update(b"\x1f")
+            h.update(b"\x1e")
+        for value in index.get("english") or ():     # only corpora that have English names
+            h.update(str(value).encode("utf-8"))
+            h.update(b"\x1f")
+        live = getattr(index.get("bm25"), "live", None)     # rows deleted by live updates
+        if live is not None:
+            h.update(np.packbits(live).tobytes())
+        fingerprint = index["fingerprint"] = h.hexdigest()[:16]
+    return fingerprint
+
+
+def _row_lookup(index: Dict) -> Dict:
+    """(code, title) -> first row, to turn pipeline candidates back into rows"""
+    rows = {}
+    for i, key in enumerate(zip(index["codes"], index["terms"])):
+        rows.setdefault(key, i)
+    return rows
+
+
+def _resolve(candidates: List[Dict], positions: Dict, k: int):
+    """Rows and scores of pipeline candidates, padded to k with row -1 (None if one is not in the index)"""
+    rows = [positions.get((c["code"], c["title"])) for c in candidates]
+    if any(row is None for row in rows):
+        return None
+    pad = k - len(rows)
+    return rows + [-1] * pad, [c["score"] for c in candidates] + [0.0] * pad
+
+
+def _stamp(path: Path) -> Optional[tuple]:
+    try:
+        version = resolve_bundle(path)
+        st = (version / MANIFEST).stat()
+    except OSError:
+        return None
+    return version.name, st.st_mtime_ns, st.st_size, st.st_ino
+
+
+# -------------------------------------------------------------
+# Offline build
+# -------------------------------------------------------------
+def build_table(systems: Iterable[str] = TM_SYSTEMS, k: int = TOP_K, path: Path = TABLE_PATH,
+                map_fn=None, previous: Dict = None) -> Dict:
+    """
+    Run the mapping pipeline for every code of each TM system and write the table
+
+    map_fn defaults to build_indexes.mapper.map_to_icd. Every code is mapped
+    against the same ICD index versions (pinned for the whole build); their
+    fingerprints go into the manifest. Returns the manifest.
+
+    previous (a load_table() result) is updated instead of starting over.
+    If it was built from the current ICD index versions, its other systems
+    are copied and codes whose term is unchanged keep their stored
+    candidates; otherwise all of its systems are mapped again.
+    """
+    if map_fn is None:
+        from build_indexes.mapper import map_to_icd as map_fn
+
+    path = Path(path)
+    systems = list(systems)
+    start = time.perf_counter()
+    arrays, manifest_systems, unresolved, reused = {}, {}, 0, 0
+    with pinned(STANDARD) as standard, pinned(TM2) as tm2:
+        icd = {"icd11_standard_candidates": standard, "icd11_tm2_candidates": tm2}
+        icd_versions = {ICD_SYSTEMS[key][0]: index_fingerprint(index) for key, index in icd.items()}
+        positions = {key: _row_lookup(index) for key, index in icd.items()}
+
+        if previous is not None:
+            if previous["manifest"]["icd"] != icd_versions or previous["manifest"]["k"] != k:
+                systems = list(dict.fromkeys([*previous["systems"], *systems]))
+                previous = None     # every stored candidate is stale
+            else:
+                for system, stored in previous["systems"].items():
+                    if system in systems:
+                        continue
+                    arrays[f"{system}.codes"], arrays[f"{system}.terms"] = stored["codes"], stored["terms"]
+                    if stored["english"] is not None:
+                        arrays[f"{system}.english"] = stored["english"]
+                    for key, (name, _) in ICD_SYSTEMS.items():
+                        arrays[f"{system}.{name}.rows"] = stored["rows"][key]
+                        arrays[f"{system}.{name}.scores"] = stored["scores"][key]
+                    manifest_systems[system] = previous["manifest"]["systems"][system]
+
+        for system in systems:
+            stored = previous["systems"].get(system) if previous is not None else None
+            kept = reused
+            with pinned(system) as tm:
+                rows = sorted({r for found in code_index(tm).values() for r in found})
+                english = tm.get("english")
+                codes, terms, titles = [], [], []
+                icd_rows = {key: [] for key in icd}
+                icd_scores = {key: [] for key in icd}
+                for n, r in enumerate(rows, 1):
+                    if n % 500 == 0:
+                        print(f"   {system}: {n}/{len(rows)} codes mapped")
+                    code, term = tm["codes"][r], tm["terms"][r]
+                    if not term:
+                        continue
+                    i = stored["entries"].get((code_key(code), normalize(term))) if stored else None
+                    if i is not None:
+                        reused += 1
+                        entry = {key: (stored["rows"][key][i], stored["scores"][key][i]) for key in icd}
+                    else:
+                        # Same query and ICD blob as /map/{system}-code for this code
+                        result = map_fn(f"{code} {term}", system=system,
+                                        tm_candidates=[{"code": code, "term": term}])
+                        entry = {key: _resolve(result[key][:k], positions[key], k) for key in icd}
+                    if any(found is None for found in entry.values()):
+                        unresolved += 1
+                        continue
+                    codes.append(code)
+                    terms.append(term)
+                    if english is not None:
+                        titles.append(english[r] or "")
+                    for key, (found_rows, found_scores) in entry.items():
+                        icd_rows[key].append(found_rows)
+                        icd_scores[key].append(found_scores)
+
+                arrays[f"{system}.codes"] = np.array(codes, dtype=str)
+                arrays[f"{system}.terms"] = np.array(terms, dtype=str)
+                if english is not None:
+                    arrays[f"{system}.english"] = np.array(titles, dtype=str)
+                for key, (name, _) in ICD_SYSTEMS.items():
+                    arrays[f"{system}.{name}.rows"] = np.array(icd_rows[key], dtype=np.int32).reshape(-1, k)
+                    arrays[f"{system}.{name}.scores"] = np.array(icd_scores[key], dtype=np.float32).reshape(-1, k)
+                manifest_systems[system] = {"entries": len(codes), "fingerprint": index_fingerprint(tm)}
+                print(f"✅ {system}: {len(codes)} codes mapped"
+                      f"{f' ({reused - kept} kept from the previous table)' if stored else ''}")
+
+        manifest = {
+            "format": FORMAT,
+            "version": FORMAT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "k": k,
+            "systems": manifest_systems,
+            "icd": icd_versions,
+            "unresolved": unresolved,
+            "reused": reused,
+            "seconds": round(time.perf_counter() - start, 1)
+        }
+
+    # New version directory behind an atomic pointer, like index bundles
+    tmp = start_version(path)
+    np.savez_compressed(tmp / TABLE_FILE, **arrays)
+    with open(tmp / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    publish_version(path, tmp)
+    return manifest
+
+
+def load_table(path: Path = TABLE_PATH) -> Dict:
+    """Read a table into per-system (code key, normalized term) -> entry maps"""
+    path = resolve_bundle(path)
+    with open(path / MANIFEST, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} mapping table (rebuild it with mapping_table.py)")
+
+    systems = {}
+    with np.load(path / TABLE_FILE, allow_pickle=False) as data:
+        for system in manifest["systems"]:
+            entries, aliases = {}, {}
+            for i, (code, term) in enumerate(zip(data[f"{system}.codes"], data[f"{system}.terms"])):
+                entries.setdefault((code_key(str(code)), normalize(str(term))), i)
+            english = data[f"{system}.english"] if f"{system}.english" in data.files else None
+            for i, (code, title) in enumerate(zip(data[f"{system}.codes"], english if english is not None else ())):
+                if str(title):
+                    aliases.setdefault((code_key(str(code)), normalize(str(title))), i)
+            systems[system] = {
+                "entries": entries,
+                "aliases": aliases,          # (code, English name) -> entry
+                "codes": data[f"{system}.codes"],
+                "terms": data[f"{system}.terms"],
+                "english": english,
+                "rows": {key: data[f"{system}.{name}.rows"] for key, (name, _) in ICD_SYSTEMS.items()},
+                "scores": {key: data[f"{system}.{name}.scores"] for key, (name, _) in ICD_SYSTEMS.items()}
+            }
+    return {"manifest": manifest, "systems": systems}
+
+
+# -------------------------------------------------------------
+# Lookup
+# -------------------------------------------------------------
+class MappingTable:
+    """The table on disk, re-read when its manifest changes, plus background rebuilds"""
+
+    def __init__(self, path: Path = TABLE_PATH, rebuild: bool = REBUILD):
+        self.path = Path(path)
+        self.rebuild = rebuild
+        self.lock = threading.Lock()
+        self.table: Optional[Dict] = None
+        self.stamp = None
+        self.rebuild_thread: Optional[threading.Thread] = None
+        self.rebuilt_for = None
+        self.stats = Counter()
+
+    def _current(self) -> Optional[Dict]:
+        stamp = _stamp(self.path)
+        with self.lock:
+            if stamp == self.stamp:
+                return self.table
+        table = None
+        if stamp is not None:
+            try:
+                table = load_table(self.path)
+                print(f"📦 Loaded mapping table ({table['manifest']['created_at']})")
+            except (OSError, ValueError, KeyError) as e:
+                # Mid-swap or unreadable: the live pipeline answers until it is readable
+                print(f"⚠️  Could not read mapping table, using the live pipeline: {e}")
+                stamp = None
+        with self.lock:
+            self.table, self.stamp = table, stamp
+        return table
+
+    def lookup(self, system: str, code: str, term: str) -> Optional[Dict[str, List[Dict]]]:
+        """
+        Stored ICD candidates for a TM code and its term or English name, or None (use the live pipeline)
+
+        Returns {"icd11_standard_candidates": [...], "icd11_tm2_candidates": [...]}
+        with the same candidate dicts the ICD searches return.
+        """
+        if not MAP_TABLE:
+            return None
+        table = self._current()
+        stored = table["systems"].get(system) if table else None
+        key = (code_key(code), normalize(term))
+        i = stored["entries"].get(key, stored["aliases"].get(key)) if stored else None
+        if i is None:
+            self._count("misses")
+            return None
+
+        manifest = table["manifest"]
+        with pinned(system) as tm:
+            fingerprint = index_fingerprint(tm)
+            if fingerprint != manifest["systems"][system]["fingerprint"]:
+                self._rebuild_later([system], {system: fingerprint})
+
+        with pinned(STANDARD) as standard, pinned(TM2) as tm2:
+            icd = {"icd11_standard_candidates": standard, "icd11_tm2_candidates": tm2}
+            current = {ICD_SYSTEMS[key][0]: index_fingerprint(index) for key, index in icd.items()}
+            if current != manifest["icd"]:
+                self._count("stale")
+                self._rebuild_later(list(manifest["systems"]), current)
+                return None
+            result = {}
+            for key, index in icd.items():
+                candidate = ICD_SYSTEMS[key][1]
+                result[key] = [candidate(index, int(row), float(score))
+                               for row, score in zip(stored["rows"][key][i], stored["scores"][key][i]) if row >= 0]
+        self._count("hits")
+        return result
+
+    def _count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _rebuild_later(self, systems: List[str], changed: Dict[str, str]):
+        """Update the table for systems in a background thread, once per set of changed index versions"""
+        if not self.rebuild:
+            return
+        key = frozenset(changed.items())
+        with self.lock:
+            if self.rebuild_thread is not None and self.rebuild_thread.is_alive():
+                return
+            if self.rebuilt_for == key:
+                return      # already rebuilt (or failed) for these versions
+            self.rebuilt_for = key
+            table = self.table
+            self.rebuild_thread = threading.Thread(
+                target=self._rebuild,
+                args=(systems, table["manifest"]["k"] if table else TOP_K, table),
+                name="mapping-table-rebuild",
+                daemon=True
+            )
+            self.rebuild_thread.start()
+
+    def _rebuild(self, systems: List[str], k: int, previous: Optional[Dict]):
+        print(f"🔄 Indexes changed, updating the mapping table ({', '.join(systems)})")
+        try:
+            manifest = build_table(systems, k, self.path, previous=previous)
+            self._count("rebuilds")
+            print(f"✅ Mapping table rebuilt in {manifest['seconds']:.0f}s ({manifest['reused']} entries kept)")
+        except Exception as e:
+            self._count("rebuild_errors")
+            print(f"❌ Mapping table rebuild failed, using the live pipeline: {e}")
+
+    def get_statistics(self) -> Dict:
+        table = self._current()
+        with self.lock:
+            manifest = table["manifest"] if table else None
+            return {
+                "enabled": MAP_TABLE,
+                "path": str(self.path),
+                "loaded": table is not None,
+                "background_rebuild": self.rebuild,
+                "created_at": manifest["created_at"] if manifest else None,
+                "entries": {s: info["entries"] for s, info in manifest["systems"].items()} if manifest else {},
+                "rebuilding": self.rebuild_thread is not None and self.rebuild_thread.is_alive(),
+                **{name: self.stats[name] for name in ("hits", "misses", "stale", "rebuilds", "rebuild_errors")}
+            }
+
+
+# -------------------------------------------------------------
+# Process-wide table
+# -------------------------------------------------------------
+_table: Optional[MappingTable] = None
+_table_lock = threading.Lock()
+
+
+def get_table() -> MappingTable:
+    """Mapping table shared by the API (read on first use)"""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = MappingTable()
+    return _table
+
+
+def mapping_table_stats() -> Dict:
+    return get_table().get_statistics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute ICD-11 candidates for every TM code")
+    parser.add_argument("systems", nargs="*", default=list(TM_SYSTEMS),
+                        help=f"TM systems to map ({', '.join(TM_SYSTEMS)})")
+    parser.add_argument("--k", type=int, default=TOP_K, help="candidates kept per code and ICD system")
+    parser.add_argument("--out", type=Path, default=TABLE_PATH)
+    parser.add_argument("--full", action="store_true", help="map every code again instead of updating the table")
+    args = parser.parse_args()
+
+    previous = None
+    if not args.full and _stamp(args.out) is not None:
+        try:
+            previous = load_table(args.out)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Existing table unreadable, mapping every code: {e}")
+    manifest = build_table(args.systems, args.k, args.out, previous=previous)
+    size = sum(f.stat().st_size for f in resolve_bundle(args.out).iterdir())
+    print(f"\n✅ Mapping table written to {args.out}: "
+          f"{sum(s['entries'] for s in manifest['systems'].values())} codes, "
+          f"{size / 1024:.0f} KB, {manifest['seconds']:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+ONNX Runtime Query Encoder
+CPU backend for the shared query encoder (encoder.py): the PubMedBERT
+sentence-transformer (transformer + pooling) exported once to ONNX,
+optionally with dynamic int8 quantization of its weights, and run through
+ONNX Runtime instead of PyTorch eager mode.
+
+Every export is checked against the torch model on PARITY_TEXTS; the
+result is recorded next to the model files and a backend whose check
+failed is refused at load time.
+
+Usage (needs torch, onnx and onnxruntime):
+    python onnx_encoder.py                          # models/onnx/: model.onnx + model.int8.onnx
+    python onnx_encoder.py --out-dir /srv/onnx --no-quantize
+
+Configuration:
+    SIH_ONNX_DIR        export directory (default Mapping/models/onnx)
+    SIH_ONNX_THREADS    ONNX Runtime intra-op threads (default 0: all cores)
+"""
+
+import os
+import json
+import time
+import inspect
+import argparse
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+# Configuration
+BASE_DIR = Path(__file__).parent
+ONNX_DIR = Path(os.getenv("SIH_ONNX_DIR", BASE_DIR / "models" / "onnx"))
+THREADS = int(os.getenv("SIH_ONNX_THREADS", "0"))
+OPSET = 17
+META_FILE = "encoder.json"
+FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+INPUTS = ["input_ids", "attention_mask", "token_type_ids"]
+
+# Smallest cosine between torch and ONNX embeddings of the same text
+PARITY_MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.99}
+PARITY_TEXTS = [
+    "fever with headache", "knee pain and swelling in the morning", "cough with breathlessness",
+    "skin rash with itching", "abdominal pain and diarrhoea", "burning sensation while passing urine",
+    "loss of appetite and weight loss", "difficulty sleeping", "Jvara", "Vata vyadhi",
+    "Type 2 diabetes mellitus without complications", "Chronic obstructive pulmonary disease",
+    "pain in the lower back radiating to the left leg with numbness and tingling in the toes"
+]
+
+
+class OnnxEncoder:
+    """Drop-in for SentenceTransformer.encode over an exported ONNX model"""
+
+    def __init__(self, model_path, tokenizer_dir, max_length: int, threads: int = THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.inputs = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_dir))
+        self.max_length = max_length
+        self.path = Path(model_path)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Sentence embeddings, (len(sentences) x dim) float32"""
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size)[0]
+        out = []
+        for start in range(0, len(sentences), batch_size):
+            batch = self.tokenizer(list(sentences[start:start + batch_size]), padding=True, truncation=True,
+                                   max_length=self.max_length, return_tensors="np")
+            feed = {
+                name: np.asarray(batch[name] if name in batch else np.zeros_like(batch["input_ids"]), dtype=np.int64)
+                for name in self.inputs
+            }
+            out.append(self.session.run(["sentence_embedding"], feed)[0])
+        if not out:
+            return np.empty((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        return np.concatenate(out).astype(np.float32)
+
+
+# -------------------------------------------------------------
+# Export
+# -------------------------------------------------------------
+def _export_torch(model, path: Path):
+    """Trace the sentence-transformer (all modules) into one ONNX graph"""
+    import torch
+
+    class SentenceEmbedding(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            features = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+            return self.model(features)["sentence_embedding"]
+
+    sample = model.tokenizer(PARITY_TEXTS[:2], padding=True, return_tensors="pt")
+    args = tuple(sample[name] if name in sample else torch.zeros_like(sample["input_ids"]) for name in INPUTS)
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            SentenceEmbedding(model).eval(), args, str(path),
+            input_names=INPUTS, output_names=["sentence_embedding"],
+            dynamic_axes={**{name: {0: "batch", 1: "tokens"} for name in INPUTS}, "sentence_embedding": {0: "batch"}},
+            opset_version=OPSET, do_constant_folding=True, **legacy
+        )
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray, min_cosine: float) -> Dict:
+    """Row-wise agreement of two embedding matrices of the same texts"""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+        "passed": bool(cosine.min() >= min_cosine)
+    }
+
+
+def export(out_dir=ONNX_DIR, model=None, model_name: str = None, quantize: bool = True) -> Dict:
+    """
+    Export the query encoder to out_dir, quantize it, and check parity
+
+    Args:
+        model: SentenceTransformer to export (default: encoder.py's model)
+        model_name: Name recorded for load_encoder's check (default encoder.MODEL_NAME)
+        quantize: Also write the dynamic int8 model
+
+    Returns:
+        The metadata written to out_dir/encoder.json
+    """
+    from encoder import MODEL_NAME
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(MODEL_NAME, device="cpu")
+    model_name = model_name or MODEL_NAME
+
+    _export_torch(model, out_dir / FILES["onnx"])
+    model.tokenizer.save_pretrained(str(out_dir))
+    backends = ["onnx"]
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out_dir / FILES["onnx"]), str(out_dir / FILES["onnx-int8"]),
+                         weight_type=QuantType.QInt8)
+        backends.append("onnx-int8")
+
+    reference = model.encode(PARITY_TEXTS, convert_to_numpy=True)
+    meta = {
+        "model": model_name,
+        "dim": int(reference.shape[1]),
+        "max_seq_length": int(model.max_seq_length),
+        "opset": OPSET,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": {b: FILES[b] for b in backends},
+        "parity": {}
+    }
+    for backend in backends:
+        encoder = OnnxEncoder(out_dir / FILES[backend], out_dir, meta["max_seq_length"])
+        meta["parity"][backend] = parity(reference, encoder.encode(PARITY_TEXTS), PARITY_MIN_COSINE[backend])
+
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_encoder(backend: str = "onnx-int8", out_dir=ONNX_DIR, model_name: str = None,
+                 threads: int = THREADS) -> OnnxEncoder:
+    """The exported model for an ONNX backend, if it exists and passed its parity check"""
+    from encoder import MODEL_NAME
+
+    out_dir = Path(out_dir)
+    meta_path = out_dir / META_FILE
+    if not meta_path.exists():
+        raise FileNotFoundError(f"No ONNX export in {out_dir} (run python onnx_encoder.py)")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    model_name = model_name or MODEL_NAME
+    if meta["model"] != model_name:
+        raise ValueError(f"ONNX export is of {meta['model']}, queries use {model_name} (re-export)")
+    if backend not in meta["files"]:
+        raise FileNotFoundError(f"No {backend} model in {out_dir}")
+    if not meta["parity"].get(backend, {}).get("passed"):
+        raise ValueError(f"{backend} export failed its parity check: {meta['parity'].get(backend)}")
+    return OnnxEncoder(out_dir / meta["files"][backend], out_dir, meta["max_seq_length"], threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the query encoder to ONNX (+ int8)")
+    parser.add_argument("--out-dir", type=Path, default=ONNX_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="skip the int8 model")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"📦 Exporting query encoder to {args.out_dir}")
+    print("=" * 70)
+    start = time.perf_counter()
+    meta = export(args.out_dir, quantize=not args.no_quantize)
+    print(f"\n{meta['model']}: {meta['dim']} dims, exported in {time.perf_counter() - start:.1f}s")
+    for backend, check in meta["parity"].items():
+        size = (args.out_dir / meta["files"][backend]).stat().st_size / 1024 / 1024
+        mark = "✅" if check["passed"] else "❌"
+        print(f"   {mark} {backend:<10} {size:7.1f} MB  min cosine {check['min_cosine']:.5f}  "
+              f"max |diff| {check['max_abs_diff']:.1e}")
+    print("\nUse with SIH_ENCODER_BACKEND=onnx-int8 (or onnx); python benchmark_encoder.py compares latency.")
+
+
+if __name__ == "__main__":
+    main()
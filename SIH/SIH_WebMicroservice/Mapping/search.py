@@ -2,57 +2,38 @@
 # search_siddha.py
 # -------------------------------------------------------------
 import json
-import pickle
 import numpy as np
 from pathlib import Path
 
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
-from scipy import sparse
-from sentence_transformers import SentenceTransformer, util
-from groq import Groq
+from cross_encoder import maybe_rerank
+from encoder import encode_query
+from ann_index import DENSE_K, DENSE_RETRIEVAL, union_ids
+from embedding_matrix import cosine_scores
+from index_registry import register_system, get_system, pinned
+from index_bundle import bundle_path, load_index_files
+from corpus_store import attach, get_corpus
+from code_lookup import match_code, prepend_exact
+from llm_cache import cached_completion, make_groq_client
 
 from dotenv import load_dotenv
-import os
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+client = make_groq_client()
 # -------------------------------------------------------------
 # PATHS
 # -------------------------------------------------------------
-DATA_PATH = Path(r"C:\Users\Shriharsh\Downloads\SIH(10)\SIH\Mapping\data\siddha_clean.json")
-INDEX_DIR = Path(r"C:\Users\Shriharsh\Downloads\SIH(10)\SIH\Mapping\indexes")
-INDEX_DIR.mkdir(exist_ok=True)
+BASE_DIR = Path(__file__).parent
+INDEX_DIR = BASE_DIR / "indexes"
+SYSTEM = "siddha"
 # -------------------------------------------------------------
-# LOAD DATA
+# LOAD INDEXES (on first search, via the index registry)
 # -------------------------------------------------------------
-with open(DATA_PATH, "r", encoding="utf-8") as f:
-    siddha = json.load(f)
+def load_index():
+    # Bundle from convert_indexes.py if present, else the pickles; strings
+    # come from the shared corpus store (also used by autocomplete)
+    return attach(load_index_files(INDEX_DIR, SYSTEM), get_corpus(SYSTEM))
 
-codes = [x["code"] for x in siddha]
-terms = [x["term"] for x in siddha]
-defs = [x["definition"] for x in siddha]
-
-docs = []
-for c, t, d in zip(codes,terms, defs):
-    docs.append(f"{c}. {t}. {d}" if d else t)
-
-
-# -------------------------------------------------------------
-# LOAD INDEX FILES
-# -------------------------------------------------------------
-bm25_data = pickle.load(open(INDEX_DIR / "bm25_siddha.pkl", "rb"))
-bm25 = bm25_data["model"]
-
-tfidf_data = pickle.load(open(INDEX_DIR / "tfidf_siddha.pkl", "rb"))
-tfidf_vectorizer = tfidf_data["vectorizer"]
-
-tfidf_matrix = sparse.load_npz(INDEX_DIR / "tfidf_matrix_siddha.npz")
-
-embeddings = np.load(INDEX_DIR / "embeddings_siddha.npy")
-embed_meta = pickle.load(open(INDEX_DIR / "embeddings_siddha_meta.pkl", "rb"))
-
-embedder = SentenceTransformer("pritamdeka/S-PubMedBert-MS-MARCO")
+register_system(SYSTEM, load_index, watch=bundle_path(INDEX_DIR, SYSTEM))
 
 
 # -------------------------------------------------------------
@@ -60,15 +41,16 @@ embedder = SentenceTransformer("pritamdeka/S-PubMedBert-MS-MARCO")
 # -------------------------------------------------------------
 def bm25_search(query, top_k=50):
     tokenized = query.lower().split()
-    scores = bm25.get_scores(tokenized)
+    scores = get_system(SYSTEM)["bm25"].get_scores(tokenized)
 
     top_ids = np.argsort(scores)[::-1][:top_k]
     return top_ids
 
 
 def tfidf_rerank(query, candidate_ids, top_k=20):
-    q_vec = tfidf_vectorizer.transform([query])
-    sub_matrix = tfidf_matrix[candidate_ids]
+    index = get_system(SYSTEM)
+    q_vec = index["tfidf_vectorizer"].transform([query])
+    sub_matrix = index["tfidf_matrix"][candidate_ids]
 
     scores = (sub_matrix @ q_vec.T).toarray().flatten()
     top_local = np.argsort(scores)[::-1][:top_k]
@@ -76,28 +58,39 @@ def tfidf_rerank(query, candidate_ids, top_k=20):
     return [candidate_ids[i] for i in top_local]
 
 
+def dense_search(query, top_k=DENSE_K):
+    # IVF or sign-bit prefilter scan over the embeddings: finds codes that share no words with the query
+    index = get_system(SYSTEM)
+    ids, _ = index["ann"].search(index["embeddings"], encode_query(query), top_k)
+    return ids
+
+
+def candidate(index, i, score):
+    definition = index["definitions"][i]
+    return {"code": index["codes"][i],
+            "term": index["terms"][i],
+            "definition": definition if definition and definition != "nan" else "No description available.",
+            "score": score}
+
+
 def semantic_rerank(query, candidate_ids, top_k=5):
-    q_emb = embedder.encode([query])[0]
-    sub_emb = embeddings[candidate_ids]
+    index = get_system(SYSTEM)
 
-    scores = util.cos_sim(q_emb, sub_emb).cpu().numpy()[0]
+    # Stored embeddings are unit rows: one dot product over the candidates
+    scores = cosine_scores(index["embeddings"], encode_query(query), candidate_ids)
     top_local = np.argsort(scores)[::-1][:top_k]
 
-    return [
-        {"code": codes[candidate_ids[i]],
-         "term": terms[candidate_ids[i]],
-         "definition": defs[candidate_ids[i]] if defs[candidate_ids[i]] and defs[candidate_ids[i]] != "nan" else "No description available.",
-         "score": float(scores[i])}
-        for i in top_local
-    ]
+    return [candidate(index, candidate_ids[i], float(scores[i])) for i in top_local]
 
 # -------------------------------------------------------------
 # 4) LLM Refinement — pick the BEST Siddha diagnosis
 # -------------------------------------------------------------
-def refine_with_llm(query, candidates):
+def refine_with_llm(query, candidates, use_cache=True, timeout=None, system_name="Siddha"):
     """
     candidates = list of dicts:
     [{"code": "...", "term": "...", "score": 0.xx}, ...]
+    use_cache = False skips the LLM cache lookup (the fresh answer is still stored)
+    timeout = hard deadline in seconds for the Groq call (falls back on expiry)
     """
 
     # Format candidate list for LLM
@@ -109,27 +102,28 @@ def refine_with_llm(query, candidates):
     User symptoms:
     "{query}"
 
-    Here are Siddha diagnosis candidates:
+    Here are {system_name} diagnosis candidates:
 
     {cand_text}
 
-    Pick the SINGLE best Siddha diagnosis that matches the symptoms.
+    Pick the SINGLE best {system_name} diagnosis that matches the symptoms.
     Return ONLY JSON like:
     {{"code": "...", "reason": "..."}}
     """
 
     try:
-        response = client.chat.completions.create(
+        raw = cached_completion(
+            client,
             model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
+            prompt=prompt,
+            use_cache=use_cache,
+            validate=lambda text: json.loads(text.strip()),
+            timeout=timeout,
             max_tokens=150,
             temperature=0.2
-        )
-
-        raw = response.choices[0].message.content.strip()
+        ).strip()
 
         # Safe JSON extraction
-        import json
         result = json.loads(raw)
         return result
 
@@ -142,14 +136,27 @@ def refine_with_llm(query, candidates):
 # UNIFIED SEARCH PIPELINE
 # -------------------------------------------------------------
 def search_siddha(query):
-    # Stage 1 — BM25 (find 50)
-    bm25_ids = bm25_search(query, top_k=100)
-
-    # Stage 2 — TF-IDF re-rank (down to 20)
-    tfidf_ids = tfidf_rerank(query, bm25_ids, top_k=60)
-
-    # Stage 3 — Semantic re-rank (final 5)
-    candidates = semantic_rerank(query, tfidf_ids, top_k=10)
+    # One index version for every stage, even if a reload swaps it mid-search
+    with pinned(SYSTEM):
+        # A code, or a code and its term: its rows go first, ahead of the ranked results
+        index = get_system(SYSTEM)
+        rows = match_code(index, query, SYSTEM)
+
+        # Stage 1 — BM25 (find 50)
+        bm25_ids = bm25_search(query, top_k=100)
+
+        # Stage 2 — TF-IDF re-rank (down to 20)
+        tfidf_ids = tfidf_rerank(query, bm25_ids, top_k=60)
+        if DENSE_RETRIEVAL:
+            tfidf_ids = union_ids(tfidf_ids, dense_search(query))
+
+        # Stage 3 — Semantic re-rank (final 5)
+        candidates = semantic_rerank(query, tfidf_ids, top_k=10)
+
+    # Optional local cross-encoder pass over the top-N (SIH_CROSS_ENCODER=1)
+    candidates = maybe_rerank(query, candidates)
+    if rows:
+        candidates = prepend_exact([candidate(index, i, 1.0) for i in rows], candidates)
 
     
 
@@ -1,94 +1,93 @@
-import json
-import pickle
 import numpy as np
 from pathlib import Path
 
-from rank_bm25 import BM25Okapi
-from sklearn.feature_extraction.text import TfidfVectorizer
-from scipy import sparse
-from sentence_transformers import SentenceTransformer, util
+from cross_encoder import maybe_rerank
+from encoder import encode_query
+from ann_index import DENSE_K, DENSE_RETRIEVAL, union_ids
+from embedding_matrix import cosine_scores
+from index_registry import register_system, get_system, pinned
+from index_bundle import bundle_path, load_index_files
+from corpus_store import attach, get_corpus
+from code_lookup import match_code, prepend_exact
 
 # -------------------------------------------------------------
 # PATHS
 # -------------------------------------------------------------
 BASE_DIR = Path(__file__).parent
-DATA_PATH = BASE_DIR / "data" / "ayurveda_data.json"
 INDEX_DIR = BASE_DIR / "indexes"
+SYSTEM = "ayurveda"
 
 # -------------------------------------------------------------
-# LOAD DATA
+# LOAD INDEXES (on first search, via the index registry)
 # -------------------------------------------------------------
-with open(DATA_PATH, "r", encoding="utf-8") as f:
-    ayurveda = json.load(f)
+def load_index():
+    # Bundle from convert_indexes.py if present, else the pickles; strings
+    # come from the shared corpus store (also used by autocomplete)
+    return attach(load_index_files(INDEX_DIR, SYSTEM), get_corpus(SYSTEM))
 
-codes = [x["tm2_code"] for x in ayurveda]
-original_terms = [x["term"] for x in ayurveda]
-english_terms = [x["english"] for x in ayurveda]
-definitions = [x["description"] for x in ayurveda]
-
-docs = []
-for orig_term, eng_term, defi in zip(original_terms, english_terms, definitions):
-    if defi and defi != "No description available.":
-        docs.append(f"{orig_term}. {eng_term}. {defi}")
-    else:
-        docs.append(f"{orig_term}. {eng_term}")
-
-# -------------------------------------------------------------
-# LOAD INDEX FILES
-# -------------------------------------------------------------
-bm25_data = pickle.load(open(INDEX_DIR / "bm25_ayurveda.pkl", "rb"))
-bm25 = bm25_data["model"]
-
-tfidf_data = pickle.load(open(INDEX_DIR / "tfidf_ayurveda.pkl", "rb"))
-tfidf_vectorizer = tfidf_data["vectorizer"]
-
-tfidf_matrix = sparse.load_npz(INDEX_DIR / "tfidf_matrix_ayurveda.npz")
-
-embeddings = np.load(INDEX_DIR / "embeddings_ayurveda.npy")
-embed_meta = pickle.load(open(INDEX_DIR / "embeddings_ayurveda_meta.pkl", "rb"))
-
-embedder = SentenceTransformer("pritamdeka/S-PubMedBert-MS-MARCO")
+register_system(SYSTEM, load_index, watch=bundle_path(INDEX_DIR, SYSTEM))
 
 # -------------------------------------------------------------
 # SEARCH FUNCTIONS
 # -------------------------------------------------------------
 def bm25_search(query, top_k=50):
     tokenized = query.lower().split()
-    scores = bm25.get_scores(tokenized)
+    scores = get_system(SYSTEM)["bm25"].get_scores(tokenized)
     top_ids = np.argsort(scores)[::-1][:top_k]
     return top_ids
 
 def tfidf_rerank(query, candidate_ids, top_k=20):
-    q_vec = tfidf_vectorizer.transform([query])
-    sub_matrix = tfidf_matrix[candidate_ids]
+    index = get_system(SYSTEM)
+    q_vec = index["tfidf_vectorizer"].transform([query])
+    sub_matrix = index["tfidf_matrix"][candidate_ids]
     scores = (sub_matrix @ q_vec.T).toarray().flatten()
     top_local = np.argsort(scores)[::-1][:top_k]
     return [candidate_ids[i] for i in top_local]
 
+def dense_search(query, top_k=DENSE_K):
+    # IVF or sign-bit prefilter scan over the embeddings: finds codes that share no words with the query
+    index = get_system(SYSTEM)
+    ids, _ = index["ann"].search(index["embeddings"], encode_query(query), top_k)
+    return ids
+
+def candidate(index, i, score):
+    return {
+        "code": index["codes"][i],
+        "term": index["terms"][i],
+        "english": index["english"][i],
+        "definition": index["definitions"][i],
+        "score": score
+    }
+
 def semantic_rerank(query, candidate_ids, top_k=5):
-    q_emb = embedder.encode([query])[0]
-    sub_emb = embeddings[candidate_ids]
-    scores = util.cos_sim(q_emb, sub_emb).cpu().numpy()[0]
+    index = get_system(SYSTEM)
+
+    # Stored embeddings are unit rows: one dot product over the candidates
+    scores = cosine_scores(index["embeddings"], encode_query(query), candidate_ids)
     top_local = np.argsort(scores)[::-1][:top_k]
-    
-    return [
-        {
-            "code": codes[candidate_ids[i]],
-            "term": original_terms[candidate_ids[i]],
-            "english": english_terms[candidate_ids[i]],
-            "definition": definitions[candidate_ids[i]],
-            "score": float(scores[i])
-        }
-        for i in top_local
-    ]
+
+    return [candidate(index, candidate_ids[i], float(scores[i])) for i in top_local]
 
 # -------------------------------------------------------------
 # UNIFIED SEARCH PIPELINE
 # -------------------------------------------------------------
 def search_ayurveda(query):
-    bm25_ids = bm25_search(query, top_k=100)
-    tfidf_ids = tfidf_rerank(query, bm25_ids, top_k=60)
-    candidates = semantic_rerank(query, tfidf_ids, top_k=10)
+    # One index version for every stage, even if a reload swaps it mid-search
+    with pinned(SYSTEM):
+        # A code, or a code and its term: its rows go first, ahead of the ranked results
+        index = get_system(SYSTEM)
+        rows = match_code(index, query, SYSTEM)
+
+        bm25_ids = bm25_search(query, top_k=100)
+        tfidf_ids = tfidf_rerank(query, bm25_ids, top_k=60)
+        if DENSE_RETRIEVAL:
+            tfidf_ids = union_ids(tfidf_ids, dense_search(query))
+        candidates = semantic_rerank(query, tfidf_ids, top_k=10)
+
+    # Optional local cross-encoder pass over the top-N (SIH_CROSS_ENCODER=1)
+    candidates = maybe_rerank(query, candidates)
+    if rows:
+        candidates = prepend_exact([candidate(index, i, 1.0) for i in rows], candidates)
     return {"candidates": candidates}
 
 # -------------------------------------------------------------
@@ -0,0 +1,154 @@
+"""
+Test the IVF nearest-neighbour index and the sign-bit prefilter
+The IVF search must find nearly all of the exact top-10 while scanning a
+fraction of the corpus, match exact search when every list is probed,
+stay correct after live appends / deletes, and be written to and loaded
+from index bundles. The binary prefilter must do the same while rescoring
+a few hundred rows
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import ann_index
+from ann_index import (ANN_MIN_DOCS, BinaryIndex, build_binary, build_ivf, default_lists, exact_search,
+                       hamming, pack_signs, recall_at_k, union_ids)
+from corpus_store import attach, load_corpus
+from index_builder import build_corpus
+from index_bundle import load_index_files
+from index_registry import IndexRegistry
+from live_updates import LiveCorpus
+from test_index_builder import RECORDS, FakeEncoder, write_data
+
+
+def clustered(n, dim=32, clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_ann_index():
+    print("=" * 70)
+    print("🧪 Testing IVF nearest-neighbour index")
+    print("=" * 70)
+
+    embeddings = clustered(3000)
+    queries = clustered(50, seed=1)
+
+    # 1. Recall against exact search
+    print("\n1. Recall@10 against exact search...")
+    ivf = build_ivf(embeddings, n_lists=54, nprobe=8)
+    assert ivf.n_lists == 54 and len(ivf) == 3000
+    assert sorted(ivf.ids.tolist()) == list(range(3000))
+    result = recall_at_k(ivf, embeddings, queries, k=10)
+    assert result["recall"] >= 0.9, result
+    scanned = np.mean([len(ivf.probe(q / np.linalg.norm(q), 8)) for q in queries]) / 3000
+    print(f"   ✅ recall@10 {result['recall']:.3f} scanning {scanned:.0%} of the corpus")
+
+    # 2. Probing every list is exact; tiny corpora get a single list
+    print("\n2. Exhaustive probe and small corpora...")
+    for q in queries[:10]:
+        truth, truth_scores = exact_search(embeddings, q, 10)
+        found, scores = ivf.search(embeddings, q, 10, nprobe=ivf.n_lists)
+        assert np.array_equal(found, truth) and np.allclose(scores, truth_scores, atol=1e-5)
+    assert default_lists(ANN_MIN_DOCS - 1) == 1 and default_lists(40000) == 200
+    small = build_ivf(embeddings[:50])
+    assert small.n_lists == 1
+    assert np.array_equal(small.search(embeddings[:50], queries[0], 5)[0], exact_search(embeddings[:50], queries[0], 5)[0])
+    print("   ✅ Same ids and scores as exact search")
+
+    # 3. Live appends and deletes
+    print("\n3. Appended and deleted rows...")
+    extra = clustered(20, seed=2)
+    deleted = [int(i) for i in exact_search(embeddings, queries[0], 3)[0]]
+    live = ivf.extended(3000, extra, deleted)
+    stacked = np.vstack([embeddings, extra])
+    assert len(live) == 3000 + 20 - 3
+    found, _ = live.search(stacked, extra[7], 1)
+    assert found[0] == 3007, "an appended row is found by its own vector"
+    found, _ = live.search(stacked, queries[0], 10, nprobe=live.n_lists)
+    assert not set(found.tolist()) & set(deleted)
+    assert union_ids([5, 3], np.array([3, 9])) == [5, 3, 9]
+    print("   ✅ New rows assigned to lists, deleted rows never returned")
+
+    # 4. Bundles carry the index; live updates extend it
+    print("\n4. Bundle round trip and live updates...")
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        data_dir, index_dir = tmp / "data", tmp / "indexes"
+        data_dir.mkdir()
+        write_data(data_dir, [dict(r) for r in RECORDS])
+        report = build_corpus("siddha", data_dir, index_dir, encoder=FakeEncoder(), model="fake")
+        assert report["stages"]["ann"] == "rebuilt"
+        index = load_index_files(index_dir, "siddha")
+        assert index["manifest"]["ann"]["lists"] == 1 and len(index["ann"]) == 5
+
+        registry = IndexRegistry()
+        registry.register("siddha", lambda: attach(load_index_files(index_dir, "siddha"),
+                                                   load_corpus("siddha", data_dir)))
+        corpus = LiveCorpus("siddha", index_dir, data_dir, registry=registry, encoder=FakeEncoder(), model="fake")
+        registry.get("siddha")
+        corpus.add({"code": "SK13", "term": "Vikkal", "definition": "hiccups", "system": "Siddha"})
+        corpus.delete("SK10")
+        index = registry.get("siddha")
+        query = FakeEncoder().encode(["Vikkal. hiccups"])[0]
+        found, _ = index["ann"].search(index["embeddings"], query, 10)
+        assert found[0] == 5 and 3 not in found.tolist() and len(found) == 5
+        print(f"   ✅ Bundle manifest: {index['manifest']['ann']}; live row found, deleted row gone")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # 5. Sign-bit prefilter: popcount distances, recall, live rows, bundles
+    print("\n5. Binary prefilter...")
+    wide = clustered(3000, dim=256, seed=3) + 3.0     # one shared direction, like real embeddings
+    wide_queries = wide[::60] + 0.3 * np.random.default_rng(4).normal(size=(50, 256)).astype(np.float32)
+    bits = pack_signs(wide[:4] - 3.0)
+    assert bits.dtype == np.uint64 and bits.shape == (4, 4)
+    unpacked = np.unpackbits(bits.view(np.uint8), axis=1)
+    assert np.array_equal(hamming(bits, bits[0]), (unpacked != unpacked[0]).sum(axis=1))
+
+    binary = build_binary(wide, rescore=300)
+    assert isinstance(binary, BinaryIndex) and len(binary) == 3000
+    result = recall_at_k(binary, wide, wide_queries, k=10)
+    assert result["recall"] >= 0.9, result
+    found, scores = binary.search(wide, wide_queries[0], 10, rescore=3000)
+    truth, truth_scores = exact_search(wide, wide_queries[0], 10)
+    assert np.array_equal(found, truth) and np.allclose(scores, truth_scores, atol=1e-5)
+    print(f"   ✅ recall@10 {result['recall']:.3f} rescoring 300 of 3000 rows")
+
+    extra = clustered(20, dim=256, seed=5) + 3.0
+    deleted = [int(i) for i in truth[:3]]
+    live = binary.extended(3000, extra, deleted)
+    stacked = np.vstack([wide, extra])
+    assert len(live) == 3000 + 20 - 3
+    assert live.search(stacked, extra[7], 1)[0][0] == 3007
+    assert not set(live.search(stacked, wide_queries[0], 10)[0].tolist()) & set(deleted)
+    print("   ✅ Appended rows found, deleted rows never returned")
+
+    tmp = Path(tempfile.mkdtemp())
+    min_docs = ann_index.BINARY_MIN_DOCS
+    try:
+        ann_index.BINARY_MIN_DOCS = 1
+        data_dir, index_dir = tmp / "data", tmp / "indexes"
+        data_dir.mkdir()
+        write_data(data_dir, [dict(r) for r in RECORDS])
+        build_corpus("siddha", data_dir, index_dir, encoder=FakeEncoder(), model="fake")
+        index = load_index_files(index_dir, "siddha")
+        assert isinstance(index["ann"], BinaryIndex) and index["manifest"]["ann"]["kind"] == "binary"
+        query = FakeEncoder().encode(["Kasam. cough with phlegm"])[0]
+        assert index["ann"].search(index["embeddings"], query, 1)[0][0] == 3
+        print(f"   ✅ Bundle manifest: {index['manifest']['ann']}")
+    finally:
+        ann_index.BINARY_MIN_DOCS = min_docs
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n" + "=" * 70)
+    print("✅ ALL ANN INDEX TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_ann_index()
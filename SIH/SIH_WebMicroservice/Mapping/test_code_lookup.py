@@ -0,0 +1,108 @@
+"""
+Test the exact-code fast path
+Code queries must find their row ignoring case, spacing and hyphens,
+compound codes must be found by each part unless a part is too common,
+"code term" queries must only match the code's own term, ordinary text
+must never match, and a search module must put a code query's row ahead
+of the cascade's ranked results, in the same shape and without repeating
+it - also for rows added by live updates
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import search
+from code_lookup import MAX_HITS, build_code_index, code_key, code_lookup_stats, match_code
+from corpus_store import attach, load_corpus
+from index_builder import build_corpus
+from index_bundle import load_index_files
+from index_registry import registry
+from live_updates import LiveCorpus
+from test_index_builder import RECORDS, FakeEncoder, write_data
+
+
+def test_code_lookup():
+    print("=" * 70)
+    print("🧪 Testing exact-code lookup")
+    print("=" * 70)
+
+    # 1. Matching rules on a small index
+    print("\n1. Code matching...")
+    codes = ["SP42", "SP70 (EE-4.4)", "Z", "Z$", "CAC 1.1", "A-29.10"] + \
+            [f"AAB-{i} (SP9Y)" for i in range(MAX_HITS + 1)]
+    index = {
+        "codes": codes,
+        "terms": ["Jvara", "Vatavyadhi", "Zed", "Zed dollar", "Cac", "Humma"] + ["x"] * (MAX_HITS + 1),
+        "english": ["Fever", "Nervous disorder", "", "", "", ""] + [""] * (MAX_HITS + 1)
+    }
+    cases = {
+        "SP42": [0], " sp42 ": [0], "SP-42": [0], "SP70 (EE-4.4)": [1], "ee 4.4": [1], "EE-4.4": [1],
+        "sp70": [1], "Z": [2], "Z$": [3], "CAC 1.1": [4], "cac1.1": [4], "a29.10": [5],
+        "SP42 Jvara": [0], "SP42 jvara": [0], "SP42 Fever": [0], "SP70 (EE-4.4) Vatavyadhi": [1],
+        "AAB-3 (SP9Y)": [9],
+        "SP9Y": None,                    # names more than MAX_HITS rows
+        "SP42 fever with headache": None, "SP43": None, "fever": None, "jvara": None, "z": None,
+        "": None, "A-29.1": None
+    }
+    for query, expected in cases.items():
+        assert match_code(index, query, "test") == expected, (query, match_code(index, query, "test"))
+    assert code_key("SR10\xa0 (AAA-2.1)") == code_key("SR10 (AAA-2.1)")
+    assert build_code_index(["A1", "B2"], skip=[0]) == {"B2": [1]}
+    stats = code_lookup_stats()["test"]
+    assert stats["hits"] == 17 and stats["misses"] == len(cases) - 17
+    print(f"   ✅ {len(cases)} queries: {stats}")
+
+    # 2. Search module: exact row first, then the ranked results
+    print("\n2. search_siddha with a code query...")
+    tmp = Path(tempfile.mkdtemp())
+    saved_loader, saved_encode = registry.loaders.get("siddha"), search.encode_query
+    try:
+        data_dir, index_dir = tmp / "data", tmp / "indexes"
+        data_dir.mkdir()
+        write_data(data_dir, [dict(r) for r in RECORDS])
+        build_corpus("siddha", data_dir, index_dir, encoder=FakeEncoder(), model="fake")
+        registry.register("siddha", lambda: attach(load_index_files(index_dir, "siddha"),
+                                                   load_corpus("siddha", data_dir)))
+        registry.unload("siddha")
+
+        fake = FakeEncoder()
+        search.encode_query = lambda query: fake.encode([query])[0]
+        cascade = search.search_siddha("cough with phlegm")["candidates"]
+        assert fake.encoded
+
+        for query in ("SK10", "sk-10", "SK10 Kasam"):
+            hits = search.search_siddha(query)["candidates"]
+            codes = [h["code"] for h in hits]
+            assert codes[0] == "SK10" and hits[0]["score"] == 1.0
+            assert codes.count("SK10") == 1 and len(hits) == len(cascade)
+            assert set(codes[1:]) <= {c["code"] for c in RECORDS}
+            assert set(hits[0]) == set(cascade[0])
+        assert search.search_siddha("SK11")["candidates"][0]["definition"] == "No description available."
+        print(f"   ✅ Exact row first, {len(cascade) - 1} ranked results after it, keys {sorted(cascade[0])}")
+
+        # 3. Live updates: new codes found, deleted and replaced codes gone
+        print("\n3. Live updates...")
+        live = LiveCorpus("siddha", index_dir, data_dir, registry=registry, encoder=FakeEncoder(), model="fake")
+        live.add({"code": "SN99", "term": "Vali", "definition": "convulsions"})
+        live.delete("SP43")
+        live.update("SP42", {"term": "Suram (new)"})
+        assert search.search_siddha("SN99")["candidates"][0]["term"] == "Vali"
+        hits = search.search_siddha("sp42")["candidates"]
+        assert hits[0]["term"] == "Suram (new)" and hits[0]["score"] == 1.0
+        assert match_code(search.get_system("siddha"), "SP43") is None     # deleted code: no exact row
+        print("   ✅ Added / updated codes found, deleted code not")
+    finally:
+        search.encode_query = saved_encode
+        if saved_loader is not None:
+            registry.register("siddha", saved_loader)
+        registry.unload("siddha")
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n" + "=" * 70)
+    print("✅ ALL CODE LOOKUP TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_code_lookup()
@@ -0,0 +1,118 @@
+"""
+Test the shared columnar corpus store
+Autocomplete over the store must return what the old list-of-dicts
+implementation returned, corpora must be loaded once and shared, and
+indexes that do not line up with their corpus must be rejected
+"""
+
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import corpus_store
+from corpus_store import attach, get_corpus, load_corpus
+
+# Real datasets live in the CLI tree; the web tree's data/ is not checked in
+DATA_DIR = Path(__file__).resolve().parents[2] / "CLI_Version" / "SIH" / "Mapping" / "data"
+QUERIES = ["fe", "fever", "jvara", "sp", "pain", "vata", "SR1", "cough", "headache", "xq", "a"]
+
+
+def reference_autocomplete(query, dataset):
+    """The pre-store implementation, kept here as the oracle"""
+    def normalize(text):
+        return re.sub(r"[^a-zA-Z0-9 ]", "", text.lower())
+
+    query = normalize(query)
+    if len(query) < 2:
+        return []
+    results = []
+    for item in dataset:
+        if normalize(item["term"]).startswith(query) or normalize(item["code"]).startswith(query) or normalize(item["definition"]).startswith(query):
+            results.append(item)
+    if len(results) < 20:
+        for item in dataset:
+            blob = normalize(item["term"] + " " + item["code"] + " " + item["definition"])
+            if query in blob and item not in results:
+                results.append(item)
+    return results[:20]
+
+
+def reference_dataset(system):
+    with open(DATA_DIR / corpus_store.CORPORA[system]["data"], "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if system == "siddha":
+        return raw
+    return [{"code": x["tm2_code"], "term": x["english"], "definition": x["description"]} for x in raw]
+
+
+def test_corpus_store():
+    if not DATA_DIR.exists():
+        print(f"⚠️  Skipping: {DATA_DIR} not found")
+        return
+    corpus_store.DATA_DIR = DATA_DIR
+    corpus_store._corpora.clear()
+    from api.autocomplete import autocomplete_search
+
+    print("=" * 70)
+    print("🧪 Testing columnar corpus store")
+    print("=" * 70)
+
+    # 1. Autocomplete parity with the old implementation
+    print("\n1. Autocomplete matches the list-of-dicts implementation...")
+    for system in ("siddha", "ayurveda", "unani"):
+        dataset = reference_dataset(system)
+        for query in QUERIES:
+            expected = [(x["code"], x["term"], x["definition"]) for x in reference_autocomplete(query, dataset)]
+            got = [(x["code"], x["term"], x["definition"]) for x in autocomplete_search(query, system)]
+            assert got == expected, (system, query, got[:3], expected[:3])
+        print(f"   ✅ {system}: {len(QUERIES)} queries identical")
+
+    # 2. Speed: normalized forms are computed once
+    dataset = reference_dataset("ayurveda")
+    start = time.perf_counter()
+    for query in QUERIES:
+        reference_autocomplete(query, dataset)
+    old_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for query in QUERIES:
+        autocomplete_search(query, "ayurveda")
+    new_ms = (time.perf_counter() - start) * 1000
+    print(f"   ✅ ayurveda, {len(QUERIES)} queries: {old_ms:.0f} ms -> {new_ms:.0f} ms")
+
+    # 3. One shared copy; strings are interned
+    print("\n2. Sharing and interning...")
+    ayurveda = get_corpus("ayurveda")
+    assert get_corpus("ayurveda") is ayurveda
+    assert len(ayurveda) == len(dataset) and ayurveda.english is not None
+    assert get_corpus("siddha").english is None
+    fresh = load_corpus("ayurveda", DATA_DIR)
+    assert fresh.definitions[0] is ayurveda.definitions[0]
+    assert sys.intern(ayurveda.codes[5]) is ayurveda.codes[5]
+    record = ayurveda.record(0, "english")
+    assert record["term"] == dataset[0]["term"] and record["code"] == dataset[0]["code"]
+    print(f"   ✅ Corpora shared, strings interned; loaded: {sorted(corpus_store.corpus_stats())}")
+
+    # 4. Index / corpus row-count check
+    print("\n3. Rejecting indexes that do not match the corpus...")
+
+    class FakeBM25:
+        corpus_size = len(ayurveda) - 1
+
+    try:
+        attach({"bm25": FakeBM25()}, ayurveda)
+        assert False, "mismatched index should be rejected"
+    except ValueError as e:
+        print(f"   ✅ {e}")
+    FakeBM25.corpus_size = len(ayurveda)
+    index = attach({"bm25": FakeBM25()}, ayurveda)
+    assert index["codes"] is ayurveda.codes and index["english"] is ayurveda.english
+
+    print("\n" + "=" * 70)
+    print("✅ ALL CORPUS STORE TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_corpus_store()
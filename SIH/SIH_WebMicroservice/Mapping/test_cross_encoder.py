@@ -0,0 +1,84 @@
+"""
+Test the local cross-encoder reranking stage
+The top-N candidates must be scored in one batched predict call and
+re-ordered by score, top_n must bound what is scored, candidates past it
+must keep their original order, and the stage must be a no-op when off
+"""
+
+import cross_encoder
+from cross_encoder import candidate_text, cross_encoder_rerank, maybe_rerank
+
+CANDIDATES = [
+    {"code": "SP42", "term": "Suram", "definition": "fever with headache", "score": 0.71},
+    {"code": "SP43", "term": "Azhal suram", "definition": "fever with burning sensation", "score": 0.64},
+    {"code": "SK10", "term": "Kasam", "definition": "cough with phlegm", "score": 0.41},
+    {"code": "SM31", "term": "Keel vayu", "definition": "nan", "score": 0.30},
+    {"code": "SK12", "term": "Irumal", "definition": "dry cough", "score": 0.22},
+]
+
+
+class FakeCrossEncoder:
+    """CrossEncoder.predict lookalike: scores by a fixed table, records each call"""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append({"pairs": list(pairs), "batch_size": batch_size})
+        return [self.scores[text] for _, text in pairs]
+
+
+def test_cross_encoder():
+    print("=" * 70)
+    print("🧪 Testing cross-encoder reranking")
+    print("=" * 70)
+
+    texts = [candidate_text(c) for c in CANDIDATES]
+    assert texts[0] == "Suram. fever with headache" and texts[3] == "Keel vayu"
+
+    # 1. One batched call, top N re-ordered by score
+    print("\n1. Reranking the top 3...")
+    model = FakeCrossEncoder(dict(zip(texts, [0.1, 0.2, 0.9, 5.0, 7.0])))
+    reranked = cross_encoder_rerank("cough", CANDIDATES, top_n=3, model=model)
+    assert len(model.calls) == 1 and model.calls[0]["batch_size"] == 3
+    assert model.calls[0]["pairs"] == [("cough", text) for text in texts[:3]]
+    assert [c["code"] for c in reranked[:3]] == ["SK10", "SP43", "SP42"]
+    assert reranked[0]["rerank_score"] == 0.9 and reranked[0]["score"] == 0.41
+    print(f"   ✅ {[c['code'] for c in reranked]} from one predict call of 3 pairs")
+
+    # 2. The tail keeps its order and is not scored
+    print("\n2. Candidates past top_n...")
+    assert reranked[3:] == CANDIDATES[3:]
+    assert all("rerank_score" not in c for c in reranked[3:])
+    assert all("rerank_score" not in c for c in CANDIDATES)      # inputs untouched
+    print("   ✅ SM31, SK12 kept in place despite higher fake scores")
+
+    # 3. top_n bounds, including fewer than two candidates to rerank
+    print("\n3. top_n limits...")
+    model.calls.clear()
+    everything = cross_encoder_rerank("cough", CANDIDATES, top_n=10, model=model)
+    assert [c["code"] for c in everything] == ["SK12", "SM31", "SK10", "SP43", "SP42"]
+    assert model.calls[0]["batch_size"] == 5
+    model.calls.clear()
+    assert cross_encoder_rerank("cough", CANDIDATES, top_n=1, model=model) == CANDIDATES
+    assert cross_encoder_rerank("cough", [], model=model) == []
+    assert not model.calls
+    print("   ✅ top_n larger than the list scores all; fewer than two is a no-op")
+
+    # 4. Off by default: no model is loaded
+    saved = cross_encoder.ENABLED
+    try:
+        cross_encoder.ENABLED = False
+        assert maybe_rerank("cough", CANDIDATES) is CANDIDATES
+    finally:
+        cross_encoder.ENABLED = saved
+    print("   ✅ maybe_rerank is a no-op when SIH_CROSS_ENCODER is off")
+
+    print("\n" + "=" * 70)
+    print("✅ ALL CROSS-ENCODER TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_cross_encoder()
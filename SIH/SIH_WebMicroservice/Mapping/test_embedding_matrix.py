@@ -0,0 +1,149 @@
+"""
+Test normalized / quantized embedding matrices
+Stored rows must be unit length within the rounding of their dtype, the
+dot-product kernel must match cosine similarity on the float32 vectors,
+int8 rows must carry their scales through bundles, appended rows (live
+updates) must score like the rest, and reduced rows must score close to
+the full cosine through bundles and incremental builds
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from embedding_matrix import TOLERANCE, EmbeddingMatrix, cosine_scores, fit_projection, normalize_rows, quantize
+from index_builder import build_corpus
+from index_bundle import bundle_path, load_bundle, load_index_files, resolve_bundle, write_bundle
+from test_index_builder import RECORDS, FakeEncoder, write_data
+
+
+def reference_cosine(vectors, query):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    return vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+
+
+def test_embedding_matrix():
+    rng = np.random.default_rng(3)
+    vectors = (rng.normal(size=(500, 64)) + 2.0).astype(np.float32)   # shared direction, like real embeddings
+    query = rng.normal(size=64).astype(np.float32) + 2.0
+    expected = reference_cosine(vectors, query)
+    candidates = rng.choice(500, 60, replace=False)
+
+    print("=" * 70)
+    print("🧪 Testing normalized embedding matrices")
+    print("=" * 70)
+
+    # 1. Each dtype: size, rounding and scores
+    print("\n1. float32 / float16 / int8 storage...")
+    for dtype, size in (("float32", 4), ("float16", 2), ("int8", 1)):
+        matrix = EmbeddingMatrix.from_vectors(vectors, dtype)
+        assert matrix.storage_dtype == dtype and matrix.data.itemsize == size
+        assert np.abs(np.asarray(matrix) - normalize_rows(vectors)).max() <= TOLERANCE[dtype]
+        scores = cosine_scores(matrix, query, candidates)
+        assert scores.dtype == np.float32
+        error = np.abs(scores - expected[candidates]).max()
+        assert error < {"float32": 1e-6, "float16": 1e-3, "int8": 1e-2}[dtype], (dtype, error)
+        assert np.argmax(scores) == np.argmax(expected[candidates])
+        print(f"   ✅ {dtype}: {matrix.nbytes / 1024:.0f} KB, max score error {error:.1e}")
+
+    # 2. Plain float32 matrices go through the same function
+    print("\n2. Unnormalized matrices (pickled indexes)...")
+    assert np.allclose(cosine_scores(vectors, query, candidates), expected[candidates], atol=1e-6)
+    assert np.allclose(cosine_scores(vectors, query), expected, atol=1e-6)
+    print("   ✅ Same scores from raw float32 rows")
+
+    # 3. Appended rows keep the dtype and score like the base rows
+    print("\n3. Appending rows...")
+    base = EmbeddingMatrix.from_vectors(vectors[:400], "int8")
+    grown = base.appended(vectors[400:])
+    assert grown.shape == (500, 64) and grown.storage_dtype == "int8" and len(grown.scales) == 500
+    assert np.array_equal(grown.offset, base.offset)    # new rows reuse the stored offset
+    assert np.abs(grown.dot(normalize_rows(query).ravel()) - expected).max() < 1e-2
+    data, scales, offset = quantize(vectors[:2], "int8")
+    assert np.abs(data).max() == 127 and scales.shape == (2,) and offset.shape == (64,)
+    print("   ✅ Appended rows quantized the same way")
+
+    # 4. int8 bundles keep their scales; the kernel reads the mmap'd rows
+    print("\n4. int8 bundle round trip...")
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        docs = [f"doc {i} fever" for i in range(500)]
+        bm25 = BM25Okapi([d.split() for d in docs])
+        vectorizer = TfidfVectorizer()
+        tfidf = vectorizer.fit_transform(docs)
+        path = bundle_path(tmp, "siddha")
+        manifest = write_bundle(path, "siddha", {"codes": docs}, bm25, vectorizer, tfidf, vectors,
+                                embedding_dtype="int8")
+        assert manifest["embeddings"] == {"dim": 64, "dtype": "int8", "normalized": True}
+        loaded = load_bundle(path)["embeddings"]
+        assert isinstance(loaded.data, np.memmap) and loaded.scales is not None and loaded.offset is not None
+        assert np.allclose(cosine_scores(loaded, query, candidates), expected[candidates], atol=1e-2)
+        size = (resolve_bundle(path) / "embeddings.npy").stat().st_size
+        assert size < vectors.nbytes / 3
+        print(f"   ✅ {size / 1024:.0f} KB on disk vs {vectors.nbytes / 1024:.0f} KB float32")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # 5. Reduced rows: projected queries, bundles, builder option
+    print("\n5. PCA-reduced embeddings...")
+    factors = rng.normal(size=(500, 15)) @ rng.normal(size=(15, 64))
+    low_rank = (factors + 6.0 + 0.05 * rng.normal(size=(500, 64))).astype(np.float32)
+    expected = reference_cosine(low_rank, query)
+    basis = fit_projection(low_rank, 16)
+    assert basis.shape == (64, 16) and np.allclose(basis.T @ basis, np.eye(16), atol=1e-5)
+    assert np.allclose(basis[:, 0], normalize_rows(normalize_rows(low_rank).mean(axis=0)), atol=1e-5)
+    for dtype in ("float32", "int8"):
+        reduced = EmbeddingMatrix.from_vectors(low_rank, dtype, basis)
+        assert reduced.shape == (500, 64) and reduced.data.shape == (500, 16)
+        scores = cosine_scores(reduced, query)
+        assert np.abs(scores - expected).max() < 1e-2 and np.argmax(scores) == np.argmax(expected)
+        assert np.abs(reduced[[0, 1]] - normalize_rows(low_rank[:2])).max() < 1e-2
+    grown = reduced.appended(low_rank[:5])
+    assert grown.projection is basis and np.allclose(grown.dot(normalize_rows(query).ravel())[500:],
+                                                     expected[:5], atol=1e-2)
+    try:
+        fit_projection(low_rank, 64)
+        assert False, "reducing to the full dimension should be rejected"
+    except ValueError:
+        pass
+    print(f"   ✅ 64 -> 16 dims: {reduced.nbytes / 1024:.0f} KB, max score error "
+          f"{np.abs(scores - expected).max():.1e}")
+
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        path = bundle_path(tmp, "siddha")
+        manifest = write_bundle(path, "siddha", {"codes": docs}, bm25, vectorizer, tfidf, reduced,
+                                embedding_dtype="int8")
+        assert manifest["embeddings"] == {"dim": 64, "dtype": "int8", "normalized": True, "reduced_dim": 16}
+        loaded = load_bundle(path)["embeddings"]
+        assert np.array_equal(loaded.projection, basis)
+        assert np.allclose(cosine_scores(loaded, query), cosine_scores(reduced, query))
+
+        data_dir, index_dir = tmp / "data", tmp / "indexes"
+        data_dir.mkdir()
+        write_data(data_dir, [dict(r) for r in RECORDS])
+        build_corpus("siddha", data_dir, index_dir, encoder=FakeEncoder(), model="fake", embedding_dim=4)
+        encoder = FakeEncoder()
+        report = build_corpus("siddha", data_dir, index_dir, encoder=encoder, model="fake")
+        assert report["stages"]["embeddings"] == "rebuilt" and not encoder.encoded
+        assert load_index_files(index_dir, "siddha")["embeddings"].projection is None
+        build_corpus("siddha", data_dir, index_dir, encoder=encoder, model="fake", embedding_dim=4)
+        index = load_index_files(index_dir, "siddha")
+        assert index["manifest"]["embeddings"]["reduced_dim"] == 4 and not encoder.encoded
+        kasam = FakeEncoder().encode(["Kasam. cough with phlegm"])[0]
+        assert index["ann"].search(index["embeddings"], kasam, 1)[0][0] == 3
+        print("   ✅ Bundle keeps the basis; builder switches dimension from the embedding cache")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n" + "=" * 70)
+    print("✅ ALL EMBEDDING MATRIX TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_embedding_matrix()
@@ -0,0 +1,142 @@
+"""
+Test the shared embedding sidecar
+A client must get the sidecar's vectors for any batch size and from many
+threads at once, requests must share batched encodes, a sidecar serving
+another model or a missing socket must mean in-process encoding, a dead
+sidecar must fall back to the in-process model, and another process must
+encode queries through it without loading a model of its own
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import encoder
+import embedding_sidecar
+from embedding_sidecar import UNIX_SOCKETS, RemoteEmbedder, SidecarClient, connect
+from encode_batcher import MAX_BATCH
+from test_index_builder import FakeEncoder
+
+BASE_DIR = Path(__file__).parent
+
+
+def serve(path):
+    server = embedding_sidecar.EmbeddingServer(path, "torch")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_embedding_sidecar():
+    print("=" * 70)
+    print("🧪 Testing embedding sidecar")
+    print("=" * 70)
+    if not UNIX_SOCKETS:
+        print("⏭️  No UNIX sockets on this platform, skipped")
+        return
+
+    tmp = Path(tempfile.mkdtemp())
+    path = tmp / "embed.sock"
+    saved = dict(encoder._embedders)
+    fake = FakeEncoder()
+    encoder._embedders.clear()
+    encoder._embedders["torch"] = fake
+    server = serve(path)
+    try:
+        # 1. Vectors over the socket
+        print("\n1. Encoding through the sidecar...")
+        client = connect(path, model=encoder.MODEL_NAME)
+        assert client is not None and client.info["pid"] == os.getpid()
+        texts = ["fever with headache", "Jvara", "knee pain"]
+        assert np.array_equal(client.encode(texts, "torch"), FakeEncoder().encode(texts))
+        many = [f"document {i}" for i in range(MAX_BATCH + 10)]
+        assert np.array_equal(client.encode(many, "torch"), FakeEncoder().encode(many))
+        assert client.encode([], "torch").shape[0] == 0
+        print(f"   ✅ {len(texts)} queries and a {len(many)}-text batch match the model")
+
+        # 2. Concurrent clients share batches
+        print("\n2. Concurrent clients...")
+        results, barrier = {}, threading.Barrier(12)
+
+        def worker(i):
+            barrier.wait()
+            results[i] = client.encode([f"query {i}"], "torch")[0]
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i, vector in results.items():
+            assert np.array_equal(vector, FakeEncoder().encode([f"query {i}"])[0])
+        stats = client.request({"op": "info"})
+        assert stats["requests"] == 15 and stats["batching"]["torch"]["batches"] < 15
+        print(f"   ✅ 12 threads, server batch sizes {stats['batching']['torch']['batch_size_histogram']}")
+
+        # 3. Errors, other models, missing and busy sockets
+        print("\n3. Refusals...")
+        try:
+            client.encode(["x"], "tensorrt")
+            assert False, "unknown backend should fail"
+        except ValueError as e:
+            print(f"   ✅ {e}")
+        assert client.encode(["x"], "torch").shape == (1, 8)       # connection still usable
+        assert connect(path, model="another/model") is None
+        assert connect(tmp / "missing.sock") is None
+        try:
+            embedding_sidecar.EmbeddingServer(path)
+            assert False, "a second sidecar on a live socket should be refused"
+        except OSError:
+            pass
+        print("   ✅ Other model / no socket -> in-process; live socket not taken over")
+
+        # 4. Another process encodes queries without loading a model
+        print("\n4. Client process...")
+        script = ("import encoder, json; v = encoder.encode_query('Vata vyadhi'); "
+                  "print(json.dumps({'vector': v.tolist(), 'loaded': encoder.encoder_stats()['loaded']}))")
+        env = {**os.environ, "SIH_EMBED_SOCKET": str(path)}
+        out = subprocess.run([sys.executable, "-c", script], cwd=BASE_DIR, env=env,
+                             capture_output=True, text=True, timeout=120)
+        assert out.returncode == 0, out.stderr
+        reply = __import__("json").loads(out.stdout.strip().splitlines()[-1])
+        assert reply["loaded"] == []
+        assert np.allclose(reply["vector"], FakeEncoder().encode(["Vata vyadhi"])[0])
+        print("   ✅ Query encoded by the sidecar, no model loaded in the client")
+
+        # 5. Sidecar goes away: in-process fallback
+        print("\n5. Fallback...")
+        local = FakeEncoder()
+        remote = RemoteEmbedder(SidecarClient(path), "torch", lambda: local)
+        assert np.array_equal(remote.encode(["before"]), FakeEncoder().encode(["before"]))
+        server.shutdown()
+        server.server_close()
+        assert not path.exists()
+        assert np.array_equal(remote.encode("after"), FakeEncoder().encode(["after"])[0])
+        assert local.encoded == ["after"]
+        assert remote.client.failures == 1
+        print("   ✅ Encoded in-process once the sidecar stopped")
+
+        # 6. A stale socket file is replaced
+        path.touch()
+        server = serve(path)
+        assert SidecarClient(path).encode(["again"], "torch").shape == (1, 8)
+        print("   ✅ Stale socket file replaced by a new sidecar")
+    finally:
+        server.shutdown()
+        server.server_close()
+        encoder._embedders.clear()
+        encoder._embedders.update(saved)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n" + "=" * 70)
+    print("✅ ALL EMBEDDING SIDECAR TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_embedding_sidecar()
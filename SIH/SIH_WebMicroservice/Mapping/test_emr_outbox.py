@@ -0,0 +1,171 @@
+"""
+Test the durable EMR outbox against the local HAPI stand-in
+Covers immediate enqueue, background delivery, retry with backoff,
+permanent failures, idempotent redelivery after a crash and
+idempotency keys scoped to the target EMR and EMR clients that follow
+password changes
+"""
+
+import os
+import time
+import sqlite3
+import tempfile
+
+import emr_outbox
+from emr_outbox import EMROutbox, OutboxDispatcher
+from test_hapi_transaction import HAPIStandIn, start_hapi_stand_in, make_condition
+
+
+def wait_for(outbox, delivery_id, statuses, timeout=10.0):
+    """Poll the outbox like the UI does until the delivery settles"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        delivery = outbox.get_delivery(delivery_id)
+        if delivery["status"] in statuses:
+            return delivery
+        time.sleep(0.05)
+    raise AssertionError(f"delivery {delivery_id} stuck in {delivery['status']}")
+
+
+def test_outbox():
+    server, base_url = start_hapi_stand_in()
+    db_path = os.path.join(tempfile.mkdtemp(), "emr_outbox_test.db")
+
+    # Keep retries fast for the test
+    emr_outbox.BACKOFF_BASE = 0.05
+
+    outbox = EMROutbox(db_path)
+    dispatcher = OutboxDispatcher(outbox, max_attempts=4, poll_interval=0.05)
+
+    print("=" * 70)
+    print("🧪 Testing EMR outbox (local HAPI stand-in)")
+    print("=" * 70)
+
+    try:
+        # 1. Enqueue returns at once, duplicates collapse onto one delivery
+        print("\n1. Enqueueing while the dispatcher is stopped...")
+        condition = make_condition("pat-outbox", "SP42")
+        first = outbox.enqueue(condition, base_url)
+        again = outbox.enqueue(condition, base_url)
+        assert first["status"] == "pending"
+        assert first["id"] == again["id"]
+        assert "password" not in first
+        print(f"   ✅ Delivery {first['id'][:8]} queued, duplicate submit deduplicated")
+
+        # 2. Dispatcher delivers it in the background
+        print("\n2. Starting dispatcher...")
+        dispatcher.start()
+        delivered = wait_for(outbox, first["id"], {"delivered"})
+        assert delivered["resource_id"] in HAPIStandIn.resources["Condition"]
+        print(f"   ✅ Delivered as Condition/{delivered['resource_id']}")
+
+        # 3. EMR outage: two 503s, then success
+        print("\n3. Simulating a short EMR outage...")
+        HAPIStandIn.fail_next[0] = 2
+        flaky = outbox.enqueue(make_condition("pat-outbox", "FA20.0"), base_url)
+        dispatcher.wake()
+        delivered = wait_for(outbox, flaky["id"], {"delivered", "failed"})
+        assert delivered["status"] == "delivered", delivered
+        assert delivered["attempts"] == 3
+        print(f"   ✅ Delivered after {delivered['attempts']} attempts")
+
+        # 4. A 4xx is not retried
+        print("\n4. Sending to a bad endpoint...")
+        bad = outbox.enqueue(make_condition("pat-outbox", "MG26"), base_url + "/nowhere",
+                             username="superman", password="Admin123")
+        dispatcher.wake()
+        failed = wait_for(outbox, bad["id"], {"failed"})
+        assert failed["attempts"] == 1 and failed["last_status_code"] == 400
+        stored = outbox.conn.execute(
+            "SELECT username, password FROM emr_outbox WHERE id = ?", (bad["id"],)
+        ).fetchone()
+        assert tuple(stored) == (None, None)
+        print("   ✅ Marked failed without retrying, credentials cleared")
+
+        stats = outbox.get_statistics()
+        assert stats["delivered"] == 2 and stats["failed"] == 1 and stats["pending"] == 0
+        print(f"   📊 {stats}")
+
+        # 5. Crash after the EMR stored it but before we recorded it
+        print("\n5. Redelivering an item interrupted mid-flight...")
+        dispatcher.stop()
+        crashed = outbox.enqueue(make_condition("pat-outbox", "SR40"), base_url)
+        item = outbox.claim_due()[0]
+        assert outbox.recover_stale() == 0         # a live claim is not taken over
+        dispatcher._deliver(dict(item))            # EMR stores the Condition...
+        outbox.conn.execute(                       # ...but our process dies first
+            "UPDATE emr_outbox SET status = 'in_progress', claimed_at = ? WHERE id = ?",
+            (time.time() - emr_outbox.CLAIM_LEASE - 1, crashed["id"])
+        )
+        outbox.conn.commit()
+        stored = len(HAPIStandIn.resources["Condition"])
+
+        dispatcher.start()                         # recover_stale() re-queues it once the lease ran out
+        wait_for(outbox, crashed["id"], {"delivered"})
+        assert len(HAPIStandIn.resources["Condition"]) == stored
+        print("   ✅ Idempotency key prevented a duplicate Condition")
+
+        # 6. Keys are per EMR, including in a database from before that
+        print("\n6. Same idempotency key for two EMRs...")
+        legacy_path = os.path.join(tempfile.mkdtemp(), "emr_outbox_legacy.db")
+        legacy = sqlite3.connect(legacy_path)
+        legacy.execute('''
+            CREATE TABLE emr_outbox (
+                id TEXT PRIMARY KEY,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                emr_url TEXT NOT NULL,
+                username TEXT,
+                password TEXT,
+                fhir_condition TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                last_status_code INTEGER,
+                resource_id TEXT,
+                delivered_at TEXT
+            )
+        ''')
+        legacy.execute(
+            "INSERT INTO emr_outbox (id, idempotency_key, created_at, updated_at, emr_url,"
+            " fhir_condition, status, next_attempt_at) VALUES"
+            " ('old-1', 'cond-1', 'then', 'then', 'http://emr-a/fhir', '{}', 'pending', 0)"
+        )
+        legacy.commit()
+        legacy.close()
+
+        with EMROutbox(legacy_path) as scoped:
+            assert not scoped._has_global_key_constraint()
+            condition = make_condition("pat-outbox", "SP42")
+            condition["id"] = "cond-1"
+            same_emr = scoped.enqueue(condition, "http://emr-a/fhir")
+            other_emr = scoped.enqueue(condition, "http://emr-b/fhir")
+            assert same_emr["id"] == "old-1"
+            assert other_emr["id"] != "old-1"
+            assert scoped.enqueue(condition, "http://emr-b/fhir")["id"] == other_emr["id"]
+            assert scoped.get_statistics()["pending"] == 2
+        print("   ✅ Old database rebuilt, one delivery per EMR for the same key")
+
+        # 7. A changed password gets a new client, the same one is reused
+        print("\n7. EMR clients and password changes...")
+        item = {"emr_url": base_url, "username": "superman", "password": "Admin123"}
+        client = dispatcher._client(item)
+        assert dispatcher._client(dict(item)) is client
+        changed = dispatcher._client(dict(item, password="NewPass1"))
+        assert changed is not client and changed.password == "NewPass1"
+        assert dispatcher.clients[(base_url, "superman")][1] is changed    # replaced, not added
+        print("   ✅ Client rebuilt for the new password, one per endpoint and user")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL OUTBOX TESTS PASSED")
+        print("=" * 70)
+    finally:
+        dispatcher.stop()
+        outbox.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_outbox()
@@ -0,0 +1,129 @@
+"""
+Test pooled OpenMRS sessions against a local OpenMRS stand-in
+Checks that integration instances share one login, that the session is
+renewed only when it expires, that encounters are reused per patient and
+that a request with other credentials does not replace a pooled session
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from emr_session_pool import get_session, pool_stats, clear_pool
+from emr_integration_obs import BahmniObservationIntegration
+
+
+class OpenMRSStandIn(BaseHTTPRequestHandler):
+    calls = []
+    sessions = set()
+    next_id = [0]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, cookie=None):
+        payload = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if cookie:
+            self.send_header("Set-Cookie", f"JSESSIONID={cookie}; Path=/")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _has_session(self):
+        cookie = self.headers.get("Cookie", "")
+        return any(f"JSESSIONID={s}" in cookie for s in self.sessions)
+
+    def _new_uuid(self):
+        self.next_id[0] += 1
+        return f"uuid-{self.next_id[0]}"
+
+    def do_GET(self):
+        self.calls.append(("GET", self.path))
+        if self.path.startswith("/openmrs/ws/rest/v1/session"):
+            if not self.headers.get("Authorization"):
+                return self._send(401)
+            session_id = self._new_uuid()
+            self.sessions.add(session_id)
+            return self._send(200, {"authenticated": True}, cookie=session_id)
+        if not self._has_session():
+            return self._send(401)
+        return self._send(200, {"results": []})
+
+    def do_POST(self):
+        self.calls.append(("POST", self.path))
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if not self._has_session():
+            return self._send(401)
+        return self._send(201, {"uuid": self._new_uuid()})
+
+
+def count(method, prefix):
+    return sum(1 for m, p in OpenMRSStandIn.calls if m == method and p.startswith(prefix))
+
+
+def test_session_pool():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenMRSStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    clear_pool()
+
+    print("=" * 70)
+    print("🧪 Testing pooled OpenMRS sessions (local stand-in)")
+    print("=" * 70)
+
+    try:
+        # 1. Several integration instances (one per API request) log in once
+        print("\n1. Sending diagnoses through 3 separate instances...")
+        for code in ("SP42", "FA20.0", "MG26"):
+            bahmni = BahmniObservationIntegration(base_url, "superman", "Admin123")
+            result = bahmni.send_diagnosis("pat-1", code, "Test", "siddha", "S1", "Term")
+            assert result["success"], result
+        assert count("GET", "/openmrs/ws/rest/v1/session") == 1
+        print("   ✅ 1 authentication for 3 instances")
+
+        # 2. One encounter for the consultation, one obs per diagnosis
+        assert count("POST", "/openmrs/ws/rest/v1/encounter") == 1
+        assert count("POST", "/openmrs/ws/rest/v1/obs") == 3
+        print("   ✅ Encounter reused, 3 observations recorded")
+
+        # 3. Server-side expiry -> transparent re-auth and retry
+        print("\n2. Expiring the session on the server...")
+        OpenMRSStandIn.sessions.clear()
+        result = bahmni.send_diagnosis("pat-1", "SR40", "Test", "siddha", "S2", "Term")
+        assert result["success"], result
+        assert count("GET", "/openmrs/ws/rest/v1/session") == 2
+        print("   ✅ Re-authenticated once and retried")
+
+        # 4. Client-side TTL expiry renews before the next request
+        print("\n3. Letting the session TTL lapse...")
+        client = get_session(base_url, "superman", "Admin123")
+        client.authenticated_at -= client.session_ttl
+        bahmni.get_patient_observations("pat-1")
+        assert count("GET", "/openmrs/ws/rest/v1/session") == 3
+        print("   ✅ Renewed on expiry")
+
+        # 5. A wrong password gets its own client, the good one stays pooled
+        print("\n4. Requesting a session with another password...")
+        other = get_session(base_url, "superman", "wrong")
+        assert other is not client
+        assert get_session(base_url, "superman", "Admin123") is client
+        assert client.is_authenticated()
+        print("   ✅ Pooled session kept, mismatched credentials isolated")
+
+        stats = pool_stats()[f"superman@{base_url}"]
+        assert stats["cache_hits"] >= 3
+        print(f"   📊 {stats}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL SESSION POOL TESTS PASSED")
+        print("=" * 70)
+    finally:
+        clear_pool()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_session_pool()
@@ -0,0 +1,120 @@
+"""
+Test the micro-batching query encoder
+Concurrent callers must share batched encode calls and each get the
+vector of its own query; batches must respect the size limit, repeated
+queries must be encoded once, an encoder error must reach every caller of
+its batch without stopping the worker, and the histograms must add up
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from encode_batcher import QueryBatcher
+
+
+class SlowEncoder:
+    """Vector = [len(text), first char code]; each call takes `delay` seconds"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        if any(t == "boom" for t in texts):
+            raise RuntimeError("encoder failed")
+        return np.array([[len(t), ord(t[0])] for t in texts], dtype=np.float32)
+
+
+def concurrent(batcher, queries):
+    """Encode each query on its own thread, all released at once"""
+    results, errors = [None] * len(queries), [None] * len(queries)
+    barrier = threading.Barrier(len(queries))
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = batcher.encode(queries[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(queries))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_encode_batcher():
+    print("=" * 70)
+    print("🧪 Testing micro-batching query encoder")
+    print("=" * 70)
+
+    # 1. Concurrent callers share forward passes
+    print("\n1. 16 concurrent queries...")
+    encoder = SlowEncoder()
+    batcher = QueryBatcher(encoder.encode, window_ms=5, max_batch=32)
+    queries = [f"{chr(97 + i)} query {'x' * i}" for i in range(16)]
+    results, errors = concurrent(batcher, queries)
+    assert not any(errors)
+    for query, vector in zip(queries, results):
+        assert np.array_equal(vector, [len(query), ord(query[0])])
+    assert len(encoder.calls) <= 3, encoder.calls
+    print(f"   ✅ {len(encoder.calls)} encode call(s), sizes {[len(c) for c in encoder.calls]}")
+
+    # 2. Batch size limit and repeated queries
+    print("\n2. Size limit and duplicates...")
+    encoder = SlowEncoder()
+    batcher = QueryBatcher(encoder.encode, window_ms=5, max_batch=8)
+    results, _ = concurrent(batcher, [f"q{i % 10}" for i in range(40)])
+    assert max(len(c) for c in encoder.calls) <= 8
+    assert all(len(c) == len(set(c)) for c in encoder.calls)
+    assert all(np.array_equal(v, [2, ord("q")]) for v in results)
+    stats = batcher.get_statistics()
+    assert stats["queries"] == 40 and stats["encoded"] == sum(len(c) for c in encoder.calls)
+    assert sum(stats["batch_size_histogram"].values()) == stats["batches"] == len(encoder.calls)
+    assert sum(int(size) * n for size, n in stats["batch_size_histogram"].items()) == 40
+    assert sum(stats["queue_wait_ms_histogram"].values()) == 40
+    print(f"   ✅ Batch sizes {stats['batch_size_histogram']}, {stats['encoded']} texts encoded for 40 queries")
+
+    # 3. A lone query waits at most the window
+    print("\n3. Lone query latency...")
+    encoder = SlowEncoder(delay=0)
+    batcher = QueryBatcher(encoder.encode, window_ms=5)
+    start = time.perf_counter()
+    batcher.encode("alone")
+    elapsed = (time.perf_counter() - start) * 1000
+    assert elapsed < 50 and encoder.calls == [["alone"]]
+    zero = QueryBatcher(SlowEncoder(delay=0).encode, window_ms=0)
+    assert np.array_equal(zero.encode("now"), [3, ord("n")])
+    print(f"   ✅ {elapsed:.1f} ms with a 5 ms window")
+
+    # 4. Errors reach their batch; the worker keeps going
+    print("\n4. Encoder errors...")
+    encoder = SlowEncoder()
+    batcher = QueryBatcher(encoder.encode, window_ms=20)
+    results, errors = concurrent(batcher, ["boom", "fine", "also fine"])
+    failed = [e for e in errors if e is not None]
+    assert failed and all(isinstance(e, RuntimeError) for e in failed)
+    assert np.array_equal(batcher.encode("later"), [5, ord("l")])
+    assert batcher.get_statistics()["errors"] >= 1
+    print(f"   ✅ {len(failed)} caller(s) got the error, next query encoded")
+
+    # 5. Stop and restart
+    batcher.stop()
+    assert batcher._thread is None
+    assert np.array_equal(batcher.encode("again"), [5, ord("a")])
+    batcher.stop()
+    print("   ✅ Worker stops and restarts on the next query")
+
+    print("\n" + "=" * 70)
+    print("✅ ALL ENCODE BATCHER TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_encode_batcher()
@@ -0,0 +1,68 @@
+"""
+Test paged FHIR condition retrieval against the local HAPI stand-in
+Checks that every page is followed, that the next page is prefetched,
+and that several patients can be fetched concurrently
+"""
+
+import time
+
+import fhir_paging
+from emr_integration_hapi import BahmniIntegration
+from test_hapi_transaction import HAPIStandIn, start_hapi_stand_in, make_condition
+
+
+def test_paging():
+    server, base_url = start_hapi_stand_in()
+
+    print("=" * 70)
+    print("🧪 Testing paged FHIR search (local HAPI stand-in)")
+    print("=" * 70)
+
+    try:
+        hapi = BahmniIntegration(base_url=base_url)
+        for pid, n in (("pat-a", 25), ("pat-b", 7), ("pat-c", 0)):
+            if n:
+                hapi.send_fhir_conditions([make_condition(pid, f"X{i}") for i in range(n)])
+
+        # 1. All pages are followed
+        print("\n1. Streaming 25 conditions in pages of 10...")
+        HAPIStandIn.requests_seen.clear()
+        ids = [c["id"] for c in hapi.iter_patient_conditions("pat-a", page_size=10)]
+        pages = [p for m, p in HAPIStandIn.requests_seen if m == "GET"]
+        assert len(ids) == len(set(ids)) == 25
+        assert len(pages) == 3, pages
+        print(f"   ✅ 25 conditions over {len(pages)} pages")
+
+        # 2. The next page is requested before the current one is consumed
+        print("\n2. Checking prefetch...")
+        HAPIStandIn.requests_seen.clear()
+        server_id = hapi._patient_reference("pat-a").replace("Patient/", "")
+        stream = fhir_paging.iter_search_pages(
+            hapi.session, f"{base_url}/Condition", {"patient": server_id}, page_size=10
+        )
+        next(stream)
+        time.sleep(0.2)
+        assert len(HAPIStandIn.requests_seen) == 2
+        stream.close()
+        print("   ✅ Page 2 fetched while page 1 was being processed")
+
+        # 3. Bundle-shaped result is unchanged for existing callers
+        bundle = hapi.get_patient_conditions("pat-a", page_size=10)
+        assert bundle["total"] == 25 and len(bundle["entry"]) == 25
+
+        # 4. Several patients, bounded concurrency
+        print("\n3. Fetching 3 patients concurrently...")
+        results = hapi.get_conditions_for_patients(["pat-a", "pat-b", "pat-c"], max_workers=2)
+        counts = {pid: len(r["resources"]) for pid, r in results.items()}
+        assert counts == {"pat-a": 25, "pat-b": 7, "pat-c": 0}, counts
+        print(f"   ✅ {counts}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL PAGING TESTS PASSED")
+        print("=" * 70)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_paging()
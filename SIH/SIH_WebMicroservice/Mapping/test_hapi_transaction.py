@@ -0,0 +1,245 @@
+"""
+Test FHIR transaction-bundle submission against a local HAPI stand-in
+Verifies that many Conditions go out in one request, that missing patients
+are PUT under their own ID (the same one ensure_patient_exists uses), that
+existing ones are found instead of overwritten, that known patients are
+cached and that absolute response locations are understood
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from emr_integration_hapi import BahmniIntegration, PATIENT_IDENTIFIER_SYSTEM
+
+
+# -------------------------------------------------------------
+# Minimal HAPI FHIR stand-in (just what BahmniIntegration uses)
+# -------------------------------------------------------------
+class HAPIStandIn(BaseHTTPRequestHandler):
+    resources = {"Patient": {}, "Condition": {}}
+    requests_seen = []
+    next_id = [1000]
+    fail_next = [0]  # answer this many POSTs with 503 (outage simulation)
+    location_base = [""]  # prefix for transaction-response locations, e.g. the server URL
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None):
+        payload = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/fhir+json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _create(self, resource_type, resource, resource_id=None):
+        if resource_id is None:
+            self.next_id[0] += 1
+            resource_id = str(self.next_id[0])
+        resource = dict(resource, id=resource_id)
+        self.resources[resource_type][resource_id] = resource
+        return resource
+
+    def _find_by_identifier(self, resource_type, query):
+        # "identifier=system|value"
+        system, value = query.split("=", 1)[1].split("|", 1)
+        for resource in self.resources[resource_type].values():
+            for ident in resource.get("identifier", []):
+                if ident.get("system") == system and ident.get("value") == value:
+                    return resource
+        return None
+
+    def do_GET(self):
+        self.requests_seen.append(("GET", self.path))
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")[1:]  # drop "fhir"
+
+        if len(parts) == 2 and parts[1] in self.resources.get(parts[0], {}):
+            return self._send(200, self.resources[parts[0]][parts[1]])
+        if parts == ["Patient"]:
+            ids = parse_qs(url.query).get("_id", [""])[0].split(",")
+            found = [self.resources["Patient"][i] for i in ids if i in self.resources["Patient"]]
+            return self._send(200, {"resourceType": "Bundle", "type": "searchset",
+                                    "entry": [{"resource": p} for p in found]})
+        if parts == ["Condition"]:
+            query = parse_qs(url.query)
+            patient = query.get("patient", [""])[0]
+            matches = [
+                c for c in self.resources["Condition"].values()
+                if c["subject"]["reference"] == f"Patient/{patient}"
+            ]
+            # Paging: _count per page, _offset into the result set
+            count = int(query.get("_count", [len(matches) or 1])[0])
+            offset = int(query.get("_offset", ["0"])[0])
+            links = []
+            if offset + count < len(matches):
+                links.append({
+                    "relation": "next",
+                    "url": f"Condition?patient={patient}&_count={count}&_offset={offset + count}"
+                })
+            return self._send(200, {
+                "resourceType": "Bundle",
+                "type": "searchset",
+                "total": len(matches),
+                "link": links,
+                "entry": [{"resource": c} for c in matches[offset:offset + count]]
+            })
+        return self._send(404, {"resourceType": "OperationOutcome"})
+
+    def do_PUT(self):
+        self.requests_seen.append(("PUT", self.path))
+        parts = urlparse(self.path).path.strip("/").split("/")[1:]
+        if len(parts) != 2 or parts[0] not in self.resources:
+            return self._send(400, {"resourceType": "OperationOutcome"})
+        resource = self._create(parts[0], self._read_json(), parts[1])
+        return self._send(201, resource)
+
+    def do_POST(self):
+        self.requests_seen.append(("POST", self.path))
+        parts = urlparse(self.path).path.strip("/").split("/")[1:]
+        body = self._read_json()
+
+        if self.fail_next[0] > 0:
+            self.fail_next[0] -= 1
+            return self._send(503, {"resourceType": "OperationOutcome"})
+
+        if parts == ["Condition"]:
+            if_none_exist = self.headers.get("If-None-Exist")
+            existing = if_none_exist and self._find_by_identifier("Condition", if_none_exist)
+            if existing:
+                return self._send(200, existing)
+            return self._send(201, self._create("Condition", body))
+
+        if parts == [] and body.get("type") == "transaction":
+            resolved = {}
+            response_entries = []
+            for entry in body["entry"]:
+                resource = entry["resource"]
+                request = entry["request"]
+                if request["method"] == "PUT":
+                    resource_type, resource_id = request["url"].split("/")
+                    created = self._create(resource_type, resource, resource_id)
+                    status = "201 Created"
+                else:
+                    ref = resource["subject"]["reference"]
+                    resource["subject"]["reference"] = resolved.get(ref, ref)
+                    created = self._create(resource["resourceType"], resource)
+                    status = "201 Created"
+                resolved[entry["fullUrl"]] = f"{resource['resourceType']}/{created['id']}"
+                response_entries.append({"response": {
+                    "status": status,
+                    "location": f"{self.location_base[0]}{resource['resourceType']}/{created['id']}/_history/1"
+                }})
+            return self._send(200, {
+                "resourceType": "Bundle",
+                "type": "transaction-response",
+                "entry": response_entries
+            })
+
+        return self._send(400, {"resourceType": "OperationOutcome"})
+
+
+def make_condition(patient_id, code):
+    return {
+        "resourceType": "Condition",
+        "id": f"local-{code}",
+        "code": {"coding": [{"system": "http://id.who.int/icd/release/11/mms", "code": code}]},
+        "subject": {"reference": f"Patient/{patient_id}"}
+    }
+
+
+def start_hapi_stand_in():
+    """Start the stand-in on a free port. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HAPIStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/fhir"
+
+
+def test_transaction_submission():
+    """Send an encounter's diagnoses in one transaction and check the cache"""
+    server, base_url = start_hapi_stand_in()
+
+    print("=" * 70)
+    print("🧪 Testing FHIR transaction submission (local HAPI stand-in)")
+    print("=" * 70)
+
+    try:
+        hapi = BahmniIntegration(base_url=base_url)
+
+        # 1. Three diagnoses for a new patient -> one request
+        print("\n1. Sending 3 conditions for a new patient...")
+        result = hapi.send_fhir_conditions([
+            make_condition("pat-1", code) for code in ("SP42", "FA20.0", "MG26")
+        ])
+        assert result.get("success"), result
+        assert len(result["resource_ids"]) == 3
+        assert [m for m, _ in HAPIStandIn.requests_seen] == ["GET", "POST"]   # patient search + transaction
+        assert list(HAPIStandIn.resources["Patient"]) == ["pat-1"]
+        print(f"   ✅ 3 conditions, 1 patient, {len(HAPIStandIn.requests_seen)} requests")
+
+        # 2. Patient is now cached -> no patient entry in the next bundle
+        print("\n2. Sending again for the same patient...")
+        bundle = hapi.build_transaction_bundle([make_condition("pat-1", "SR40")])
+        assert [e["request"]["url"] for e in bundle["entry"]] == ["Condition"]
+        result = hapi.send_fhir_conditions([make_condition("pat-1", "SR40")])
+        assert result.get("success"), result
+        print("   ✅ Patient served from cache, no patient entry needed")
+
+        # 3. A fresh client (as /emr/send creates per request) shares the cache
+        print("\n3. New client instance, same server...")
+        fresh = BahmniIntegration(base_url=base_url)
+        assert "pat-1" in fresh.known_patients
+        before = len(HAPIStandIn.requests_seen)
+        fresh.send_fhir_condition(make_condition("pat-1", "1A00"))
+        assert len(HAPIStandIn.requests_seen) == before + 1  # POST only, no GET/PUT
+        print("   ✅ Single-condition path skips the patient GET/PUT")
+
+        # 4. Patients the cache does not know (e.g. after a restart) are found, not re-created
+        print("\n4. Existing patients unknown to the cache...")
+        fresh.known_patients.clear()
+        fresh.send_fhir_condition(make_condition("pat-2", "SP42"))      # single path PUTs Patient/pat-2
+        HAPIStandIn.resources["Patient"]["pat-1"]["name"] = [{"text": "Real Name"}]
+        fresh.known_patients.clear()
+        result = fresh.send_fhir_conditions([make_condition(p, "SP43") for p in ("pat-1", "pat-2")])
+        assert result.get("success"), result
+        assert sorted(HAPIStandIn.resources["Patient"]) == ["pat-1", "pat-2"]
+        assert HAPIStandIn.resources["Patient"]["pat-1"]["name"] == [{"text": "Real Name"}]
+        print("   ✅ Same patient IDs on both paths, existing patients not overwritten")
+
+        # 5. Everything is retrievable for the patient
+        print("\n5. Fetching the patient's conditions...")
+        conditions = fresh.get_patient_conditions("pat-1")
+        assert conditions["total"] == 6, conditions
+        patient = HAPIStandIn.resources["Patient"]["pat-1"]
+        assert patient["identifier"][0]["system"] == PATIENT_IDENTIFIER_SYSTEM
+        print(f"   ✅ {conditions['total']} conditions linked to the patient")
+
+        # 6. Servers may answer with absolute locations
+        print("\n6. Absolute transaction-response locations...")
+        HAPIStandIn.location_base[0] = base_url + "/"
+        try:
+            fresh.known_patients.clear()
+            result = fresh.send_fhir_conditions([make_condition("pat-3", "SP42")])
+        finally:
+            HAPIStandIn.location_base[0] = ""
+        assert result.get("success"), result
+        assert result["resource_ids"][0] in HAPIStandIn.resources["Condition"]
+        assert fresh.known_patients["pat-3"] == "Patient/pat-3"
+        print(f"   ✅ {base_url}/Condition/{result['resource_ids'][0]}/_history/1 read correctly")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL TRANSACTION TESTS PASSED")
+        print("=" * 70)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_transaction_submission()
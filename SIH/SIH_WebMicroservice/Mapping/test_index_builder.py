@@ -0,0 +1,173 @@
+"""
+Test the incremental index builder
+A rebuild must re-encode only changed documents, carry over stages whose
+inputs are unchanged, and produce bundles the search modules can load.
+Length-bucketed encoding must keep row order, and parallel builds must
+produce the same bundles as serial ones
+"""
+
+import json
+import shutil
+import tempfile
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from corpus_store import attach, load_corpus
+from embedding_matrix import TOLERANCE
+from index_builder import (CACHE_NAME, build_all, build_corpus, build_docs, encode_bucketed,
+                           length_buckets)
+from index_bundle import bundle_path, load_bundle, load_index_files, resolve_bundle
+
+RECORDS = [
+    {"code": "SP42", "term": "Suram", "definition": "fever with headache", "system": "Siddha"},
+    {"code": "SP43", "term": "Azhal suram", "definition": "fever with burning sensation", "system": "Siddha"},
+    {"code": "SM31", "term": "Keel vayu", "definition": "joint pain and swelling", "system": "Siddha"},
+    {"code": "SK10", "term": "Kasam", "definition": "cough with phlegm", "system": "Siddha"},
+    {"code": "SK11", "term": "Iraippu", "definition": "", "system": "Siddha"},
+]
+
+
+class FakeEncoder:
+    """Deterministic 8-d vectors from the text hash; counts what it encodes"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False):
+        self.encoded.extend(texts)
+        return np.array([
+            np.frombuffer(hashlib.sha256(t.encode()).digest()[:8], dtype=np.uint8) / 255.0
+            for t in texts
+        ], dtype=np.float32)
+
+
+def write_data(data_dir: Path, records):
+    with open(data_dir / "siddha_clean.json", "w", encoding="utf-8") as f:
+        json.dump(records, f)
+
+
+def test_index_builder():
+    tmp = Path(tempfile.mkdtemp())
+    data_dir, index_dir = tmp / "data", tmp / "indexes"
+    data_dir.mkdir()
+    records = [dict(r) for r in RECORDS]
+    write_data(data_dir, records)
+
+    def build(**kwargs):
+        encoder = FakeEncoder()
+        report = build_corpus("siddha", data_dir, index_dir, encoder=encoder, model="fake", **kwargs)
+        return report, encoder
+
+    print("=" * 70)
+    print("🧪 Testing incremental index builder")
+    print("=" * 70)
+
+    try:
+        # 1. First build encodes everything and matches a direct BM25 fit
+        print("\n1. Full build...")
+        report, encoder = build()
+        assert len(encoder.encoded) == 5 and set(report["stages"].values()) == {"rebuilt"}
+        docs = build_docs(load_corpus("siddha", data_dir))
+        assert docs[0] == "Suram. fever with headache" and docs[4] == "Iraippu"
+        index = attach(load_index_files(index_dir, "siddha"), load_corpus("siddha", data_dir))
+        tokens = "fever headache".split()
+        expected = BM25Okapi([d.lower().split() for d in docs]).get_scores(tokens)
+        assert np.allclose(index["bm25"].get_scores(tokens), expected)
+        assert index["manifest"]["build"]["model"] == "fake"
+        first = np.array(index["embeddings"])
+        print(f"   ✅ {report['docs']} docs encoded, bundle loads through load_index_files")
+
+        # 2. Nothing changed: no encoder call, bundle untouched
+        print("\n2. Rebuild with no changes...")
+        mtime = (resolve_bundle(bundle_path(index_dir, "siddha")) / "manifest.json").stat().st_mtime_ns
+        report, encoder = build()
+        assert report["up_to_date"] and not encoder.encoded
+        assert (resolve_bundle(bundle_path(index_dir, "siddha")) / "manifest.json").stat().st_mtime_ns == mtime
+        print("   ✅ Up to date, nothing rewritten")
+
+        # 3. One definition fixed: one document encoded, the rest from the cache
+        print("\n3. Small data fix...")
+        records[2]["definition"] = "joint pain, swelling and stiffness"
+        write_data(data_dir, records)
+        report, encoder = build()
+        assert encoder.encoded == ["Keel vayu. joint pain, swelling and stiffness"]
+        assert report["embeddings"] == {"cached": 4, "reused": 0, "encoded": 1}
+        assert report["stages"]["bm25"] == "rebuilt" and report["stages"]["columns"] == "rebuilt"
+        index = load_bundle(bundle_path(index_dir, "siddha"))
+        # cached vectors, requantized against the corpus's new int8 offset
+        assert np.allclose(index["embeddings"][[0, 1, 3, 4]], first[[0, 1, 3, 4]],
+                           atol=2 * TOLERANCE[index["embeddings"].storage_dtype])
+        assert not np.array_equal(index["embeddings"][2], first[2])
+        print(f"   ✅ {report['embeddings']}")
+
+        # 4. Code-only change: document text unchanged, only the columns stage reruns
+        print("\n4. Code-only change...")
+        records[4]["code"] = "SK12"
+        write_data(data_dir, records)
+        report, encoder = build()
+        assert report["stages"] == {"columns": "rebuilt", "bm25": "reused",
+                                    "tfidf": "reused", "embeddings": "reused", "ann": "reused"}
+        assert not encoder.encoded
+        index = load_bundle(bundle_path(index_dir, "siddha"))
+        assert index["codes"][4] == "SK12"
+        docs = build_docs(load_corpus("siddha", data_dir))
+        expected = BM25Okapi([d.lower().split() for d in docs]).get_scores(tokens)
+        assert np.allclose(index["bm25"].get_scores(tokens), expected)
+        print(f"   ✅ Stages: {report['stages']}")
+
+        # 5. Lost cache: unchanged documents are taken from a previous float32 bundle
+        print("\n5. Forced rebuild without the embedding cache...")
+        report, encoder = build(embedding_dtype="float32")
+        assert report["stages"]["embeddings"] == "rebuilt" and not encoder.encoded
+        (index_dir / CACHE_NAME).unlink()
+        records.append({"code": "SK13", "term": "Vikkal", "definition": "hiccups", "system": "Siddha"})
+        write_data(data_dir, records)
+        report, encoder = build(force=True, embedding_dtype="float32")
+        assert report["embeddings"] == {"cached": 0, "reused": 5, "encoded": 1}
+        assert encoder.encoded == ["Vikkal. hiccups"]
+        assert load_bundle(bundle_path(index_dir, "siddha"))["manifest"]["doc_count"] == 6
+        print(f"   ✅ {report['embeddings']}")
+
+        # 6. Length buckets: token budget respected, rows returned in input order
+        print("\n6. Length-bucketed encoding...")
+        lengths = [3, 40, 5, 12, 40, 3, 80, 7]
+        batches = length_buckets(lengths, tokens_per_batch=100, max_batch=3)
+        assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+        assert all(len(b) * max(lengths[i] for i in b) <= 100 or len(b) == 1 for b in batches)
+        assert all(len(b) <= 3 for b in batches) and batches[0] == [0, 5, 2]
+        texts = [" ".join(["word"] * n) + f" {i}" for i, n in enumerate(lengths)]
+        vectors, stats = encode_bucketed(FakeEncoder(), texts, tokens_per_batch=100, max_batch=3)
+        assert np.array_equal(vectors, FakeEncoder().encode(texts))
+        assert stats["batches"] == len(batches) and 0 < stats["padding_efficiency"] <= 1
+        print(f"   ✅ {len(texts)} texts in {stats['batches']} batches, "
+              f"{stats['padding_efficiency']:.0%} of padded tokens real")
+
+        # 7. Parallel workers produce the same bundles as the serial build
+        print("\n7. Parallel build of two corpora...")
+        with open(data_dir / "icd11_tm_codes.json", "w", encoding="utf-8") as f:
+            json.dump([{"code": "SK25", "title": "Fever disorder", "definition": "raised temperature"},
+                       {"code": "SK26", "title": "Cough disorder", "definition": ""}], f)
+        parallel_dir = tmp / "parallel"
+        results = dict(build_all(["siddha", "icd_tm2"], workers=2, threads=1, data_dir=data_dir,
+                                 index_dir=parallel_dir, encoder=FakeEncoder(), model="fake",
+                                 embedding_dtype="float32"))
+        assert not any(isinstance(r, Exception) for r in results.values()), results
+        assert results["icd_tm2"]["encode"]["docs_per_sec"] > 0
+        serial = load_bundle(bundle_path(index_dir, "siddha"))
+        parallel = load_bundle(bundle_path(parallel_dir, "siddha"))
+        assert np.allclose(serial["embeddings"], parallel["embeddings"], atol=1e-6)
+        assert list(parallel["codes"]) == list(serial["codes"])
+        print("   ✅ siddha + icd_tm2 built in 2 workers, embeddings identical to serial")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL INDEX BUILDER TESTS PASSED")
+        print("=" * 70)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_index_builder()
@@ -0,0 +1,124 @@
+"""
+Test the binary index bundle format
+A bundle written from fitted BM25Okapi / TfidfVectorizer objects must load
+without pickle, memory-map its arrays and reproduce the original scores
+"""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from embedding_matrix import TOLERANCE, normalize_rows
+from index_bundle import (CURRENT, FORMAT_VERSION, MANIFEST, bundle_exists, bundle_path,
+                          load_bundle, prune_versions, read_manifest, resolve_bundle, write_bundle)
+from index_registry import estimate_size, measure_index
+
+CODES = ["SP42", "SP43", "SM31", "SK10", "EA12"]
+TERMS = ["Suram", "Azhal suram", "Keel vayu", "Kasam", "Jvara - café"]
+DEFS = ["fever with headache", "fever with burning sensation", "joint pain and swelling",
+        "cough with phlegm", ""]
+
+
+def build_corpus():
+    docs = [f"{c}. {t}. {d}" if d else f"{c}. {t}" for c, t, d in zip(CODES, TERMS, DEFS)]
+    bm25 = BM25Okapi([doc.lower().split() for doc in docs])
+    vectorizer = TfidfVectorizer(stop_words="english")
+    tfidf_matrix = vectorizer.fit_transform(docs)
+    embeddings = np.random.default_rng(7).random((len(docs), 16)).astype(np.float32)
+    return bm25, vectorizer, tfidf_matrix, embeddings
+
+
+def test_index_bundle():
+    tmp = Path(tempfile.mkdtemp())
+    bm25, vectorizer, tfidf_matrix, embeddings = build_corpus()
+
+    print("=" * 70)
+    print("🧪 Testing binary index bundles")
+    print("=" * 70)
+
+    try:
+        # 1. Write
+        print("\n1. Writing bundle...")
+        path = bundle_path(tmp, "siddha")
+        manifest = write_bundle(path, "siddha", {"codes": CODES, "terms": TERMS, "defs": DEFS},
+                                bm25, vectorizer, tfidf_matrix, embeddings)
+        assert bundle_exists(tmp, "siddha") and manifest["doc_count"] == 5
+        version = resolve_bundle(path)
+        assert version.parent == path and (path / CURRENT).read_text() == version.name
+        assert not list(version.glob("*.pkl"))
+        print(f"   ✅ {len(list(version.iterdir()))} files in {version.name}, no pickles")
+
+        # 2. Load and compare
+        print("\n2. Loading and checking parity...")
+        index = load_bundle(path)
+        assert list(index["codes"]) == CODES and index["terms"][4] == "Jvara - café"
+        assert index["defs"][-1] == "" and index["codes"][-1] == "EA12"
+
+        for query in ["fever headache", "swelling of joints", "unknownword", "fever fever"]:
+            tokens = query.lower().split()
+            assert np.allclose(index["bm25"].get_scores(tokens), bm25.get_scores(tokens)), query
+            expected = vectorizer.transform([query]).toarray()
+            assert np.allclose(index["tfidf_vectorizer"].transform([query]).toarray(), expected)
+        assert abs(index["tfidf_matrix"] - tfidf_matrix).max() < 1e-12
+        stored = index["embeddings"]
+        assert np.allclose(stored[[0, 3]], normalize_rows(embeddings[[0, 3]]), atol=TOLERANCE[stored.storage_dtype])
+        print("   ✅ BM25, TF-IDF and embeddings match the fitted objects")
+
+        # 3. Arrays are memory-mapped, not copied onto the heap
+        assert isinstance(index["embeddings"].data, np.memmap)
+        assert estimate_size(index["embeddings"].data) == 0
+        assert estimate_size(index["tfidf_matrix"]) == 0
+        resident, mapped = measure_index(index)
+        files = sum(f.stat().st_size for f in resolve_bundle(path).glob("*") if f.suffix in (".npy", ".utf8"))
+        assert index["embeddings"].data.nbytes < mapped <= files
+        print(f"   ✅ Embeddings and CSR matrices are memory-mapped "
+              f"({resident} B heap, {mapped} B mapped)")
+
+        # 4. Rewriting publishes a new version; the mapped one stays until pruned
+        write_bundle(path, "siddha", {"codes": CODES, "terms": TERMS, "defs": DEFS},
+                     bm25, vectorizer, tfidf_matrix, embeddings[::-1])
+        assert np.allclose(load_bundle(path)["embeddings"][[0]], normalize_rows(embeddings[[-1]]), atol=1e-3)
+        assert resolve_bundle(path) != version and version.exists()
+        assert list(index["codes"]) == CODES          # old version still readable
+        write_bundle(path, "siddha", {"codes": CODES, "terms": TERMS, "defs": DEFS},
+                     bm25, vectorizer, tfidf_matrix, embeddings)
+        assert not version.exists()                   # older than the previous one: pruned
+        assert prune_versions(path) == 1
+        assert sorted(p.name for p in path.iterdir()) == [CURRENT, resolve_bundle(path).name]
+        assert [p.name for p in tmp.iterdir()] == ["siddha.bundle"]
+        print("   ✅ Pointer swapped, old versions pruned, no temp directories left")
+
+        # 5. Version and shape checks
+        print("\n3. Rejecting bad bundles...")
+        with open(resolve_bundle(path) / MANIFEST) as f:
+            stored = json.load(f)
+        stored["version"] = FORMAT_VERSION + 1
+        with open(resolve_bundle(path) / MANIFEST, "w") as f:
+            json.dump(stored, f)
+        try:
+            read_manifest(path)
+            assert False, "newer bundle version should be rejected"
+        except ValueError as e:
+            print(f"   ✅ {e}")
+
+        try:
+            write_bundle(bundle_path(tmp, "bad"), "bad", {"codes": CODES[:3]},
+                         bm25, vectorizer, tfidf_matrix, embeddings)
+            assert False, "short column should be rejected"
+        except ValueError as e:
+            print(f"   ✅ {e}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL INDEX BUNDLE TESTS PASSED")
+        print("=" * 70)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_index_bundle()
@@ -0,0 +1,107 @@
+"""
+Test lazy index loading with an LRU memory budget
+Systems must load on first use only, the least recently used system must
+be evicted when the budget is exceeded, and stats must report load times
+and resident sizes
+"""
+
+import threading
+
+import numpy as np
+
+from index_registry import IndexRegistry, estimate_size
+
+MB = 1024 * 1024
+
+
+def fake_loader(name, megabytes, calls):
+    """Loader returning an index with a float32 embedding matrix of the given size"""
+    def load():
+        calls[name] = calls.get(name, 0) + 1
+        return {
+            "codes": [f"{name}-{i}" for i in range(10)],
+            "embeddings": np.zeros(megabytes * MB // 4, dtype=np.float32)
+        }
+    return load
+
+
+def test_index_registry():
+    calls = {}
+    registry = IndexRegistry(memory_budget_mb=2.5)
+    for name in ("siddha", "ayurveda", "unani"):
+        registry.register(name, fake_loader(name, 1, calls))
+
+    print("=" * 70)
+    print("🧪 Testing lazy index registry")
+    print("=" * 70)
+
+    # 1. Registering loads nothing
+    print("\n1. Registration is lazy...")
+    assert calls == {}
+    assert registry.get_statistics()["resident_bytes"] == 0
+    print("   ✅ No system loaded at registration")
+
+    # 2. First use loads, second use hits
+    print("\n2. Loading on first use...")
+    index = registry.get("ayurveda")
+    assert index["codes"][0] == "ayurveda-0"
+    assert registry.get("ayurveda") is index
+    stats = registry.get_statistics()["systems"]["ayurveda"]
+    assert calls == {"ayurveda": 1}
+    assert stats["loads"] == 1 and stats["hits"] == 1
+    assert stats["load_time_ms"] is not None and stats["resident_bytes"] >= MB
+    print(f"   ✅ Loaded in {stats['load_time_ms']} ms, "
+          f"{stats['resident_bytes'] / MB:.2f} MB resident")
+
+    # 3. Budget evicts the least recently used system
+    print("\n3. LRU eviction under a 2.5 MB budget...")
+    registry.get("siddha")
+    registry.get("ayurveda")            # ayurveda is now most recent
+    registry.get("unani")               # third MB: siddha must go
+    stats = registry.get_statistics()
+    assert stats["lru_order"] == ["ayurveda", "unani"], stats["lru_order"]
+    assert stats["systems"]["siddha"]["evictions"] == 1
+    assert stats["resident_bytes"] <= 2.5 * MB
+    print(f"   ✅ Evicted siddha, resident {stats['resident_bytes'] / MB:.2f} MB")
+
+    # 4. Evicted systems reload transparently
+    registry.get("siddha")
+    assert calls["siddha"] == 2
+    assert registry.get_statistics()["lru_order"] == ["unani", "siddha"]
+    print("   ✅ siddha reloaded on next use, ayurveda evicted")
+
+    # 5. A system larger than the budget still loads (never evicts itself)
+    registry.register("icd", fake_loader("icd", 3, calls))
+    registry.get("icd")
+    assert registry.get_statistics()["lru_order"] == ["icd"]
+    print("   ✅ Oversized system kept while in use")
+
+    # 6. Concurrent first use loads once
+    print("\n4. Concurrent first use...")
+    registry = IndexRegistry()
+    calls.clear()
+    registry.register("unani", fake_loader("unani", 1, calls))
+    threads = [threading.Thread(target=registry.get, args=("unani",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == {"unani": 1}
+    print("   ✅ 8 threads, 1 load")
+
+    # 7. Size estimate counts arrays and Python containers
+    sized = estimate_size({"a": np.zeros(1000, dtype=np.float64), "b": ["x" * 100] * 3})
+    assert sized >= 8000 + 100
+    try:
+        registry.get("missing")
+        assert False, "unknown system should raise"
+    except KeyError:
+        pass
+
+    print("\n" + "=" * 70)
+    print("✅ ALL INDEX REGISTRY TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_index_registry()
@@ -0,0 +1,119 @@
+"""
+Test hot index reload
+A rebuilt bundle must be swapped in for new searches while a search that
+started on the old version finishes on it, the old version must be
+released once drained, a bad bundle must leave the live version serving,
+and the watcher must pick up a rebuilt bundle on its own
+"""
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from corpus_store import attach, load_corpus
+from index_builder import build_corpus
+from index_bundle import MANIFEST, bundle_path, load_index_files, resolve_bundle
+from index_registry import IndexRegistry, IndexWatcher
+from test_index_builder import RECORDS, FakeEncoder, write_data
+
+
+def test_index_reload():
+    tmp = Path(tempfile.mkdtemp())
+    data_dir, index_dir = tmp / "data", tmp / "indexes"
+    data_dir.mkdir()
+    records = [dict(r) for r in RECORDS]
+
+    def rebuild():
+        write_data(data_dir, records)
+        build_corpus("siddha", data_dir, index_dir, encoder=FakeEncoder(), model="fake")
+
+    rebuild()
+    registry = IndexRegistry()
+    registry.register(
+        "siddha",
+        lambda: attach(load_index_files(index_dir, "siddha"), load_corpus("siddha", data_dir)),
+        watch=bundle_path(index_dir, "siddha")
+    )
+
+    print("=" * 70)
+    print("🧪 Testing hot index reload")
+    print("=" * 70)
+
+    try:
+        # 1. A search pinned to v1 keeps it across a reload
+        print("\n1. Reload while a search is in flight...")
+        started, finish = threading.Event(), threading.Event()
+        seen = {}
+
+        def search():
+            with registry.pinned("siddha") as index:
+                seen["before"] = len(index["codes"])
+                started.set()
+                finish.wait(5)
+                # Later stages of the same search still see the same version
+                seen["after"] = len(registry.get("siddha")["codes"])
+
+        worker = threading.Thread(target=search)
+        worker.start()
+        started.wait(5)
+
+        records.append({"code": "SK13", "term": "Vikkal", "definition": "hiccups", "system": "Siddha"})
+        rebuild()
+        info = registry.reload("siddha")
+        assert info["version"] == 2 and info["previous_version"] == 1 and info["doc_count"] == 6
+        assert len(registry.get("siddha")["codes"]) == 6, "new searches get the new version"
+        assert registry.get_statistics()["systems"]["siddha"]["draining"] == 1
+        bundle = bundle_path(index_dir, "siddha")
+        assert len([p for p in bundle.iterdir() if p.is_dir()]) == 2, "v1 kept while it drains"
+
+        finish.set()
+        worker.join(5)
+        assert seen == {"before": 5, "after": 5}
+        assert [p for p in bundle.iterdir() if p.is_dir()] == [resolve_bundle(bundle)], "v1 pruned after drain"
+        stats = registry.get_statistics()
+        assert stats["systems"]["siddha"]["draining"] == 0 and stats["in_flight"] == 0
+        print(f"   ✅ In-flight search stayed on v1 ({seen}); v2 live, v1 released after drain")
+
+        # 2. A bundle that fails the manifest check is rejected
+        print("\n2. Rejecting a bad bundle...")
+        manifest_path = resolve_bundle(bundle_path(index_dir, "siddha")) / MANIFEST
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest["doc_count"] = 99
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        try:
+            registry.reload("siddha")
+            assert False, "bad bundle should be rejected"
+        except ValueError as e:
+            print(f"   ✅ {e}")
+        assert registry.get_statistics()["systems"]["siddha"]["version"] == 2
+        assert len(registry.get("siddha")["codes"]) == 6
+
+        # 3. The watcher reloads a rebuilt bundle
+        print("\n3. Watcher picks up a rebuild...")
+        watcher = IndexWatcher(registry, interval=0.05).start()
+        try:
+            records.append({"code": "SK14", "term": "Mantham", "definition": "indigestion", "system": "Siddha"})
+            rebuild()
+            deadline = time.time() + 5
+            while len(registry.get("siddha")["codes"]) != 7 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            watcher.stop()
+        assert len(registry.get("siddha")["codes"]) == 7
+        assert watcher.stats["reloads"] >= 1 and watcher.stats["errors"] == 0
+        print(f"   ✅ Reloaded by the watcher: {watcher.stats}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL INDEX RELOAD TESTS PASSED")
+        print("=" * 70)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_index_reload()
@@ -0,0 +1,139 @@
+"""
+Test live corpus updates
+Added, edited and deleted documents must be searchable as soon as the call
+returns, with BM25 scores equal to a full refit over the live documents and
+only new documents encoded. The journal must survive a restart, and
+compaction must fold it into the corpus JSON and rebuild without
+re-encoding anything
+"""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from corpus_store import attach, load_corpus
+from embedding_matrix import normalize_rows
+from index_builder import build_corpus, doc_text
+from index_bundle import load_index_files
+from index_registry import IndexRegistry
+from live_updates import LiveCorpus
+from test_index_builder import RECORDS, FakeEncoder, write_data
+
+
+def live_docs(index):
+    """Document text of each live row, with its row number"""
+    rows = np.flatnonzero(getattr(index["bm25"], "live", np.ones(len(index["codes"]), dtype=bool)))
+    docs = [doc_text("siddha", {name: index[name][i] for name in ("terms", "definitions")}) for i in rows]
+    return rows, docs
+
+
+def assert_bm25_exact(index, query):
+    rows, docs = live_docs(index)
+    expected = BM25Okapi([d.lower().split() for d in docs]).get_scores(query)
+    scores = index["bm25"].get_scores(query)
+    assert np.allclose(scores[rows], expected), (scores[rows], expected)
+    assert np.all(np.isneginf(np.delete(scores, rows)))
+
+
+def test_live_updates():
+    tmp = Path(tempfile.mkdtemp())
+    data_dir, index_dir = tmp / "data", tmp / "indexes"
+    data_dir.mkdir()
+    write_data(data_dir, [dict(r) for r in RECORDS])
+    build_corpus("siddha", data_dir, index_dir, encoder=FakeEncoder(), model="fake")
+
+    def new_registry():
+        registry = IndexRegistry()
+        registry.register("siddha", lambda: attach(load_index_files(index_dir, "siddha"),
+                                                   load_corpus("siddha", data_dir)))
+        return registry
+
+    registry = new_registry()
+    encoder = FakeEncoder()
+    live = LiveCorpus("siddha", index_dir, data_dir, registry=registry, encoder=encoder, model="fake")
+    query = "fever hiccups".split()
+
+    print("=" * 70)
+    print("🧪 Testing live corpus updates")
+    print("=" * 70)
+
+    try:
+        registry.get("siddha")
+
+        # 1. A new document is searchable at once; only it is encoded
+        print("\n1. Adding a document...")
+        result = live.add({"code": "SK13", "term": "Vikkal", "definition": "hiccups with fever", "system": "Siddha"})
+        assert result["searchable"] and result["pending"] == 1
+        assert encoder.encoded == ["Vikkal. hiccups with fever"]
+        index = registry.get("siddha")
+        assert index["codes"][-1] == "SK13" and len(index["codes"]) == 6
+        assert index["tfidf_matrix"].shape[0] == 6 and index["embeddings"].shape[0] == 6
+        assert int(np.argmax(index["bm25"].get_scores(["hiccups"]))) == 5
+        expected = normalize_rows(FakeEncoder().encode(["Vikkal. hiccups with fever"]))
+        assert np.allclose(index["embeddings"][[5]], expected, atol=1e-3)
+        assert_bm25_exact(index, query)
+        print(f"   ✅ SK13 searchable in {result['apply_ms']}ms, BM25 equals a full refit")
+
+        # 2. A definition fix replaces the row
+        print("\n2. Updating a definition...")
+        live.update("SP42", {"definition": "fever with shivering"})
+        index = registry.get("siddha")
+        assert not index["bm25"].live[0] and index["codes"][-1] == "SP42"
+        assert int(np.argmax(index["bm25"].get_scores(["shivering"]))) == 6
+        assert_bm25_exact(index, query)
+        try:
+            live.update("XX00", {"definition": "nothing"})
+            assert False, "unknown code should be rejected"
+        except KeyError:
+            pass
+        print("   ✅ Old row retired, new definition found")
+
+        # 3. Deletion
+        print("\n3. Deleting a document...")
+        live.delete("SK10")
+        index = registry.get("siddha")
+        assert np.isneginf(index["bm25"].get_scores(["cough"])[3])
+        assert_bm25_exact(index, query + ["cough"])
+        assert live.current_record("SK10") is None
+        print("   ✅ SK10 can no longer score")
+
+        # 4. The journal is replayed by a fresh process
+        print("\n4. Replaying the journal after a restart...")
+        registry2 = new_registry()
+        encoder2 = FakeEncoder()
+        live2 = LiveCorpus("siddha", index_dir, data_dir, registry=registry2, encoder=encoder2, model="fake")
+        replayed = registry2.get("siddha")
+        assert live2.pending() == 3 and list(replayed["codes"]) == list(index["codes"])
+        assert not encoder2.encoded, "replay takes embeddings from the cache"
+        assert_bm25_exact(replayed, query)
+        print(f"   ✅ {live2.pending()} changes replayed, nothing re-encoded")
+
+        # 5. Compaction writes the JSON and rebuilds exactly
+        print("\n5. Compacting...")
+        version = registry.get_statistics()["systems"]["siddha"]["version"]
+        result = live.compact()
+        assert result["compacted"] == 3 and result["encoded"] == 0 and result["reloaded"]
+        with open(data_dir / "siddha_clean.json", encoding="utf-8") as f:
+            codes = [r["code"] for r in json.load(f)]
+        assert codes == ["SP42", "SP43", "SM31", "SK11", "SK13"]
+        assert live.pending() == 0 and not live.journal.exists()
+        index = registry.get("siddha")
+        assert registry.get_statistics()["systems"]["siddha"]["version"] == version + 1
+        assert list(index["codes"]) == codes and index["definitions"][0] == "fever with shivering"
+        assert isinstance(index["embeddings"].data, np.memmap), "compacted rows come from the bundle again"
+        assert_bm25_exact(index, query)
+        print(f"   ✅ {result}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL LIVE UPDATE TESTS PASSED")
+        print("=" * 70)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_live_updates()
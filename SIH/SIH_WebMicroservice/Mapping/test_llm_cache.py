@@ -0,0 +1,94 @@
+"""
+Test the LLM response cache against the local Groq stand-in
+Repeated prompts must be served from SQLite, whitespace-only changes must
+still hit, bypass must reach the LLM, and expired entries must miss
+"""
+
+import os
+import tempfile
+
+from groq import Groq
+
+import llm_cache
+from llm_cache import LLMCache, cached_completion
+from local_stubs import start_stub_server
+
+PROMPT = """
+    Here are Siddha diagnosis candidates:
+
+    1. SP42 — Suram
+    2. SP43 — Other
+
+    Return ONLY JSON like:
+    {"code": "...", "reason": "..."}
+"""
+
+
+def groq_calls(server):
+    return server.state.stats["groq"]["requests"]
+
+
+def test_llm_cache():
+    server, base_url = start_stub_server()
+    client = Groq(api_key="stub", base_url=f"{base_url}/groq")
+    llm_cache._cache = LLMCache(os.path.join(tempfile.mkdtemp(), "llm_cache_test.db"))
+
+    print("=" * 70)
+    print("🧪 Testing LLM response cache (local Groq stand-in)")
+    print("=" * 70)
+
+    try:
+        # 1. First call goes to the LLM, second is served from the cache
+        print("\n1. Same prompt twice...")
+        first = cached_completion(client, "llama-3.3-70b-versatile", PROMPT, max_tokens=150)
+        second = cached_completion(client, "llama-3.3-70b-versatile", PROMPT, max_tokens=150)
+        assert first == second
+        assert groq_calls(server) == 1
+        print("   ✅ 1 LLM call for 2 requests")
+
+        # 2. Whitespace changes normalize to the same key; another model does not
+        print("\n2. Re-indented prompt and a different model...")
+        cached_completion(client, "llama-3.3-70b-versatile", " ".join(PROMPT.split()))
+        assert groq_calls(server) == 1
+        cached_completion(client, "llama-3.1-8b-instant", PROMPT)
+        assert groq_calls(server) == 2
+        print("   ✅ Keyed on model + normalized prompt")
+
+        # 3. Bypass reaches the LLM
+        print("\n3. Bypassing the cache...")
+        cached_completion(client, "llama-3.3-70b-versatile", PROMPT, use_cache=False)
+        assert groq_calls(server) == 3
+        print("   ✅ use_cache=False forced a fresh call")
+
+        # 4. Invalid answers are not cached
+        print("\n4. Unparseable answer...")
+        cached_completion(client, "llama-3.3-70b-versatile", "no candidates here",
+                          validate=lambda text: False)
+        cached_completion(client, "llama-3.3-70b-versatile", "no candidates here",
+                          validate=lambda text: False)
+        assert groq_calls(server) == 5
+        print("   ✅ Rejected answers are retried, not replayed")
+
+        # 5. TTL expiry
+        print("\n5. Expired entry...")
+        cached_completion(client, "llama-3.3-70b-versatile", "short lived", ttl=-1)
+        cached_completion(client, "llama-3.3-70b-versatile", "short lived")
+        assert groq_calls(server) == 7
+        assert llm_cache.get_cache().purge_expired() == 0  # replaced by the fresh answer
+        print("   ✅ Expired entries miss")
+
+        stats = llm_cache.cache_stats()
+        assert stats["hits"] == 2 and stats["bypassed"] == 1
+        print(f"   📊 {stats}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL LLM CACHE TESTS PASSED")
+        print("=" * 70)
+    finally:
+        llm_cache.get_cache().close()
+        llm_cache._cache = None
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_llm_cache()
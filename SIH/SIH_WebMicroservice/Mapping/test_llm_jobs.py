@@ -0,0 +1,115 @@
+"""
+Test background LLM refinement jobs against the local Groq stand-in
+Jobs must return immediately, deliver their result by polling, a slow
+LLM must be cut off by the per-call deadline, a full queue must
+reject new jobs instead of queueing them, and jobs cancelled before they
+ran must give their place in the queue back
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from groq import Groq
+
+import llm_cache
+from llm_cache import LLMCache, cached_completion
+from llm_jobs import RefinementJobs
+from local_stubs import start_stub_server
+
+PROMPT = "Candidates:\n1. SP42 — Suram\n2. SP43 — Other"
+
+
+def test_llm_jobs():
+    server, base_url = start_stub_server()
+    client = Groq(api_key="stub", base_url=f"{base_url}/groq")
+    llm_cache._cache = LLMCache(os.path.join(tempfile.mkdtemp(), "llm_jobs_test.db"))
+    jobs = RefinementJobs(max_workers=2)
+
+    print("=" * 70)
+    print("🧪 Testing background LLM refinement jobs")
+    print("=" * 70)
+
+    try:
+        # 1. Submission does not wait for the LLM
+        print("\n1. Submitting against a 500 ms LLM...")
+        server.state.configure("groq", latency_ms=500)
+        start = time.perf_counter()
+        job = jobs.submit("refine_tm", cached_completion, client, "stub-model", PROMPT,
+                          use_cache=False, timeout=5.0)
+        assert time.perf_counter() - start < 0.1
+        assert job["status"] in ("pending", "running")
+        print(f"   ✅ Job {job['job_id'][:8]} returned in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # 2. Polling delivers the result
+        done = jobs.wait(job["job_id"], timeout=5.0)
+        assert done["status"] == "done" and '"SP42"' in done["result"]
+        print(f"   ✅ Result after {done['duration_ms']} ms")
+
+        # 3. Deadline: a 2 s LLM with a 0.3 s deadline frees the worker quickly
+        print("\n2. Slow LLM with a 300 ms deadline...")
+        server.state.configure("groq", latency_ms=2000)
+        start = time.perf_counter()
+        slow = jobs.submit("refine_tm", cached_completion, client, "stub-model", PROMPT,
+                           use_cache=False, timeout=0.3)
+        failed = jobs.wait(slow["job_id"], timeout=5.0)
+        elapsed = time.perf_counter() - start
+        assert failed["status"] == "failed", failed
+        assert elapsed < 1.5, elapsed
+        print(f"   ✅ Cut off after {elapsed * 1000:.0f} ms: {failed['error']}")
+
+        # 4. A full queue rejects new jobs at once
+        print("\n3. Burst against one worker and a queue of one...")
+        burst = RefinementJobs(max_workers=1, max_pending=1)
+        server.state.configure("groq", latency_ms=500)
+        try:
+            queued = [burst.submit("refine_tm", cached_completion, client, "stub-model", PROMPT,
+                                   use_cache=False, timeout=5.0) for _ in range(2)]
+            time.sleep(0.1)                    # the first job is running, the second waits
+            start = time.perf_counter()
+            rejected = burst.submit("refine_tm", cached_completion, client, "stub-model", PROMPT,
+                                    use_cache=False, timeout=5.0)
+            assert rejected["status"] == "rejected" and time.perf_counter() - start < 0.1
+            assert burst.wait(rejected["job_id"], 0.1)["status"] == "rejected"
+            assert all(burst.wait(j["job_id"], 5.0)["status"] == "done" for j in queued)
+            assert burst.submit("refine_tm", lambda: "ok")["status"] != "rejected"
+            print(f"   ✅ Rejected: {rejected['error']}")
+        finally:
+            burst.shutdown()
+
+        # 5. Cancelled jobs free their slots
+        print("\n4. Shutting down with jobs still queued...")
+        cancelling = RefinementJobs(max_workers=1, max_pending=2)
+        release = threading.Event()
+        try:
+            blocker = cancelling.submit("refine_tm", release.wait, 5.0)
+            time.sleep(0.1)                    # the blocker holds the only worker
+            queued = [cancelling.submit("refine_tm", lambda: "never") for _ in range(2)]
+            assert cancelling.pending == 2
+            cancelling.shutdown()
+            assert cancelling.pending == 0
+            assert all(cancelling.wait(j["job_id"], 1.0)["status"] == "cancelled" for j in queued)
+            late = cancelling.submit("refine_tm", lambda: "never")
+            assert late["status"] == "cancelled" and cancelling.pending == 0
+        finally:
+            release.set()
+        assert cancelling.wait(blocker["job_id"], 5.0)["status"] == "done"
+        print("   ✅ 2 queued jobs cancelled, queue back to 0")
+
+        # 6. Unknown job ids
+        assert jobs.get("missing") is None and jobs.wait("missing", 0.1) is None
+
+        print("\n" + "=" * 70)
+        print("✅ ALL LLM JOB TESTS PASSED")
+        print("=" * 70)
+    finally:
+        jobs.shutdown()
+        llm_cache.get_cache().close()
+        llm_cache._cache = None
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_llm_jobs()
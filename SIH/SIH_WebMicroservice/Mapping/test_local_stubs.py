@@ -0,0 +1,102 @@
+"""
+Test the local stand-in servers with the project's real clients
+Points ICD11FHIRPipeline, BahmniIntegration and the Groq SDK at
+local_stubs.py via SIH_STUB_URL and checks latency/error injection and
+that search paging keeps every search parameter
+"""
+
+import os
+import time
+
+import requests
+from groq import Groq
+
+from local_stubs import start_stub_server
+
+
+def test_local_stubs():
+    server, base_url = start_stub_server()
+    os.environ["SIH_STUB_URL"] = base_url
+
+    # Import after the switch is set (clients read it on construction)
+    from icd11_fhir_pipeline import ICD11FHIRPipeline
+    from emr_integration_hapi import BahmniIntegration
+    from test_hapi_transaction import make_condition
+
+    print("=" * 70)
+    print("🧪 Testing local stand-in servers")
+    print("=" * 70)
+
+    try:
+        # 1. WHO ICD-11: recorded and synthesized codes
+        print("\n1. ICD-11 pipeline against the WHO stand-in...")
+        pipeline = ICD11FHIRPipeline("stub-id", "stub-secret")
+        concept = pipeline.process_code("1A00")["concept"][0]
+        assert concept["display"] == "Cholera"
+        assert concept["extension"][0]["valueString"] == "257068234"
+        synthetic = pipeline.process_code("MG26")["concept"][0]
+        assert synthetic["code"] == "MG26" and synthetic["extension"][0]["valueString"]
+        print("   ✅ Recorded (1A00) and synthesized (MG26) codes resolved")
+
+        # 2. HAPI FHIR: the switch sets the default URL, an explicit one is kept
+        print("\n2. EMR client against the FHIR stand-in...")
+        assert BahmniIntegration(base_url="http://emr.invalid/fhir").base_url == "http://emr.invalid/fhir"
+        hapi = BahmniIntegration()
+        assert hapi.base_url == f"{base_url}/fhir"
+        result = hapi.send_fhir_conditions([make_condition("stub-pat", "1A00")])
+        assert result.get("success"), result
+        assert hapi.get_patient_conditions("stub-pat")["total"] == 1
+        print("   ✅ Transaction stored and searchable")
+
+        # Paging through an _id search keeps the _id filter on every page
+        more = hapi.send_fhir_conditions([make_condition("stub-pat", code) for code in ("SP42", "MG26", "CA23")])
+        wanted = more["resource_ids"][:2]
+        url, seen = f"{base_url}/fhir/Condition?_id={','.join(wanted)}&_count=1", []
+        while url:
+            page = requests.get(url).json()
+            seen += [entry["resource"]["id"] for entry in page["entry"]]
+            url = next((link["url"] for link in page["link"] if link["relation"] == "next"), None)
+            assert url is None or f"_id={wanted[0]}%2C{wanted[1]}" in url, url
+        assert seen == wanted
+        print("   ✅ Next links keep _id, 2 pages of the 4 conditions")
+
+        # 3. Groq: same SDK call shape as refine_with_llm
+        print("\n3. Groq SDK against the LLM stand-in...")
+        client = Groq(api_key="stub", base_url=f"{base_url}/groq")
+        response = client.chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=[{"role": "user", "content": "Candidates:\n1. SP42 — Suram\n2. SP43 — Other"}],
+            max_tokens=150
+        )
+        assert '"SP42"' in response.choices[0].message.content
+        print("   ✅ Deterministic answer picked the first candidate")
+
+        # 4. Google Custom Search
+        response = requests.get(f"{base_url}/google/customsearch/v1",
+                                params={"q": "fever Siddha medicine", "num": 5})
+        assert response.json()["items"][0]["title"].startswith("Fever")
+        print("   ✅ Recorded Google results served")
+
+        # 5. Latency and error injection
+        print("\n4. Injecting latency and errors...")
+        requests.post(f"{base_url}/_stub/config", json={"who": {"latency_ms": 200}})
+        start = time.perf_counter()
+        requests.post(f"{base_url}/who/connect/token")
+        assert time.perf_counter() - start >= 0.2
+        requests.post(f"{base_url}/_stub/config",
+                      json={"who": {"latency_ms": 0}, "fhir": {"error_rate": 1.0}})
+        assert requests.get(f"{base_url}/fhir/Condition").status_code == 503
+        stats = requests.get(f"{base_url}/_stub/stats").json()
+        assert stats["fhir"]["errors"] == 1
+        print(f"   ✅ Latency and 503s injected, 📊 {stats}")
+
+        print("\n" + "=" * 70)
+        print("✅ ALL STAND-IN TESTS PASSED")
+        print("=" * 70)
+    finally:
+        os.environ.pop("SIH_STUB_URL", None)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_local_stubs()
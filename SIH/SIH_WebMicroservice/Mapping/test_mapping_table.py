@@ -0,0 +1,186 @@
+"""
+Test the precomputed TM code -> ICD mapping table
+The table must give each code the ICD candidates the live pipeline gives
+it, /map/*-code (mapper.map_code) must answer from it without searching
+either ICD index, edited terms and unknown codes must go through the
+pipeline, a changed ICD index must send lookups back to the pipeline
+until the background rebuild has caught up, a TM edit must only map
+the edited code again, and an English name must find its code's entry
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import search
+import search_icd11_standard
+import search_icd_tm2
+from build_indexes import mapper
+from code_lookup import match_code, prepend_exact
+from index_bundle import CURRENT, resolve_bundle
+from index_registry import get_system, registry
+from mapping_table import MappingTable, build_table, load_table
+
+SIDDHA = {
+    "codes": ["SP42", "SP43", "SK10"],
+    "terms": ["Suram", "Azhal suram", "Kasam"],
+    "definitions": ["fever with headache", "fever with burning", "cough with phlegm"],
+    "manifest": {"created_at": "siddha-v1"}
+}
+AYURVEDA = {
+    "codes": ["AAB-12", "AAC-3"],
+    "terms": ["jvaraH", "kAsaH"],
+    "english": ["Fever", "Cough"],
+    "definitions": ["suram fever", "kasam cough"],
+    "manifest": {"created_at": "ayurveda-v1"}
+}
+STANDARD = {
+    "codes": ["MG26", "1D01", "CA23", "ME84"],
+    "terms": ["Fever of other origin", "Suram kasam fever", "Acute bronchitis kasam", "Headache"],
+    "definitions": ["", "", "", ""],
+    "manifest": {"created_at": "standard-v1"}
+}
+TM2 = {
+    "codes": ["SK62", "SK60", "SM11"],
+    "terms": ["Fever disorder suram", "Cough disorder kasam", "Azhal disorder"],
+    "definitions": ["", "", ""],
+    "manifest": {"created_at": "tm2-v1"}
+}
+
+
+def fake_search(system, module, calls):
+    """Word-overlap ranking over the registered index: deterministic, scores exact in float32"""
+    def search(blob):
+        calls.append(blob)
+        index = get_system(system)
+        words = set(blob.lower().split())
+        scores = [len(words & set(t.lower().split())) / 4 for t in index["terms"]]
+        order = sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:3]
+        return [module.candidate(index, i, scores[i]) for i in order]
+    return search
+
+
+def fake_tm_search(system, module, calls):
+    """fake_search with the exact-code rows first, as the TM search modules return them"""
+    ranked = fake_search(system, module, calls)
+
+    def search(query):
+        index = get_system(system)
+        exact = [module.candidate(index, i, 1.0) for i in match_code(index, query, system) or []]
+        return {"candidates": prepend_exact(exact, ranked(query))}
+    return search
+
+
+def test_mapping_table():
+    print("=" * 70)
+    print("🧪 Testing the precomputed mapping table")
+    print("=" * 70)
+
+    tmp = Path(tempfile.mkdtemp())
+    names = ("siddha", "ayurveda", search_icd11_standard.SYSTEM, search_icd_tm2.SYSTEM)
+    saved_loaders = {name: registry.loaders.get(name) for name in names}
+    saved = mapper.search_siddha, mapper.search_icd11_standard, mapper.search_icd_tm2, mapper.get_table
+    calls, tm_calls = [], []
+    try:
+        for name, index in zip(names, (SIDDHA, AYURVEDA, STANDARD, TM2)):
+            registry.register(name, lambda index=index: dict(index))
+            registry.unload(name)
+        standard_search = fake_search(search_icd11_standard.SYSTEM, search_icd11_standard, calls)
+        mapper.search_icd11_standard = lambda blob: {"candidates": standard_search(blob)}
+        mapper.search_icd_tm2 = fake_search(search_icd_tm2.SYSTEM, search_icd_tm2, calls)
+        mapper.search_siddha = fake_tm_search("siddha", search, tm_calls)
+
+        # 1. Offline build
+        print("\n1. Building the table...")
+        path = tmp / "icd_map.table"
+        manifest = build_table(["siddha"], k=3, path=path)
+        assert manifest["systems"]["siddha"]["entries"] == 3 and not manifest["unresolved"]
+        assert len(calls) == 6
+        table = load_table(path)["systems"]["siddha"]
+        assert table["rows"]["icd11_standard_candidates"].shape == (3, 3)
+        assert sorted(f.name for f in path.iterdir()) == [CURRENT, resolve_bundle(path).name]
+        print(f"   ✅ 3 codes in {sorted(f.name for f in resolve_bundle(path).iterdir())}")
+
+        # 2. Table answers equal the live pipeline, without ICD searches
+        print("\n2. Lookups...")
+        table = MappingTable(path, rebuild=False)
+        mapper.get_table = lambda: table
+        for code, term in zip(SIDDHA["codes"], SIDDHA["terms"]):
+            live = mapper.map_to_icd(f"{code} {term}", system="siddha")
+            calls.clear()
+            assert mapper.map_code(code, term, system="siddha") == live, code
+            assert mapper.map_code(code.lower(), term.upper(), system="siddha")["icd11_tm2_candidates"] == \
+                live["icd11_tm2_candidates"]
+            assert not calls
+        picked = [{"code": "SK10", "term": "Kasam", "score": 0.5}]
+        assert mapper.map_code("SK10", "Kasam", system="siddha", tm_candidates=picked)["siddha_candidates"] == picked
+        print("   ✅ Same result as map_to_icd, no ICD search")
+
+        # 3. Edited terms, unknown codes and other systems use the pipeline
+        print("\n3. Misses...")
+        for code, term, system in (("SK10", "Kasam with fever", "siddha"), ("SK99", "Kasam", "siddha"),
+                                   ("SK10", "Kasam", "unani")):
+            assert table.lookup(system, code, term) is None
+        mapper.map_code("SK10", "Kasam with fever", system="siddha", tm_candidates=picked)
+        assert calls == ["SK10 Kasam with fever Kasam "] * 2
+        print("   ✅ Edited term / unknown code / unbuilt system fall back")
+
+        # 4. A changed ICD index: pipeline until the rebuild catches up
+        print("\n4. Rebuild on index change...")
+        table.rebuild = True
+        registry.refresh(search_icd_tm2.SYSTEM, lambda index: {
+            **{k: v for k, v in index.items() if k != "fingerprint"},
+            "terms": ["Fever disorder", "Cough disorder kasam", "Azhal disorder"]
+        })
+        calls.clear()
+        assert table.lookup("siddha", "SP42", "Suram") is None
+        table.rebuild_thread.join(timeout=10)
+        assert len(calls) == 6                     # three codes rebuilt, two ICD searches each
+        calls.clear()
+        hits = table.lookup("siddha", "SP42", "Suram")["icd11_tm2_candidates"]
+        assert hits[0]["title"] == "Fever disorder" and not calls     # the new version's title
+        assert table.lookup("siddha", "SP42", "Suram") is not None
+        stats = table.get_statistics()
+        assert stats["stale"] == 1 and stats["rebuilds"] == 1 and stats["entries"] == {"siddha": 3}
+        print(f"   ✅ {stats}")
+
+        # 5. A TM edit (e.g. a live corpus update) maps only the edited code again
+        print("\n5. Update after a TM edit...")
+        registry.refresh("siddha", lambda index: {
+            **{k: v for k, v in index.items() if k != "fingerprint"},
+            "terms": ["Suram", "Azhal suram", "Kasam irumal"]
+        })
+        calls.clear()
+        assert table.lookup("siddha", "SP42", "Suram") is not None     # unchanged code still served
+        table.rebuild_thread.join(timeout=10)
+        assert len(calls) == 2                     # only SK10, two ICD searches
+        manifest = load_table(path)["manifest"]
+        assert manifest["reused"] == 2 and manifest["systems"]["siddha"]["entries"] == 3
+        assert table.lookup("siddha", "SK10", "Kasam irumal") is not None
+        assert table.lookup("siddha", "SK10", "Kasam") is None
+        print(f"   ✅ 1 code mapped, {manifest['reused']} kept")
+
+        # 6. Ayurveda / Unani: the UI sends the English name, which finds the same entry
+        print("\n6. Lookup by English name...")
+        ayurveda = MappingTable(tmp / "ayurveda.table", rebuild=False)
+        build_table(["ayurveda"], k=3, path=ayurveda.path)
+        by_english = ayurveda.lookup("ayurveda", "AAB-12", "Fever")
+        assert by_english is not None and by_english == ayurveda.lookup("ayurveda", "AAB-12", "jvaraH")
+        assert ayurveda.lookup("ayurveda", "AAB-12", "Cough") is None      # another row's name
+        assert ayurveda.get_statistics()["hits"] == 2
+        print("   ✅ English name and term give the same stored candidates")
+    finally:
+        mapper.search_siddha, mapper.search_icd11_standard, mapper.search_icd_tm2, mapper.get_table = saved
+        for name, loader in saved_loaders.items():
+            if loader is not None:
+                registry.register(name, loader)
+            registry.unload(name)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n" + "=" * 70)
+    print("✅ ALL MAPPING TABLE TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_mapping_table()
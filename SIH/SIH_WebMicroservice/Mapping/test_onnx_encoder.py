@@ -0,0 +1,117 @@
+"""
+Test the ONNX Runtime query encoder backend
+Unknown backends are rejected and an ONNX backend that cannot be loaded
+falls back to torch. Where onnx and onnxruntime are installed, a tiny
+random BERT sentence-transformer is exported, quantized and checked: its
+ONNX embeddings must match torch, padding in a batch must not change a
+query's vector, and exports of another model or with a failed parity
+check must be refused
+"""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import encoder
+import onnx_encoder
+from onnx_encoder import PARITY_TEXTS, export, load_encoder
+from test_index_builder import FakeEncoder
+
+
+def tiny_sentence_transformer(path: Path):
+    """2-layer random BERT with a vocabulary covering PARITY_TEXTS, mean pooling"""
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    words = sorted({w for text in PARITY_TEXTS for w in text.lower().split()})
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words
+    path.mkdir(parents=True)
+    (path / "vocab.txt").write_text("\n".join(vocab), encoding="utf-8")
+    BertTokenizerFast(vocab_file=str(path / "vocab.txt")).save_pretrained(str(path))
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=128)
+    BertModel(config).save_pretrained(str(path))
+    transformer = models.Transformer(str(path), max_seq_length=64)
+    return SentenceTransformer(modules=[transformer, models.Pooling(32, "mean")], device="cpu")
+
+
+def test_onnx_encoder():
+    print("=" * 70)
+    print("🧪 Testing ONNX query encoder backend")
+    print("=" * 70)
+
+    # 1. Backend selection and fallback
+    print("\n1. Backend selection...")
+    saved, saved_loader = dict(encoder._embedders), onnx_encoder.load_encoder
+    try:
+        fake = FakeEncoder()
+        encoder._embedders.clear()
+        encoder._embedders["torch"] = fake
+
+        def missing(backend):
+            raise FileNotFoundError("no export")
+
+        onnx_encoder.load_encoder = missing
+        assert encoder.get_embedder("onnx-int8") is fake and encoder.get_embedder("torch") is fake
+        try:
+            encoder.get_embedder("tensorrt")
+            assert False, "unknown backend should be rejected"
+        except ValueError as e:
+            print(f"   ✅ {e}")
+        print("   ✅ Missing ONNX export falls back to the torch encoder")
+    finally:
+        encoder._embedders.clear()
+        encoder._embedders.update(saved)
+        onnx_encoder.load_encoder = saved_loader
+
+    # 2. Export, quantize, parity (needs onnx + onnxruntime)
+    print("\n2. Export and parity...")
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("   ⚠️  onnx / onnxruntime not installed: export checks skipped")
+    else:
+        tmp = Path(tempfile.mkdtemp())
+        try:
+            model = tiny_sentence_transformer(tmp / "tiny")
+            meta = export(tmp / "onnx", model=model, model_name="tiny")
+            assert set(meta["files"]) == {"onnx", "onnx-int8"} and meta["dim"] == 32
+            assert meta["parity"]["onnx"]["passed"] and meta["parity"]["onnx-int8"]["passed"], meta["parity"]
+            print(f"   ✅ fp32 min cosine {meta['parity']['onnx']['min_cosine']:.6f}, "
+                  f"int8 {meta['parity']['onnx-int8']['min_cosine']:.4f}")
+
+            fp32 = load_encoder("onnx", tmp / "onnx", model_name="tiny")
+            single = fp32.encode(["fever with headache"])
+            batched = fp32.encode(["fever with headache", PARITY_TEXTS[-1]])
+            assert single.shape == (1, 32) and single.dtype == np.float32
+            assert np.allclose(single[0], batched[0], atol=1e-5)
+            assert np.allclose(single[0], model.encode(["fever with headache"])[0], atol=1e-4)
+            print("   ✅ Same vector alone and in a padded batch, and as torch")
+
+            try:
+                load_encoder("onnx", tmp / "onnx", model_name="other")
+                assert False, "export of another model should be refused"
+            except ValueError as e:
+                print(f"   ✅ {e}")
+            meta["parity"]["onnx-int8"]["passed"] = False
+            with open(tmp / "onnx" / onnx_encoder.META_FILE, "w") as f:
+                json.dump(meta, f)
+            try:
+                load_encoder("onnx-int8", tmp / "onnx", model_name="tiny")
+                assert False, "failed parity check should be refused"
+            except ValueError:
+                print("   ✅ Export with a failed parity check refused")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n" + "=" * 70)
+    print("✅ ALL ONNX ENCODER TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_onnx_encoder()
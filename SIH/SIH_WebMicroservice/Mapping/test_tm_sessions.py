@@ -0,0 +1,116 @@
+"""
+Test reusing diagnose results in the mapping step
+Sessions must hand back the stored candidates until they expire or are
+crowded out, the picked code must be moved to the front, and map_to_icd
+given the candidates must build its ICD query from the picked term
+without searching the TM corpus again - also for a diagnose followed by
+a map-code call with the session token
+"""
+
+import time
+
+from build_indexes import mapper
+from tm_sessions import DiagnoseSessions, picked_candidates, selected_first
+
+CANDIDATES = [
+    {"code": "SP42", "term": "Suram", "definition": "fever with headache", "score": 0.71},
+    {"code": "SP43", "term": "Azhal suram", "definition": "fever with burning sensation", "score": 0.64},
+    {"code": "SK10", "term": "Kasam", "definition": "cough with phlegm", "score": 0.41},
+]
+
+
+def test_tm_sessions():
+    print("=" * 70)
+    print("🧪 Testing diagnose sessions")
+    print("=" * 70)
+
+    # 1. Store, look up, expire, bound
+    print("\n1. Session store...")
+    sessions = DiagnoseSessions(ttl=0.2, max_sessions=3)
+    token = sessions.create("siddha", "fever", CANDIDATES)
+    session = sessions.get(token)
+    assert session["system"] == "siddha" and session["candidates"] == CANDIDATES
+    assert sessions.get("not-a-token") is None
+    time.sleep(0.3)
+    assert sessions.get(token) is None
+    tokens = [sessions.create("siddha", f"q{i}", CANDIDATES) for i in range(5)]
+    assert sessions.get(tokens[0]) is None and sessions.get(tokens[-1]) is not None
+    stats = sessions.get_statistics()
+    assert stats["sessions"] == 3 and stats["created"] == 6 and stats["hits"] == 2 and stats["misses"] == 3
+    print(f"   ✅ {stats}")
+
+    # 2. Picked candidate first
+    print("\n2. Selecting a code...")
+    picked = selected_first(CANDIDATES, "SK10")
+    assert [c["code"] for c in picked] == ["SK10", "SP42", "SP43"]
+    assert selected_first(CANDIDATES, "XX99") is None
+    print("   ✅ Picked code moved to the front, unknown code refused")
+
+    # 3. map_to_icd reuses the candidates
+    print("\n3. Mapping without a TM search...")
+    saved = mapper.search_siddha, mapper.search_icd11_standard, mapper.search_icd_tm2
+    tm_queries, icd_queries = [], []
+    try:
+        mapper.search_siddha = lambda query: tm_queries.append(query) or {"candidates": CANDIDATES}
+        mapper.search_icd11_standard = lambda blob: icd_queries.append(blob) or {"candidates": [{"code": "MG26"}]}
+        mapper.search_icd_tm2 = lambda blob: [{"code": "SK62"}]
+
+        result = mapper.map_to_icd("SK10 Kasam", system="siddha", tm_candidates=picked)
+        assert not tm_queries
+        assert icd_queries == ["SK10 Kasam Kasam "]
+        assert result["siddha_candidates"] == picked
+        assert result["icd11_standard_candidates"] == [{"code": "MG26"}]
+
+        result = mapper.map_to_icd("SK10 Kasam", system="siddha")
+        assert tm_queries == ["SK10 Kasam"] and icd_queries[-1] == "SK10 Kasam Suram "
+        print("   ✅ Given candidates skip the TM search; without them it still runs")
+    finally:
+        mapper.search_siddha, mapper.search_icd11_standard, mapper.search_icd_tm2 = saved
+
+    # 4. Diagnose, then map-code with the session token (the UI flow)
+    print("\n4. Diagnose -> map-code with the session...")
+    sessions = DiagnoseSessions()
+    saved = mapper.search_siddha, mapper.search_icd11_standard, mapper.search_icd_tm2, mapper.get_table
+    tm_queries = []
+    try:
+        mapper.search_siddha = lambda query: tm_queries.append(query) or {"candidates": CANDIDATES}
+        mapper.search_icd11_standard = lambda blob: {"candidates": [{"code": "MG26"}]}
+        mapper.search_icd_tm2 = lambda blob: [{"code": "SK62"}]
+        table = {"icd11_standard_candidates": [{"code": "MG26"}], "icd11_tm2_candidates": [{"code": "SK62"}]}
+
+        # /siddha/diagnose: one TM search, its candidates kept under the token
+        token = sessions.create("siddha", "fever", mapper.search_siddha("fever")["candidates"])
+        for lookup in (lambda system, code, term: None, lambda system, code, term: table):
+            mapper.get_table = lambda: type("Table", (), {"lookup": staticmethod(lookup)})()
+            # /map/siddha-code {"code": "SK10", "term": "Cough", "session": token}
+            picked = picked_candidates(sessions, "siddha", "SK10", session=token)
+            result = mapper.map_code("SK10", "Cough", system="siddha", tm_candidates=picked)
+            assert result["siddha_candidates"][0]["code"] == "SK10"
+            assert result["icd11_standard_candidates"] == [{"code": "MG26"}]
+        assert tm_queries == ["fever"], tm_queries      # only the diagnose search
+
+        assert picked_candidates(sessions, "siddha", "SK10") is None
+        record = picked_candidates(sessions, "siddha", "SK10", record=CANDIDATES[2])
+        assert record == [CANDIDATES[2]]
+        try:
+            picked_candidates(sessions, "siddha", "SK10", session="expired")
+            assert False, "unknown session should raise"
+        except LookupError:
+            pass
+        for system, code in (("unani", "SK10"), ("siddha", "XX99")):
+            try:
+                picked_candidates(sessions, system, code, session=token)
+                assert False, (system, code)
+            except ValueError as e:
+                print(f"   ✅ Refused: {e}")
+        print("   ✅ Map-code with the session token ran no TM search (table hit and miss)")
+    finally:
+        mapper.search_siddha, mapper.search_icd11_standard, mapper.search_icd_tm2, mapper.get_table = saved
+
+    print("\n" + "=" * 70)
+    print("✅ ALL DIAGNOSE SESSION TESTS PASSED")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    test_tm_sessions()
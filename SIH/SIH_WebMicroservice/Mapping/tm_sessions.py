@@ -0,0 +1,129 @@
+"""
+Diagnose Sessions
+Keeps the TM candidates a diagnose / map call returned under a session
+token, so the follow-up /map/{system}-code call can name the picked code
+(or send the picked record) instead of making the mapper search the TM
+corpus again for "code term" just to take its first candidate.
+
+Sessions live in memory for SIH_SESSION_TTL seconds; the oldest are
+dropped once SIH_SESSION_MAX are held.
+
+Configuration:
+    SIH_SESSION_TTL   seconds a diagnose result can be mapped by its token (default 1800)
+    SIH_SESSION_MAX   most sessions kept (default 10000)
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Configuration
+SESSION_TTL = float(os.getenv("SIH_SESSION_TTL", "1800"))
+SESSION_MAX = int(os.getenv("SIH_SESSION_MAX", "10000"))
+
+
+class DiagnoseSessions:
+    """In-memory TM candidate lists keyed by token, oldest first"""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+        self.misses = 0
+
+    def create(self, system: str, query: str, candidates: List[Dict]) -> str:
+        """Store a diagnose result and return its token"""
+        token = uuid.uuid4().hex
+        with self.lock:
+            self._expire()
+            self.sessions[token] = {
+                "system": system,
+                "query": query,
+                "candidates": candidates,
+                "created_at": time.time()
+            }
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            self.created += 1
+        return token
+
+    def get(self, token: str) -> Optional[Dict]:
+        """The stored result, or None if unknown or expired"""
+        with self.lock:
+            self._expire()
+            session = self.sessions.get(token)
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return session
+
+    def _expire(self):
+        # Caller holds the lock; insertion order is creation order
+        cutoff = time.time() - self.ttl
+        while self.sessions:
+            token, session = next(iter(self.sessions.items()))
+            if session["created_at"] >= cutoff:
+                break
+            del self.sessions[token]
+
+    def get_statistics(self) -> Dict:
+        with self.lock:
+            return {"sessions": len(self.sessions), "ttl_s": self.ttl, "created": self.created,
+                    "hits": self.hits, "misses": self.misses}
+
+
+def selected_first(candidates: List[Dict], code: str) -> Optional[List[Dict]]:
+    """The candidates with the one for `code` moved to the front, or None if it is not among them"""
+    for i, candidate in enumerate(candidates):
+        if candidate.get("code") == code:
+            return [candidate] + candidates[:i] + candidates[i + 1:]
+    return None
+
+
+def picked_candidates(sessions: DiagnoseSessions, system: str, code: str,
+                      session: str = None, record: Dict = None) -> Optional[List[Dict]]:
+    """
+    TM candidates (picked code first) for a /map/{system}-code call, or
+    None when it names neither a session nor a record
+
+    Raises LookupError for an unknown / expired session and ValueError when
+    the session or record does not fit the call.
+    """
+    if record is not None:
+        if record.get("code") != code or not record.get("term"):
+            raise ValueError("record must be the selected candidate (code and term)")
+        return [record]
+    if session is None:
+        return None
+    stored = sessions.get(session)
+    if stored is None:
+        raise LookupError("Unknown or expired session")
+    if stored["system"] != system:
+        raise ValueError(f"Session is for {stored['system']}, not {system}")
+    candidates = selected_first(stored["candidates"], code)
+    if candidates is None:
+        raise ValueError(f"{code} is not among the session's candidates")
+    return candidates
+
+
+# -------------------------------------------------------------
+# Process-wide store
+# -------------------------------------------------------------
+_sessions: Optional[DiagnoseSessions] = None
+_sessions_lock = threading.Lock()
+
+
+def get_sessions() -> DiagnoseSessions:
+    """Session store shared by the API (created on first use)"""
+    global _sessions
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = DiagnoseSessions()
+    return _sessions
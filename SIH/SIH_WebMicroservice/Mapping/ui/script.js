@@ -2,6 +2,7 @@ const API = window.location.origin;
 
 let currentSystem = "siddha";
 let authToken = null;
+let mappingSession = null;  // token of the last /map result: /map/{system}-code reuses its candidates
 
 // ===== AUTHENTICATION =====
 
@@ -125,6 +126,7 @@ function clearResults() {
     document.getElementById('mappingInput').value = '';
     document.getElementById('mappingResults').innerHTML = '';
     document.getElementById('icdResults').innerHTML = '';
+    mappingSession = null;
 }
 
 // ===== FULL MAPPING =====
@@ -151,6 +153,7 @@ async function runMapping() {
         });
 
         const data = await res.json();
+        mappingSession = data.session || null;
 
         const systemName = currentSystem.charAt(0).toUpperCase() + currentSystem.slice(1);
         const candidatesKey = `${currentSystem}_candidates`;
@@ -206,14 +209,20 @@ async function mapToICD(code, term) {
     icdDiv.innerHTML = '<div class="result-card"><i class="fas fa-spinner fa-spin"></i> Mapping to ICD-11 Standard and TM2...</div>';
 
     try {
-        const res = await fetch(`${API}/map/${currentSystem}-code`, {
+        const post = (body) => fetch(`${API}/map/${currentSystem}-code`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 ...(authToken ? { 'Authorization': `Bearer ${authToken}` } : {})
             },
-            body: JSON.stringify({ code, term })
+            body: JSON.stringify(body)
         });
+        // The session hands back the candidates just shown, so the TM corpus is not searched again
+        let res = await post(mappingSession ? { code, term, session: mappingSession } : { code, term });
+        if (res.status === 404 && mappingSession) {
+            mappingSession = null;   // expired: map by code and term
+            res = await post({ code, term });
+        }
 
         const data = await res.json();
 
@@ -553,7 +562,14 @@ async function sendToEMR() {
             })
         });
         
-        const emrResult = await emrRes.json();
+        const queued = await emrRes.json();
+        
+        if (!queued.success) {
+            throw new Error(queued.error || 'Failed to queue for EMR');
+        }
+        
+        // Delivery happens in the background; wait for the outbox to report it
+        const emrResult = await waitForEMRDelivery(queued.delivery_id);
         
         // Remove loading modal
         loadingModal.remove();
@@ -603,6 +619,31 @@ async function sendToEMR() {
     }
 }
 
+async function waitForEMRDelivery(deliveryId, timeoutMs = 30000) {
+    const started = Date.now();
+    
+    while (Date.now() - started < timeoutMs) {
+        const res = await fetch(`${API}/emr/outbox/${deliveryId}`, {
+            headers: authToken ? { 'Authorization': `Bearer ${authToken}` } : {}
+        });
+        const delivery = await res.json();
+        
+        if (delivery.status === 'delivered') {
+            return { success: true, resource_id: delivery.resource_id, delivery_id: deliveryId };
+        }
+        if (delivery.status === 'failed' || delivery.error) {
+            return { success: false, error: delivery.last_error || delivery.error };
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+    
+    return {
+        success: false,
+        error: `EMR is slow to respond; delivery ${deliveryId} is still queued and will be retried automatically`
+    };
+}
+
 function showEMRSuccessModal(emrResult, fhirData) {
     const modal = document.createElement('div');
     modal.className = 'modal';
@@ -1,13 +1,20 @@
 """
 View FHIR Conditions in Bahmni EMR
 Fetches and displays all conditions stored in the EMR
+
+Usage:
+    python view_emr_conditions.py                  # all conditions, streamed page by page
+    python view_emr_conditions.py <uuid> [<uuid>]  # selected patients, fetched concurrently
 """
 
+import sys
 import requests
 import json
 import urllib3
 from datetime import datetime
 
+from fhir_paging import FHIRSearchError, fetch_for_patients, iter_search_resources
+
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -15,6 +22,8 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 BAHMNI_URL = "http://localhost"
 USERNAME = "superman"
 PASSWORD = "Admin123"
+PAGE_SIZE = 50      # conditions per FHIR search page
+MAX_WORKERS = 4     # concurrent patients when UUIDs are given
 
 print("=" * 80)
 print("🏥 Bahmni EMR - View Conditions")
@@ -37,116 +46,136 @@ else:
     print(f"   ❌ Authentication failed: {auth_response.status_code}")
     exit(1)
 
-# Fetch all conditions
+
+def print_condition(idx, resource):
+    """Print one Condition resource"""
+    print(f"\n{'─' * 80}")
+    print(f"Condition #{idx}")
+    print(f"{'─' * 80}")
+    
+    # Resource ID
+    resource_id = resource.get('id', 'N/A')
+    print(f"🆔 Resource ID: {resource_id}")
+    
+    # Patient
+    subject = resource.get('subject', {})
+    patient_ref = subject.get('reference', 'N/A')
+    patient_display = subject.get('display', 'N/A')
+    print(f"👤 Patient: {patient_display} ({patient_ref})")
+    
+    # Clinical Status
+    clinical_status = resource.get('clinicalStatus', {})
+    clinical_coding = clinical_status.get('coding', [{}])[0]
+    clinical_code = clinical_coding.get('code', 'N/A')
+    print(f"📊 Clinical Status: {clinical_code}")
+    
+    # Verification Status
+    verification_status = resource.get('verificationStatus', {})
+    verification_coding = verification_status.get('coding', [{}])[0]
+    verification_code = verification_coding.get('code', 'N/A')
+    print(f"✓ Verification Status: {verification_code}")
+    
+    # Codes (ICD-11, Traditional Medicine)
+    code = resource.get('code', {})
+    codings = code.get('coding', [])
+    
+    if codings:
+        print(f"\n💊 Diagnosis Codes:")
+        for coding in codings:
+            system = coding.get('system', 'N/A')
+            code_value = coding.get('code', 'N/A')
+            display = coding.get('display', 'N/A')
+            
+            # Identify the system
+            if 'icd-11' in system.lower():
+                system_name = "ICD-11"
+            elif 'traditional-medicine' in system.lower():
+                system_name = "Traditional Medicine"
+            else:
+                system_name = system
+            
+            print(f"   • {system_name}: {code_value}")
+            print(f"     Display: {display}")
+    
+    # Text description
+    code_text = code.get('text', '')
+    if code_text:
+        print(f"\n📝 Description: {code_text}")
+    
+    # Recorded Date
+    recorded_date = resource.get('recordedDate', 'N/A')
+    if recorded_date != 'N/A':
+        try:
+            dt = datetime.fromisoformat(recorded_date.replace('Z', '+00:00'))
+            formatted_date = dt.strftime('%Y-%m-%d %H:%M:%S')
+            print(f"📅 Recorded: {formatted_date}")
+        except:
+            print(f"📅 Recorded: {recorded_date}")
+    
+    # Notes
+    notes = resource.get('note', [])
+    if notes:
+        print(f"\n📌 Notes:")
+        for note in notes:
+            note_text = note.get('text', '')
+            if note_text:
+                print(f"   {note_text}")
+    
+    # Full JSON (optional)
+    print(f"\n🔍 View full JSON:")
+    print(f"   {BAHMNI_URL}/openmrs/ws/fhir2/R4/Condition/{resource_id}")
+
+
+# Fetch conditions page by page
 print("\n2. Fetching FHIR Conditions...")
 fhir_url = f"{BAHMNI_URL}/openmrs/ws/fhir2/R4/Condition"
+session.auth = (USERNAME, PASSWORD)  # follow-up page links need auth too
 
-response = session.get(
-    fhir_url,
-    auth=(USERNAME, PASSWORD),
-    headers={'Accept': 'application/fhir+json'},
-    verify=False
-)
+# Optional: patient UUIDs on the command line fetch just those patients, concurrently
+patient_uuids = sys.argv[1:]
+total = None
+fetch_error = None
+
+try:
+    if patient_uuids:
+        by_patient = fetch_for_patients(
+            lambda uuid: list(iter_search_resources(
+                session, fhir_url, {"patient": uuid}, page_size=PAGE_SIZE
+            )),
+            patient_uuids,
+            max_workers=MAX_WORKERS
+        )
+        conditions = []
+        for uuid, result in by_patient.items():
+            if "error" in result:
+                print(f"   ❌ {uuid}: {result['error']}")
+            else:
+                print(f"   ✅ {uuid}: {len(result['resources'])} condition(s)")
+                conditions.extend(result["resources"])
+    else:
+        # Stream: each page is printed while the next one is being fetched
+        conditions = iter_search_resources(session, fhir_url, page_size=PAGE_SIZE)
+
+    total = 0
+    for resource in conditions:
+        if total == 0:
+            print("\n" + "=" * 80)
+            print("📋 CONDITIONS IN EMR")
+            print("=" * 80)
+        total += 1
+        print_condition(total, resource)
 
-if response.status_code == 200:
-    bundle = response.json()
-    total = bundle.get('total', 0)
-    print(f"   ✅ Found {total} condition(s)")
-    
     if total > 0:
-        print("\n" + "=" * 80)
-        print("📋 CONDITIONS IN EMR")
-        print("=" * 80)
-        
-        entries = bundle.get('entry', [])
-        for idx, entry in enumerate(entries, 1):
-            resource = entry.get('resource', {})
-            
-            print(f"\n{'─' * 80}")
-            print(f"Condition #{idx}")
-            print(f"{'─' * 80}")
-            
-            # Resource ID
-            resource_id = resource.get('id', 'N/A')
-            print(f"🆔 Resource ID: {resource_id}")
-            
-            # Patient
-            subject = resource.get('subject', {})
-            patient_ref = subject.get('reference', 'N/A')
-            patient_display = subject.get('display', 'N/A')
-            print(f"👤 Patient: {patient_display} ({patient_ref})")
-            
-            # Clinical Status
-            clinical_status = resource.get('clinicalStatus', {})
-            clinical_coding = clinical_status.get('coding', [{}])[0]
-            clinical_code = clinical_coding.get('code', 'N/A')
-            print(f"📊 Clinical Status: {clinical_code}")
-            
-            # Verification Status
-            verification_status = resource.get('verificationStatus', {})
-            verification_coding = verification_status.get('coding', [{}])[0]
-            verification_code = verification_coding.get('code', 'N/A')
-            print(f"✓ Verification Status: {verification_code}")
-            
-            # Codes (ICD-11, Traditional Medicine)
-            code = resource.get('code', {})
-            codings = code.get('coding', [])
-            
-            if codings:
-                print(f"\n💊 Diagnosis Codes:")
-                for coding in codings:
-                    system = coding.get('system', 'N/A')
-                    code_value = coding.get('code', 'N/A')
-                    display = coding.get('display', 'N/A')
-                    
-                    # Identify the system
-                    if 'icd-11' in system.lower():
-                        system_name = "ICD-11"
-                    elif 'traditional-medicine' in system.lower():
-                        system_name = "Traditional Medicine"
-                    else:
-                        system_name = system
-                    
-                    print(f"   • {system_name}: {code_value}")
-                    print(f"     Display: {display}")
-            
-            # Text description
-            code_text = code.get('text', '')
-            if code_text:
-                print(f"\n📝 Description: {code_text}")
-            
-            # Recorded Date
-            recorded_date = resource.get('recordedDate', 'N/A')
-            if recorded_date != 'N/A':
-                try:
-                    dt = datetime.fromisoformat(recorded_date.replace('Z', '+00:00'))
-                    formatted_date = dt.strftime('%Y-%m-%d %H:%M:%S')
-                    print(f"📅 Recorded: {formatted_date}")
-                except:
-                    print(f"📅 Recorded: {recorded_date}")
-            
-            # Notes
-            notes = resource.get('note', [])
-            if notes:
-                print(f"\n📌 Notes:")
-                for note in notes:
-                    note_text = note.get('text', '')
-                    if note_text:
-                        print(f"   {note_text}")
-            
-            # Full JSON (optional)
-            print(f"\n🔍 View full JSON:")
-            print(f"   {BAHMNI_URL}/openmrs/ws/fhir2/R4/Condition/{resource_id}")
-        
         print("\n" + "=" * 80)
         print(f"✅ Total Conditions: {total}")
         print("=" * 80)
     else:
         print("\n⚠️  No conditions found in the EMR")
         print("   Try sending a condition from your web interface first")
-else:
-    print(f"   ❌ Failed to fetch conditions: {response.status_code}")
-    print(f"   Error: {response.text}")
+except FHIRSearchError as e:
+    fetch_error = e
+    print(f"   ❌ Failed to fetch conditions: {e.status_code}")
+    print(f"   Error: {e.text}")
 
 # Summary
 print("\n" + "=" * 80)
@@ -154,7 +183,7 @@ print("📊 SUMMARY")
 print("=" * 80)
 print(f"Bahmni URL: {BAHMNI_URL}")
 print(f"FHIR API: {fhir_url}")
-print(f"Total Conditions: {total if response.status_code == 200 else 'N/A'}")
+print(f"Total Conditions: {total if fetch_error is None else 'N/A'}")
 
 print("\n💡 To view in Bahmni Web Interface:")
 print("   1. Open: http://localhost")